@@ -0,0 +1,58 @@
+"""add_temp_mailbox_status_expires_index
+
+Revision ID: 8a1f3c5e7b92
+Revises: 6d4e8b2a1c3f
+Create Date: 2026-10-19 10:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "8a1f3c5e7b92"
+down_revision: Union[str, Sequence[str], None] = "6d4e8b2a1c3f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM information_schema.tables "
+            "WHERE table_schema = 'public' AND table_name = :table_name"
+        ),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def index_exists(index_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :index_name"),
+        {"index_name": index_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not table_exists("temp_mailboxes"):
+        return
+
+    if not index_exists("ix_temp_mailboxes_status_expires_at"):
+        op.create_index(
+            "ix_temp_mailboxes_status_expires_at",
+            "temp_mailboxes",
+            ["status", "expires_at"],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    if not table_exists("temp_mailboxes"):
+        return
+
+    if index_exists("ix_temp_mailboxes_status_expires_at"):
+        op.drop_index("ix_temp_mailboxes_status_expires_at", table_name="temp_mailboxes")
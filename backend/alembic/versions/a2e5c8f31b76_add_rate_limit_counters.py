@@ -0,0 +1,43 @@
+"""add_rate_limit_counters
+
+Revision ID: a2e5c8f31b76
+Revises: f8c2d4a6b913
+Create Date: 2026-10-19 16:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "a2e5c8f31b76"
+down_revision: Union[str, Sequence[str], None] = "f8c2d4a6b913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM information_schema.tables WHERE table_name = :table_name"),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not table_exists("rate_limit_counters"):
+        op.create_table(
+            "rate_limit_counters",
+            sa.Column("bucket_key", sa.String(length=128), nullable=False, comment="限流键"),
+            sa.Column("window_start", sa.BigInteger(), nullable=False, comment="窗口序号（Unix 秒 / 窗口长度）"),
+            sa.Column("hits", sa.Integer(), nullable=False, server_default="0", comment="窗口内已允许的请求数"),
+            sa.PrimaryKeyConstraint("bucket_key", "window_start"),
+            prefixes=["UNLOGGED"],
+            comment="滑动窗口限流的固定窗口计数",
+        )
+
+
+def downgrade() -> None:
+    if table_exists("rate_limit_counters"):
+        op.drop_table("rate_limit_counters")
@@ -0,0 +1,83 @@
+"""add_external_sync_state
+
+1. external_accounts 增加本地根文件夹与最近一次同步的耗时 / 邮件数
+2. 添加 external_folder_states 表（远端文件夹映射与 UID / MODSEQ 同步位置）
+
+Revision ID: a3e7c1f9b265
+Revises: f1d6b8c2e594
+Create Date: 2026-10-19 23:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "a3e7c1f9b265"
+down_revision: Union[str, Sequence[str], None] = "f1d6b8c2e594"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM information_schema.tables WHERE table_name = :table_name"),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = :table_name AND column_name = :column_name"
+        ),
+        {"table_name": table_name, "column_name": column_name},
+    )
+    return result.fetchone() is not None
+
+
+def account_columns() -> list:
+    return [
+        sa.Column("last_sync_duration_ms", sa.Integer(), nullable=True, comment="最近一次同步耗时（毫秒）"),
+        sa.Column("last_sync_message_count", sa.Integer(), nullable=True, comment="最近一次同步拉取的邮件数"),
+        sa.Column("root_folder_id", sa.Integer(), sa.ForeignKey("folders.id", ondelete="SET NULL"), nullable=True, comment="本地根文件夹，远端文件夹映射为其子文件夹"),
+    ]
+
+
+def upgrade() -> None:
+    for column in account_columns():
+        if not column_exists("external_accounts", column.name):
+            op.add_column("external_accounts", column)
+
+    if not table_exists("external_folder_states"):
+        op.create_table(
+            "external_folder_states",
+            sa.Column("id", sa.Integer(), nullable=False, comment="主键"),
+            sa.Column("account_id", sa.Integer(), nullable=False, comment="外部邮箱账号ID"),
+            sa.Column("remote_name", sa.String(), nullable=False, comment="远端文件夹名（IMAP modified UTF-7 原文）"),
+            sa.Column("local_folder_id", sa.Integer(), nullable=True, comment="映射到的本地文件夹"),
+            sa.Column("uidvalidity", sa.BigInteger(), nullable=True, comment="远端 UIDVALIDITY，变化时从头同步"),
+            sa.Column("last_uid", sa.BigInteger(), nullable=False, server_default="0", comment="已同步的最大 UID"),
+            sa.Column("highest_modseq", sa.BigInteger(), nullable=True, comment="CONDSTORE HIGHESTMODSEQ，未变化时跳过该文件夹"),
+            sa.Column("last_synced_at", sa.DateTime(timezone=True), nullable=True, comment="最近同步时间"),
+            sa.Column("last_fetched_count", sa.Integer(), nullable=False, server_default="0", comment="最近一次同步拉取的邮件数"),
+            sa.Column("last_duration_ms", sa.Integer(), nullable=True, comment="最近一次同步耗时（毫秒）"),
+            sa.Column("total_fetched_count", sa.BigInteger(), nullable=False, server_default="0", comment="累计拉取的邮件数"),
+            sa.ForeignKeyConstraint(["account_id"], ["external_accounts.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["local_folder_id"], ["folders.id"], ondelete="SET NULL"),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("account_id", "remote_name", name="uq_external_folder_states_account_remote"),
+            comment="外部邮箱远端文件夹与本地文件夹的映射及 UID / MODSEQ 同步位置",
+        )
+
+
+def downgrade() -> None:
+    if table_exists("external_folder_states"):
+        op.drop_table("external_folder_states")
+    for column in reversed(account_columns()):
+        if column_exists("external_accounts", column.name):
+            op.drop_column("external_accounts", column.name)
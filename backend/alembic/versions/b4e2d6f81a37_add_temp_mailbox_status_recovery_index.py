@@ -0,0 +1,58 @@
+"""add_temp_mailbox_status_recovery_index
+
+Revision ID: b4e2d6f81a37
+Revises: 8a1f3c5e7b92
+Create Date: 2026-10-19 11:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b4e2d6f81a37"
+down_revision: Union[str, Sequence[str], None] = "8a1f3c5e7b92"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM information_schema.tables "
+            "WHERE table_schema = 'public' AND table_name = :table_name"
+        ),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def index_exists(index_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :index_name"),
+        {"index_name": index_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not table_exists("temp_mailboxes"):
+        return
+
+    if not index_exists("ix_temp_mailboxes_status_recovery_until"):
+        op.create_index(
+            "ix_temp_mailboxes_status_recovery_until",
+            "temp_mailboxes",
+            ["status", "recovery_until"],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    if not table_exists("temp_mailboxes"):
+        return
+
+    if index_exists("ix_temp_mailboxes_status_recovery_until"):
+        op.drop_index("ix_temp_mailboxes_status_recovery_until", table_name="temp_mailboxes")
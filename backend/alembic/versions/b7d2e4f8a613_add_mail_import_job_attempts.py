@@ -0,0 +1,44 @@
+"""add_mail_import_job_attempts
+
+mail_import_jobs 增加 attempts：记录任务开始处理的次数，反复中断的任务达到上限后标记失败
+
+Revision ID: b7d2e4f8a613
+Revises: a3e7c1f9b265
+Create Date: 2026-10-20 10:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b7d2e4f8a613"
+down_revision: Union[str, Sequence[str], None] = "a3e7c1f9b265"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = :table_name AND column_name = :column_name"
+        ),
+        {"table_name": table_name, "column_name": column_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not column_exists("mail_import_jobs", "attempts"):
+        op.add_column(
+            "mail_import_jobs",
+            sa.Column("attempts", sa.Integer(), nullable=False, server_default="0",
+                      comment="开始处理的次数（含中断后续跑）"),
+        )
+
+
+def downgrade() -> None:
+    if column_exists("mail_import_jobs", "attempts"):
+        op.drop_column("mail_import_jobs", "attempts")
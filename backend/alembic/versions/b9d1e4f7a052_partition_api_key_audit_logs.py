@@ -0,0 +1,150 @@
+"""partition_api_key_audit_logs
+
+api_key_audit_logs 改为按 created_at 按天分区（RANGE）。分区 DDL 在此内联，不依赖应用代码：
+创建默认分区与最近 AUDIT_PARTITION_BACKFILL_DAYS 天到未来 PARTITION_PRECREATE_DAYS 天的按天分区，
+旧表数据全部迁入，更早的行落入默认分区，由应用的分区维护按当前保留期删除
+
+Revision ID: b9d1e4f7a052
+Revises: a2e5c8f31b76
+Create Date: 2026-10-19 17:00:00.000000
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b9d1e4f7a052"
+down_revision: Union[str, Sequence[str], None] = "a2e5c8f31b76"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "api_key_audit_logs"
+LEGACY_TABLE = "api_key_audit_logs_legacy"
+COLUMNS = "id, api_key_id, user_id, method, path, ip_address, status_code, decision, error_code, created_at"
+INDEXES = (
+    ("ix_api_key_audit_logs_api_key_id", "api_key_id"),
+    ("ix_api_key_audit_logs_user_id", "user_id"),
+    ("ix_api_key_audit_logs_created_at", "created_at"),
+)
+DEFAULT_PARTITION = f"{TABLE}_default"
+# 迁移时按天分区覆盖的历史天数（默认保留期）与提前创建的天数
+AUDIT_PARTITION_BACKFILL_DAYS = 30
+PARTITION_PRECREATE_DAYS = 7
+
+
+def is_partitioned(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table_name"
+        ),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM information_schema.tables "
+            "WHERE table_schema = 'public' AND table_name = :table_name"
+        ),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def _columns(primary_key_created_at: bool):
+    return [
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False, comment="审计日志唯一标识符"),
+        sa.Column("api_key_id", sa.Integer(), nullable=True, comment="关联的 API Key ID"),
+        sa.Column("user_id", sa.Integer(), nullable=True, comment="调用用户ID"),
+        sa.Column("method", sa.String(length=16), nullable=True, comment="HTTP 方法"),
+        sa.Column("path", sa.String(length=255), nullable=True, comment="请求路径"),
+        sa.Column("ip_address", sa.String(length=64), nullable=True, comment="请求来源 IP"),
+        sa.Column("status_code", sa.Integer(), nullable=True, comment="响应状态码"),
+        sa.Column("decision", sa.String(length=32), nullable=False, comment="决策结果: allow/deny"),
+        sa.Column("error_code", sa.String(length=64), nullable=True, comment="错误类型标识"),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False,
+            comment="创建时间（分区键）" if primary_key_created_at else "创建时间",
+        ),
+        sa.ForeignKeyConstraint(["api_key_id"], ["api_keys.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint(*(("id", "created_at") if primary_key_created_at else ("id",))),
+    ]
+
+
+def _day_start(day) -> str:
+    return f"{day.isoformat()} 00:00:00+00"
+
+
+def _create_partitions(start, days: int) -> None:
+    op.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE}_p{day:%Y%m%d} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{_day_start(day)}') TO ('{_day_start(day + timedelta(days=1))}')"
+        )
+
+
+def _rename_existing_to_legacy() -> None:
+    op.rename_table(TABLE, LEGACY_TABLE)
+    op.execute(f"ALTER INDEX IF EXISTS {TABLE}_pkey RENAME TO {LEGACY_TABLE}_pkey")
+    op.execute(f"ALTER SEQUENCE IF EXISTS {TABLE}_id_seq RENAME TO {LEGACY_TABLE}_id_seq")
+    for index_name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+def _copy_from_legacy() -> None:
+    op.execute(f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {LEGACY_TABLE}")
+    op.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)"
+    )
+    op.drop_table(LEGACY_TABLE)
+
+
+def upgrade() -> None:
+    if is_partitioned(TABLE):
+        return
+
+    has_legacy = table_exists(TABLE)
+    if has_legacy:
+        _rename_existing_to_legacy()
+
+    op.create_table(
+        TABLE,
+        *_columns(primary_key_created_at=True),
+        comment="API Key 调用审计日志",
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    for index_name, column in INDEXES:
+        op.create_index(index_name, TABLE, [column], unique=False)
+
+    # 覆盖最近的历史数据与未来几天
+    today = datetime.now(timezone.utc).date()
+    _create_partitions(
+        today - timedelta(days=AUDIT_PARTITION_BACKFILL_DAYS),
+        AUDIT_PARTITION_BACKFILL_DAYS + PARTITION_PRECREATE_DAYS,
+    )
+
+    if has_legacy:
+        _copy_from_legacy()
+
+
+def downgrade() -> None:
+    if not is_partitioned(TABLE):
+        return
+
+    _rename_existing_to_legacy()
+    op.create_table(TABLE, *_columns(primary_key_created_at=False), comment="API Key 调用审计日志")
+    for index_name, column in INDEXES:
+        op.create_index(index_name, TABLE, [column], unique=False)
+    # 分区随父表一起删除
+    _copy_from_legacy()
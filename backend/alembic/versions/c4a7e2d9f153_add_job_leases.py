@@ -0,0 +1,50 @@
+"""add_job_leases
+
+Revision ID: c4a7e2d9f153
+Revises: b9d1e4f7a052
+Create Date: 2026-10-19 18:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c4a7e2d9f153"
+down_revision: Union[str, Sequence[str], None] = "b9d1e4f7a052"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM information_schema.tables WHERE table_name = :table_name"),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not table_exists("job_leases"):
+        op.create_table(
+            "job_leases",
+            sa.Column("name", sa.String(length=64), nullable=False, comment="任务名"),
+            sa.Column("owner", sa.String(length=128), nullable=False, comment="持有者（主机名:进程号）"),
+            sa.Column("acquired_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="当前持有者获得租约的时间"),
+            sa.Column("heartbeat_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="最近续约时间"),
+            sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=False, comment="租约到期时间，过期后其他 worker 可接管"),
+            sa.Column("last_started_at", sa.DateTime(timezone=True), nullable=True, comment="最近一次运行开始时间"),
+            sa.Column("last_finished_at", sa.DateTime(timezone=True), nullable=True, comment="最近一次运行结束时间"),
+            sa.Column("last_duration_ms", sa.Integer(), nullable=True, comment="最近一次运行耗时（毫秒）"),
+            sa.Column("last_status", sa.String(length=16), nullable=True, comment="最近一次运行结果（ok / error）"),
+            sa.Column("last_error", sa.Text(), nullable=True, comment="最近一次运行的错误信息"),
+            sa.Column("run_count", sa.BigInteger(), nullable=False, server_default="0", comment="累计运行次数"),
+            sa.PrimaryKeyConstraint("name"),
+            comment="后台定时任务与单例服务（LMTP）的租约与最近运行记录",
+        )
+
+
+def downgrade() -> None:
+    if table_exists("job_leases"):
+        op.drop_table("job_leases")
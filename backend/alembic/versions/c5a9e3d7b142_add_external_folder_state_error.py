@@ -0,0 +1,43 @@
+"""add_external_folder_state_error
+
+external_folder_states 增加 last_error：单个远端文件夹同步失败时记录原因，不影响其他文件夹
+
+Revision ID: c5a9e3d7b142
+Revises: b7d2e4f8a613
+Create Date: 2026-10-20 11:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c5a9e3d7b142"
+down_revision: Union[str, Sequence[str], None] = "b7d2e4f8a613"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = :table_name AND column_name = :column_name"
+        ),
+        {"table_name": table_name, "column_name": column_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not column_exists("external_folder_states", "last_error"):
+        op.add_column(
+            "external_folder_states",
+            sa.Column("last_error", sa.Text(), nullable=True, comment="最近一次同步失败的原因，成功后清空"),
+        )
+
+
+def downgrade() -> None:
+    if column_exists("external_folder_states", "last_error"):
+        op.drop_column("external_folder_states", "last_error")
@@ -0,0 +1,42 @@
+"""add_seed_fingerprints
+
+Revision ID: d2b8f5a1c367
+Revises: c4a7e2d9f153
+Create Date: 2026-10-19 19:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "d2b8f5a1c367"
+down_revision: Union[str, Sequence[str], None] = "c4a7e2d9f153"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM information_schema.tables WHERE table_name = :table_name"),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not table_exists("seed_fingerprints"):
+        op.create_table(
+            "seed_fingerprints",
+            sa.Column("name", sa.String(length=64), nullable=False, comment="seeder 名称"),
+            sa.Column("content_hash", sa.String(length=64), nullable=False, comment="seeder 定义的 sha256"),
+            sa.Column("applied_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="最近一次执行时间"),
+            sa.PrimaryKeyConstraint("name"),
+            comment="启动种子数据的内容指纹",
+        )
+
+
+def downgrade() -> None:
+    if table_exists("seed_fingerprints"):
+        op.drop_table("seed_fingerprints")
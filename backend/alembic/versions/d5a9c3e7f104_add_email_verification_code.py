@@ -0,0 +1,146 @@
+"""add_email_verification_code
+
+回填使用的验证码规则是本迁移编写时 core.verification_codes 规则的副本，
+之后修改应用中的规则不影响本迁移的结果
+
+Revision ID: d5a9c3e7f104
+Revises: b4e2d6f81a37
+Create Date: 2026-10-19 12:00:00.000000
+"""
+import html
+import re
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "d5a9c3e7f104"
+down_revision: Union[str, Sequence[str], None] = "b4e2d6f81a37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 回填最近 7 天临时邮箱邮件的验证码（/codes/latest 的最大查询窗口）
+BACKFILL_DAYS = 7
+BACKFILL_BATCH_SIZE = 1000
+
+MAX_SCAN_CHARS = 20000
+CODE_MAX_LENGTH = 32
+# (规则名称, 正则)，验证码在第 1 个分组，先命中者生效
+CODE_PATTERNS = [
+    ("zh_label", re.compile(r'验证码(?:是)?[：:\s]*([A-Za-z0-9]{4,8})', re.IGNORECASE)),
+    ("en_verification_code", re.compile(r'verification code(?: is)?[：:\s]*([A-Za-z0-9]{4,8})', re.IGNORECASE)),
+    ("en_code_label", re.compile(r'code[：:\s]+([A-Za-z0-9]{4,8})', re.IGNORECASE)),
+    ("standalone_digits", re.compile(r'(?:^|\s)(\d{4,8})(?:\s|$)')),
+]
+_SCRIPT_STYLE = re.compile(r'<(script|style|head)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_BLOCK_TAGS = re.compile(r'<\s*(br|/p|/div|/tr|/li|/h[1-6]|/td)\b[^>]*>', re.IGNORECASE)
+_TAGS = re.compile(r'<[^>]+>')
+_HTML_COMMENTS = re.compile(r'<!--.*?-->', re.DOTALL)
+_INLINE_SPACES = re.compile(r'[ \t\r\f\v\u00a0]+')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = :table_name AND column_name = :column_name"
+        ),
+        {"table_name": table_name, "column_name": column_name},
+    )
+    return result.fetchone() is not None
+
+
+def index_exists(index_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :index_name"),
+        {"index_name": index_name},
+    )
+    return result.fetchone() is not None
+
+
+def html_to_text(body_html: str) -> str:
+    text = _HTML_COMMENTS.sub(' ', body_html)
+    text = _SCRIPT_STYLE.sub(' ', text)
+    text = _BLOCK_TAGS.sub('\n', text)
+    text = _TAGS.sub(' ', text)
+    text = html.unescape(text)
+    text = _INLINE_SPACES.sub(' ', text)
+    return _BLANK_LINES.sub('\n', text).strip()
+
+
+def extract_code(body_text: Optional[str], body_html: Optional[str]):
+    """返回 (验证码, 规则名称)；优先纯文本正文，没有纯文本时使用 HTML 转换后的文本"""
+    text = body_text or (html_to_text(body_html) if body_html else "")
+    text = text[:MAX_SCAN_CHARS]
+    for name, regex in CODE_PATTERNS:
+        match = regex.search(text)
+        if match:
+            code = match.group(1)
+            if code and len(code) <= CODE_MAX_LENGTH:
+                return code, name
+    return None
+
+
+def backfill_recent_codes() -> None:
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(
+                "SELECT e.id, e.body_text, e.body_html FROM emails e "
+                "JOIN temp_mailboxes t ON t.email = e.mailbox_address "
+                "WHERE e.id > :last_id AND e.received_at >= now() - make_interval(days => :days) "
+                "ORDER BY e.id LIMIT :limit"
+            ),
+            {"last_id": last_id, "days": BACKFILL_DAYS, "limit": BACKFILL_BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            match = extract_code(row.body_text, row.body_html)
+            if match:
+                updates.append({"id": row.id, "code": match[0], "pattern": match[1]})
+        if updates:
+            conn.execute(
+                sa.text("UPDATE emails SET verification_code = :code, verification_code_pattern = :pattern WHERE id = :id"),
+                updates,
+            )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    if not column_exists("emails", "verification_code"):
+        op.add_column(
+            "emails",
+            sa.Column("verification_code", sa.String(length=32), nullable=True, comment="入库时提取的验证码"),
+        )
+    if not column_exists("emails", "verification_code_pattern"):
+        op.add_column(
+            "emails",
+            sa.Column("verification_code_pattern", sa.String(length=64), nullable=True, comment="命中的验证码规则名称"),
+        )
+
+    if not index_exists("ix_emails_mailbox_code_received"):
+        op.create_index(
+            "ix_emails_mailbox_code_received",
+            "emails",
+            ["mailbox_address", sa.text("received_at DESC")],
+            unique=False,
+            postgresql_where=sa.text("verification_code IS NOT NULL"),
+        )
+
+    backfill_recent_codes()
+
+
+def downgrade() -> None:
+    if index_exists("ix_emails_mailbox_code_received"):
+        op.drop_index("ix_emails_mailbox_code_received", table_name="emails")
+    if column_exists("emails", "verification_code_pattern"):
+        op.drop_column("emails", "verification_code_pattern")
+    if column_exists("emails", "verification_code"):
+        op.drop_column("emails", "verification_code")
@@ -0,0 +1,57 @@
+"""add_temp_mailbox_policy_run_state
+
+temp_mailbox_policies 增加清理游标与最近一次运行吞吐量：
+维护任务只在 worker 进程运行，写到策略行上 API 进程才能读到，切换 worker 后游标也不会丢失
+
+Revision ID: d8b3f6a1c927
+Revises: c5a9e3d7b142
+Create Date: 2026-10-21 09:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "d8b3f6a1c927"
+down_revision: Union[str, Sequence[str], None] = "c5a9e3d7b142"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = :table_name AND column_name = :column_name"
+        ),
+        {"table_name": table_name, "column_name": column_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not column_exists("temp_mailbox_policies", "purge_cursor_recovery_until"):
+        op.add_column(
+            "temp_mailbox_policies",
+            sa.Column("purge_cursor_recovery_until", sa.DateTime(timezone=True), nullable=True,
+                      comment="清理游标：上一批最后一行的恢复截止时间"),
+        )
+    if not column_exists("temp_mailbox_policies", "purge_cursor_id"):
+        op.add_column(
+            "temp_mailbox_policies",
+            sa.Column("purge_cursor_id", sa.Integer(), nullable=True,
+                      comment="清理游标：上一批最后一行的 ID，为空表示从头扫描"),
+        )
+    if not column_exists("temp_mailbox_policies", "last_run_metrics"):
+        op.add_column(
+            "temp_mailbox_policies",
+            sa.Column("last_run_metrics", sa.JSON(), nullable=True, comment="最近一次过期/清理运行的吞吐量"),
+        )
+
+
+def downgrade() -> None:
+    for column in ("last_run_metrics", "purge_cursor_id", "purge_cursor_recovery_until"):
+        if column_exists("temp_mailbox_policies", column):
+            op.drop_column("temp_mailbox_policies", column)
@@ -0,0 +1,215 @@
+"""add_mailbox_email_stats
+
+Revision ID: e3b7a91c4d28
+Revises: d5a9c3e7f104
+Create Date: 2026-10-19 14:00:00.000000
+"""
+from typing import List, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e3b7a91c4d28"
+down_revision: Union[str, Sequence[str], None] = "d5a9c3e7f104"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 触发器与回填 SQL 为本迁移编写时的快照，不引用应用代码；之后的修改应通过新迁移替换函数
+_DELTA_SELECT = """
+    PERFORM mailbox_email_stats_merge(
+        d.mailbox_address,
+        COALESCE(SUM(d.sign), 0),
+        COALESCE(SUM(d.sign) FILTER (WHERE NOT COALESCE(d.is_read, false)), 0),
+        COALESCE(SUM(d.sign) FILTER (WHERE (d.received_at AT TIME ZONE 'UTC')::date = v_today), 0),
+        MAX(d.received_at) FILTER (WHERE d.sign > 0)
+    )
+    FROM ({rows}) d
+    WHERE d.mailbox_address IS NOT NULL
+    GROUP BY d.mailbox_address
+    ORDER BY d.mailbox_address;
+"""
+
+_CHANGED_ROWS = """
+    SELECT {side}.mailbox_address, {sign} AS sign, {side}.is_read, {side}.received_at
+    FROM old_rows o JOIN new_rows n ON n.id = o.id
+    WHERE (o.mailbox_address, o.is_read, o.received_at) IS DISTINCT FROM (n.mailbox_address, n.is_read, n.received_at)
+"""
+
+_INSERT_DELTA = _DELTA_SELECT.format(rows="SELECT mailbox_address, 1 AS sign, is_read, received_at FROM new_rows")
+_DELETE_DELTA = _DELTA_SELECT.format(rows="SELECT mailbox_address, -1 AS sign, is_read, received_at FROM old_rows")
+_UPDATE_DELTA = _DELTA_SELECT.format(
+    rows=_CHANGED_ROWS.format(side="o", sign=-1) + " UNION ALL " + _CHANGED_ROWS.format(side="n", sign=1)
+)
+
+MAILBOX_STATS_TRIGGER_SQL: List[str] = [
+    """
+    CREATE OR REPLACE FUNCTION mailbox_email_stats_merge(
+        p_address text, p_total bigint, p_unread bigint, p_today bigint, p_last timestamptz
+    ) RETURNS void AS $$
+    DECLARE
+        v_today date := (now() AT TIME ZONE 'UTC')::date;
+    BEGIN
+        INSERT INTO mailbox_email_stats AS s
+            (mailbox_address, total_count, unread_count, today_date, today_count, last_received_at, updated_at)
+        VALUES
+            (p_address, GREATEST(p_total, 0), GREATEST(p_unread, 0), v_today, GREATEST(p_today, 0), p_last, now())
+        ON CONFLICT (mailbox_address) DO UPDATE SET
+            total_count = GREATEST(s.total_count + p_total, 0),
+            unread_count = GREATEST(s.unread_count + p_unread, 0),
+            today_count = GREATEST(CASE WHEN s.today_date = v_today THEN s.today_count ELSE 0 END + p_today, 0),
+            today_date = v_today,
+            last_received_at = GREATEST(s.last_received_at, p_last),
+            updated_at = now();
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION mailbox_email_stats_trigger() RETURNS trigger AS $$
+    DECLARE
+        v_today date := (now() AT TIME ZONE 'UTC')::date;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {_INSERT_DELTA}
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP = 'DELETE' THEN
+            {_DELETE_DELTA}
+        ELSE
+            {_UPDATE_DELTA}
+        END IF;
+
+        -- 移走的邮件中包含最新一封时，重新计算最近收件时间
+        UPDATE mailbox_email_stats s
+        SET last_received_at = (
+            SELECT MAX(e.received_at) FROM emails e WHERE e.mailbox_address = s.mailbox_address
+        )
+        FROM (
+            SELECT mailbox_address, MAX(received_at) AS received_at
+            FROM old_rows WHERE mailbox_address IS NOT NULL GROUP BY mailbox_address
+        ) o
+        WHERE s.mailbox_address = o.mailbox_address AND o.received_at >= s.last_received_at;
+
+        DELETE FROM mailbox_email_stats s
+        USING (SELECT DISTINCT mailbox_address FROM old_rows) o
+        WHERE s.mailbox_address = o.mailbox_address AND s.total_count = 0;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_insert ON emails;",
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_update ON emails;",
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_delete ON emails;",
+    """
+    CREATE TRIGGER emails_mailbox_stats_insert
+    AFTER INSERT ON emails REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mailbox_email_stats_trigger();
+    """,
+    """
+    CREATE TRIGGER emails_mailbox_stats_update
+    AFTER UPDATE ON emails REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mailbox_email_stats_trigger();
+    """,
+    """
+    CREATE TRIGGER emails_mailbox_stats_delete
+    AFTER DELETE ON emails REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mailbox_email_stats_trigger();
+    """,
+]
+
+MAILBOX_STATS_DROP_SQL: List[str] = [
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_insert ON emails;",
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_update ON emails;",
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_delete ON emails;",
+    "DROP FUNCTION IF EXISTS mailbox_email_stats_trigger();",
+    "DROP FUNCTION IF EXISTS mailbox_email_stats_merge(text, bigint, bigint, bigint, timestamptz);",
+]
+
+# 按 emails 全量（或指定邮箱）重建统计行
+REBUILD_SQL = """
+    INSERT INTO mailbox_email_stats
+        (mailbox_address, total_count, unread_count, today_date, today_count, last_received_at, updated_at)
+    SELECT
+        mailbox_address,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE NOT COALESCE(is_read, false)),
+        (now() AT TIME ZONE 'UTC')::date,
+        COUNT(*) FILTER (WHERE (received_at AT TIME ZONE 'UTC')::date = (now() AT TIME ZONE 'UTC')::date),
+        MAX(received_at),
+        now()
+    FROM emails
+    WHERE mailbox_address IS NOT NULL {address_filter}
+    GROUP BY mailbox_address
+    ON CONFLICT (mailbox_address) DO UPDATE SET
+        total_count = EXCLUDED.total_count,
+        unread_count = EXCLUDED.unread_count,
+        today_date = EXCLUDED.today_date,
+        today_count = EXCLUDED.today_count,
+        last_received_at = EXCLUDED.last_received_at,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM information_schema.tables WHERE table_name = :table_name"),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def index_exists(index_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :index_name"),
+        {"index_name": index_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not index_exists("ix_emails_mailbox_received"):
+        op.create_index(
+            "ix_emails_mailbox_received",
+            "emails",
+            ["mailbox_address", sa.text("received_at DESC")],
+            unique=False,
+        )
+    # 单列索引是复合索引的前缀，删除以减少写入开销
+    if index_exists("ix_emails_mailbox_address"):
+        op.drop_index("ix_emails_mailbox_address", table_name="emails")
+
+    if not table_exists("mailbox_email_stats"):
+        op.create_table(
+            "mailbox_email_stats",
+            sa.Column("mailbox_address", sa.String(), nullable=False, comment="邮箱地址"),
+            sa.Column("total_count", sa.Integer(), nullable=False, server_default="0", comment="邮件总数"),
+            sa.Column("unread_count", sa.Integer(), nullable=False, server_default="0", comment="未读邮件数"),
+            sa.Column("today_date", sa.Date(), nullable=True, comment="today_count 对应的日期（UTC）"),
+            sa.Column("today_count", sa.Integer(), nullable=False, server_default="0", comment="today_date 当天收到的邮件数"),
+            sa.Column("last_received_at", sa.DateTime(timezone=True), nullable=True, comment="最近一封邮件的接收时间"),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True, comment="统计更新时间"),
+            sa.PrimaryKeyConstraint("mailbox_address"),
+            comment="按邮箱地址聚合的邮件统计，由 emails 表触发器维护",
+        )
+
+    conn = op.get_bind()
+    # 先锁表再装触发器并回填，避免回填期间写入的邮件被重复计数
+    conn.execute(sa.text("LOCK TABLE emails IN SHARE ROW EXCLUSIVE MODE"))
+    for statement in MAILBOX_STATS_TRIGGER_SQL:
+        conn.execute(sa.text(statement))
+    conn.execute(sa.text(REBUILD_SQL.format(address_filter="")))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    for statement in MAILBOX_STATS_DROP_SQL:
+        conn.execute(sa.text(statement))
+    if table_exists("mailbox_email_stats"):
+        op.drop_table("mailbox_email_stats")
+    if not index_exists("ix_emails_mailbox_address"):
+        op.create_index("ix_emails_mailbox_address", "emails", ["mailbox_address"], unique=False)
+    if index_exists("ix_emails_mailbox_received"):
+        op.drop_index("ix_emails_mailbox_received", table_name="emails")
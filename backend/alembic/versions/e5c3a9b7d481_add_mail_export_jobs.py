@@ -0,0 +1,57 @@
+"""add_mail_export_jobs
+
+Revision ID: e5c3a9b7d481
+Revises: d2b8f5a1c367
+Create Date: 2026-10-19 21:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e5c3a9b7d481"
+down_revision: Union[str, Sequence[str], None] = "d2b8f5a1c367"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM information_schema.tables WHERE table_name = :table_name"),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not table_exists("mail_export_jobs"):
+        op.create_table(
+            "mail_export_jobs",
+            sa.Column("id", sa.String(length=32), nullable=False, comment="任务 ID"),
+            sa.Column("user_id", sa.Integer(), nullable=False, comment="所属用户"),
+            sa.Column("folder_id", sa.Integer(), nullable=True, comment="导出的文件夹，为空表示全部"),
+            sa.Column("since", sa.DateTime(timezone=True), nullable=True, comment="接收时间下限（含）"),
+            sa.Column("until", sa.DateTime(timezone=True), nullable=True, comment="接收时间上限（不含）"),
+            sa.Column("format", sa.String(length=8), nullable=False, comment="导出格式（mbox / zip）"),
+            sa.Column("status", sa.String(length=16), nullable=False, server_default="pending", comment="状态（pending / running / completed）"),
+            sa.Column("total_count", sa.Integer(), nullable=False, server_default="0", comment="创建时符合条件的邮件数"),
+            sa.Column("exported_count", sa.Integer(), nullable=False, server_default="0", comment="已确认导出的邮件数"),
+            sa.Column("last_email_id", sa.Integer(), nullable=False, server_default="0", comment="已确认导出的最大邮件 ID，续传从其后开始"),
+            sa.Column("parts", sa.Integer(), nullable=False, server_default="0", comment="已开始的下载次数（分卷序号）"),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="创建时间"),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="最近更新时间"),
+            sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True, comment="完成时间"),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["folder_id"], ["folders.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+            comment="邮箱批量导出（mbox / zip）任务与续传位置",
+        )
+        op.create_index("ix_mail_export_jobs_user_id", "mail_export_jobs", ["user_id"])
+
+
+def downgrade() -> None:
+    if table_exists("mail_export_jobs"):
+        op.drop_index("ix_mail_export_jobs_user_id", table_name="mail_export_jobs")
+        op.drop_table("mail_export_jobs")
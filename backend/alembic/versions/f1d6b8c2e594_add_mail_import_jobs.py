@@ -0,0 +1,85 @@
+"""add_mail_import_jobs
+
+1. 添加 mail_import_jobs 表
+2. search_vector 触发器在插入时若已提供向量则跳过计算（批量导入在多行 INSERT 中直接生成）
+
+Revision ID: f1d6b8c2e594
+Revises: e5c3a9b7d481
+Create Date: 2026-10-19 22:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "f1d6b8c2e594"
+down_revision: Union[str, Sequence[str], None] = "e5c3a9b7d481"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM information_schema.tables WHERE table_name = :table_name"),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+SEARCH_VECTOR_FUNCTION = """
+    CREATE OR REPLACE FUNCTION emails_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        {skip}NEW.search_vector :=
+            setweight(to_tsvector('simple', COALESCE(NEW.subject, '')), 'A') ||
+            setweight(to_tsvector('simple', COALESCE(NEW.sender, '')), 'B') ||
+            setweight(to_tsvector('simple', COALESCE(NEW.body_text, '')), 'C');
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+SKIP_PROVIDED_VECTOR = """IF TG_OP = 'INSERT' AND NEW.search_vector IS NOT NULL THEN
+            RETURN NEW;
+        END IF;
+        """
+
+
+def upgrade() -> None:
+    if not table_exists("mail_import_jobs"):
+        op.create_table(
+            "mail_import_jobs",
+            sa.Column("id", sa.String(length=32), nullable=False, comment="任务 ID"),
+            sa.Column("user_id", sa.Integer(), nullable=False, comment="所属用户"),
+            sa.Column("folder_id", sa.Integer(), nullable=False, comment="导入到的文件夹"),
+            sa.Column("format", sa.String(length=8), nullable=False, comment="文件格式（mbox / zip / eml）"),
+            sa.Column("filename", sa.String(length=255), nullable=True, comment="上传的原始文件名"),
+            sa.Column("file_path", sa.String(), nullable=False, comment="上传文件的存储路径，完成后删除"),
+            sa.Column("file_size", sa.BigInteger(), nullable=False, server_default="0", comment="上传文件大小（字节）"),
+            sa.Column("status", sa.String(length=16), nullable=False, server_default="pending", comment="状态（pending / running / completed / failed）"),
+            sa.Column("processed_count", sa.Integer(), nullable=False, server_default="0", comment="已处理的邮件数（续跑时跳过）"),
+            sa.Column("imported_count", sa.Integer(), nullable=False, server_default="0", comment="已入库的邮件数"),
+            sa.Column("duplicate_count", sa.Integer(), nullable=False, server_default="0", comment="按 Message-ID 去重跳过的邮件数"),
+            sa.Column("failed_count", sa.Integer(), nullable=False, server_default="0", comment="解析失败的邮件数"),
+            sa.Column("bytes_processed", sa.BigInteger(), nullable=False, server_default="0", comment="已处理的文件字节数，用于估算进度"),
+            sa.Column("error", sa.Text(), nullable=True, comment="失败原因"),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="创建时间"),
+            sa.Column("started_at", sa.DateTime(timezone=True), nullable=True, comment="开始处理时间"),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="最近更新时间"),
+            sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True, comment="完成时间"),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["folder_id"], ["folders.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+            comment="邮箱批量导入（mbox / zip / eml）任务与进度",
+        )
+        op.create_index("ix_mail_import_jobs_user_id", "mail_import_jobs", ["user_id"])
+
+    op.execute(SEARCH_VECTOR_FUNCTION.format(skip=SKIP_PROVIDED_VECTOR))
+
+
+def downgrade() -> None:
+    op.execute(SEARCH_VECTOR_FUNCTION.format(skip=""))
+    if table_exists("mail_import_jobs"):
+        op.drop_index("ix_mail_import_jobs_user_id", table_name="mail_import_jobs")
+        op.drop_table("mail_import_jobs")
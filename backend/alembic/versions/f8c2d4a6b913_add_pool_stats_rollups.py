@@ -0,0 +1,69 @@
+"""add_pool_stats_rollups
+
+Revision ID: f8c2d4a6b913
+Revises: e3b7a91c4d28
+Create Date: 2026-10-19 15:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "f8c2d4a6b913"
+down_revision: Union[str, Sequence[str], None] = "e3b7a91c4d28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM information_schema.tables WHERE table_name = :table_name"),
+        {"table_name": table_name},
+    )
+    return result.fetchone() is not None
+
+
+def index_exists(index_name: str) -> bool:
+    conn = op.get_bind()
+    result = conn.execute(
+        sa.text("SELECT 1 FROM pg_indexes WHERE indexname = :index_name"),
+        {"index_name": index_name},
+    )
+    return result.fetchone() is not None
+
+
+def upgrade() -> None:
+    if not index_exists("ix_temp_mailboxes_owner_status"):
+        op.create_index(
+            "ix_temp_mailboxes_owner_status",
+            "temp_mailboxes",
+            ["owner_id", "status"],
+            unique=False,
+        )
+
+    if not table_exists("pool_stats_rollups"):
+        op.create_table(
+            "pool_stats_rollups",
+            sa.Column("scope", sa.String(length=32), nullable=False, comment="汇总范围（global）"),
+            sa.Column("total_mailboxes", sa.Integer(), nullable=False, server_default="0", comment="未清理的临时邮箱数"),
+            sa.Column("active_mailboxes", sa.Integer(), nullable=False, server_default="0", comment="活跃临时邮箱数"),
+            sa.Column("recoverable_mailboxes", sa.Integer(), nullable=False, server_default="0", comment="可恢复临时邮箱数"),
+            sa.Column("purged_mailboxes", sa.Integer(), nullable=False, server_default="0", comment="已清理临时邮箱数"),
+            sa.Column("owners", sa.Integer(), nullable=False, server_default="0", comment="拥有临时邮箱的用户数"),
+            sa.Column("total_emails", sa.BigInteger(), nullable=False, server_default="0", comment="临时邮箱邮件总数"),
+            sa.Column("unread_emails", sa.BigInteger(), nullable=False, server_default="0", comment="临时邮箱未读邮件数"),
+            sa.Column("today_emails", sa.BigInteger(), nullable=False, server_default="0", comment="临时邮箱当天（UTC）收到的邮件数"),
+            sa.Column("computed_at", sa.DateTime(timezone=True), nullable=True, comment="汇总计算时间"),
+            sa.Column("duration_ms", sa.Integer(), nullable=False, server_default="0", comment="汇总计算耗时（毫秒）"),
+            sa.PrimaryKeyConstraint("scope"),
+            comment="账号池全局统计汇总（管理端仪表盘读取）",
+        )
+
+
+def downgrade() -> None:
+    if table_exists("pool_stats_rollups"):
+        op.drop_table("pool_stats_rollups")
+    if index_exists("ix_temp_mailboxes_owner_status"):
+        op.drop_index("ix_temp_mailboxes_owner_status", table_name="temp_mailboxes")
@@ -7,6 +7,8 @@ from db.models.email import Alias
 from db.models.billing import Subscription, Plan
 from api import deps
 from core.config import settings
+from core.config_cache import get_default_plan
+from core.reserved_prefixes import is_prefix_reserved
 from datetime import datetime, timezone
 
 router = APIRouter()
@@ -50,7 +52,7 @@ def get_user_alias_limit(db: Session, user: models.User) -> int:
                 return plan.max_aliases
     
     # 默认套餐
-    default_plan = db.query(Plan).filter(Plan.is_default == True).first()
+    default_plan = get_default_plan(db)
     return default_plan.max_aliases if default_plan else 0
 
 
@@ -82,6 +84,8 @@ def create_alias(
     prefix = data.alias_prefix.lower().strip()
     if not prefix:
         raise HTTPException(status_code=400, detail="别名前缀不能为空")
+    if current_user.role != "admin" and is_prefix_reserved(db, prefix):
+        raise HTTPException(status_code=400, detail=f"前缀 '{prefix}' 是系统保留前缀，不允许使用")
     
     alias_email = f"{prefix}@{settings.BASE_DOMAIN}"
     
@@ -6,6 +6,8 @@ from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
 from api import deps
+from core.api_key_audit import api_key_audit_writer
+from core.api_key_cache import invalidate_api_key
 from core.api_keys import generate_api_key
 from core.config import settings
 from db import models
@@ -160,6 +162,9 @@ def revoke_api_key(
         return {"message": "API Key 已吊销"}
 
     api_key.revoked_at = datetime.now(timezone.utc)
+    # 先提交再失效认证缓存，避免其他请求在提交前重新加载到未吊销的快照
+    db.commit()
+    invalidate_api_key(api_key.id)
     return {"message": "API Key 已吊销"}
 
 
@@ -177,10 +182,20 @@ def list_api_key_audit_logs(
     if not key_ids:
         return []
 
+    # 限定在保留期内，查询只扫描仍存在的按天分区
+    retention_start = datetime.now(timezone.utc) - timedelta(days=settings.API_KEY_AUDIT_RETENTION_DAYS)
     return (
         db.query(ApiKeyAuditLog)
-        .filter(ApiKeyAuditLog.api_key_id.in_(key_ids))
+        .filter(ApiKeyAuditLog.api_key_id.in_(key_ids), ApiKeyAuditLog.created_at >= retention_start)
         .order_by(ApiKeyAuditLog.created_at.desc())
         .limit(limit)
         .all()
     )
+
+
+@router.get("/admin/audit-writer")
+def get_audit_writer_status(
+    current_user: models.User = Depends(deps.get_current_admin_user),
+):
+    """审计日志批量写入队列状态（本进程）"""
+    return api_key_audit_writer.stats()
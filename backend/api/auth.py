@@ -18,10 +18,11 @@ from crud import user as crud_user
 from db import models
 from db.database import get_db
 from db.models.user import UserSession
-from db.models.system import ReservedPrefix, VerificationCode
+from db.models.system import VerificationCode
 from schemas.user import UserCreate
 from schemas.schemas import Token # Will be moved to schemas.token soon
 from api import deps
+from core.reserved_prefixes import is_prefix_reserved
 
 router = APIRouter()
 
@@ -376,11 +377,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     email_prefix = user.email.split('@')[0].lower().strip()
     
     # 检查是否是保留前缀
-    reserved = db.query(ReservedPrefix).filter(
-        ReservedPrefix.prefix == email_prefix,
-        ReservedPrefix.is_active == True
-    ).first()
-    if reserved:
+    if is_prefix_reserved(db, email_prefix):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"邮箱前缀 '{email_prefix}' 是系统保留前缀，不允许注册",
@@ -451,11 +448,7 @@ def register_user_with_verification(
     email_prefix = user.email.split('@')[0].lower().strip()
     
     # 检查是否是保留前缀
-    reserved = db.query(ReservedPrefix).filter(
-        ReservedPrefix.prefix == email_prefix,
-        ReservedPrefix.is_active == True
-    ).first()
-    if reserved:
+    if is_prefix_reserved(db, email_prefix):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"邮箱前缀 '{email_prefix}' 是系统保留前缀，不允许注册",
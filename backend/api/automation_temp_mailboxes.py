@@ -1,18 +1,30 @@
+import asyncio
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from api import deps
 from api.pool import (
+    batch_results_to_response,
+    create_temp_mailboxes_batch,
     ensure_pool_access,
-    extract_verification_code,
-    generate_random_prefix,
+    expand_batch_request,
     get_user_temp_mailbox_limit,
     mailbox_to_read,
+    mailboxes_to_read,
+    normalize_idempotency_key,
+    resolve_temp_mailbox_prefix,
     sync_temp_mailbox_to_server,
+    sync_temp_mailboxes_to_server,
+    TempMailboxBatchCreate,
+    TempMailboxBatchResponse,
     TempMailboxCreate,
     TempMailboxRead,
 )
@@ -20,15 +32,27 @@ from core.temp_mailbox_lifecycle import (
     STATUS_ACTIVE,
     STATUS_EXPIRED_RECOVERABLE,
     STATUS_PURGED,
+    active_mailbox_clause,
     compute_new_expiry_windows,
-    get_or_create_policy,
-    run_temp_mailbox_maintenance,
+    effective_status,
+    get_policy_snapshot,
 )
+from core.mailbox_stats import get_mailbox_stats
+from core.mailbox_waiters import mailbox_waiters
+from core.pool_stats import invalidate_user_stats
 from db import models
-from db.models.system import ApiKey
+from db.database import SessionLocal
+from core.api_key_cache import ApiKeyPrincipal
 
 router = APIRouter(prefix="/automation/temp-mailboxes", tags=["Automation Temp Mailboxes"])
 
+# 长轮询最长等待时间（秒）
+MAX_WAIT_SECONDS = 120
+# SSE 连接最长保持时间（秒）
+MAX_STREAM_SECONDS = 3600
+# 等待期间的复查间隔（秒），兜底跨进程通知丢失的情况，同时作为 SSE 心跳间隔
+WAIT_RECHECK_SECONDS = 15
+
 
 class TempMailboxEmailItem(BaseModel):
     id: int
@@ -54,6 +78,7 @@ class TempMailboxCodeRead(BaseModel):
     subject: Optional[str] = None
     received_at: Optional[str] = None
     code: str
+    pattern: Optional[str] = None
 
 
 class ExtendRestoreResponse(BaseModel):
@@ -64,7 +89,7 @@ class ExtendRestoreResponse(BaseModel):
 
 def _get_api_key_user(
     db: Session,
-    api_key: ApiKey,
+    api_key: ApiKeyPrincipal,
 ) -> models.User:
     user = db.query(models.User).filter(models.User.id == api_key.user_id).first()
     if not user:
@@ -73,6 +98,13 @@ def _get_api_key_user(
     return user
 
 
+def _get_api_key_owner_id(api_key: ApiKeyPrincipal) -> int:
+    """只需要所属用户 ID 的接口使用密钥快照校验账号池权限，不再查询用户"""
+    if not api_key.has_pool_access:
+        raise HTTPException(status_code=403, detail="您没有账号池功能权限")
+    return api_key.user_id
+
+
 def _get_owned_mailbox_or_404(db: Session, user_id: int, mailbox_id: int) -> models.TempMailbox:
     mailbox = db.query(models.TempMailbox).filter(
         models.TempMailbox.id == mailbox_id,
@@ -87,16 +119,15 @@ def _get_owned_mailbox_or_404(db: Session, user_id: int, mailbox_id: int) -> mod
 def list_temp_mailboxes_for_api_key(
     include_purged: bool = Query(False),
     db: Session = Depends(deps.get_db),
-    api_key: ApiKey = Depends(deps.require_api_key_scopes(["temp_mailbox:read"])),
+    api_key: ApiKeyPrincipal = Depends(deps.require_api_key_scopes(["temp_mailbox:read"])),
 ):
-    user = _get_api_key_user(db, api_key)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=user.id)
+    user_id = _get_api_key_owner_id(api_key)
 
-    query = db.query(models.TempMailbox).filter(models.TempMailbox.owner_id == user.id)
+    query = db.query(models.TempMailbox).filter(models.TempMailbox.owner_id == user_id)
     if not include_purged:
         query = query.filter(models.TempMailbox.status != STATUS_PURGED)
     items = query.order_by(models.TempMailbox.created_at.desc()).all()
-    return [mailbox_to_read(db, mailbox) for mailbox in items]
+    return mailboxes_to_read(db, items)
 
 
 @router.post("", response_model=TempMailboxRead)
@@ -104,19 +135,13 @@ def create_temp_mailbox_for_api_key(
     data: TempMailboxCreate,
     idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
     db: Session = Depends(deps.get_db),
-    api_key: ApiKey = Depends(deps.require_api_key_scopes(["temp_mailbox:create"])),
+    api_key: ApiKeyPrincipal = Depends(deps.require_api_key_scopes(["temp_mailbox:create"])),
 ):
     user = _get_api_key_user(db, api_key)
-    policy = get_or_create_policy(db)
-
-    normalized_idempotency_key: Optional[str] = None
-    if idempotency_key is not None:
-        normalized_idempotency_key = idempotency_key.strip()
-        if not normalized_idempotency_key:
-            raise HTTPException(status_code=400, detail="Idempotency-Key 不能为空字符串")
-        if len(normalized_idempotency_key) > 128:
-            raise HTTPException(status_code=400, detail="Idempotency-Key 长度不能超过 128")
+    policy = get_policy_snapshot(db)
 
+    normalized_idempotency_key = normalize_idempotency_key(idempotency_key)
+    if normalized_idempotency_key is not None:
         existing_by_idempotency = db.query(models.TempMailbox).filter(
             models.TempMailbox.owner_id == user.id,
             models.TempMailbox.api_idempotency_key == normalized_idempotency_key,
@@ -129,8 +154,7 @@ def create_temp_mailbox_for_api_key(
     if limit != -1:
         current_count = db.query(models.TempMailbox).filter(
             models.TempMailbox.owner_id == user.id,
-            models.TempMailbox.status == STATUS_ACTIVE,
-            models.TempMailbox.is_active == True,  # noqa: E712
+            active_mailbox_clause(),
         ).count()
         if current_count >= limit:
             raise HTTPException(
@@ -138,9 +162,7 @@ def create_temp_mailbox_for_api_key(
                 detail=f"已达到临时邮箱数量上限 ({limit} 个)，请升级套餐或删除不需要的邮箱",
             )
 
-    prefix = data.prefix.strip().lower() if data.prefix else generate_random_prefix()
-    if not prefix.replace("_", "").replace("-", "").isalnum():
-        raise HTTPException(status_code=400, detail="邮箱前缀只能包含字母、数字、下划线和连字符")
+    prefix = resolve_temp_mailbox_prefix(db, user, data.prefix)
 
     domain = user.email.split("@")[1]
     email = f"{prefix}@{domain}"
@@ -175,11 +197,25 @@ def create_temp_mailbox_for_api_key(
     )
     db.commit()
     db.refresh(mailbox)
+    invalidate_user_stats(user.id)
 
     sync_temp_mailbox_to_server(email)
     return mailbox_to_read(db, mailbox)
 
 
+@router.post("/batch", response_model=TempMailboxBatchResponse)
+def create_temp_mailboxes_for_api_key(
+    data: TempMailboxBatchCreate,
+    db: Session = Depends(deps.get_db),
+    api_key: ApiKeyPrincipal = Depends(deps.require_api_key_scopes(["temp_mailbox:create"])),
+):
+    """批量创建临时邮箱，每个条目可携带独立的 idempotency_key"""
+    user = _get_api_key_user(db, api_key)
+    results, new_emails = create_temp_mailboxes_batch(db, user, expand_batch_request(data), "api_create")
+    sync_temp_mailboxes_to_server(new_emails)
+    return batch_results_to_response(db, results)
+
+
 @router.get("/{mailbox_id}/emails", response_model=TempMailboxEmailListResponse)
 def get_mailbox_emails_for_api_key(
     mailbox_id: int,
@@ -187,27 +223,27 @@ def get_mailbox_emails_for_api_key(
     limit: int = Query(20, ge=1, le=100),
     include_body: bool = Query(False),
     db: Session = Depends(deps.get_db),
-    api_key: ApiKey = Depends(deps.require_api_key_scopes(["temp_email:read"])),
+    api_key: ApiKeyPrincipal = Depends(deps.require_api_key_scopes(["temp_email:read"])),
 ):
-    user = _get_api_key_user(db, api_key)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=user.id)
+    user_id = _get_api_key_owner_id(api_key)
 
     mailbox = db.query(models.TempMailbox).filter(
         models.TempMailbox.id == mailbox_id,
-        models.TempMailbox.owner_id == user.id,
+        models.TempMailbox.owner_id == user_id,
         models.TempMailbox.status != STATUS_PURGED,
     ).first()
     if not mailbox:
         raise HTTPException(status_code=404, detail="临时邮箱不存在")
 
-    query = db.query(models.Email).filter(models.Email.mailbox_address == mailbox.email)
-    total = query.count()
-    emails = query.order_by(models.Email.received_at.desc()).offset((page - 1) * limit).limit(limit).all()
+    stats = get_mailbox_stats(db, mailbox.email)
+    total = stats.total_count if stats else 0
+    emails = db.query(models.Email).filter(
+        models.Email.mailbox_address == mailbox.email
+    ).order_by(models.Email.received_at.desc()).offset((page - 1) * limit).limit(limit).all()
 
     items: List[TempMailboxEmailItem] = []
     for email in emails:
-        text_source = email.body_text or email.body_html or ""
-        code = extract_verification_code(text_source) if mailbox.auto_verify_codes else None
+        code = email.verification_code if mailbox.auto_verify_codes else None
         items.append(
             TempMailboxEmailItem(
                 id=email.id,
@@ -223,75 +259,207 @@ def get_mailbox_emails_for_api_key(
     return TempMailboxEmailListResponse(items=items, total=total)
 
 
-@router.get("/{mailbox_id}/codes/latest", response_model=Optional[TempMailboxCodeRead])
-def get_latest_verification_code(
-    mailbox_id: int,
-    sender_contains: Optional[str] = Query(default=None),
-    subject_contains: Optional[str] = Query(default=None),
-    unread_only: bool = Query(default=False),
-    within_minutes: int = Query(default=1440, ge=1, le=10080),
-    db: Session = Depends(deps.get_db),
-    api_key: ApiKey = Depends(deps.require_api_key_scopes(["temp_code:read"])),
-):
-    user = _get_api_key_user(db, api_key)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=user.id)
+@dataclass(frozen=True)
+class CodeFilter:
+    sender_contains: Optional[str] = None
+    subject_contains: Optional[str] = None
+    unread_only: bool = False
+    within_minutes: int = 1440
+    after_email_id: Optional[int] = None
+
+
+def _code_query(db: Session, mailbox_email: str, code_filter: CodeFilter):
+    since_time = datetime.now(timezone.utc) - timedelta(minutes=code_filter.within_minutes)
+    query = db.query(models.Email).filter(
+        models.Email.mailbox_address == mailbox_email,
+        models.Email.verification_code.isnot(None),
+        models.Email.received_at >= since_time,
+    )
+    if code_filter.after_email_id is not None:
+        query = query.filter(models.Email.id > code_filter.after_email_id)
+    if code_filter.unread_only:
+        query = query.filter(models.Email.is_read == False)  # noqa: E712
+    if code_filter.sender_contains:
+        query = query.filter(models.Email.sender.ilike(f"%{code_filter.sender_contains.strip()}%"))
+    if code_filter.subject_contains:
+        query = query.filter(models.Email.subject.ilike(f"%{code_filter.subject_contains.strip()}%"))
+    return query
+
+
+def _code_to_read(mailbox_id: int, mailbox_email: str, email: models.Email) -> TempMailboxCodeRead:
+    return TempMailboxCodeRead(
+        mailbox_id=mailbox_id,
+        mailbox_email=mailbox_email,
+        email_id=email.id,
+        sender=email.sender,
+        subject=email.subject,
+        received_at=email.received_at.isoformat() if email.received_at else None,
+        code=email.verification_code,
+        pattern=email.verification_code_pattern,
+    )
+
+
+def _find_latest_code(
+    db: Session, mailbox_id: int, mailbox_email: str, code_filter: CodeFilter
+) -> Optional[TempMailboxCodeRead]:
+    # 验证码在入库时已提取，走 (mailbox_address, received_at DESC) 部分索引
+    email = _code_query(db, mailbox_email, code_filter).order_by(models.Email.received_at.desc()).first()
+    return _code_to_read(mailbox_id, mailbox_email, email) if email else None
+
+
+def _find_codes_after(
+    mailbox_id: int, mailbox_email: str, code_filter: CodeFilter, limit: int = 50
+) -> List[TempMailboxCodeRead]:
+    """SSE 使用：按到达顺序返回游标之后的验证码（独立短会话）"""
+    db = SessionLocal()
+    try:
+        emails = _code_query(db, mailbox_email, code_filter).order_by(models.Email.id.asc()).limit(limit).all()
+        return [_code_to_read(mailbox_id, mailbox_email, email) for email in emails]
+    finally:
+        db.close()
+
 
+def _get_code_mailbox(db: Session, api_key: ApiKeyPrincipal, mailbox_id: int) -> Tuple[int, str]:
+    """校验权限并返回 (邮箱 ID, 邮箱地址)，之后提交事务释放连接"""
+    user_id = _get_api_key_owner_id(api_key)
     mailbox = db.query(models.TempMailbox).filter(
         models.TempMailbox.id == mailbox_id,
-        models.TempMailbox.owner_id == user.id,
+        models.TempMailbox.owner_id == user_id,
         models.TempMailbox.status != STATUS_PURGED,
     ).first()
     if not mailbox:
         raise HTTPException(status_code=404, detail="临时邮箱不存在")
+    result = (mailbox.id, mailbox.email)
+    db.commit()
+    return result
 
-    since_time = datetime.now(timezone.utc) - timedelta(minutes=within_minutes)
-    query = db.query(models.Email).filter(
-        models.Email.mailbox_address == mailbox.email,
-        models.Email.received_at >= since_time,
+
+@router.get("/{mailbox_id}/codes/latest", response_model=Optional[TempMailboxCodeRead])
+async def get_latest_verification_code(
+    mailbox_id: int,
+    sender_contains: Optional[str] = Query(default=None),
+    subject_contains: Optional[str] = Query(default=None),
+    unread_only: bool = Query(default=False),
+    within_minutes: int = Query(default=1440, ge=1, le=10080),
+    after_email_id: Optional[int] = Query(default=None, description="只返回该邮件 ID 之后到达的验证码"),
+    wait: int = Query(default=0, ge=0, le=MAX_WAIT_SECONDS, description="长轮询：没有匹配的验证码时最多等待的秒数"),
+    db: Session = Depends(deps.get_db),
+    api_key: ApiKeyPrincipal = Depends(deps.require_api_key_scopes(["temp_code:read"])),
+):
+    mailbox_id, mailbox_email = await run_in_threadpool(_get_code_mailbox, db, api_key, mailbox_id)
+    code_filter = CodeFilter(sender_contains, subject_contains, unread_only, within_minutes, after_email_id)
+
+    if wait == 0:
+        return await run_in_threadpool(_find_latest_code, db, mailbox_id, mailbox_email, code_filter)
+
+    # 先登记再查询，避免查询与登记之间到达的邮件被漏掉
+    waiter = mailbox_waiters.register(mailbox_email)
+    try:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            result = await run_in_threadpool(_find_latest_code, db, mailbox_id, mailbox_email, code_filter)
+            # 结束只读事务，等待期间不占用连接池中的连接
+            await run_in_threadpool(db.commit)
+            if result is not None:
+                return result
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            # 被入库路径唤醒或到达复查间隔后重新查询
+            await waiter.wait(min(remaining, WAIT_RECHECK_SECONDS))
+    finally:
+        mailbox_waiters.unregister(waiter)
+
+
+@router.get("/{mailbox_id}/codes/stream")
+async def stream_verification_codes(
+    request: Request,
+    mailbox_id: int,
+    sender_contains: Optional[str] = Query(default=None),
+    subject_contains: Optional[str] = Query(default=None),
+    unread_only: bool = Query(default=False),
+    within_minutes: int = Query(default=1440, ge=1, le=10080),
+    after_email_id: Optional[int] = Query(default=None, description="只推送该邮件 ID 之后到达的验证码"),
+    timeout: int = Query(default=300, ge=1, le=MAX_STREAM_SECONDS, description="连接最长保持秒数"),
+    db: Session = Depends(deps.get_db),
+    api_key: ApiKeyPrincipal = Depends(deps.require_api_key_scopes(["temp_code:read"])),
+):
+    """
+    以 Server-Sent Events 推送验证码
+    未指定 after_email_id 时先推送当前最新的一条，之后推送新到达的验证码
+    """
+    mailbox_id, mailbox_email = await run_in_threadpool(_get_code_mailbox, db, api_key, mailbox_id)
+    base_filter = CodeFilter(sender_contains, subject_contains, unread_only, within_minutes, after_email_id)
+    if after_email_id is None:
+        latest = await run_in_threadpool(_find_latest_code, db, mailbox_id, mailbox_email, base_filter)
+        await run_in_threadpool(db.commit)
+        initial = [latest] if latest else []
+        last_id = latest.email_id if latest else await run_in_threadpool(_latest_email_id, db, mailbox_email)
+    else:
+        initial = []
+        last_id = after_email_id
+
+    async def event_stream():
+        cursor = last_id
+        waiter = mailbox_waiters.register(mailbox_email)
+        try:
+            for item in initial:
+                yield f"event: code\nid: {item.email_id}\ndata: {item.model_dump_json()}\n\n"
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while not await request.is_disconnected():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    yield "event: timeout\ndata: {}\n\n"
+                    return
+                woken = await waiter.wait(min(remaining, WAIT_RECHECK_SECONDS))
+                code_filter = replace(base_filter, after_email_id=cursor)
+                items = await run_in_threadpool(_find_codes_after, mailbox_id, mailbox_email, code_filter)
+                for item in items:
+                    cursor = item.email_id
+                    yield f"event: code\nid: {item.email_id}\ndata: {item.model_dump_json()}\n\n"
+                if not woken and not items:
+                    yield ": keepalive\n\n"
+        finally:
+            mailbox_waiters.unregister(waiter)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    if unread_only:
-        query = query.filter(models.Email.is_read == False)  # noqa: E712
-    if sender_contains:
-        query = query.filter(models.Email.sender.ilike(f"%{sender_contains.strip()}%"))
-    if subject_contains:
-        query = query.filter(models.Email.subject.ilike(f"%{subject_contains.strip()}%"))
 
-    emails = query.order_by(models.Email.received_at.desc()).limit(200).all()
-    for email in emails:
-        code = extract_verification_code(email.body_text or email.body_html or "")
-        if code:
-            return TempMailboxCodeRead(
-                mailbox_id=mailbox.id,
-                mailbox_email=mailbox.email,
-                email_id=email.id,
-                sender=email.sender,
-                subject=email.subject,
-                received_at=email.received_at.isoformat() if email.received_at else None,
-                code=code,
-            )
-    return None
+
+def _latest_email_id(db: Session, mailbox_email: str) -> int:
+    """当前邮箱最大的邮件 ID，作为 SSE 的起始游标"""
+    latest_id = db.query(func.max(models.Email.id)).filter(
+        models.Email.mailbox_address == mailbox_email
+    ).scalar()
+    db.commit()
+    return latest_id or 0
 
 
 @router.post("/{mailbox_id}/extend", response_model=ExtendRestoreResponse)
 def extend_temp_mailbox_for_api_key(
     mailbox_id: int,
     db: Session = Depends(deps.get_db),
-    api_key: ApiKey = Depends(deps.require_api_key_scopes(["temp_mailbox:extend"])),
+    api_key: ApiKeyPrincipal = Depends(deps.require_api_key_scopes(["temp_mailbox:extend"])),
 ):
-    user = _get_api_key_user(db, api_key)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=user.id)
+    user_id = _get_api_key_owner_id(api_key)
 
     mailbox = db.query(models.TempMailbox).filter(
         models.TempMailbox.id == mailbox_id,
-        models.TempMailbox.owner_id == user.id,
+        models.TempMailbox.owner_id == user_id,
         models.TempMailbox.status != STATUS_PURGED,
     ).first()
     if not mailbox:
         raise HTTPException(status_code=404, detail="临时邮箱不存在")
-    if mailbox.status == STATUS_EXPIRED_RECOVERABLE and mailbox.recovery_until and mailbox.recovery_until < datetime.now(timezone.utc):
+    if effective_status(mailbox) == STATUS_EXPIRED_RECOVERABLE and mailbox.recovery_until and mailbox.recovery_until < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="该临时邮箱已超过恢复窗口，无法续期")
 
-    policy = get_or_create_policy(db)
+    policy = get_policy_snapshot(db)
     now = datetime.now(timezone.utc)
     mailbox.expires_at, mailbox.recovery_until = compute_new_expiry_windows(now, policy)
     mailbox.status = STATUS_ACTIVE
@@ -300,7 +468,7 @@ def extend_temp_mailbox_for_api_key(
 
     db.add(
         models.PoolActivityLog(
-            user_id=user.id,
+            user_id=user_id,
             action="api_extend",
             mailbox_email=mailbox.email,
             details=f"续期到 {mailbox.expires_at.isoformat()}",
@@ -308,6 +476,7 @@ def extend_temp_mailbox_for_api_key(
     )
     db.commit()
     db.refresh(mailbox)
+    invalidate_user_stats(user_id)
     sync_temp_mailbox_to_server(mailbox.email)
     return ExtendRestoreResponse(status="success", message="临时邮箱已续期", mailbox=mailbox_to_read(db, mailbox))
 
@@ -316,20 +485,19 @@ def extend_temp_mailbox_for_api_key(
 def restore_temp_mailbox_for_api_key(
     mailbox_id: int,
     db: Session = Depends(deps.get_db),
-    api_key: ApiKey = Depends(deps.require_api_key_scopes(["temp_mailbox:restore"])),
+    api_key: ApiKeyPrincipal = Depends(deps.require_api_key_scopes(["temp_mailbox:restore"])),
 ):
-    user = _get_api_key_user(db, api_key)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=user.id)
+    user_id = _get_api_key_owner_id(api_key)
 
-    mailbox = _get_owned_mailbox_or_404(db, user.id, mailbox_id)
-    if mailbox.status != STATUS_EXPIRED_RECOVERABLE:
+    mailbox = _get_owned_mailbox_or_404(db, user_id, mailbox_id)
+    if effective_status(mailbox) != STATUS_EXPIRED_RECOVERABLE:
         raise HTTPException(status_code=400, detail="当前邮箱不处于可恢复状态")
 
     now = datetime.now(timezone.utc)
     if mailbox.recovery_until and mailbox.recovery_until < now:
         raise HTTPException(status_code=400, detail="恢复窗口已过，无法恢复")
 
-    policy = get_or_create_policy(db)
+    policy = get_policy_snapshot(db)
     mailbox.expires_at, mailbox.recovery_until = compute_new_expiry_windows(now, policy)
     mailbox.status = STATUS_ACTIVE
     mailbox.is_active = True
@@ -337,7 +505,7 @@ def restore_temp_mailbox_for_api_key(
 
     db.add(
         models.PoolActivityLog(
-            user_id=user.id,
+            user_id=user_id,
             action="api_restore",
             mailbox_email=mailbox.email,
             details=f"恢复并延长到 {mailbox.expires_at.isoformat()}",
@@ -345,5 +513,6 @@ def restore_temp_mailbox_for_api_key(
     )
     db.commit()
     db.refresh(mailbox)
+    invalidate_user_stats(user_id)
     sync_temp_mailbox_to_server(mailbox.email)
     return ExtendRestoreResponse(status="success", message="临时邮箱已恢复", mailbox=mailbox_to_read(db, mailbox))
@@ -15,6 +15,7 @@ import secrets
 import string
 
 from api import deps
+from core.config_cache import default_plan_cache
 from db.models import User
 from db.models.billing import Plan, Subscription, RedemptionCode, SubscriptionHistory
 from db.models.email import TempMailbox, Alias, Domain
@@ -68,6 +69,7 @@ def create_plan(
     db.add(plan)
     db.commit()
     db.refresh(plan)
+    default_plan_cache.invalidate()
     return plan
 
 
@@ -92,6 +94,7 @@ def update_plan(
     
     db.commit()
     db.refresh(plan)
+    default_plan_cache.invalidate()
     return plan
 
 
@@ -119,6 +122,7 @@ def delete_plan(
     
     db.delete(plan)
     db.commit()
+    default_plan_cache.invalidate()
     return {"status": "success"}
 
 
@@ -1,37 +1,57 @@
 from datetime import datetime, timezone
-from fastapi import Depends, HTTPException, Request, status
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 
-from core.api_keys import extract_api_key_prefix, verify_api_key
+from core.api_key_audit import AuditEvent, api_key_audit_writer
+from core.api_key_cache import ApiKeyPrincipal, api_key_auth_cache
+from core.api_keys import extract_api_key_prefix, hash_api_key, verify_api_key
 from core import security
-from crud import user as crud_user
+from core.principal_cache import UserPrincipal, get_principal
+from core.rate_limiter import api_key_rate_limiter
 from db import models
-from db.database import get_db
-from db.models.system import ApiKey, ApiKeyAuditLog
+from db.database import get_async_db, get_db, get_read_db
+from db.models.system import ApiKey
 
 
-def get_current_user(
-    token: str = Depends(security.oauth2_scheme), db: Session = Depends(get_db)
-) -> models.User:
-    """
-    Dependency to get the current user from a token.
-    """
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+
+def _resolve_principal(db: Session, token: str) -> Optional[UserPrincipal]:
     token_data = security.verify_token(token)
     if not token_data:
-        raise credentials_exception
+        return None
+    return get_principal(db, token_data.sub, token_data.session_id)
 
-    user = crud_user.get_user_by_email(db, email=token_data.sub)
+
+def get_current_principal(
+    token: str = Depends(security.oauth2_scheme), db: Session = Depends(get_db)
+) -> UserPrincipal:
+    """
+    Dependency to get a lightweight snapshot of the current user (cached per token subject and session).
+    Endpoints that only need id / role / pool_enabled should depend on this instead of get_current_user.
+    """
+    principal = _resolve_principal(db, token)
+    if principal is None:
+        raise _credentials_exception()
+    return principal
+
+
+def get_current_user(
+    principal: UserPrincipal = Depends(get_current_principal), db: Session = Depends(get_db)
+) -> models.User:
+    """
+    Dependency to get the current user from a token.
+    """
+    user = db.get(models.User, principal.id)
     if user is None:
-        raise credentials_exception
-        
+        raise _credentials_exception()
     return user
 
 
@@ -49,10 +69,10 @@ def get_current_active_user(
 
 def get_current_user_from_token(db: Session, token: str) -> models.User | None:
     """从 token 获取用户（用于 WebSocket 认证）"""
-    token_data = security.verify_token(token)
-    if not token_data:
+    principal = _resolve_principal(db, token)
+    if principal is None:
         return None
-    return crud_user.get_user_by_email(db, email=token_data.sub)
+    return db.get(models.User, principal.id)
 
 
 def get_current_admin_user(
@@ -87,139 +107,108 @@ def get_current_session_id(
 api_key_scheme = HTTPBearer(auto_error=False)
 
 
-def get_current_api_key(
-    request: Request,
-    credentials: HTTPAuthorizationCredentials = Depends(api_key_scheme),
-    db: Session = Depends(get_db),
-) -> ApiKey:
-    """通过 Bearer API Key 认证，返回当前有效密钥记录。"""
-    request_ip = request.client.host if request.client else None
-    request_path = request.url.path if request.url else None
-    request_method = request.method if request.method else None
-
-    if not credentials or not credentials.credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing API key",
-            headers={"WWW-Authenticate": "Bearer"},
+def _record_audit(
+    api_key: ApiKeyPrincipal, request: Request, status_code: int, decision: str, error_code: Optional[str] = None
+) -> None:
+    """审计事件交给后台批量写入，last_used_at 由写入线程按密钥合并更新"""
+    api_key_audit_writer.record(
+        AuditEvent(
+            api_key_id=api_key.id,
+            user_id=api_key.user_id,
+            method=request.method if request.method else None,
+            path=request.url.path if request.url else None,
+            ip_address=request.client.host if request.client else None,
+            status_code=status_code,
+            decision=decision,
+            error_code=error_code,
         )
+    )
 
-    raw_key = credentials.credentials.strip()
-    key_prefix = extract_api_key_prefix(raw_key)
 
+def _load_api_key(db: Session, raw_key: str) -> Optional[ApiKeyPrincipal]:
+    """按前缀查询候选密钥并逐个校验哈希，所属用户随同一查询加载"""
     candidates = (
         db.query(ApiKey)
-        .filter(ApiKey.key_prefix == key_prefix)
+        .options(joinedload(ApiKey.user))
+        .filter(ApiKey.key_prefix == extract_api_key_prefix(raw_key))
         .all()
     )
-    if not candidates:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    matched_key = None
     for candidate in candidates:
         if verify_api_key(raw_key, candidate.key_hash):
-            matched_key = candidate
-            break
+            return ApiKeyPrincipal.from_model(candidate)
+    return None
 
-    if matched_key is None:
+
+def get_current_api_key(
+    request: Request,
+    response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(api_key_scheme),
+    db: Session = Depends(get_db),
+) -> ApiKeyPrincipal:
+    """通过 Bearer API Key 认证，返回当前有效密钥的快照（已验证的密钥走认证缓存）。"""
+    if not credentials or not credentials.credentials:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key",
+            detail="Missing API key",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    now = datetime.now(timezone.utc)
-    if matched_key.revoked_at is not None:
-        db.add(
-            ApiKeyAuditLog(
-                api_key_id=matched_key.id,
-                user_id=matched_key.user_id,
-                method=request_method,
-                path=request_path,
-                ip_address=request_ip,
+    raw_key = credentials.credentials.strip()
+    cache_key = hash_api_key(raw_key)
+    matched_key = api_key_auth_cache.get(cache_key)
+    if matched_key is None:
+        generation = api_key_auth_cache.generation
+        matched_key = _load_api_key(db, raw_key)
+        if matched_key is None:
+            raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                decision="deny",
-                error_code="revoked",
+                detail="Invalid API key",
+                headers={"WWW-Authenticate": "Bearer"},
             )
-        )
-        db.commit()
+        api_key_auth_cache.put(cache_key, matched_key, generation)
+
+    now = datetime.now(timezone.utc)
+    if matched_key.revoked_at is not None:
+        _record_audit(matched_key, request, status.HTTP_401_UNAUTHORIZED, "deny", "revoked")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API key revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # 过期时间每次都按快照精确判断，缓存命中也不会放行已过期的密钥
     if matched_key.expires_at is not None and matched_key.expires_at <= now:
-        db.add(
-            ApiKeyAuditLog(
-                api_key_id=matched_key.id,
-                user_id=matched_key.user_id,
-                method=request_method,
-                path=request_path,
-                ip_address=request_ip,
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                decision="deny",
-                error_code="expired",
-            )
-        )
-        db.commit()
+        _record_audit(matched_key, request, status.HTTP_401_UNAUTHORIZED, "deny", "expired")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API key expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    window_start = now.replace(second=0, microsecond=0)
-    used_count = db.query(ApiKeyAuditLog).filter(
-        ApiKeyAuditLog.api_key_id == matched_key.id,
-        ApiKeyAuditLog.created_at >= window_start,
-    ).count()
-    if used_count >= matched_key.rate_limit_per_minute:
-        db.add(
-            ApiKeyAuditLog(
-                api_key_id=matched_key.id,
-                user_id=matched_key.user_id,
-                method=request_method,
-                path=request_path,
-                ip_address=request_ip,
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                decision="deny",
-                error_code="rate_limited",
-            )
-        )
-        db.commit()
+    rate_limit = api_key_rate_limiter.hit(f"api_key:{matched_key.id}", matched_key.rate_limit_per_minute)
+    if not rate_limit.allowed:
+        _record_audit(matched_key, request, status.HTTP_429_TOO_MANY_REQUESTS, "deny", "rate_limited")
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="API key rate limit exceeded",
+            headers=rate_limit.headers(),
         )
+    response.headers.update(rate_limit.headers())
 
-    matched_key.last_used_at = now
-    db.add(
-        ApiKeyAuditLog(
-            api_key_id=matched_key.id,
-            user_id=matched_key.user_id,
-            method=request_method,
-            path=request_path,
-            ip_address=request_ip,
-            status_code=status.HTTP_200_OK,
-            decision="allow",
-            error_code=None,
-        )
-    )
+    _record_audit(matched_key, request, status.HTTP_200_OK, "allow")
     return matched_key
 
 
-def get_api_key_user(api_key: ApiKey = Depends(get_current_api_key)) -> models.User:
+def get_api_key_user(
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
+    db: Session = Depends(get_db),
+) -> models.User:
     """返回 API Key 所属用户。"""
-    return api_key.user
+    return db.get(models.User, api_key.user_id)
 
 
 def require_api_key_scopes(required_scopes: List[str]):
     """生成 scope 校验依赖，要求 API Key 拥有全部 required_scopes。"""
-    def _dependency(api_key: ApiKey = Depends(get_current_api_key)) -> ApiKey:
+    def _dependency(api_key: ApiKeyPrincipal = Depends(get_current_api_key)) -> ApiKeyPrincipal:
         current_scopes = set(api_key.scopes or [])
         missing_scopes = [scope for scope in required_scopes if scope not in current_scopes]
         if missing_scopes:
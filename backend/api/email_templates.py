@@ -13,7 +13,11 @@ from db.models.template import TemplateMetadata, GlobalVariable
 from db.models.automation import AutomationRule
 from db.models.user import User
 from api.deps import get_current_user
-from core.template_engine import TemplateEngine
+from core.template_engine import (
+    TemplateEngine,
+    invalidate_global_variables_cache,
+    invalidate_template_cache,
+)
 from core.mail_service import MailService
 from core.event_publisher import EventPublisher
 from core.config import settings
@@ -264,6 +268,7 @@ def update_global_variable(
     var.value = var_data.value
     db.commit()
     db.refresh(var)
+    invalidate_global_variables_cache()
     
     return GlobalVariableResponse(
         id=var.id,
@@ -466,6 +471,7 @@ def create_email_template(
     
     db.commit()
     db.refresh(template)
+    invalidate_template_cache(template.code)
     
     return EmailTemplateResponse(
         id=template.id,
@@ -591,6 +597,7 @@ def update_email_template(
     
     db.commit()
     db.refresh(template)
+    invalidate_template_cache(template.code)
     
     return EmailTemplateResponse(
         id=template.id,
@@ -635,6 +642,7 @@ def delete_email_template(
     
     db.delete(template)
     db.commit()
+    invalidate_template_cache(template.code)
     
     return {"status": "success", "message": "模板已删除"}
 
@@ -776,6 +784,7 @@ def reset_template_to_default(
     
     db.commit()
     db.refresh(template)
+    invalidate_template_cache(template.code)
     
     return EmailTemplateResponse(
         id=template.id,
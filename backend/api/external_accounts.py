@@ -7,7 +7,7 @@ from datetime import datetime
 from db.database import get_db
 from api.deps import get_current_user
 from db.models.user import User
-from db.models.external_account import ExternalAccount
+from db.models.external_account import ExternalAccount, ExternalFolderState
 from core.crypto import encrypt_password, decrypt_password
 
 router = APIRouter(prefix="/external-accounts", tags=["external-accounts"])
@@ -133,9 +133,27 @@ class ExternalAccountCreate(BaseModel):
     smtp_starttls: Optional[bool] = True
 
 
+class ExternalFolderStateResponse(BaseModel):
+    remote_name: str
+    local_folder_id: Optional[int]
+    last_uid: int
+    last_synced_at: Optional[datetime]
+    last_fetched_count: int
+    last_duration_ms: Optional[int]
+    total_fetched_count: int
+    last_error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
 class ExternalAccountUpdate(BaseModel):
     display_name: Optional[str] = None
+    username: Optional[str] = None
     password: Optional[str] = None
+    imap_host: Optional[str] = None
+    imap_port: Optional[int] = None
+    imap_ssl: Optional[bool] = None
     is_active: Optional[bool] = None
     sync_enabled: Optional[bool] = None
 
@@ -151,6 +169,9 @@ class ExternalAccountResponse(BaseModel):
     sync_enabled: bool
     last_sync_at: Optional[datetime]
     sync_error: Optional[str]
+    last_sync_duration_ms: Optional[int] = None
+    last_sync_message_count: Optional[int] = None
+    root_folder_id: Optional[int] = None
     created_at: datetime
 
     class Config:
@@ -253,6 +274,26 @@ def update_account(account_id: int, data: ExternalAccountUpdate, db: Session = D
         account.display_name = data.display_name
     if data.password is not None:
         account.password = encrypt_password(data.password)  # 加密存储密码
+
+    # 换了服务器或登录名就是另一个远端邮箱，原有的 UID 同步位置不再适用
+    mailbox_changed = (
+        (data.imap_host is not None and data.imap_host != account.imap_host)
+        or (data.username is not None and data.username != account.username)
+    )
+    if data.imap_host is not None:
+        account.imap_host = data.imap_host
+    if data.imap_port is not None:
+        account.imap_port = data.imap_port
+    if data.imap_ssl is not None:
+        account.imap_ssl = data.imap_ssl
+    if data.username is not None:
+        account.username = data.username
+    if mailbox_changed:
+        db.query(ExternalFolderState).filter(
+            ExternalFolderState.account_id == account.id
+        ).delete(synchronize_session=False)
+        account.last_sync_at = None
+        account.sync_error = None
     if data.is_active is not None:
         account.is_active = data.is_active
     if data.sync_enabled is not None:
@@ -309,4 +350,34 @@ def test_connection(account_id: int, db: Session = Depends(get_db), user: User =
     except Exception as e:
         account.sync_error = str(e)
         db.commit()
-        raise HTTPException(400, f"连接失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(400, f"连接失败: {str(e)}")
+
+
+def _get_account(db: Session, account_id: int, user: User) -> ExternalAccount:
+    account = db.query(ExternalAccount).filter(
+        ExternalAccount.id == account_id,
+        ExternalAccount.user_id == user.id
+    ).first()
+    if not account:
+        raise HTTPException(404, "账号不存在")
+    return account
+
+
+@router.post("/{account_id}/sync")
+def request_sync(account_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    """立即同步：清除上次同步时间，后台同步任务下一轮（1 分钟内）处理"""
+    account = _get_account(db, account_id, user)
+    if not account.is_active or not account.sync_enabled:
+        raise HTTPException(400, "账号未启用同步")
+    account.last_sync_at = None
+    db.commit()
+    return {"status": "queued", "message": "已加入同步队列"}
+
+
+@router.get("/{account_id}/folders", response_model=List[ExternalFolderStateResponse])
+def list_sync_folders(account_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    """各远端文件夹的同步位置与最近一次同步情况"""
+    account = _get_account(db, account_id, user)
+    return db.query(ExternalFolderState).filter(
+        ExternalFolderState.account_id == account.id
+    ).order_by(ExternalFolderState.id).all()
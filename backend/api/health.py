@@ -5,7 +5,12 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from db.database import get_db
+from api import deps
+from core.job_coordinator import job_coordinator
+from core.startup_profile import startup_profile
+from db import models
+from db.database import async_engine, engine, get_db, read_engine
+from db.pooling import pool_status
 
 router = APIRouter()
 
@@ -79,4 +84,39 @@ async def liveness_check():
     return {
         "status": "alive",
         "service": "talentmail-backend"
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/health/db-pools")
+def db_pool_status(
+    current_user: models.User = Depends(deps.get_current_admin_user),
+):
+    """
+    数据库连接池状态（本进程，管理员）
+
+    包含当前占用/空闲连接数，以及获取连接的次数、等待时间分位数和超时次数。
+    """
+    pools = [pool_status("primary", engine), pool_status("async", async_engine.sync_engine)]
+    if read_engine is not engine:
+        pools.append(pool_status("replica", read_engine))
+    return {"pools": pools}
+
+
+@router.get("/health/jobs")
+def background_job_status(
+    current_user: models.User = Depends(deps.get_current_admin_user),
+):
+    """
+    后台任务归属与最近运行情况（管理员）
+
+    owner 为当前持有租约的 worker，is_self 表示处理本请求的 worker 是否为持有者。
+    """
+    return job_coordinator.status()
+
+
+@router.get("/health/startup")
+def startup_phases(
+    current_user: models.User = Depends(deps.get_current_admin_user),
+):
+    """本进程启动各阶段耗时（管理员）"""
+    return startup_profile.snapshot()
@@ -1,18 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, UploadFile, File, Form
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import Optional, Dict
 from pydantic import BaseModel
+import os
+import tempfile
 import uuid
+import zipfile
 import json
-import os
 from urllib.parse import quote
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from email.utils import formataddr, formatdate
+from email.utils import formataddr
 from api import deps
 from db.database import SessionLocal
 from schemas import email as email_schema
@@ -25,6 +23,16 @@ from db.models.email import Email, Folder, Attachment
 from db.models.features import TrackingPixel
 from crud.folder import get_user_folder_by_role
 from core.config import settings
+from core.mail_export import (
+    PdfExportBusy,
+    PdfExportTimeout,
+    build_eml,
+    iter_email_pdfs,
+    render_email_pdf,
+    safe_filename,
+)
+from core import mail_import, mailbox_export
+from core.principal_cache import UserPrincipal
 import logging
 from datetime import datetime, timezone
 
@@ -211,8 +219,8 @@ def search_emails(
     q: str = Query(..., min_length=1, description="搜索关键词"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    db: Session = Depends(deps.get_read_db),
+    current_user: UserPrincipal = Depends(deps.get_current_principal),
 ):
     """搜索邮件（使用 PostgreSQL 全文搜索）"""
     from sqlalchemy import or_, text
@@ -285,8 +293,8 @@ def search_emails(
 def list_snoozed_emails(
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    db: Session = Depends(deps.get_read_db),
+    current_user: UserPrincipal = Depends(deps.get_current_principal),
 ):
     """获取待办邮件（已设置推迟时间的邮件）"""
     from datetime import datetime, timezone
@@ -343,8 +351,8 @@ def list_all_emails(
     is_read: Optional[bool] = None,
     is_starred: Optional[bool] = None,
     inbox_only: bool = Query(False, description="是否只查询收件箱"),
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    db: Session = Depends(deps.get_read_db),
+    current_user: UserPrincipal = Depends(deps.get_current_principal),
 ):
     """获取所有邮件（跨文件夹）"""
     if inbox_only:
@@ -414,8 +422,8 @@ def list_emails(
     limit: int = Query(50, ge=1, le=100),
     is_read: Optional[bool] = None,
     is_starred: Optional[bool] = None,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    db: Session = Depends(deps.get_read_db),
+    current_user: UserPrincipal = Depends(deps.get_current_principal),
 ):
     """获取邮件列表"""
     # 验证文件夹属于当前用户
@@ -1089,243 +1097,295 @@ def export_email(
         raise HTTPException(status_code=400, detail="不支持的导出格式，请使用 eml 或 pdf")
 
 
-def export_as_eml(email: Email, db: Session) -> Response:
-    """导出邮件为 EML 格式"""
-    # 创建 MIME 消息
-    if email.body_html:
-        msg = MIMEMultipart('alternative')
-        # 添加纯文本版本
-        if email.body_text:
-            text_part = MIMEText(email.body_text, 'plain', 'utf-8')
-            msg.attach(text_part)
-        # 添加 HTML 版本
-        html_part = MIMEText(email.body_html, 'html', 'utf-8')
-        msg.attach(html_part)
-    else:
-        msg = MIMEText(email.body_text or '', 'plain', 'utf-8')
-    
-    # 设置邮件头
-    msg['Subject'] = email.subject or '(无主题)'
-    msg['From'] = email.sender or ''
-    
-    # 解析收件人
-    if email.recipients:
-        try:
-            recipients = json.loads(email.recipients)
-            to_list = [r.get('email', '') for r in recipients.get('to', [])]
-            cc_list = [r.get('email', '') for r in recipients.get('cc', [])]
-            if to_list:
-                msg['To'] = ', '.join(to_list)
-            if cc_list:
-                msg['Cc'] = ', '.join(cc_list)
-        except:
-            msg['To'] = email.recipients
-    
-    # 设置日期
-    if email.received_at:
-        msg['Date'] = formatdate(email.received_at.timestamp(), localtime=True)
-    
-    # 设置 Message-ID
-    if email.message_id:
-        msg['Message-ID'] = f'<{email.message_id}>'
-    
-    # 获取附件
-    attachments = db.query(Attachment).filter(Attachment.email_id == email.id).all()
-    
-    # 如果有附件，需要改用 mixed 类型
-    if attachments:
-        outer = MIMEMultipart('mixed')
-        # 复制头信息
-        for key in ['Subject', 'From', 'To', 'Cc', 'Date', 'Message-ID']:
-            if msg[key]:
-                outer[key] = msg[key]
-        outer.attach(msg)
-        
-        # 添加附件
-        for att in attachments:
-            if att.file_path and os.path.exists(att.file_path):
-                try:
-                    with open(att.file_path, 'rb') as f:
-                        att_part = MIMEBase('application', 'octet-stream')
-                        att_part.set_payload(f.read())
-                        encoders.encode_base64(att_part)
-                        att_part.add_header(
-                            'Content-Disposition',
-                            'attachment',
-                            filename=att.filename or 'attachment'
-                        )
-                        outer.attach(att_part)
-                except Exception as e:
-                    logger.warning(f"无法添加附件 {att.filename}: {e}")
-        
-        msg = outer
-    
-    # 生成 EML 内容
-    eml_content = msg.as_bytes()
-    
-    # 生成文件名（使用 RFC 5987 编码支持中文）
-    safe_subject = (email.subject or 'email')[:50].replace('/', '_').replace('\\', '_')
-    filename = f"{safe_subject}.eml"
-    # URL 编码文件名以支持非 ASCII 字符
+def _attachment_response(content: bytes, media_type: str, filename: str) -> Response:
+    # URL 编码文件名以支持非 ASCII 字符（RFC 5987）
     encoded_filename = quote(filename, safe='')
-    
     return Response(
-        content=eml_content,
-        media_type="message/rfc822",
+        content=content,
+        media_type=media_type,
         headers={
             "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
         }
     )
 
 
+def export_as_eml(email: Email, db: Session) -> Response:
+    """导出邮件为 EML 格式"""
+    attachments = db.query(Attachment).filter(Attachment.email_id == email.id).all()
+    return _attachment_response(build_eml(email, attachments), "message/rfc822", safe_filename(email.subject, "eml"))
+
+
+def _render_pdf_or_raise(email: Email, db: Session, user_timezone: str):
+    """渲染 PDF（进程池 + 磁盘缓存），渲染忙或超时转换为 HTTP 错误"""
+    attachment_names = [
+        name or 'attachment'
+        for (name,) in db.query(Attachment.filename).filter(Attachment.email_id == email.id).all()
+    ]
+    try:
+        return render_email_pdf(email, attachment_names, user_timezone)
+    except PdfExportBusy:
+        raise HTTPException(status_code=503, detail="PDF 导出繁忙，请稍后重试", headers={"Retry-After": "5"})
+    except PdfExportTimeout:
+        raise HTTPException(status_code=504, detail="PDF 生成超时，邮件内容过大")
+
+
 def export_as_pdf(email: Email, db: Session, user_timezone: str = "Asia/Shanghai") -> Response:
-    """导出邮件为 PDF 格式（简单 HTML 转 PDF）"""
-    from zoneinfo import ZoneInfo
-    
-    # 获取用户时区
+    """导出邮件为 PDF 格式（weasyprint 不可用时返回 HTML）"""
+    content, media_type, ext = _render_pdf_or_raise(email, db, user_timezone)
+    return _attachment_response(content, media_type, safe_filename(email.subject, ext))
+
+
+class BulkExportRequest(BulkActionRequest):
+    """批量导出请求"""
+    format: str = "pdf"
+    tz: str = "Asia/Shanghai"
+
+
+@router.post("/bulk/export")
+def bulk_export_emails(
+    data: BulkExportRequest,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """批量导出邮件为 zip（每封一个 EML 或 PDF 文件）"""
+    if data.format not in ("eml", "pdf"):
+        raise HTTPException(status_code=400, detail="不支持的导出格式，请使用 eml 或 pdf")
+    if not data.email_ids:
+        raise HTTPException(status_code=400, detail="请选择要导出的邮件")
+    if len(data.email_ids) > settings.EXPORT_BATCH_MAX_EMAILS:
+        raise HTTPException(status_code=400, detail=f"单次最多导出 {settings.EXPORT_BATCH_MAX_EMAILS} 封邮件")
+
+    emails = db.query(Email).join(Folder).filter(
+        Email.id.in_(data.email_ids),
+        Folder.user_id == current_user.id
+    ).order_by(Email.received_at.desc()).all()
+    if not emails:
+        raise HTTPException(status_code=404, detail="Email not found")
+
+    attachments_by_email: Dict[int, list] = {email.id: [] for email in emails}
+    for attachment in db.query(Attachment).filter(Attachment.email_id.in_(list(attachments_by_email))).all():
+        attachments_by_email[attachment.email_id].append(attachment)
+
+    if data.format == "eml":
+        files = (
+            (email, build_eml(email, attachments_by_email[email.id]), "message/rfc822", "eml")
+            for email in emails
+        )
+    else:
+        # 多封邮件同时提交到渲染进程池，按顺序写入 zip
+        files = iter_email_pdfs(
+            [(email, [a.filename or 'attachment' for a in attachments_by_email[email.id]]) for email in emails],
+            data.tz,
+        )
+
     try:
-        user_tz = ZoneInfo(user_timezone)
-    except Exception:
-        user_tz = ZoneInfo("Asia/Shanghai")  # 默认时区
-    
-    # 时区显示名称映射
-    tz_display_names = {
-        "Asia/Shanghai": "北京时间 (UTC+8)",
-        "Asia/Tokyo": "东京时间 (UTC+9)",
-        "America/New_York": "纽约时间 (UTC-5)",
-        "America/Los_Angeles": "洛杉矶时间 (UTC-8)",
-        "Europe/London": "伦敦时间 (UTC+0)",
-        "Europe/Paris": "巴黎时间 (UTC+1)",
-        "UTC": "世界协调时间 (UTC)",
-    }
-    tz_display = tz_display_names.get(user_timezone, user_timezone)
-    
-    # 解析收件人
-    recipients_str = ""
-    if email.recipients:
-        try:
-            recipients = json.loads(email.recipients)
-            to_list = [r.get('email', '') for r in recipients.get('to', [])]
-            cc_list = [r.get('email', '') for r in recipients.get('cc', [])]
-            if to_list:
-                recipients_str += f"收件人: {', '.join(to_list)}"
-            if cc_list:
-                recipients_str += f"<br>抄送: {', '.join(cc_list)}"
-        except:
-            recipients_str = f"收件人: {email.recipients}"
-    
-    # 格式化日期（转换为用户时区）
-    date_str = ""
-    if email.received_at:
-        # 确保时间有时区信息，然后转换为用户时区
-        if email.received_at.tzinfo is None:
-            from datetime import timezone as dt_timezone
-            received_at_utc = email.received_at.replace(tzinfo=dt_timezone.utc)
-        else:
-            received_at_utc = email.received_at
-        received_at_local = received_at_utc.astimezone(user_tz)
-        date_str = received_at_local.strftime("%Y年%m月%d日 %H:%M")
-    
-    # 获取附件列表
-    attachments = db.query(Attachment).filter(Attachment.email_id == email.id).all()
-    attachments_html = ""
-    if attachments:
-        att_list = ', '.join([att.filename or 'attachment' for att in attachments])
-        attachments_html = f'<p style="color: #666; font-size: 12px; margin-top: 20px; padding-top: 10px; border-top: 1px solid #eee;">📎 附件: {att_list}</p>'
-    
-    # 构建 HTML 内容
-    html_content = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <style>
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 40px;
-            color: #333;
-            line-height: 1.6;
-        }}
-        .header {{
-            border-bottom: 2px solid #3b82f6;
-            padding-bottom: 20px;
-            margin-bottom: 30px;
-        }}
-        .subject {{
-            font-size: 24px;
-            font-weight: bold;
-            margin-bottom: 15px;
-            color: #1a1a1a;
-        }}
-        .meta {{
-            font-size: 14px;
-            color: #666;
-        }}
-        .meta-row {{
-            margin: 5px 0;
-        }}
-        .label {{
-            font-weight: 600;
-            color: #444;
-        }}
-        .body {{
-            margin-top: 20px;
-        }}
-        .footer {{
-            margin-top: 40px;
-            padding-top: 20px;
-            border-top: 1px solid #eee;
-            font-size: 12px;
-            color: #999;
-            text-align: center;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <div class="subject">{email.subject or '(无主题)'}</div>
-        <div class="meta">
-            <div class="meta-row"><span class="label">发件人:</span> {email.sender or ''}</div>
-            <div class="meta-row">{recipients_str}</div>
-            <div class="meta-row"><span class="label">日期:</span> {date_str}</div>
-        </div>
-    </div>
-    <div class="body">
-        {email.body_html or f'<pre style="white-space: pre-wrap; font-family: inherit;">{email.body_text or "(无正文内容)"}</pre>'}
-    </div>
-    {attachments_html}
-    <div class="footer">
-        由 TalentMail 导出 · {datetime.now(user_tz).strftime("%Y-%m-%d %H:%M")} ({tz_display})
-    </div>
-</body>
-</html>
-"""
-    
-    # 尝试使用 weasyprint 生成 PDF（如果可用）
+        archive_file = _write_export_zip(files)
+    except PdfExportBusy:
+        raise HTTPException(status_code=503, detail="PDF 导出繁忙，请稍后重试", headers={"Retry-After": "5"})
+    except PdfExportTimeout:
+        raise HTTPException(status_code=504, detail="PDF 生成超时，邮件内容过大")
+
+    encoded_filename = quote(f"emails_{len(emails)}.zip", safe='')
+    return StreamingResponse(
+        _iter_and_close(archive_file),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"},
+    )
+
+
+def _write_export_zip(files):
+    """把 (邮件, 内容, media_type, 扩展名) 写入临时文件中的 zip，不在内存中保留整个压缩包"""
+    archive_file = tempfile.TemporaryFile()
     try:
-        from weasyprint import HTML
-        pdf_content = HTML(string=html_content).write_pdf()
-        media_type = "application/pdf"
-        ext = "pdf"
-    except ImportError:
-        # 如果 weasyprint 不可用，返回 HTML 文件
-        logger.info("weasyprint 不可用，返回 HTML 格式")
-        pdf_content = html_content.encode('utf-8')
-        media_type = "text/html"
-        ext = "html"
-    
-    # 生成文件名（使用 RFC 5987 编码支持中文）
-    safe_subject = (email.subject or 'email')[:50].replace('/', '_').replace('\\', '_')
-    filename = f"{safe_subject}.{ext}"
-    # URL 编码文件名以支持非 ASCII 字符
-    encoded_filename = quote(filename, safe='')
-    
-    return Response(
-        content=pdf_content,
-        media_type=media_type,
+        with zipfile.ZipFile(archive_file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for email, content, _, ext in files:
+                # PDF 已经压缩，不再二次压缩
+                compress = zipfile.ZIP_STORED if ext == "pdf" else zipfile.ZIP_DEFLATED
+                archive.writestr(f"{email.id}_{safe_filename(email.subject, ext)}", content, compress_type=compress)
+    except BaseException:
+        archive_file.close()
+        raise
+    finally:
+        # 中途失败时取消尚未开始的渲染
+        files.close()
+    archive_file.seek(0)
+    return archive_file
+
+
+def _iter_and_close(fileobj, chunk_size: int = 1024 * 1024):
+    """分块读取文件并在读完（或客户端断开）后关闭"""
+    try:
+        while chunk := fileobj.read(chunk_size):
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+class MailboxExportRequest(BaseModel):
+    """邮箱批量导出请求：按文件夹和/或接收时间范围"""
+    format: str = "mbox"
+    folder_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+
+def _export_job_status(job: models.MailExportJob) -> dict:
+    return {
+        "job_id": job.id,
+        "format": job.format,
+        "status": job.status,
+        "total_count": job.total_count,
+        "exported_count": job.exported_count,
+        "parts": job.parts,
+        "created_at": job.created_at,
+        "completed_at": job.completed_at,
+    }
+
+
+def _get_export_job(db: Session, job_id: str, user_id: int) -> models.MailExportJob:
+    job = db.query(models.MailExportJob).filter(
+        models.MailExportJob.id == job_id,
+        models.MailExportJob.user_id == user_id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+    return job
+
+
+@router.post("/mailbox-export")
+def create_mailbox_export(
+    data: MailboxExportRequest,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """创建邮箱批量导出任务，之后通过下载地址获取 mbox.gz 或 EML zip"""
+    if data.format not in mailbox_export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="不支持的导出格式，请使用 mbox 或 zip")
+    if data.folder_id is not None:
+        folder = db.query(Folder).filter(Folder.id == data.folder_id, Folder.user_id == current_user.id).first()
+        if not folder:
+            raise HTTPException(status_code=404, detail="Folder not found")
+    job = mailbox_export.create_export_job(
+        db, current_user.id, data.format, folder_id=data.folder_id, since=data.since, until=data.until
+    )
+    return _export_job_status(job)
+
+
+@router.get("/mailbox-export/{job_id}")
+def get_mailbox_export(
+    job_id: str,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """查询导出进度"""
+    return _export_job_status(_get_export_job(db, job_id, current_user.id))
+
+
+@router.get("/mailbox-export/{job_id}/download")
+def download_mailbox_export(
+    job_id: str,
+    token: str = Query(..., description="认证 token"),
+    db: Session = Depends(deps.get_db),
+):
+    """
+    流式下载导出文件（通过 URL token 参数认证）
+    下载中断后再次请求同一地址，从已确认导出的位置继续，返回后续分卷
+    """
+    user = deps.get_current_user_from_token(db, token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    job = _get_export_job(db, job_id, user.id)
+    if job.status == mailbox_export.STATUS_COMPLETED:
+        raise HTTPException(status_code=409, detail="导出已完成，请重新创建导出任务")
+
+    mailbox_export.start_part(db, job)
+    stream = mailbox_export.stream_export(
+        job.id, job.user_id, job.format, job.folder_id, job.since, job.until, job.last_email_id
+    )
+    encoded_filename = quote(mailbox_export.export_filename(job), safe='')
+    return StreamingResponse(
+        stream,
+        media_type=mailbox_export.MEDIA_TYPES[job.format],
         headers={
-            "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
+            "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+            "Cache-Control": "no-store",
+            "X-Export-Job-Id": job.id,
         }
     )
+
+
+def _import_job_status(job: models.MailImportJob) -> dict:
+    progress = 100 if job.status == mail_import.STATUS_COMPLETED else (
+        min(99, int(job.bytes_processed * 100 / job.file_size)) if job.file_size else 0
+    )
+    return {
+        "job_id": job.id,
+        "format": job.format,
+        "filename": job.filename,
+        "folder_id": job.folder_id,
+        "status": job.status,
+        "progress": progress,
+        "processed_count": job.processed_count,
+        "imported_count": job.imported_count,
+        "duplicate_count": job.duplicate_count,
+        "failed_count": job.failed_count,
+        "error": job.error,
+        "created_at": job.created_at,
+        "completed_at": job.completed_at,
+    }
+
+
+@router.post("/import")
+async def import_mailbox(
+    file: UploadFile = File(...),
+    folder_id: Optional[int] = Form(None, description="导入到的文件夹，默认收件箱"),
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """上传 mbox / EML zip / EML 文件并创建导入任务，由后台分批入库"""
+    file_format = mail_import.detect_format(file.filename)
+    if not file_format:
+        raise HTTPException(status_code=400, detail="不支持的文件格式，请上传 .mbox、.zip 或 .eml 文件")
+
+    if folder_id is not None:
+        folder = db.query(Folder).filter(Folder.id == folder_id, Folder.user_id == current_user.id).first()
+    else:
+        folder = get_user_folder_by_role(db, current_user.id, "inbox")
+    if not folder:
+        raise HTTPException(status_code=404, detail="Folder not found")
+
+    # 分块写入暂存目录，不整体读入内存
+    os.makedirs(settings.MAIL_IMPORT_DIR, exist_ok=True)
+    file_path = os.path.join(settings.MAIL_IMPORT_DIR, f"{uuid.uuid4().hex}.{file_format}")
+    size = 0
+    try:
+        with open(file_path, "wb") as f:
+            while chunk := await file.read(1024 * 1024):
+                size += len(chunk)
+                if size > settings.MAIL_IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="导入文件过大")
+                f.write(chunk)
+    except BaseException:
+        os.remove(file_path)
+        raise
+
+    job = mail_import.create_import_job(
+        db, current_user.id, folder.id, file_format, file.filename, file_path, size
+    )
+    return _import_job_status(job)
+
+
+@router.get("/import/{job_id}")
+def get_mailbox_import(
+    job_id: str,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """查询导入进度"""
+    job = db.query(models.MailImportJob).filter(
+        models.MailImportJob.id == job_id,
+        models.MailImportJob.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return _import_job_status(job)
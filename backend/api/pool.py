@@ -2,23 +2,38 @@
 import random
 import string
 import secrets
-import re
 from datetime import datetime, timezone
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 import logging
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from api import deps
-from core.mailserver_sync import create_mail_user, delete_mail_user
+from core.config_cache import get_default_plan
+from core.mail_provisioner import mail_provisioner
+from core.mailbox_stats import get_mailbox_stats, get_mailbox_stats_map
+from core.pool_stats import (
+    get_global_pool_stats,
+    get_user_pool_stats,
+    invalidate_user_stats,
+    refresh_global_rollup,
+)
+from core.principal_cache import UserPrincipal
+from core.reserved_prefixes import get_reserved_prefix_matcher
 from core.temp_mailbox_lifecycle import (
     STATUS_ACTIVE,
     STATUS_EXPIRED_RECOVERABLE,
     STATUS_PURGED,
+    active_mailbox_clause,
     compute_new_expiry_windows,
+    effective_status,
+    get_lifecycle_metrics,
     get_or_create_policy,
+    get_policy_snapshot,
+    policy_cache,
     run_temp_mailbox_maintenance,
 )
 from db import models
@@ -34,6 +49,23 @@ class TempMailboxCreate(BaseModel):
     auto_verify_codes: bool = True
 
 
+# 批量创建单次最多邮箱数
+MAX_BATCH_CREATE_SIZE = 500
+IDEMPOTENCY_KEY_MAX_LENGTH = 128
+
+
+class TempMailboxBatchItem(TempMailboxCreate):
+    idempotency_key: Optional[str] = None
+
+
+class TempMailboxBatchCreate(BaseModel):
+    """items 与 count 二选一：items 逐个指定，count 按统一参数生成随机前缀"""
+    items: List[TempMailboxBatchItem] = Field(default_factory=list, max_length=MAX_BATCH_CREATE_SIZE)
+    count: Optional[int] = Field(default=None, ge=1, le=MAX_BATCH_CREATE_SIZE)
+    purpose: Optional[str] = None
+    auto_verify_codes: bool = True
+
+
 class TempMailboxRead(BaseModel):
     id: int
     email: str
@@ -55,6 +87,18 @@ class TempMailboxListResponse(BaseModel):
     total: int
 
 
+class TempMailboxBatchResult(BaseModel):
+    mailbox: TempMailboxRead
+    created: bool
+    idempotency_key: Optional[str] = None
+
+
+class TempMailboxBatchResponse(BaseModel):
+    items: List[TempMailboxBatchResult]
+    created_count: int
+    existing_count: int
+
+
 class TempMailboxPolicyRead(BaseModel):
     cleanup_enabled: bool
     ttl_hours: int
@@ -87,10 +131,35 @@ class ExtendRestoreResponse(BaseModel):
     mailbox: TempMailboxRead
 
 
+# 随机前缀命中保留规则时的最大重试次数
+RANDOM_PREFIX_ATTEMPTS = 10
+
+
 def generate_random_prefix(length: int = 8) -> str:
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
 
+def resolve_temp_mailbox_prefix(db: Session, user: models.User, requested: Optional[str]) -> str:
+    """
+    确定临时邮箱前缀：校验用户指定的前缀，或生成不命中保留规则的随机前缀
+    管理员不受保留前缀限制
+    """
+    matcher = get_reserved_prefix_matcher(db)
+    if not requested:
+        for _ in range(RANDOM_PREFIX_ATTEMPTS):
+            prefix = generate_random_prefix()
+            if user.role == "admin" or not matcher.is_reserved(prefix):
+                return prefix
+        raise HTTPException(status_code=400, detail="无法生成可用的随机前缀，请手动指定前缀")
+
+    prefix = requested.strip().lower()
+    if not prefix.replace('_', '').replace('-', '').isalnum():
+        raise HTTPException(status_code=400, detail="邮箱前缀只能包含字母、数字、下划线和连字符")
+    if user.role != "admin" and matcher.is_reserved(prefix):
+        raise HTTPException(status_code=400, detail=f"前缀 '{prefix}' 是系统保留前缀，不允许使用")
+    return prefix
+
+
 def get_user_temp_mailbox_limit(db: Session, user: models.User) -> int:
     if user.role == "admin":
         return -1
@@ -106,7 +175,7 @@ def get_user_temp_mailbox_limit(db: Session, user: models.User) -> int:
             if plan:
                 return plan.max_temp_mailboxes
 
-    default_plan = db.query(Plan).filter(Plan.is_default == True).first()
+    default_plan = get_default_plan(db)
     if default_plan:
         return default_plan.max_temp_mailboxes
 
@@ -118,18 +187,16 @@ def ensure_pool_access(user: models.User):
         raise HTTPException(status_code=403, detail="您没有账号池功能权限")
 
 
-def mailbox_to_read(db: Session, mailbox: models.TempMailbox) -> TempMailboxRead:
-    unread = db.query(models.Email).filter(
-        models.Email.mailbox_address == mailbox.email,
-        models.Email.is_read == False
-    ).count()
+def _build_mailbox_read(mailbox: models.TempMailbox, unread: int, now: datetime) -> TempMailboxRead:
+    # 状态在读取时根据有效期计算，不依赖后台任务是否已推进
+    status = effective_status(mailbox, now)
     return TempMailboxRead(
         id=mailbox.id,
         email=mailbox.email,
         purpose=mailbox.purpose,
         auto_verify_codes=mailbox.auto_verify_codes,
-        is_active=mailbox.is_active,
-        status=mailbox.status or STATUS_ACTIVE,
+        is_active=bool(mailbox.is_active) and status == STATUS_ACTIVE,
+        status=status,
         created_at=mailbox.created_at,
         expires_at=mailbox.expires_at,
         recovery_until=mailbox.recovery_until,
@@ -137,11 +204,235 @@ def mailbox_to_read(db: Session, mailbox: models.TempMailbox) -> TempMailboxRead
     )
 
 
+def mailbox_to_read(db: Session, mailbox: models.TempMailbox) -> TempMailboxRead:
+    stats = get_mailbox_stats(db, mailbox.email)
+    unread = stats.unread_count if stats else 0
+    return _build_mailbox_read(mailbox, unread, datetime.now(timezone.utc))
+
+
 def sync_temp_mailbox_to_server(temp_email: str):
-    random_password = secrets.token_urlsafe(16)
-    ok = create_mail_user(temp_email, random_password)
-    if not ok:
-        logger.warning(f"同步临时邮箱到邮件服务器失败: {temp_email}")
+    """提交到开通队列，由后台线程批量创建邮件服务器账户"""
+    mail_provisioner.submit_create(temp_email, secrets.token_urlsafe(16))
+
+
+def sync_temp_mailboxes_to_server(emails: List[str]):
+    """批量提交到开通队列"""
+    mail_provisioner.submit_create_many([(email, secrets.token_urlsafe(16)) for email in emails])
+
+
+def mailboxes_to_read(db: Session, mailboxes: List[models.TempMailbox]) -> List[TempMailboxRead]:
+    """批量转换，未读数从 mailbox_email_stats 按主键读取"""
+    if not mailboxes:
+        return []
+    stats_map = get_mailbox_stats_map(db, [m.email for m in mailboxes])
+    now = datetime.now(timezone.utc)
+    return [
+        _build_mailbox_read(
+            mailbox,
+            stats_map[mailbox.email].unread_count if mailbox.email in stats_map else 0,
+            now,
+        )
+        for mailbox in mailboxes
+    ]
+
+
+def normalize_idempotency_key(key: Optional[str]) -> Optional[str]:
+    if key is None:
+        return None
+    normalized = key.strip()
+    if not normalized:
+        raise HTTPException(status_code=400, detail="Idempotency-Key 不能为空字符串")
+    if len(normalized) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key 长度不能超过 {IDEMPOTENCY_KEY_MAX_LENGTH}")
+    return normalized
+
+
+def _allocate_batch_emails(
+    db: Session,
+    user: models.User,
+    requested_prefixes: List[Optional[str]],
+) -> List[str]:
+    """
+    为一批请求分配邮箱地址
+    指定的前缀逐个校验，随机前缀成批生成；已存在检查每轮只查询一次数据库
+    """
+    domain = user.email.split('@')[1]
+    matcher = get_reserved_prefix_matcher(db)
+    is_admin = user.role == "admin"
+
+    emails: List[Optional[str]] = [None] * len(requested_prefixes)
+    explicit: Dict[str, int] = {}
+    for index, requested in enumerate(requested_prefixes):
+        if not requested:
+            continue
+        prefix = requested.strip().lower()
+        if not prefix.replace('_', '').replace('-', '').isalnum():
+            raise HTTPException(status_code=400, detail=f"邮箱前缀只能包含字母、数字、下划线和连字符: {requested}")
+        if not is_admin and matcher.is_reserved(prefix):
+            raise HTTPException(status_code=400, detail=f"前缀 '{prefix}' 是系统保留前缀，不允许使用")
+        email = f"{prefix}@{domain}"
+        if email in explicit:
+            raise HTTPException(status_code=400, detail=f"请求中包含重复的前缀: {prefix}")
+        explicit[email] = index
+        emails[index] = email
+
+    if explicit:
+        taken = db.query(models.TempMailbox.email).filter(
+            models.TempMailbox.email.in_(list(explicit))
+        ).all()
+        if taken:
+            raise HTTPException(status_code=400, detail=f"以下邮箱地址已存在: {', '.join(row.email for row in taken)}")
+
+    pending = [index for index, email in enumerate(emails) if email is None]
+    used = set(explicit)
+    for _ in range(RANDOM_PREFIX_ATTEMPTS):
+        if not pending:
+            break
+        candidates: Dict[str, int] = {}
+        for index in pending:
+            prefix = generate_random_prefix()
+            email = f"{prefix}@{domain}"
+            if email in used or email in candidates or (not is_admin and matcher.is_reserved(prefix)):
+                continue
+            candidates[email] = index
+        taken = {
+            row.email for row in db.query(models.TempMailbox.email).filter(
+                models.TempMailbox.email.in_(list(candidates))
+            ).all()
+        } if candidates else set()
+        for email, index in candidates.items():
+            if email not in taken:
+                emails[index] = email
+                used.add(email)
+        pending = [index for index, email in enumerate(emails) if email is None]
+
+    if pending:
+        raise HTTPException(status_code=400, detail="无法生成可用的随机前缀，请手动指定前缀")
+    return emails
+
+
+def create_temp_mailboxes_batch(
+    db: Session,
+    user: models.User,
+    items: List[TempMailboxBatchItem],
+    action: str,
+) -> Tuple[List[Tuple[models.TempMailbox, bool, Optional[str]]], List[str]]:
+    """
+    批量创建临时邮箱
+
+    幂等键按条目生效：已存在的条目直接返回原邮箱，不占用配额。
+    配额只检查一次，新行与活动日志一次性插入。
+
+    Returns:
+        ([(邮箱, 是否新建, 幂等键)], 需要同步到邮件服务器的新邮箱地址)
+    """
+    keys = [normalize_idempotency_key(item.idempotency_key) for item in items]
+    present_keys = [key for key in keys if key is not None]
+    if len(present_keys) != len(set(present_keys)):
+        raise HTTPException(status_code=400, detail="请求中包含重复的 Idempotency-Key")
+
+    existing_by_key: Dict[str, models.TempMailbox] = {}
+    if present_keys:
+        for mailbox in db.query(models.TempMailbox).filter(
+            models.TempMailbox.owner_id == user.id,
+            models.TempMailbox.api_idempotency_key.in_(present_keys),
+            models.TempMailbox.status != STATUS_PURGED,
+        ).all():
+            existing_by_key[mailbox.api_idempotency_key] = mailbox
+
+    new_indexes = [index for index, key in enumerate(keys) if key is None or key not in existing_by_key]
+
+    limit = get_user_temp_mailbox_limit(db, user)
+    if limit != -1 and new_indexes:
+        current_count = db.query(models.TempMailbox).filter(
+            models.TempMailbox.owner_id == user.id,
+            active_mailbox_clause(),
+        ).count()
+        if current_count + len(new_indexes) > limit:
+            raise HTTPException(
+                status_code=403,
+                detail=f"超出临时邮箱数量上限 ({limit} 个)，当前已有 {current_count} 个，本次需新建 {len(new_indexes)} 个"
+            )
+
+    emails = _allocate_batch_emails(db, user, [items[index].prefix for index in new_indexes])
+
+    policy = get_policy_snapshot(db)
+    now = datetime.now(timezone.utc)
+    expires_at, recovery_until = compute_new_expiry_windows(now, policy)
+
+    created: Dict[int, models.TempMailbox] = {}
+    logs = []
+    for index, email in zip(new_indexes, emails):
+        item = items[index]
+        created[index] = models.TempMailbox(
+            owner_id=user.id,
+            email=email,
+            purpose=item.purpose,
+            auto_verify_codes=item.auto_verify_codes,
+            api_idempotency_key=keys[index],
+            status=STATUS_ACTIVE,
+            is_active=True,
+            expires_at=expires_at,
+            recovery_until=recovery_until,
+            last_extended_at=now,
+        )
+        logs.append(models.PoolActivityLog(
+            user_id=user.id,
+            action=action,
+            mailbox_email=email,
+            details=f"用途: {item.purpose or '未指定'}",
+        ))
+
+    if created:
+        result_emails = emails + [mailbox.email for mailbox in existing_by_key.values()]
+        db.add_all(list(created.values()))
+        db.add_all(logs)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="邮箱地址或 Idempotency-Key 与并发请求冲突，请重试")
+        invalidate_user_stats(user.id)
+        # 提交后实例全部过期，一次查询重新加载，避免序列化响应时逐行刷新
+        db.query(models.TempMailbox).filter(models.TempMailbox.email.in_(result_emails)).all()
+
+    results = []
+    for index, key in enumerate(keys):
+        if index in created:
+            results.append((created[index], True, key))
+        else:
+            results.append((existing_by_key[key], False, key))
+    return results, [mailbox.email for mailbox in created.values()]
+
+
+def expand_batch_request(data: TempMailboxBatchCreate) -> List[TempMailboxBatchItem]:
+    """将 count 形式的请求展开为条目列表"""
+    if data.items and data.count:
+        raise HTTPException(status_code=400, detail="items 与 count 不能同时指定")
+    if data.items:
+        return data.items
+    if data.count:
+        return [
+            TempMailboxBatchItem(purpose=data.purpose, auto_verify_codes=data.auto_verify_codes)
+            for _ in range(data.count)
+        ]
+    raise HTTPException(status_code=400, detail="请指定 items 或 count")
+
+
+def batch_results_to_response(
+    db: Session,
+    results: List[Tuple[models.TempMailbox, bool, Optional[str]]],
+) -> TempMailboxBatchResponse:
+    reads = mailboxes_to_read(db, [mailbox for mailbox, _, _ in results])
+    created_count = sum(1 for _, created, _ in results if created)
+    return TempMailboxBatchResponse(
+        items=[
+            TempMailboxBatchResult(mailbox=read, created=created, idempotency_key=key)
+            for read, (_, created, key) in zip(reads, results)
+        ],
+        created_count=created_count,
+        existing_count=len(results) - created_count,
+    )
 
 
 @router.get("/", response_model=TempMailboxListResponse)
@@ -154,9 +445,6 @@ def list_temp_mailboxes(
 ):
     ensure_pool_access(current_user)
 
-    # 懒更新：访问列表时推进过期状态
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=current_user.id)
-
     query = db.query(models.TempMailbox).filter(models.TempMailbox.owner_id == current_user.id)
     if not include_purged:
         query = query.filter(models.TempMailbox.status != STATUS_PURGED)
@@ -165,7 +453,7 @@ def list_temp_mailboxes(
     mailboxes = query.order_by(models.TempMailbox.created_at.desc()).offset((page - 1) * limit).limit(limit).all()
 
     return {
-        "items": [mailbox_to_read(db, mailbox) for mailbox in mailboxes],
+        "items": mailboxes_to_read(db, mailboxes),
         "total": total,
     }
 
@@ -178,14 +466,13 @@ def create_temp_mailbox(
 ):
     ensure_pool_access(current_user)
 
-    policy = get_or_create_policy(db)
+    policy = get_policy_snapshot(db)
 
     limit = get_user_temp_mailbox_limit(db, current_user)
     if limit != -1:
         current_count = db.query(models.TempMailbox).filter(
             models.TempMailbox.owner_id == current_user.id,
-            models.TempMailbox.status == STATUS_ACTIVE,
-            models.TempMailbox.is_active == True,
+            active_mailbox_clause(),
         ).count()
         if current_count >= limit:
             raise HTTPException(
@@ -193,9 +480,7 @@ def create_temp_mailbox(
                 detail=f"已达到临时邮箱数量上限 ({limit} 个)，请升级套餐或删除不需要的邮箱"
             )
 
-    prefix = data.prefix.strip().lower() if data.prefix else generate_random_prefix()
-    if not prefix.replace('_', '').replace('-', '').isalnum():
-        raise HTTPException(status_code=400, detail="邮箱前缀只能包含字母、数字、下划线和连字符")
+    prefix = resolve_temp_mailbox_prefix(db, current_user, data.prefix)
 
     domain = current_user.email.split('@')[1]
     email = f"{prefix}@{domain}"
@@ -229,6 +514,7 @@ def create_temp_mailbox(
     db.add(log)
     db.commit()
     db.refresh(mailbox)
+    invalidate_user_stats(current_user.id)
 
     try:
         sync_temp_mailbox_to_server(email)
@@ -238,6 +524,24 @@ def create_temp_mailbox(
     return mailbox_to_read(db, mailbox)
 
 
+@router.post("/batch", response_model=TempMailboxBatchResponse)
+def create_temp_mailboxes(
+    data: TempMailboxBatchCreate,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+):
+    """批量创建临时邮箱"""
+    ensure_pool_access(current_user)
+
+    results, new_emails = create_temp_mailboxes_batch(db, current_user, expand_batch_request(data), "create")
+    try:
+        sync_temp_mailboxes_to_server(new_emails)
+    except Exception as e:
+        logger.error(f"批量同步临时邮箱到邮件服务器失败: {e}")
+
+    return batch_results_to_response(db, results)
+
+
 @router.post("/{mailbox_id}/extend", response_model=ExtendRestoreResponse)
 def extend_temp_mailbox(
     mailbox_id: int,
@@ -245,7 +549,6 @@ def extend_temp_mailbox(
     current_user: models.User = Depends(deps.get_current_active_user),
 ):
     ensure_pool_access(current_user)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=current_user.id)
 
     mailbox = db.query(models.TempMailbox).filter(
         models.TempMailbox.id == mailbox_id,
@@ -255,10 +558,10 @@ def extend_temp_mailbox(
     if not mailbox:
         raise HTTPException(status_code=404, detail="临时邮箱不存在")
 
-    if mailbox.status == STATUS_EXPIRED_RECOVERABLE and mailbox.recovery_until and mailbox.recovery_until < datetime.now(timezone.utc):
+    if effective_status(mailbox) == STATUS_EXPIRED_RECOVERABLE and mailbox.recovery_until and mailbox.recovery_until < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="该临时邮箱已超过恢复窗口，无法续期")
 
-    policy = get_or_create_policy(db)
+    policy = get_policy_snapshot(db)
     now = datetime.now(timezone.utc)
     mailbox.expires_at, mailbox.recovery_until = compute_new_expiry_windows(now, policy)
     mailbox.status = STATUS_ACTIVE
@@ -272,6 +575,7 @@ def extend_temp_mailbox(
         details=f"续期到 {mailbox.expires_at.isoformat()}"
     ))
     db.commit()
+    invalidate_user_stats(current_user.id)
 
     try:
         sync_temp_mailbox_to_server(mailbox.email)
@@ -293,7 +597,6 @@ def restore_temp_mailbox(
     current_user: models.User = Depends(deps.get_current_active_user),
 ):
     ensure_pool_access(current_user)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=current_user.id)
 
     mailbox = db.query(models.TempMailbox).filter(
         models.TempMailbox.id == mailbox_id,
@@ -301,14 +604,14 @@ def restore_temp_mailbox(
     ).first()
     if not mailbox:
         raise HTTPException(status_code=404, detail="临时邮箱不存在")
-    if mailbox.status != STATUS_EXPIRED_RECOVERABLE:
+    if effective_status(mailbox) != STATUS_EXPIRED_RECOVERABLE:
         raise HTTPException(status_code=400, detail="当前邮箱不处于可恢复状态")
 
     now = datetime.now(timezone.utc)
     if mailbox.recovery_until and mailbox.recovery_until < now:
         raise HTTPException(status_code=400, detail="恢复窗口已过，无法恢复")
 
-    policy = get_or_create_policy(db)
+    policy = get_policy_snapshot(db)
     mailbox.expires_at, mailbox.recovery_until = compute_new_expiry_windows(now, policy)
     mailbox.status = STATUS_ACTIVE
     mailbox.is_active = True
@@ -321,6 +624,7 @@ def restore_temp_mailbox(
         details=f"恢复并延长到 {mailbox.expires_at.isoformat()}"
     ))
     db.commit()
+    invalidate_user_stats(current_user.id)
 
     try:
         sync_temp_mailbox_to_server(mailbox.email)
@@ -349,11 +653,6 @@ def delete_temp_mailbox(
     if not mailbox:
         raise HTTPException(status_code=404, detail="临时邮箱不存在")
 
-    try:
-        delete_mail_user(mailbox.email)
-    except Exception as e:
-        logger.error(f"删除邮件服务器邮箱失败: {e}")
-
     mailbox.status = STATUS_PURGED
     mailbox.is_active = False
     mailbox.purged_at = datetime.now(timezone.utc)
@@ -366,6 +665,9 @@ def delete_temp_mailbox(
     )
     db.add(log)
     db.commit()
+    # 提交后再删除账户：删除前会在数据库中复查状态，未提交时仍是 active
+    mail_provisioner.submit_delete(mailbox.email)
+    invalidate_user_stats(current_user.id)
 
     return {"status": "success", "message": "临时邮箱已删除"}
 
@@ -379,7 +681,6 @@ def get_mailbox_emails(
     current_user: models.User = Depends(deps.get_current_active_user)
 ):
     ensure_pool_access(current_user)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=current_user.id)
 
     mailbox = db.query(models.TempMailbox).filter(
         models.TempMailbox.id == mailbox_id,
@@ -390,9 +691,11 @@ def get_mailbox_emails(
     if not mailbox:
         raise HTTPException(status_code=404, detail="临时邮箱不存在")
 
-    query = db.query(models.Email).filter(models.Email.mailbox_address == mailbox.email)
-    total = query.count()
-    emails = query.order_by(models.Email.received_at.desc()).offset((page - 1) * limit).limit(limit).all()
+    stats = get_mailbox_stats(db, mailbox.email)
+    total = stats.total_count if stats else 0
+    emails = db.query(models.Email).filter(
+        models.Email.mailbox_address == mailbox.email
+    ).order_by(models.Email.received_at.desc()).offset((page - 1) * limit).limit(limit).all()
 
     result = []
     for email in emails:
@@ -406,101 +709,20 @@ def get_mailbox_emails(
         }
 
         if mailbox.auto_verify_codes:
-            code = extract_verification_code(email.body_text or email.body_html or "")
-            email_data["verification_code"] = code
+            email_data["verification_code"] = email.verification_code
 
         result.append(email_data)
 
     return {"items": result, "total": total}
 
 
-def extract_verification_code(text: str) -> Optional[str]:
-    patterns = [
-        r'验证码(?:是)?[：:\s]*([A-Za-z0-9]{4,8})',
-        r'verification code(?: is)?[：:\s]*([A-Za-z0-9]{4,8})',
-        r'code[：:\s]+([A-Za-z0-9]{4,8})',
-        r'(?:^|\s)(\d{4,8})(?:\s|$)',
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1)
-
-    return None
-
-
 @router.get("/stats")
 def get_pool_stats(
     db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    current_user: UserPrincipal = Depends(deps.get_current_principal)
 ):
     ensure_pool_access(current_user)
-    run_temp_mailbox_maintenance(db, force_cleanup=False, owner_id=current_user.id)
-
-    total_mailboxes = db.query(models.TempMailbox).filter(
-        models.TempMailbox.owner_id == current_user.id,
-        models.TempMailbox.status != STATUS_PURGED,
-    ).count()
-
-    active_count = db.query(models.TempMailbox).filter(
-        models.TempMailbox.owner_id == current_user.id,
-        models.TempMailbox.status == STATUS_ACTIVE,
-    ).count()
-
-    recoverable_count = db.query(models.TempMailbox).filter(
-        models.TempMailbox.owner_id == current_user.id,
-        models.TempMailbox.status == STATUS_EXPIRED_RECOVERABLE,
-    ).count()
-
-    mailboxes = db.query(models.TempMailbox.email).filter(
-        models.TempMailbox.owner_id == current_user.id,
-        models.TempMailbox.status != STATUS_PURGED,
-    ).all()
-    mailbox_emails = [m.email for m in mailboxes]
-
-    total_emails = 0
-    unread_emails = 0
-    today_emails = 0
-    recent_emails = []
-
-    if mailbox_emails:
-        total_emails = db.query(models.Email).filter(
-            models.Email.mailbox_address.in_(mailbox_emails)
-        ).count()
-
-        unread_emails = db.query(models.Email).filter(
-            models.Email.mailbox_address.in_(mailbox_emails),
-            models.Email.is_read == False
-        ).count()
-
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_emails = db.query(models.Email).filter(
-            models.Email.mailbox_address.in_(mailbox_emails),
-            models.Email.received_at >= today
-        ).count()
-
-        recent = db.query(models.Email).filter(
-            models.Email.mailbox_address.in_(mailbox_emails)
-        ).order_by(models.Email.received_at.desc()).limit(5).all()
-
-        recent_emails = [{
-            "id": e.id,
-            "mailbox": e.mailbox_address,
-            "sender": e.sender,
-            "subject": e.subject,
-            "received_at": e.received_at.isoformat() if e.received_at else None
-        } for e in recent]
-
-    return {
-        "total_mailboxes": total_mailboxes,
-        "active_mailboxes": active_count,
-        "recoverable_mailboxes": recoverable_count,
-        "total_emails": total_emails,
-        "unread_emails": unread_emails,
-        "today_emails": today_emails,
-        "recent_emails": recent_emails
-    }
+    return get_user_pool_stats(db, current_user.id)
 
 
 @router.get("/activity")
@@ -559,6 +781,7 @@ def update_temp_mailbox_policy(
 
     db.commit()
     db.refresh(policy)
+    policy_cache.invalidate()
     return policy
 
 
@@ -582,3 +805,39 @@ def run_temp_mailbox_cleanup_now(
         "purged_count": result["purged_count"],
         "cleanup_ran": result["cleanup_ran"],
     }
+
+
+@router.get("/admin/cleanup/metrics")
+def get_temp_mailbox_cleanup_metrics(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_admin_user),
+):
+    """最近一次过期/清理任务的吞吐量与当前积压（记录在策略行上，任意进程可读）"""
+    return get_lifecycle_metrics(db)
+
+
+@router.get("/admin/provisioning")
+def get_provisioning_status(
+    current_user: models.User = Depends(deps.get_current_admin_user),
+):
+    """邮件服务器开通队列状态（本进程）"""
+    return mail_provisioner.stats()
+
+
+@router.get("/admin/stats")
+def get_pool_admin_stats(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_admin_user),
+):
+    """账号池全局统计（读取后台定时刷新的汇总行）"""
+    return get_global_pool_stats(db)
+
+
+@router.post("/admin/stats/refresh")
+def refresh_pool_admin_stats(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_admin_user),
+):
+    """立即重新计算全局统计"""
+    refresh_global_rollup(db)
+    return get_global_pool_stats(db)
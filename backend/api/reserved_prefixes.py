@@ -7,6 +7,12 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from pydantic import BaseModel
 
+from core.reserved_prefixes import (
+    get_reserved_prefix_matcher,
+    is_prefix_reserved,
+    normalize_prefix,
+    reserved_prefix_cache,
+)
 from db.database import get_db
 from db.models.system import ReservedPrefix
 from db import models
@@ -47,14 +53,12 @@ class ReservedPrefixListResponse(BaseModel):
     total: int
 
 
-# Helper function
-def is_prefix_reserved(db: Session, prefix: str) -> bool:
-    """检查前缀是否被保留"""
-    prefix_lower = prefix.lower().strip()
-    return db.query(ReservedPrefix).filter(
-        ReservedPrefix.prefix == prefix_lower,
-        ReservedPrefix.is_active == True
-    ).first() is not None
+# 批量检查单次最多前缀数
+MAX_BATCH_CHECK_SIZE = 500
+
+
+class PrefixBatchCheckRequest(BaseModel):
+    prefixes: List[str]
 
 
 # Public API - 检查前缀是否可用
@@ -69,12 +73,7 @@ def check_prefix_availability(
     prefix_lower = prefix.lower().strip()
     
     # 检查是否是保留前缀
-    reserved = db.query(ReservedPrefix).filter(
-        ReservedPrefix.prefix == prefix_lower,
-        ReservedPrefix.is_active == True
-    ).first()
-    
-    if reserved:
+    if is_prefix_reserved(db, prefix_lower):
         return {
             "available": False,
             "reason": "reserved",
@@ -100,6 +99,61 @@ def check_prefix_availability(
     }
 
 
+@router.post("/check")
+def batch_check_prefix_availability(
+    data: PrefixBatchCheckRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    批量检查邮箱前缀是否可用
+    保留规则在内存中匹配，已注册前缀只查询一次数据库
+    """
+    if len(data.prefixes) > MAX_BATCH_CHECK_SIZE:
+        raise HTTPException(status_code=400, detail=f"单次最多检查 {MAX_BATCH_CHECK_SIZE} 个前缀")
+
+    matcher = get_reserved_prefix_matcher(db)
+    normalized = {normalize_prefix(p) for p in data.prefixes}
+    unreserved = [p for p in normalized if p and not matcher.is_reserved(p)]
+
+    taken = set()
+    if unreserved:
+        rows = db.query(func.lower(func.split_part(models.User.email, '@', 1))).filter(
+            func.lower(func.split_part(models.User.email, '@', 1)).in_(unreserved)
+        ).all()
+        taken = {row[0] for row in rows}
+
+    results = []
+    for prefix in data.prefixes:
+        prefix_lower = normalize_prefix(prefix)
+        rule = matcher.match(prefix_lower)
+        if rule is not None:
+            results.append({
+                "prefix": prefix,
+                "available": False,
+                "reason": "reserved",
+                "rule": rule,
+                "message": f"前缀 '{prefix}' 是系统保留前缀，不允许注册"
+            })
+        elif prefix_lower in taken:
+            results.append({
+                "prefix": prefix,
+                "available": False,
+                "reason": "taken",
+                "rule": None,
+                "message": f"前缀 '{prefix}' 已被注册"
+            })
+        else:
+            results.append({
+                "prefix": prefix,
+                "available": True,
+                "reason": None,
+                "rule": None,
+                "message": f"前缀 '{prefix}' 可以使用"
+            })
+
+    return {"items": results}
+
+
 # Admin APIs
 @router.get("/", response_model=ReservedPrefixListResponse)
 def list_reserved_prefixes(
@@ -175,6 +229,7 @@ def create_reserved_prefix(
     db.add(prefix)
     db.commit()
     db.refresh(prefix)
+    reserved_prefix_cache.invalidate()
     
     return {
         "id": prefix.id,
@@ -222,6 +277,7 @@ def update_reserved_prefix(
     
     db.commit()
     db.refresh(prefix)
+    reserved_prefix_cache.invalidate()
     
     return {
         "id": prefix.id,
@@ -250,6 +306,7 @@ def delete_reserved_prefix(
     
     db.delete(prefix)
     db.commit()
+    reserved_prefix_cache.invalidate()
     
     return {"status": "success", "message": f"前缀 '{prefix.prefix}' 已删除"}
 
@@ -297,6 +354,8 @@ def batch_create_prefixes(
         created += 1
     
     db.commit()
+    if created:
+        reserved_prefix_cache.invalidate()
     
     return {
         "status": "success",
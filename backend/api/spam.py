@@ -17,6 +17,7 @@ from db.database import SessionLocal
 from api import deps
 from crud.folder import get_user_folder_by_role
 from core.config import settings
+from core.process_mode import ROLE_WORKER, has_role
 from core.spamassassin import train_report_with_spamassassin
 
 router = APIRouter()
@@ -195,8 +196,8 @@ def mark_as_spam(
 
     db.commit()
 
-    # 后台任务：训练 SpamAssassin（如果有报告）
-    if reports:
+    # 后台任务：训练 SpamAssassin（如果有报告）；api 模式下由 worker 进程的补训练任务处理
+    if reports and has_role(ROLE_WORKER):
         report_ids = [r.id for r in reports]
         background_tasks.add_task(train_spamassassin, report_ids, 'spam')
 
@@ -252,8 +253,8 @@ def mark_as_not_spam(
 
     db.commit()
 
-    # 后台任务：训练 SpamAssassin
-    if reports:
+    # 后台任务：训练 SpamAssassin；api 模式下由 worker 进程的补训练任务处理
+    if reports and has_role(ROLE_WORKER):
         report_ids = [r.id for r in reports]
         background_tasks.add_task(train_spamassassin, report_ids, 'ham')
 
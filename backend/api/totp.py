@@ -4,7 +4,6 @@
 import io
 import base64
 import pyotp
-import qrcode
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
@@ -74,7 +73,8 @@ def setup_2fa(
         issuer_name=f"TalentMail ({settings.BASE_DOMAIN})"
     )
     
-    # 生成二维码
+    # 生成二维码（qrcode 依赖 PIL，导入较慢，只在开启 2FA 时加载）
+    import qrcode
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(provisioning_uri)
     qr.make(fit=True)
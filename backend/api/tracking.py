@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import Response
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from api import deps
+from core.principal_cache import UserPrincipal
 from db.models.features import TrackingPixel, TrackingEvent
 from db.models.email import Email, Folder
-from db.models import User
 import uuid
 import base64
 import logging
@@ -22,7 +23,7 @@ TRANSPARENT_GIF = base64.b64decode(
 async def track_open(
     pixel_id: str,
     request: Request,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
 ):
     """追踪邮件打开事件，返回 1x1 透明 GIF"""
     try:
@@ -32,34 +33,22 @@ async def track_open(
         return Response(content=TRANSPARENT_GIF, media_type="image/gif")
     
     # 查找追踪像素
-    pixel = db.query(TrackingPixel).filter(TrackingPixel.id == pixel_uuid).first()
-    if not pixel:
+    pixel_exists = await db.scalar(select(TrackingPixel.id).where(TrackingPixel.id == pixel_uuid))
+    if not pixel_exists:
         return Response(content=TRANSPARENT_GIF, media_type="image/gif")
     
     # 获取客户端信息
     ip_address = request.client.host if request.client else None
     user_agent = request.headers.get("user-agent", "")
     
-    # 记录追踪事件
-    event = TrackingEvent(
+    # 记录追踪事件（打开次数与首次打开时间由统计接口根据事件计算）
+    db.add(TrackingEvent(
         pixel_id=pixel_uuid,
         event_type="opened",
         ip_address=ip_address,
         user_agent=user_agent,
-    )
-    db.add(event)
-    
-    # 更新邮件的追踪状态
-    if pixel.email:
-        email = pixel.email
-        # 更新首次打开时间和打开次数
-        if not hasattr(email, 'first_opened_at') or email.first_opened_at is None:
-            from datetime import datetime, timezone
-            email.first_opened_at = datetime.now(timezone.utc)
-        if hasattr(email, 'open_count'):
-            email.open_count = (email.open_count or 0) + 1
-    
-    db.commit()
+    ))
+    await db.commit()
     logger.info(f"追踪事件记录: pixel={pixel_id}, ip={ip_address}")
     
     # 返回透明 GIF，设置不缓存
@@ -77,31 +66,35 @@ async def track_open(
 @router.get("/stats/{email_id}")
 async def get_tracking_stats(
     email_id: int,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: UserPrincipal = Depends(deps.get_current_principal),
 ):
     """获取邮件追踪统计"""
     # 验证邮件属于当前用户
-    email = db.query(Email).join(Folder).filter(
-        Email.id == email_id,
-        Folder.user_id == current_user.id
-    ).first()
+    is_tracked = await db.scalar(
+        select(Email.is_tracked).join(Folder).where(
+            Email.id == email_id,
+            Folder.user_id == current_user.id
+        )
+    )
     
-    if not email:
+    if is_tracked is None:
         raise HTTPException(status_code=404, detail="Email not found")
     
-    if not email.is_tracked:
+    if not is_tracked:
         return {"status": "success", "data": {"is_tracked": False}}
     
     # 获取追踪像素
-    pixel = db.query(TrackingPixel).filter(TrackingPixel.email_id == email_id).first()
-    if not pixel:
+    pixel_id = await db.scalar(select(TrackingPixel.id).where(TrackingPixel.email_id == email_id).limit(1))
+    if not pixel_id:
         return {"status": "success", "data": {"is_tracked": True, "events": [], "open_count": 0}}
     
     # 获取所有追踪事件
-    events = db.query(TrackingEvent).filter(
-        TrackingEvent.pixel_id == pixel.id
-    ).order_by(TrackingEvent.timestamp.desc()).all()
+    events = (await db.scalars(
+        select(TrackingEvent).where(
+            TrackingEvent.pixel_id == pixel_id
+        ).order_by(TrackingEvent.timestamp.desc())
+    )).all()
     
     # 解析设备信息
     def parse_device(user_agent: str) -> dict:
@@ -14,6 +14,9 @@ from api import deps
 from crud import user as crud_user
 from core import security
 from core.config import settings
+from core.config_cache import get_default_plan
+from core.api_key_cache import invalidate_api_key_owner
+from core.principal_cache import invalidate_session_principal, invalidate_user_principals
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -125,6 +128,7 @@ def change_password(
     current_user.password_hash = security.get_password_hash(data.new_password)
     db.add(current_user)
     db.commit()
+    invalidate_user_principals(current_user.id)
     
     # 同步到邮件服务器
     crud_user.sync_user_to_mailserver(current_user.email, data.new_password)
@@ -174,7 +178,7 @@ def list_users(
     users = query.order_by(models.User.created_at.desc()).offset((page - 1) * limit).limit(limit).all()
     
     # 获取默认套餐
-    default_plan = db.query(Plan).filter(Plan.is_default == True).first()
+    default_plan = get_default_plan(db)
     
     # 构建用户列表，包含订阅信息
     items = []
@@ -293,6 +297,9 @@ def update_user_permissions(
     
     db.add(user)
     db.commit()
+    if data.role is not None or data.pool_enabled is not None:
+        invalidate_api_key_owner(user_id)
+        invalidate_user_principals(user_id)
     
     # 获取更新后的订阅信息
     subscription = db.query(Subscription).filter(
@@ -393,7 +400,7 @@ def admin_create_user(
             subscription_expires_at = subscription.current_period_end.isoformat()
     else:
         # 使用默认套餐
-        default_plan = db.query(Plan).filter(Plan.is_default == True).first()
+        default_plan = get_default_plan(db)
         if default_plan:
             plan_name = default_plan.name
     
@@ -446,6 +453,8 @@ def admin_delete_user(
     # 3. 删除用户
     db.delete(user)
     db.commit()
+    invalidate_api_key_owner(user_id)
+    invalidate_user_principals(user_id)
     
     logger.info(f"管理员 {current_user.email} 删除了用户 {email}")
     
@@ -517,6 +526,7 @@ def revoke_session(
     
     session.is_active = False
     db.commit()
+    invalidate_session_principal(session_id)
     
     return {"status": "success", "message": "会话已撤销"}
 
@@ -532,6 +542,7 @@ def revoke_all_sessions(
         UserSession.is_active == True
     ).update({"is_active": False})
     db.commit()
+    invalidate_user_principals(current_user.id)
     
     return {"status": "success", "message": "所有会话已撤销"}
 
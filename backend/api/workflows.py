@@ -4,11 +4,14 @@
 """
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from db.database import get_db
-from api.deps import get_current_user, get_current_admin_user
+from db.database import get_async_db, get_db
+from api.deps import get_current_admin_user, get_current_principal, get_current_user
+from core.principal_cache import UserPrincipal
 from db.models.user import User
 from db.models.workflow import (
     NodeType, SystemWorkflow, SystemWorkflowConfig,
@@ -626,9 +629,13 @@ async def execute_user_workflow(
     workflow_id: int,
     data: ExecuteWorkflowRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    adb: AsyncSession = Depends(get_async_db),
+    current_user: UserPrincipal = Depends(get_current_principal)
 ):
-    """执行用户工作流"""
+    """
+    执行用户工作流
+    工作流定义与执行记录走异步会话；节点处理器仍使用同步会话，其数据库操作在线程池中执行
+    """
     from core.workflow_runtime import WorkflowEngine as RuntimeEngine
     from core.workflow_runtime import WorkflowDefinition, WorkflowNode as RuntimeNode, WorkflowEdge as RuntimeEdge
     from core.workflow_service import (
@@ -639,10 +646,10 @@ async def execute_user_workflow(
     )
     from datetime import datetime
     
-    workflow = db.query(Workflow).filter(
+    workflow = await adb.scalar(select(Workflow).where(
         Workflow.id == workflow_id,
         Workflow.owner_id == current_user.id
-    ).first()
+    ))
     
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
@@ -652,13 +659,13 @@ async def execute_user_workflow(
         raise HTTPException(status_code=400, detail="Workflow must be published before execution")
     
     # 获取节点和边
-    nodes = db.query(WorkflowNode).filter(
+    nodes = (await adb.scalars(select(WorkflowNode).where(
         WorkflowNode.workflow_id == workflow_id
-    ).all()
+    ))).all()
     
-    edges = db.query(WorkflowEdge).filter(
+    edges = (await adb.scalars(select(WorkflowEdge).where(
         WorkflowEdge.workflow_id == workflow_id
-    ).all()
+    ))).all()
     
     if not nodes:
         raise HTTPException(status_code=400, detail="Workflow has no nodes")
@@ -752,9 +759,8 @@ async def execute_user_workflow(
         status='running',
         started_at=datetime.utcnow()
     )
-    db.add(execution)
-    db.commit()
-    db.refresh(execution)
+    adb.add(execution)
+    await adb.commit()
     
     try:
         # 执行工作流
@@ -771,10 +777,10 @@ async def execute_user_workflow(
         execution.finished_at = end_time
         execution.result = final_context.data
         
-        # 更新工作流执行计数
-        workflow.execution_count += 1
+        # 更新工作流执行计数（在数据库中累加，避免并发执行互相覆盖）
+        workflow.execution_count = Workflow.execution_count + 1
         
-        db.commit()
+        await adb.commit()
         
         return {
             'success': True,
@@ -794,7 +800,7 @@ async def execute_user_workflow(
         execution.status = 'failed'
         execution.finished_at = end_time
         execution.error_message = str(e)
-        db.commit()
+        await adb.commit()
         
         return {
             'success': False,
@@ -0,0 +1,276 @@
+"""
+API Key 审计日志异步写入
+
+请求路径只把审计事件放进内存环形缓冲区，后台线程定时（或攒够一批时）批量写入：
+- 审计事件用多行 INSERT 写入 api_key_audit_logs
+- last_used_at 按密钥合并，每次刷新只对每个密钥执行一次更新，且只前进不后退
+- 缓冲区满时丢弃最旧的事件并计数，审计写入不反压请求
+
+api_key_audit_logs 按 created_at 按天分区（RANGE），
+后台线程提前创建未来几天的分区，并直接删除超过保留期的分区。
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.engine import Connection
+
+from core.config import settings
+from db.models.system import ApiKeyAuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_TABLE = "api_key_audit_logs"
+DEFAULT_PARTITION = f"{AUDIT_TABLE}_default"
+PARTITION_NAME_PATTERN = re.compile(rf"^{AUDIT_TABLE}_p(\d{{8}})$")
+# 提前创建的分区天数
+PARTITION_PRECREATE_DAYS = 7
+# 分区维护间隔（秒）
+PARTITION_MAINTENANCE_SECONDS = 3600
+
+
+@dataclass
+class AuditEvent:
+    api_key_id: Optional[int]
+    user_id: Optional[int]
+    method: Optional[str]
+    path: Optional[str]
+    ip_address: Optional[str]
+    status_code: Optional[int]
+    decision: str
+    error_code: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+def partition_name(day: date) -> str:
+    return f"{AUDIT_TABLE}_p{day:%Y%m%d}"
+
+
+def _day_start(day: date) -> str:
+    return f"{day.isoformat()} 00:00:00+00"
+
+
+def ensure_audit_partitions(conn: Connection, start: date, days: int) -> List[str]:
+    """创建默认分区与 [start, start + days) 的按天分区，返回新建的分区名"""
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {AUDIT_TABLE} DEFAULT"))
+    existing = set(list_audit_partitions(conn))
+    created = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        name = partition_name(day)
+        if name in existing:
+            continue
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {AUDIT_TABLE} "
+            f"FOR VALUES FROM ('{_day_start(day)}') TO ('{_day_start(day + timedelta(days=1))}')"
+        ))
+        created.append(name)
+    return created
+
+
+def list_audit_partitions(conn: Connection) -> List[str]:
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": AUDIT_TABLE}).fetchall()
+    return [row.relname for row in rows]
+
+
+def drop_expired_audit_partitions(conn: Connection, retention_days: int, today: Optional[date] = None) -> List[str]:
+    """删除超过保留期的按天分区；默认分区中的过期行逐行删除"""
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = today - timedelta(days=retention_days)
+    dropped = []
+    for name in list_audit_partitions(conn):
+        match = PARTITION_NAME_PATTERN.match(name)
+        if not match:
+            continue
+        day = datetime.strptime(match.group(1), "%Y%m%d").date()
+        if day < cutoff:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    conn.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"),
+        {"cutoff": _day_start(cutoff)},
+    )
+    return dropped
+
+
+def is_audit_table_partitioned(conn: Connection) -> bool:
+    return conn.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table"
+        ),
+        {"table": AUDIT_TABLE},
+    ).first() is not None
+
+
+def maintain_audit_partitions(conn: Connection, retention_days: Optional[int] = None) -> dict:
+    """创建未来分区并删除过期分区；表尚未迁移为分区表时不做任何事"""
+    if not is_audit_table_partitioned(conn):
+        return {"created": [], "dropped": []}
+    today = datetime.now(timezone.utc).date()
+    created = ensure_audit_partitions(conn, today, PARTITION_PRECREATE_DAYS)
+    dropped = drop_expired_audit_partitions(conn, retention_days or settings.API_KEY_AUDIT_RETENTION_DAYS, today)
+    return {"created": created, "dropped": dropped}
+
+
+class ApiKeyAuditWriter:
+    """审计事件缓冲与批量写入（单后台线程）"""
+
+    def __init__(
+        self,
+        capacity: int = settings.API_KEY_AUDIT_BUFFER_SIZE,
+        batch_size: int = settings.API_KEY_AUDIT_FLUSH_BATCH_SIZE,
+        flush_interval_ms: int = settings.API_KEY_AUDIT_FLUSH_INTERVAL_MS,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._lock = threading.Lock()
+        self._events: Deque[AuditEvent] = deque(maxlen=capacity)
+        # api_key_id -> 最近使用时间
+        self._last_used: Dict[int, datetime] = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_partition_check = 0.0
+        self._stats = {"written": 0, "dropped": 0, "flushes": 0, "failed_flushes": 0, "keys_touched": 0}
+
+    # ============ 请求路径 ============
+
+    def record(self, event: AuditEvent) -> None:
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._stats["dropped"] += 1
+            self._events.append(event)
+            if event.decision == "allow" and event.api_key_id is not None:
+                previous = self._last_used.get(event.api_key_id)
+                if previous is None or previous < event.created_at:
+                    self._last_used[event.api_key_id] = event.created_at
+            pending = len(self._events)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    # ============ 生命周期 ============
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="api-key-audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止后台线程并写出剩余事件"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        while self.flush():
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._events)
+            pending_keys = len(self._last_used)
+        return {
+            **self._stats,
+            "pending": pending,
+            "pending_keys": pending_keys,
+            "running": self._thread is not None and self._thread.is_alive(),
+        }
+
+    # ============ 后台写入 ============
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                while self.flush() >= self.batch_size and not self._stop.is_set():
+                    pass
+                self._maybe_maintain_partitions()
+            except Exception as e:
+                logger.error(f"API Key 审计日志写入异常: {e}")
+
+    def _take(self):
+        with self._lock:
+            count = min(len(self._events), self.batch_size)
+            events = [self._events.popleft() for _ in range(count)]
+            last_used, self._last_used = self._last_used, {}
+        return events, last_used
+
+    def _restore(self, events: List[AuditEvent], last_used: Dict[int, datetime]) -> None:
+        """写入失败时放回缓冲区（放在队首，超出容量的部分按环形缓冲区规则丢弃）"""
+        with self._lock:
+            for event in reversed(events):
+                if len(self._events) == self._events.maxlen:
+                    self._stats["dropped"] += 1
+                    break
+                self._events.appendleft(event)
+            for key_id, used_at in last_used.items():
+                current = self._last_used.get(key_id)
+                if current is None or current < used_at:
+                    self._last_used[key_id] = used_at
+
+    def flush(self) -> int:
+        """写出一批事件，返回写入数量"""
+        events, last_used = self._take()
+        if not events and not last_used:
+            return 0
+        try:
+            from db.database import engine
+            with engine.begin() as conn:
+                write_batch(conn, events, last_used)
+        except Exception as e:
+            self._stats["failed_flushes"] += 1
+            logger.warning(f"API Key 审计日志批量写入失败，稍后重试: {e}")
+            self._restore(events, last_used)
+            return 0
+        self._stats["flushes"] += 1
+        self._stats["written"] += len(events)
+        self._stats["keys_touched"] += len(last_used)
+        return len(events)
+
+    def _maybe_maintain_partitions(self) -> None:
+        if time.monotonic() - self._last_partition_check < PARTITION_MAINTENANCE_SECONDS:
+            return
+        self._last_partition_check = time.monotonic()
+        try:
+            from db.database import engine
+            with engine.begin() as conn:
+                result = maintain_audit_partitions(conn)
+            if result["created"] or result["dropped"]:
+                logger.info(f"API Key 审计日志分区维护: 新建 {result['created']}，删除 {result['dropped']}")
+        except Exception as e:
+            logger.warning(f"API Key 审计日志分区维护失败: {e}")
+
+
+def write_batch(conn: Connection, events: List[AuditEvent], last_used: Dict[int, datetime]) -> None:
+    """多行 INSERT 审计事件，并合并更新 last_used_at"""
+    if events:
+        conn.execute(insert(ApiKeyAuditLog.__table__), [asdict(event) for event in events])
+    if last_used:
+        key_ids = list(last_used)
+        conn.execute(
+            text(
+                "UPDATE api_keys AS k SET last_used_at = v.used_at "
+                "FROM unnest(CAST(:ids AS integer[]), CAST(:used_at AS timestamptz[])) AS v(id, used_at) "
+                "WHERE k.id = v.id AND (k.last_used_at IS NULL OR k.last_used_at < v.used_at)"
+            ),
+            {"ids": key_ids, "used_at": [last_used[key_id] for key_id in key_ids]},
+        )
+
+
+# 全局实例
+api_key_audit_writer = ApiKeyAuditWriter()
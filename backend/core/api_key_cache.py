@@ -0,0 +1,176 @@
+"""
+API Key 认证缓存
+
+按出示密钥的 SHA-256 哈希缓存已验证的密钥快照（密钥 ID、scope、过期 / 吊销时间、
+限流配置以及所属用户的角色和账号池权限），命中时认证不再查询数据库。
+
+- 只缓存验证成功的密钥，哈希相同即等价于密钥校验通过
+- 过期时间每次请求都按快照中的 expires_at 精确判断，不受缓存时间影响
+- 吊销密钥、修改用户权限或删除用户时主动失效，并通过 Postgres NOTIFY 广播到其他 worker；
+  通知丢失时由短 TTL 兜底
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from core import config_cache
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "talentmail_api_key_auth"
+# 广播失效全部条目时的 payload
+INVALIDATE_ALL = "*"
+API_KEY_AUTH_CACHE_MAX_ENTRIES = 10000
+
+
+@dataclass(frozen=True)
+class ApiKeyPrincipal:
+    """已验证密钥的只读快照，供认证依赖与自动化接口使用"""
+    id: int
+    user_id: int
+    scopes: Tuple[str, ...]
+    rate_limit_per_minute: int
+    expires_at: Optional[datetime]
+    revoked_at: Optional[datetime]
+    owner_role: Optional[str]
+    owner_pool_enabled: bool
+
+    @classmethod
+    def from_model(cls, api_key) -> "ApiKeyPrincipal":
+        owner = api_key.user
+        return cls(
+            id=api_key.id,
+            user_id=api_key.user_id,
+            scopes=tuple(api_key.scopes or ()),
+            rate_limit_per_minute=api_key.rate_limit_per_minute,
+            expires_at=api_key.expires_at,
+            revoked_at=api_key.revoked_at,
+            owner_role=owner.role if owner else None,
+            owner_pool_enabled=bool(owner.pool_enabled) if owner else False,
+        )
+
+    @property
+    def has_pool_access(self) -> bool:
+        return self.owner_pool_enabled or self.owner_role == "admin"
+
+
+class ApiKeyAuthCache:
+    """key_hash -> (写入时间, 快照)，按密钥 ID 与用户 ID 反查以便失效"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = settings.API_KEY_AUTH_CACHE_TTL_SECONDS,
+        max_entries: int = API_KEY_AUTH_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, ApiKeyPrincipal]]" = OrderedDict()
+        self._by_key_id: Dict[int, str] = {}
+        self._by_user_id: Dict[int, Set[str]] = {}
+        # 每次失效递增，加载期间发生失效时不写入旧快照
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key_hash: str) -> Optional[ApiKeyPrincipal]:
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.ttl_seconds:
+                self._remove(key_hash)
+                return None
+            self._entries.move_to_end(key_hash)
+            return entry[1]
+
+    def put(self, key_hash: str, principal: ApiKeyPrincipal, generation: int) -> None:
+        """写入快照；generation 为加载前读取的代数，期间发生过失效则放弃写入"""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._remove(key_hash)
+            self._entries[key_hash] = (time.monotonic(), principal)
+            self._by_key_id[principal.id] = key_hash
+            self._by_user_id.setdefault(principal.user_id, set()).add(key_hash)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key_hash: str) -> None:
+        entry = self._entries.pop(key_hash, None)
+        if entry is None:
+            return
+        principal = entry[1]
+        self._by_key_id.pop(principal.id, None)
+        hashes = self._by_user_id.get(principal.user_id)
+        if hashes is not None:
+            hashes.discard(key_hash)
+            if not hashes:
+                del self._by_user_id[principal.user_id]
+
+    def invalidate_key(self, key_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            key_hash = self._by_key_id.get(key_id)
+            if key_hash is not None:
+                self._remove(key_hash)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            for key_hash in list(self._by_user_id.get(user_id, ())):
+                self._remove(key_hash)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_key_id.clear()
+            self._by_user_id.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+api_key_auth_cache = ApiKeyAuthCache()
+
+
+def _handle_notification(payload: str) -> None:
+    if payload == INVALIDATE_ALL:
+        api_key_auth_cache.clear()
+        return
+    kind, _, value = payload.partition(":")
+    if not value.isdigit():
+        return
+    if kind == "key":
+        api_key_auth_cache.invalidate_key(int(value))
+    elif kind == "user":
+        api_key_auth_cache.invalidate_user(int(value))
+
+
+config_cache.register_channel_handler(NOTIFY_CHANNEL, _handle_notification)
+
+
+def invalidate_api_key(key_id: int, broadcast: bool = True) -> None:
+    """密钥被吊销或修改后调用（应在事务提交之后）"""
+    api_key_auth_cache.invalidate_key(key_id)
+    if broadcast:
+        config_cache.publish(NOTIFY_CHANNEL, f"key:{key_id}")
+
+
+def invalidate_api_key_owner(user_id: int, broadcast: bool = True) -> None:
+    """用户角色 / 账号池权限变更或用户被删除后调用（应在事务提交之后）"""
+    api_key_auth_cache.invalidate_user(user_id)
+    if broadcast:
+        config_cache.publish(NOTIFY_CHANNEL, f"user:{user_id}")
@@ -0,0 +1,167 @@
+"""
+后台服务与定时任务
+
+按进程模式的职责启动（见 core.process_mode），main.py 的 lifespan 与 run.py 的
+ingest / worker 模式共用这里的启停逻辑。定时任务与 LMTP 都通过 job_coordinator
+选主，多个进程承担同一职责时只有一个实际运行。
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import FrozenSet
+
+from core.api_key_audit import api_key_audit_writer
+from core.config import settings
+from core.external_sync import run_external_sync_once
+from core.job_coordinator import JobCoordinator, job_coordinator
+from core.lmtp_server import start_lmtp_server, stop_lmtp_server
+from core.mail_export import pdf_renderer
+from core.mail_import import run_pending_imports_once
+from core.mail_provisioner import mail_provisioner
+from core.mail_sync import run_periodic_sync
+from core.pool_stats import ROLLUP_REFRESH_SECONDS, refresh_global_rollup
+from core.process_mode import ROLE_API, ROLE_INGEST, ROLE_WORKER
+from core.temp_mailbox_lifecycle import run_temp_mailbox_maintenance
+from core import config_cache
+from db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# SpamAssassin 补训练：API 进程内联训练时新报告先由请求的后台任务处理，这里只接手更早的
+PENDING_SPAM_REPORT_MIN_AGE_SECONDS = 120
+SPAM_TRAINING_BATCH_SIZE = 100
+SPAM_TRAINING_INTERVAL_SECONDS = 60
+# 邮件导入任务轮询间隔；一次调用处理完一个任务
+MAIL_IMPORT_POLL_SECONDS = 10
+
+
+def _cleanup_sessions_once() -> None:
+    """清理30天未活动的会话"""
+    from api.auth import cleanup_old_sessions
+
+    db = SessionLocal()
+    try:
+        deleted_count = cleanup_old_sessions(db, days=30)
+        if deleted_count > 0:
+            logger.info(f"已清理 {deleted_count} 个过期会话记录")
+    finally:
+        db.close()
+
+
+def _run_temp_mailbox_maintenance_once() -> None:
+    """
+    推进临时邮箱生命周期并按策略执行清理
+    读接口只按有效期计算状态，状态变更与 mailserver 账户停用全部在这里完成。
+    实际清理频率由数据库策略控制，这里只是轮询检查。
+    """
+    db = SessionLocal()
+    try:
+        result = run_temp_mailbox_maintenance(db, force_cleanup=False)
+    finally:
+        db.close()
+    if result["expired_count"] > 0 or result["cleanup_ran"]:
+        logger.info(
+            f"临时邮箱维护完成: expired={result['expired_count']}, "
+            f"purged={result['purged_count']}, ran={result['cleanup_ran']}"
+        )
+
+
+def _refresh_pool_stats_rollup_once() -> None:
+    """刷新账号池全局统计汇总，管理端仪表盘只读汇总行"""
+    db = SessionLocal()
+    try:
+        refresh_global_rollup(db)
+    finally:
+        db.close()
+
+
+def _train_pending_spam_reports_once() -> None:
+    """训练尚未学习、也未用完重试次数的垃圾邮件报告（api 模式下报告只入库，由这里训练）"""
+    from api.spam import train_spamassassin
+    from db.models.user import SpamReport
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=PENDING_SPAM_REPORT_MIN_AGE_SECONDS)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(SpamReport.id, SpamReport.report_type)
+            .filter(
+                SpamReport.learned == False,  # noqa: E712
+                SpamReport.learn_attempts < settings.SPAMASSASSIN_MAX_RETRIES,
+                SpamReport.created_at < cutoff,
+            )
+            .order_by(SpamReport.id)
+            .limit(SPAM_TRAINING_BATCH_SIZE)
+            .all()
+        )
+    finally:
+        db.close()
+
+    by_type = {}
+    for report_id, report_type in rows:
+        by_type.setdefault(report_type, []).append(report_id)
+    for report_type, report_ids in by_type.items():
+        # 在任务线程中运行，单独的事件循环不影响主循环
+        asyncio.run(train_spamassassin(report_ids, report_type))
+
+
+def _start_lmtp() -> None:
+    start_lmtp_server(host='0.0.0.0', port=24)
+    logger.info("LMTP 服务启动成功，监听端口 24")
+
+
+def register_jobs(coordinator: JobCoordinator, roles: FrozenSet[str]) -> None:
+    """按职责向协调器登记任务"""
+    if ROLE_INGEST in roles:
+        coordinator.add_singleton("lmtp_server", start=_start_lmtp, stop=stop_lmtp_server)
+        # 邮件同步每30秒，确保临时邮箱验证码及时到达
+        coordinator.add_periodic_job("mail_sync", run_periodic_sync, interval=30)
+        # 外部邮箱每分钟检查一次到期账号，单个账号的同步间隔由 EXTERNAL_SYNC_INTERVAL_SECONDS 控制
+        coordinator.add_periodic_job("external_sync", run_external_sync_once, interval=60)
+    if ROLE_WORKER in roles:
+        coordinator.add_periodic_job("session_cleanup", _cleanup_sessions_once, interval=86400)
+        # 临时邮箱生命周期每分钟检查一次，只扫描到期行
+        coordinator.add_periodic_job(
+            "temp_mailbox_maintenance", _run_temp_mailbox_maintenance_once, interval=60
+        )
+        coordinator.add_periodic_job(
+            "pool_stats_rollup", _refresh_pool_stats_rollup_once, interval=ROLLUP_REFRESH_SECONDS
+        )
+        coordinator.add_periodic_job(
+            "spam_training", _train_pending_spam_reports_once, interval=SPAM_TRAINING_INTERVAL_SECONDS
+        )
+        coordinator.add_periodic_job("mail_import", run_pending_imports_once, interval=MAIL_IMPORT_POLL_SECONDS)
+
+
+async def start(roles: FrozenSet[str]) -> None:
+    # 配置缓存失效、验证码唤醒、新邮件推送都依赖跨进程通知，所有模式都需要监听
+    config_cache.start_listener()
+
+    # 开通队列是进程内队列：API 请求提交的开通任务由本进程执行；全量同步只由 worker 发起
+    if ROLE_API in roles or ROLE_WORKER in roles:
+        mail_provisioner.start()
+    if ROLE_WORKER in roles:
+        logger.info("后台同步邮件服务器用户...")
+        mail_provisioner.submit_full_sync()
+
+    if ROLE_API in roles:
+        # API Key 审计日志批量写入线程
+        api_key_audit_writer.start()
+
+    register_jobs(job_coordinator, roles)
+    # 会话清理等任务按租约表上记录的上次完成时间调度，从未运行过的任务在获得租约后立即执行一次
+    logger.info(f"启动后台任务协调（worker={job_coordinator.owner}, roles={sorted(roles)}）...")
+    await job_coordinator.renew_leases()
+    job_coordinator.start()
+
+
+async def stop(roles: FrozenSet[str]) -> None:
+    logger.info("停止后台任务并释放租约...")
+    await job_coordinator.stop()
+    config_cache.stop_listener()
+    if ROLE_API in roles or ROLE_WORKER in roles:
+        mail_provisioner.stop()
+    if ROLE_API in roles:
+        api_key_audit_writer.stop()
+        # PDF 导出进程池只在导出过时才创建
+        pdf_renderer.shutdown()
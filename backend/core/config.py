@@ -3,7 +3,7 @@ import os
 from pathlib import Path
 from pydantic import EmailStr
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # --- Sensitive settings loaded from .env file ---
@@ -17,6 +17,11 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_DAYS: int
     JWT_ALGORITHM: str
     ENCRYPTION_KEY: Optional[str] = None  # 用于加密外部账户密码的密钥
+    ENCRYPTION_KEYS_OLD: Optional[str] = None  # 轮换前的旧密钥（逗号分隔），仅用于解密
+    # 只读副本连接串，未配置时读请求仍走主库
+    DATABASE_READ_REPLICA_URL: Optional[str] = None
+    # 直连主库的连接串（绕过 PgBouncer），用于 LISTEN；未配置时使用 DATABASE_URL_DOCKER
+    DATABASE_DIRECT_URL: Optional[str] = None
 
     # --- Non-sensitive settings loaded from config.json ---
     APP_NAME: str = "TalentMail"
@@ -34,6 +39,52 @@ class Settings(BaseSettings):
     MAIL_PASSWORD: Optional[str] = None # Will be sourced from ADMIN_PASSWORD
     MAIL_MASTER_USER: str = "sync_master"
     MAIL_MASTER_PASSWORD: Optional[str] = None
+    # 数据库连接池（每个进程、每个引擎各自一份）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 3600
+    # 经 PgBouncer（事务池模式）连接时开启：应用侧不再维护连接池，并关闭预编译语句缓存
+    DB_PGBOUNCER_MODE: bool = False
+    # 进程模式：all（HTTP + 收信 + 后台任务，默认）/ api（只提供 HTTP）/ ingest（LMTP + IMAP 同步）
+    # / worker（定时任务、开通队列全量同步、SpamAssassin 训练）；也可由 run.py --mode 指定
+    PROCESS_MODE: str = "all"
+    # PDF 导出：渲染进程数、排队上限（含运行中）、单次渲染超时、磁盘缓存目录与容量
+    PDF_EXPORT_WORKERS: int = 2
+    PDF_EXPORT_MAX_PENDING: int = 8
+    PDF_EXPORT_TIMEOUT_SECONDS: float = 30
+    PDF_EXPORT_CACHE_DIR: str = "/app/uploads/pdf_cache"
+    PDF_EXPORT_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    # 批量导出单次最多邮件数
+    EXPORT_BATCH_MAX_EMAILS: int = 100
+    # 邮箱批量导出（mbox / zip）每批从服务端游标读取的邮件数
+    MAILBOX_EXPORT_BATCH_SIZE: int = 500
+    # 邮箱批量导入：上传文件暂存目录、单个文件大小上限、每批入库邮件数
+    MAIL_IMPORT_DIR: str = "/app/uploads/imports"
+    MAIL_IMPORT_MAX_BYTES: int = 20 * 1024 * 1024 * 1024
+    MAIL_IMPORT_BATCH_SIZE: int = 500
+    # 单封邮件原文上限：超出的 zip 条目 / mbox 邮件计为失败，防止压缩炸弹耗尽内存
+    MAIL_IMPORT_MAX_MESSAGE_BYTES: int = 100 * 1024 * 1024
+    # 任务连续中断（进程崩溃、OOM）达到该次数后标记失败，不再阻塞后续任务
+    MAIL_IMPORT_MAX_ATTEMPTS: int = 3
+    # 外部邮箱同步：每个账号的同步间隔、总并发、每个提供商的并发连接上限（JSON，未列出的用默认值）、
+    # 单次同步最多拉取邮件数（首次同步大邮箱分多次完成）、IMAP 超时
+    EXTERNAL_SYNC_INTERVAL_SECONDS: int = 300
+    EXTERNAL_SYNC_CONCURRENCY: int = 8
+    EXTERNAL_SYNC_PROVIDER_LIMITS: Dict[str, int] = {"gmail": 4, "outlook": 4, "qq": 2, "163": 2, "126": 2}
+    EXTERNAL_SYNC_PROVIDER_DEFAULT_LIMIT: int = 2
+    EXTERNAL_SYNC_MAX_MESSAGES_PER_RUN: int = 2000
+    EXTERNAL_SYNC_IMAP_TIMEOUT_SECONDS: float = 30
+    # 启动完成后打印各初始化阶段耗时
+    STARTUP_PROFILE: bool = False
+    # 忽略 seeder 内容指纹，启动时全部重新执行
+    STARTUP_FORCE_SEED: bool = False
+    # 后台任务协调：postgres（多 worker 通过租约表选主）/ memory（单进程，本进程总是持有）
+    JOB_LEASE_BACKEND: str = "postgres"
+    # 租约有效期（秒），持有者每 1/3 有效期续约一次；持有者异常退出后最多这么久被接管
+    JOB_LEASE_TTL_SECONDS: int = 30
+    # JWT 登录用户快照的缓存时间（秒），0 表示不缓存
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: int = 30
 
     # API Key 平台配置
     API_KEY_TOKEN_PREFIX: str = "tm_"
@@ -43,6 +94,15 @@ class Settings(BaseSettings):
     API_KEY_DEFAULT_RATE_LIMIT_PER_MINUTE: int = 120
     API_KEY_MIN_RATE_LIMIT_PER_MINUTE: int = 1
     API_KEY_MAX_RATE_LIMIT_PER_MINUTE: int = 10000
+    # 限流计数后端：memory（每个 worker 独立计数）/ postgres（多 worker 共享）
+    API_KEY_RATE_LIMIT_BACKEND: str = "memory"
+    # 审计日志：缓冲区容量、批量写入阈值与间隔、保留天数
+    API_KEY_AUDIT_BUFFER_SIZE: int = 50000
+    API_KEY_AUDIT_FLUSH_BATCH_SIZE: int = 500
+    API_KEY_AUDIT_FLUSH_INTERVAL_MS: int = 500
+    API_KEY_AUDIT_RETENTION_DAYS: int = 30
+    # 已验证密钥的认证缓存时间（秒），0 表示不缓存
+    API_KEY_AUTH_CACHE_TTL_SECONDS: int = 30
     SPAMASSASSIN_MAX_RETRIES: int = 3
     SPAMASSASSIN_RETRY_DELAY_SECONDS: float = 0.5
 
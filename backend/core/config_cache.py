@@ -0,0 +1,237 @@
+"""
+进程内配置缓存
+
+缓存读多写少的配置类数据（全局变量、临时邮箱策略、保留前缀、默认套餐等），
+避免每个请求都查询数据库。
+
+失效机制：
+- 每个缓存有一个版本号，管理端修改数据后调用 invalidate() 递增版本号
+- invalidate() 同时通过 Postgres NOTIFY 广播，其他 worker 的监听线程收到后递增本地版本号
+- 监听线程断线期间缓存退化为短 TTL，避免其他 worker 的修改长时间不可见
+"""
+import logging
+import select
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "talentmail_config_cache"
+# 正常情况下的最大缓存时间（秒），作为通知丢失时的兜底
+DEFAULT_MAX_AGE_SECONDS = 300
+# 监听线程未连接时的缓存时间（秒）
+FALLBACK_MAX_AGE_SECONDS = 30
+LISTENER_POLL_SECONDS = 5
+LISTENER_RETRY_SECONDS = 5
+
+_registry: Dict[str, "ConfigCache"] = {}
+# 其他模块复用监听连接订阅的频道：channel -> handler(payload)
+_channel_handlers: Dict[str, Callable[[str], None]] = {}
+_registry_lock = threading.Lock()
+_listener_thread: Optional[threading.Thread] = None
+_listener_stop = threading.Event()
+_listener_connected = threading.Event()
+
+
+class ConfigCache:
+    """单个命名空间的配置缓存"""
+
+    def __init__(
+        self,
+        namespace: str,
+        loader: Callable[[Session], Any],
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+    ):
+        self.namespace = namespace
+        self._loader = loader
+        self._max_age = max_age_seconds
+        self._lock = threading.Lock()
+        self._version = 0
+        # (版本号, 加载时间, 值)
+        self._entry: Optional[Tuple[int, float, Any]] = None
+        with _registry_lock:
+            _registry[namespace] = self
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, db: Session) -> Any:
+        """获取缓存值，版本变化或超时后重新加载"""
+        version = self._version
+        entry = self._entry
+        max_age = self._max_age if _listener_connected.is_set() else min(self._max_age, FALLBACK_MAX_AGE_SECONDS)
+        if entry is not None and entry[0] == version and time.monotonic() - entry[1] < max_age:
+            return entry[2]
+
+        value = self._loader(db)
+        with self._lock:
+            # 加载期间如果发生了失效，不写入可能已过期的值
+            if self._version == version:
+                self._entry = (version, time.monotonic(), value)
+        return value
+
+    def invalidate(self, broadcast: bool = True) -> None:
+        """使缓存失效，broadcast 为 True 时通知其他 worker"""
+        with self._lock:
+            self._version += 1
+            self._entry = None
+        if broadcast:
+            notify_config_change(self.namespace)
+
+
+def invalidate_all() -> None:
+    """使本进程所有配置缓存失效（不广播）"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    for cache in caches:
+        cache.invalidate(broadcast=False)
+
+
+def get_cache_versions() -> Dict[str, int]:
+    """返回各命名空间的当前版本号"""
+    with _registry_lock:
+        return {name: cache.version for name, cache in _registry.items()}
+
+
+def register_channel_handler(channel: str, handler: Callable[[str], None]) -> None:
+    """
+    在配置缓存的监听连接上额外订阅一个频道（需在 start_listener 之前注册）
+    handler 在监听线程中调用，应尽快返回
+    """
+    _channel_handlers[channel] = handler
+
+
+def publish(channel: str, payload: str) -> None:
+    """通过 Postgres NOTIFY 发送消息，失败时只记录日志"""
+    try:
+        from db.database import engine
+        with engine.begin() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": channel, "payload": payload},
+            )
+    except Exception as e:
+        logger.warning(f"发送通知失败: channel={channel}, payload={payload}, err={e}")
+
+
+def notify_config_change(namespace: str) -> None:
+    """通过 Postgres NOTIFY 广播配置变更，失败时只记录日志"""
+    publish(NOTIFY_CHANNEL, namespace)
+
+
+def _handle_notification(payload: str) -> None:
+    with _registry_lock:
+        cache = _registry.get(payload)
+    if cache is not None:
+        cache.invalidate(broadcast=False)
+
+
+def _listen_loop() -> None:
+    import psycopg2
+    import psycopg2.extensions
+    from sqlalchemy.engine import make_url
+    from core.config import settings
+
+    # LISTEN 需要会话级连接，PgBouncer 事务池模式下收不到通知，优先直连主库
+    url = settings.DATABASE_DIRECT_URL or settings.DATABASE_URL_DOCKER
+    dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+    while not _listener_stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+                for channel in list(_channel_handlers):
+                    cur.execute(f"LISTEN {channel};")
+            _listener_connected.set()
+            # 断线期间可能漏掉通知，重连后全部重新加载
+            invalidate_all()
+            logger.info("配置缓存监听已连接")
+
+            while not _listener_stop.is_set():
+                if select.select([conn], [], [], LISTENER_POLL_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    if notification.channel == NOTIFY_CHANNEL:
+                        _handle_notification(notification.payload)
+                        continue
+                    handler = _channel_handlers.get(notification.channel)
+                    if handler is not None:
+                        try:
+                            handler(notification.payload)
+                        except Exception as e:
+                            logger.warning(f"处理通知失败: channel={notification.channel}, err={e}")
+        except Exception as e:
+            logger.warning(f"配置缓存监听断开，{LISTENER_RETRY_SECONDS} 秒后重试: {e}")
+        finally:
+            _listener_connected.clear()
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        _listener_stop.wait(LISTENER_RETRY_SECONDS)
+
+
+def start_listener() -> None:
+    """启动跨 worker 失效通知的监听线程"""
+    global _listener_thread
+    if _listener_thread is not None and _listener_thread.is_alive():
+        return
+    _listener_stop.clear()
+    _listener_thread = threading.Thread(target=_listen_loop, name="config-cache-listener", daemon=True)
+    _listener_thread.start()
+
+
+def stop_listener() -> None:
+    """停止监听线程"""
+    global _listener_thread
+    _listener_stop.set()
+    if _listener_thread is not None:
+        _listener_thread.join(timeout=LISTENER_POLL_SECONDS + 1)
+        _listener_thread = None
+
+
+# ============ 默认套餐 ============
+
+@dataclass(frozen=True)
+class PlanSnapshot:
+    """套餐的只读快照"""
+    id: int
+    name: str
+    max_domains: int
+    max_aliases: int
+    allow_temp_mail: bool
+    max_temp_mailboxes: int
+
+
+def _load_default_plan(db: Session) -> Optional[PlanSnapshot]:
+    from db.models.billing import Plan
+    plan = db.query(Plan).filter(Plan.is_default == True).first()
+    if not plan:
+        return None
+    return PlanSnapshot(
+        id=plan.id,
+        name=plan.name,
+        max_domains=plan.max_domains,
+        max_aliases=plan.max_aliases,
+        allow_temp_mail=plan.allow_temp_mail,
+        max_temp_mailboxes=plan.max_temp_mailboxes,
+    )
+
+
+default_plan_cache = ConfigCache("default_plan", _load_default_plan)
+
+
+def get_default_plan(db: Session) -> Optional[PlanSnapshot]:
+    """获取默认套餐（缓存）"""
+    return default_plan_cache.get(db)
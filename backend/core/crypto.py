@@ -3,27 +3,72 @@
 
 使用 Fernet 对称加密算法保护敏感数据。
 遵循零硬编码原则，密钥从环境变量读取。
+
+密钥轮换：新密钥写入 ENCRYPTION_KEY，旧密钥移到 ENCRYPTION_KEYS_OLD（逗号分隔），
+加密始终使用新密钥，解密依次尝试新旧密钥（MultiFernet）；
+再用 core.key_rotation 把已有密文分批重新加密后即可移除旧密钥。
 """
-import os
 import base64
-from typing import Optional
-from cryptography.fernet import Fernet
+import threading
+from functools import lru_cache
+from typing import List, Optional, Sequence
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 from core.config import settings
 
+# Fernet 令牌的版本字节 0x80 经 base64 编码后的固定前缀
+FERNET_TOKEN_PREFIX = "gAAAAA"
+
+
+@lru_cache(maxsize=16)
+def _derive_key(password: bytes) -> bytes:
+    """PBKDF2 派生 Fernet 密钥，按输入缓存，每个进程只计算一次"""
+    # 使用固定的盐值（从 SECRET_KEY 派生）
+    # 注意：在生产环境中应该使用随机盐值
+    salt = b'talentmail_salt_' + password[:16]
+
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=100000,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(password))
+
+
+def _load_fernet(key) -> Fernet:
+    """把配置中的密钥转成 Fernet；不是合法 Fernet 密钥时（如 openssl rand -hex 32）从其派生"""
+    if isinstance(key, str):
+        key = key.encode()
+    try:
+        return Fernet(key)
+    except Exception:
+        return Fernet(_derive_key(key))
+
+
+def _split_keys(value: Optional[str]) -> List[str]:
+    return [key.strip() for key in (value or "").split(",") if key.strip()]
+
 
 class PasswordEncryption:
     """密码加密工具类"""
 
-    def __init__(self):
+    def __init__(self, encryption_key: Optional[str] = None, old_keys: Optional[Sequence[str]] = None):
         """初始化加密工具
 
         从环境变量获取加密密钥，如果不存在则生成一个。
         在生产环境中，必须设置 ENCRYPTION_KEY 环境变量。
+
+        Args:
+            encryption_key: 当前密钥，默认读取 ENCRYPTION_KEY
+            old_keys: 轮换前的旧密钥，默认读取 ENCRYPTION_KEYS_OLD
         """
-        encryption_key = settings.ENCRYPTION_KEY
+        if encryption_key is None:
+            encryption_key = settings.ENCRYPTION_KEY
+        if old_keys is None:
+            old_keys = _split_keys(settings.ENCRYPTION_KEYS_OLD)
 
         if not encryption_key:
             # 开发环境警告
@@ -36,12 +81,12 @@ class PasswordEncryption:
             # 使用 SECRET_KEY 生成一个稳定的密钥
             encryption_key = self._derive_key_from_password(settings.SECRET_KEY)
 
-        # 确保密钥是有效的 Fernet 密钥
-        try:
-            self.cipher = Fernet(encryption_key.encode() if isinstance(encryption_key, str) else encryption_key)
-        except Exception:
-            # 如果提供的密钥无效，从其派生一个有效密钥
-            self.cipher = Fernet(self._derive_key_from_password(encryption_key))
+        # 当前密钥单独保留，用于判断密文是否需要重新加密
+        self.primary = _load_fernet(encryption_key)
+        old_ciphers = [_load_fernet(key) for key in old_keys]
+        self._rotator = MultiFernet([self.primary] + old_ciphers)
+        # 没有旧密钥时直接用 Fernet，省去 MultiFernet 的逐个尝试
+        self.cipher = self._rotator if old_ciphers else self.primary
 
     def _derive_key_from_password(self, password: str) -> bytes:
         """从密码派生加密密钥
@@ -56,19 +101,7 @@ class PasswordEncryption:
         """
         if isinstance(password, str):
             password = password.encode()
-
-        # 使用固定的盐值（从 SECRET_KEY 派生）
-        # 注意：在生产环境中应该使用随机盐值
-        salt = b'talentmail_salt_' + password[:16]
-
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password))
-        return key
+        return _derive_key(password)
 
     def encrypt_password(self, password: str) -> str:
         """加密密码
@@ -115,6 +148,25 @@ class PasswordEncryption:
         except Exception as e:
             raise ValueError(f"密码解密失败: {str(e)}")
 
+    def needs_rotation(self, encrypted_password: str) -> bool:
+        """密文是否由旧密钥加密（当前密钥能解开则无需轮换）"""
+        try:
+            self.primary.decrypt(encrypted_password.encode())
+            return False
+        except InvalidToken:
+            return True
+
+    def rotate_password(self, encrypted_password: str) -> str:
+        """用当前密钥重新加密，保留原令牌的时间戳
+
+        Raises:
+            ValueError: 新旧密钥都无法解密
+        """
+        try:
+            return self._rotator.rotate(encrypted_password.encode()).decode('utf-8')
+        except InvalidToken:
+            raise ValueError("密码解密失败: 没有可用的密钥")
+
     @staticmethod
     def generate_encryption_key() -> str:
         """生成新的加密密钥
@@ -129,6 +181,7 @@ class PasswordEncryption:
 
 # 全局实例
 _encryption_instance: Optional[PasswordEncryption] = None
+_encryption_lock = threading.Lock()
 
 
 def get_password_encryption() -> PasswordEncryption:
@@ -139,7 +192,10 @@ def get_password_encryption() -> PasswordEncryption:
     """
     global _encryption_instance
     if _encryption_instance is None:
-        _encryption_instance = PasswordEncryption()
+        # 外部账户同步在线程池中并发解密，避免重复初始化
+        with _encryption_lock:
+            if _encryption_instance is None:
+                _encryption_instance = PasswordEncryption()
     return _encryption_instance
 
 
@@ -168,6 +224,11 @@ def decrypt_password(encrypted_password: str) -> str:
     return get_password_encryption().decrypt_password(encrypted_password)
 
 
+def is_encrypted(value: Optional[str]) -> bool:
+    """是否为 Fernet 密文（空值视为无需处理）"""
+    return not value or value.startswith(FERNET_TOKEN_PREFIX)
+
+
 def generate_encryption_key() -> str:
     """生成新密钥的便捷函数
 
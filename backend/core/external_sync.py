@@ -0,0 +1,468 @@
+"""
+外部邮箱（Gmail、QQ 邮箱等）IMAP 同步
+
+- 每个远端文件夹按 UID 增量拉取，UIDVALIDITY / 最大 UID 记录在 external_folder_states；
+  服务器支持 CONDSTORE 时，HIGHESTMODSEQ 未变化的文件夹不再搜索
+- 远端文件夹映射为本地根文件夹（以账号命名）下的子文件夹；Gmail 的所有邮件 / 已加星标等
+  与其他文件夹重复，草稿、垃圾箱、垃圾邮件不聚合
+- 拉取的邮件按批多行 INSERT（复用 core.mail_import），每批提交后推进 UID，中断后从该位置继续
+- 调度：有界线程池，每个提供商同时连接数有上限，避免触发服务商限流；同一账号同时只有一个连接
+- 凭据每次同步只解密一次，所有文件夹共用同一个 IMAP 连接
+- 每批提交前确认仍持有 external_sync 租约，租约被接管后停止派发剩余账号
+"""
+import base64
+import contextvars
+import imaplib
+import logging
+import re
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.crypto import decrypt_password
+from core.job_coordinator import LeaseLost, ensure_job_lease
+from core.mail_import import ParsedMessage, insert_parsed_messages, parse_message, remove_files
+from db.database import SessionLocal
+from db.models.email import Folder
+from db.models.external_account import ExternalAccount, ExternalFolderState
+
+logger = logging.getLogger(__name__)
+
+# 不同步的特殊用途文件夹（RFC 6154）
+SKIPPED_FOLDER_FLAGS = {
+    "\\all", "\\flagged", "\\important", "\\drafts", "\\trash", "\\junk", "\\noselect", "\\nonexistent",
+}
+# 未声明特殊用途的服务器（如 QQ 邮箱）按名称跳过
+SKIPPED_FOLDER_NAMES = {
+    "drafts", "trash", "junk", "spam", "deleted messages", "deleted items",
+    "草稿箱", "已删除", "垃圾邮件", "垃圾箱",
+}
+# 本地子文件夹名：收件箱与已发送、归档使用中文名，其余沿用远端名称
+SPECIAL_LOCAL_NAMES = {"\\sent": "已发送", "\\archive": "归档"}
+INBOX_LOCAL_NAME = "收件箱"
+
+FETCH_CHUNK_SIZE = 50
+
+_LIST_RE = re.compile(rb'^\((?P<flags>[^)]*)\) (?P<delimiter>"(?:[^"\\]|\\.)*"|NIL) (?P<name>.*)$')
+_UID_RE = re.compile(rb"\bUID (\d+)")
+_FLAGS_RE = re.compile(rb"\bFLAGS \(([^)]*)\)")
+
+
+@dataclass
+class RemoteFolder:
+    name: str
+    display_name: str
+    flags: Set[str]
+
+    @property
+    def is_inbox(self) -> bool:
+        return self.name.upper() == "INBOX"
+
+
+def decode_imap_utf7(name: str) -> str:
+    """IMAP 文件夹名的 modified UTF-7 解码（RFC 3501 5.1.3），如 QQ 邮箱的中文文件夹"""
+    def _decode(match: re.Match) -> str:
+        encoded = match.group(1)
+        if not encoded:
+            return "&"
+        data = encoded.replace(",", "/")
+        data += "=" * (-len(data) % 4)
+        return base64.b64decode(data).decode("utf-16-be")
+    return re.sub(r"&([^-]*)-", _decode, name)
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+        return value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return value
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def parse_list_response(lines: Sequence) -> List[RemoteFolder]:
+    """解析 LIST 响应；名称含特殊字符时服务器以 literal 返回（imaplib 中为元组）"""
+    folders = []
+    for item in lines:
+        literal = None
+        if isinstance(item, tuple):
+            item, literal = item[0], item[1]
+        if not item:
+            continue
+        match = _LIST_RE.match(item)
+        if not match:
+            continue
+        raw_name = literal if literal is not None else match.group("name")
+        name = _unquote(raw_name.decode("utf-8", "replace").strip())
+        delimiter = match.group("delimiter")
+        display_name = decode_imap_utf7(name)
+        if delimiter != b"NIL":
+            sep = _unquote(delimiter.decode())
+            if sep and sep != "/":
+                display_name = display_name.replace(sep, "/")
+        flags = {flag.lower() for flag in match.group("flags").decode().split()}
+        folders.append(RemoteFolder(name=name, display_name=display_name, flags=flags))
+    return folders
+
+
+def select_sync_folders(folders: Sequence[RemoteFolder]) -> List[RemoteFolder]:
+    """需要同步的文件夹，收件箱排在最前"""
+    selected = [
+        f for f in folders
+        if not (f.flags & SKIPPED_FOLDER_FLAGS)
+        and f.display_name.rsplit("/", 1)[-1].lower() not in SKIPPED_FOLDER_NAMES
+    ]
+    return sorted(selected, key=lambda f: not f.is_inbox)
+
+
+def parse_fetch_response(data: Sequence) -> List[Tuple[int, bool, bytes]]:
+    """解析 UID FETCH (UID FLAGS BODY.PEEK[]) 响应，返回 [(uid, 是否已读, 原文)]"""
+    messages: List[list] = []
+    for item in data:
+        if isinstance(item, tuple):
+            header, raw = item[0], item[1]
+            uid = _UID_RE.search(header)
+            if not uid:
+                continue
+            flags = _FLAGS_RE.search(header)
+            messages.append([int(uid.group(1)), flags.group(1) if flags else None, raw])
+        elif isinstance(item, bytes) and messages and messages[-1][1] is None:
+            # 部分服务器把 FLAGS 放在正文 literal 之后
+            flags = _FLAGS_RE.search(item)
+            if flags:
+                messages[-1][1] = flags.group(1)
+    return [(uid, b"\\seen" in (flags or b"").lower(), raw) for uid, flags, raw in messages]
+
+
+def provider_key(provider: Optional[str], imap_host: str) -> str:
+    """并发限制的分组：预设提供商按名称，自定义服务器按主机"""
+    if provider and provider != "custom":
+        return provider
+    return (imap_host or "").lower()
+
+
+def _connect(account: ExternalAccount) -> imaplib.IMAP4:
+    timeout = settings.EXTERNAL_SYNC_IMAP_TIMEOUT_SECONDS
+    if account.imap_ssl:
+        return imaplib.IMAP4_SSL(account.imap_host, account.imap_port, timeout=timeout)
+    return imaplib.IMAP4(account.imap_host, account.imap_port, timeout=timeout)
+
+
+def _capabilities(imap: imaplib.IMAP4) -> Set[str]:
+    # 登录后的能力可能多于连接时
+    typ, data = imap.capability()
+    if typ != "OK" or not data or not data[0]:
+        return set(imap.capabilities)
+    return set(data[0].decode().upper().split())
+
+
+def _response_int(imap: imaplib.IMAP4, code: str) -> Optional[int]:
+    _, data = imap.response(code)
+    if not data or data[-1] is None:
+        return None
+    try:
+        return int(data[-1])
+    except (TypeError, ValueError):
+        return None
+
+
+def _ensure_root_folder(db: Session, account: ExternalAccount) -> int:
+    if account.root_folder_id and db.get(Folder, account.root_folder_id):
+        return account.root_folder_id
+    root = Folder(user_id=account.user_id, name=account.display_name or account.email, role="user")
+    db.add(root)
+    db.flush()
+    account.root_folder_id = root.id
+    return root.id
+
+
+def _ensure_local_folder(db: Session, account: ExternalAccount, remote: RemoteFolder,
+                         state: ExternalFolderState) -> int:
+    if state.local_folder_id and db.get(Folder, state.local_folder_id):
+        return state.local_folder_id
+    root_id = _ensure_root_folder(db, account)
+    if remote.is_inbox:
+        name = INBOX_LOCAL_NAME
+    else:
+        name = next((SPECIAL_LOCAL_NAMES[f] for f in remote.flags if f in SPECIAL_LOCAL_NAMES), remote.display_name)
+    folder = Folder(user_id=account.user_id, name=name, parent_id=root_id, role="user")
+    db.add(folder)
+    db.flush()
+    state.local_folder_id = folder.id
+    return folder.id
+
+
+def _get_folder_state(db: Session, account_id: int, remote_name: str) -> ExternalFolderState:
+    state = db.query(ExternalFolderState).filter(
+        ExternalFolderState.account_id == account_id,
+        ExternalFolderState.remote_name == remote_name,
+    ).first()
+    if state is None:
+        state = ExternalFolderState(
+            account_id=account_id, remote_name=remote_name, last_uid=0,
+            last_fetched_count=0, total_fetched_count=0,
+        )
+        db.add(state)
+        db.flush()
+    return state
+
+
+def _store_chunk(db: Session, account: ExternalAccount, folder_id: int, state: ExternalFolderState,
+                 batch: List[ParsedMessage], last_uid: int) -> None:
+    """入库一批并推进 UID，同一事务提交"""
+    written: List[str] = []
+    try:
+        if batch:
+            _, _, written = insert_parsed_messages(
+                db, account.user_id, folder_id, account.email, batch, dedupe_in_folder=True
+            )
+        state.last_uid = last_uid
+        ensure_job_lease(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        remove_files(written)
+        raise
+
+
+def sync_folder(db: Session, imap: imaplib.IMAP4, account: ExternalAccount, remote: RemoteFolder,
+                condstore: bool, budget: int) -> int:
+    """增量同步一个远端文件夹，最多拉取 budget 封，返回拉取数"""
+    started = time.monotonic()
+    state = _get_folder_state(db, account.id, remote.name)
+    folder_id = _ensure_local_folder(db, account, remote, state)
+    db.commit()
+
+    mailbox = _quote(remote.name) + (" (CONDSTORE)" if condstore else "")
+    typ, _ = imap.select(mailbox, readonly=True)
+    if typ != "OK":
+        raise imaplib.IMAP4.error(f"无法选择文件夹: {remote.display_name}")
+    uidvalidity = _response_int(imap, "UIDVALIDITY")
+    modseq = _response_int(imap, "HIGHESTMODSEQ") if condstore else None
+
+    if state.uidvalidity != uidvalidity:
+        # UID 不再可比，从头同步（按 Message-ID 去重，不会重复入库）
+        state.uidvalidity = uidvalidity
+        state.last_uid = 0
+        state.highest_modseq = None
+    elif modseq is not None and state.highest_modseq == modseq:
+        state.last_synced_at = datetime.now(timezone.utc)
+        state.last_fetched_count = 0
+        state.last_duration_ms = int((time.monotonic() - started) * 1000)
+        state.last_error = None
+        db.commit()
+        return 0
+
+    typ, data = imap.uid("SEARCH", None, f"UID {state.last_uid + 1}:*")
+    # "n:*" 在没有新邮件时也会返回最后一封，需按 UID 过滤
+    uids = sorted(u for u in (int(x) for x in (data[0] or b"").split()) if u > state.last_uid) if typ == "OK" else []
+    pending = uids[:max(budget, 0)]
+
+    fetched = 0
+    seen: Set[str] = set()
+    for i in range(0, len(pending), FETCH_CHUNK_SIZE):
+        chunk = pending[i:i + FETCH_CHUNK_SIZE]
+        typ, data = imap.uid("FETCH", ",".join(str(u) for u in chunk), "(UID FLAGS BODY.PEEK[])")
+        if typ != "OK":
+            raise imaplib.IMAP4.error(f"FETCH 失败: {remote.display_name}")
+        batch: List[ParsedMessage] = []
+        for uid, is_read, raw in parse_fetch_response(data):
+            try:
+                parsed = parse_message(raw)
+            except Exception as e:
+                logger.warning(f"外部邮件解析失败: account={account.id}, uid={uid}, error={e}")
+                continue
+            if parsed.message_id:
+                if parsed.message_id in seen:
+                    continue
+                seen.add(parsed.message_id)
+            parsed.is_read = is_read
+            batch.append(parsed)
+        _store_chunk(db, account, folder_id, state, batch, chunk[-1])
+        fetched += len(chunk)
+
+    # 全部拉完才记录 MODSEQ，否则下次会因 MODSEQ 未变跳过剩余邮件
+    if len(pending) == len(uids):
+        state.highest_modseq = modseq
+    state.last_synced_at = datetime.now(timezone.utc)
+    state.last_fetched_count = fetched
+    state.total_fetched_count += fetched
+    state.last_duration_ms = int((time.monotonic() - started) * 1000)
+    state.last_error = None
+    db.commit()
+    return fetched
+
+
+def _record_folder_error(db: Session, account_id: int, remote: RemoteFolder, error: Exception) -> None:
+    """回滚未提交的部分后记录该文件夹的失败原因；已提交的批次与 UID 位置保留"""
+    db.rollback()
+    try:
+        state = _get_folder_state(db, account_id, remote.name)
+        state.last_error = str(error)[:1000]
+        state.last_synced_at = datetime.now(timezone.utc)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"记录外部文件夹同步错误失败: account={account_id}, error={e}")
+
+
+def sync_account(account_id: int) -> int:
+    """同步一个外部邮箱账号的所有文件夹（在调度线程中执行），返回拉取的邮件数"""
+    started = time.monotonic()
+    fetched = 0
+    error = None
+    failed_folders: List[str] = []
+    imap = None
+    db = SessionLocal()
+    try:
+        account = db.get(ExternalAccount, account_id)
+        if account is None or not account.password:
+            return 0
+        try:
+            # 凭据每次同步只解密一次，所有文件夹共用这个连接
+            password = decrypt_password(account.password)
+            imap = _connect(account)
+            imap.login(account.username, password)
+            condstore = "CONDSTORE" in _capabilities(imap)
+            typ, lines = imap.list()
+            if typ != "OK":
+                raise imaplib.IMAP4.error("LIST 失败")
+            budget = settings.EXTERNAL_SYNC_MAX_MESSAGES_PER_RUN
+            for remote in select_sync_folders(parse_list_response(lines)):
+                if budget <= 0:
+                    break
+                try:
+                    count = sync_folder(db, imap, account, remote, condstore, budget)
+                except (imaplib.IMAP4.abort, OSError, LeaseLost):
+                    # 连接已断开或租约已被接管，后续文件夹也不再同步
+                    raise
+                except Exception as e:
+                    # 单个文件夹失败（无法选择、邮件入库出错等）记录后继续同步其他文件夹
+                    logger.warning(f"外部文件夹同步失败: account={account_id}, folder={remote.display_name}, error={e}")
+                    _record_folder_error(db, account_id, remote, e)
+                    failed_folders.append(remote.display_name)
+                    continue
+                fetched += count
+                budget -= count
+        except LeaseLost:
+            raise
+        except Exception as e:
+            db.rollback()
+            error = str(e)[:1000]
+            logger.warning(f"外部邮箱同步失败: account={account_id}, error={e}")
+        if error is None and failed_folders:
+            error = f"{len(failed_folders)} 个文件夹同步失败: {', '.join(failed_folders)}"[:1000]
+
+        account.last_sync_at = datetime.now(timezone.utc)
+        account.last_sync_duration_ms = int((time.monotonic() - started) * 1000)
+        account.last_sync_message_count = fetched
+        account.sync_error = error
+        db.commit()
+        return fetched
+    finally:
+        if imap is not None:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+        db.close()
+
+
+class ExternalSyncScheduler:
+    """有界并发调度：总并发 max_workers，每个提供商同时最多 provider_limits 个连接"""
+
+    def __init__(self, max_workers: int, provider_limits: Dict[str, int], default_provider_limit: int):
+        self.max_workers = max_workers
+        self.provider_limits = provider_limits
+        self.default_provider_limit = default_provider_limit
+
+    def limit_for(self, provider: str) -> int:
+        return max(1, self.provider_limits.get(provider, self.default_provider_limit))
+
+    def run(self, accounts: Sequence[Tuple[int, str]],
+            sync_func: Callable[[int], int]) -> Dict[int, Optional[int]]:
+        """accounts 为 [(账号 ID, 提供商分组)]，返回每个账号的拉取数（失败为 None）；租约失效时抛出 LeaseLost"""
+        queues: Dict[str, Deque[int]] = {}
+        for account_id, provider in accounts:
+            queues.setdefault(provider, deque()).append(account_id)
+        active: Counter = Counter()
+        running = {}
+        results: Dict[int, Optional[int]] = {}
+        lease_lost: Optional[LeaseLost] = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="external-sync") as executor:
+            def dispatch() -> None:
+                # 只在提供商还有空位时提交，已满的提供商不占用线程池
+                for provider, queue in queues.items():
+                    while queue and active[provider] < self.limit_for(provider) and len(running) < self.max_workers:
+                        account_id = queue.popleft()
+                        # 每个任务复制一份上下文，线程中也能检查定时任务的租约
+                        context = contextvars.copy_context()
+                        running[executor.submit(context.run, sync_func, account_id)] = (account_id, provider)
+                        active[provider] += 1
+
+            dispatch()
+            while running:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    account_id, provider = running.pop(future)
+                    active[provider] -= 1
+                    try:
+                        results[account_id] = future.result()
+                    except LeaseLost as e:
+                        # 等已派发的账号结束（它们各自在下一批提交前停止），不再派发剩余账号
+                        logger.warning(f"外部邮箱同步租约已失效，停止派发: account={account_id}")
+                        results[account_id] = None
+                        lease_lost = e
+                        queues.clear()
+                    except Exception as e:
+                        logger.error(f"外部邮箱同步异常: account={account_id}, error={e}", exc_info=True)
+                        results[account_id] = None
+                dispatch()
+        if lease_lost is not None:
+            raise lease_lost
+        return results
+
+
+external_sync_scheduler = ExternalSyncScheduler(
+    max_workers=settings.EXTERNAL_SYNC_CONCURRENCY,
+    provider_limits=settings.EXTERNAL_SYNC_PROVIDER_LIMITS,
+    default_provider_limit=settings.EXTERNAL_SYNC_PROVIDER_DEFAULT_LIMIT,
+)
+
+
+def run_external_sync_once() -> None:
+    """同步所有到期的外部邮箱账号（ingest 的 external_sync 定时任务）"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.EXTERNAL_SYNC_INTERVAL_SECONDS)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ExternalAccount.id, ExternalAccount.provider, ExternalAccount.imap_host)
+            .filter(
+                ExternalAccount.is_active == True,  # noqa: E712
+                ExternalAccount.sync_enabled == True,  # noqa: E712
+                ExternalAccount.password.isnot(None),
+                or_(ExternalAccount.last_sync_at.is_(None), ExternalAccount.last_sync_at < cutoff),
+            )
+            .order_by(ExternalAccount.last_sync_at.asc().nullsfirst())
+            .all()
+        )
+    finally:
+        db.close()
+    if not rows:
+        return
+
+    results = external_sync_scheduler.run(
+        [(account_id, provider_key(provider, host)) for account_id, provider, host in rows], sync_account
+    )
+    total = sum(count or 0 for count in results.values())
+    if total:
+        logger.info(f"外部邮箱同步完成: 账号 {len(results)} 个，新邮件 {total} 封")
@@ -11,6 +11,8 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from db.models.email import Email, Folder
 from core.config import settings
+from core.mailbox_waiters import publish_new_code
+from core.verification_codes import apply_verification_code
 import logging
 
 logger = logging.getLogger(__name__)
@@ -164,6 +166,7 @@ def sync_user_mailbox(
         )
         
         new_count = 0
+        has_code = False
         for email_id in email_ids:
             # 获取邮件
             status, msg_data = imap.fetch(email_id, "(RFC822)")
@@ -192,6 +195,8 @@ def sync_user_mailbox(
                 is_starred=False,
                 is_draft=False,
             )
+            if apply_verification_code(db_email):
+                has_code = True
             db.add(db_email)
             new_count += 1
             
@@ -200,6 +205,9 @@ def sync_user_mailbox(
         
         db.commit()
         imap.logout()
+        if has_code:
+            # 与 mail_sync 一致：提交后通知等待验证码的长轮询 / SSE 客户端
+            publish_new_code(user_email)
         
         logger.info(f"同步完成: {new_count} 封新邮件")
         return new_count
@@ -0,0 +1,424 @@
+"""
+后台任务协调（多 worker 选主）
+
+uvicorn 多 worker 时每个进程都会执行 lifespan。定时任务（邮件同步、会话清理、
+临时邮箱维护、统计汇总）和 LMTP 服务每个只应有一个 worker 运行：
+
+- 每个任务对应 job_leases 表中的一行租约，持有者每 1/3 有效期续约一次
+- 租约过期（持有者崩溃、卡死、与数据库断开）后其他 worker 在下一次续约时接管
+- 正常停止时主动让出租约，其他 worker 最多一个续约间隔后接管
+- 本地按单调时钟记录租约到期时间，续约失败且超过有效期后不再认为自己是持有者
+- 定时任务的上次完成时间记录在租约行上，接管者据此决定何时运行下一次，
+  重启或切换不会导致提前或重复执行
+- 执行时间可能超过租约有效期的任务在每批提交前调用 ensure_job_lease(db)：
+  本地租约已失效，或数据库中持有者已不是自己时抛出 LeaseLost，当前批次不提交；
+  数据库检查对租约行加共享锁，接管者要等这一批提交后才能获得租约，两个 worker 不会同时写入
+
+用租约表而不是 advisory lock：advisory lock 绑定在会话上，PgBouncer 事务池模式下无法使用，
+而且租约行可以顺带记录持有者与最近运行情况，供管理端查看。
+
+后端：
+- postgres（默认）：多 worker 共享 job_leases 表
+- memory：进程内租约，单进程部署或测试使用
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKEND_MEMORY = "memory"
+BACKEND_POSTGRES = "postgres"
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+# 错误信息最多保存多少字符
+MAX_ERROR_LENGTH = 1000
+
+
+class LeaseLost(RuntimeError):
+    """任务执行期间失去租约，应立即停止，不再提交"""
+
+
+# 当前线程正在执行的任务 (协调器, 任务名)；asyncio.to_thread 会把它带进任务线程
+_current_job: contextvars.ContextVar[Optional[Tuple["JobCoordinator", str]]] = contextvars.ContextVar(
+    "current_job", default=None
+)
+
+
+def default_owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass(frozen=True)
+class LeaseGrant:
+    """获得或续约成功的结果"""
+    # 距离上次运行完成的秒数（按数据库时钟），从未运行过为 None
+    seconds_since_last_run: Optional[float]
+
+
+class MemoryLeaseBackend:
+    """进程内租约；同一实例可被多个协调器共享以模拟多 worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases: Dict[str, dict] = {}
+
+    def acquire(self, name: str, owner: str, ttl: float) -> Optional[LeaseGrant]:
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is not None and lease["owner"] != owner and lease["lease_expires_at"] > now:
+                return None
+            if lease is None:
+                lease = self._leases[name] = {"name": name, "run_count": 0, "last_finished_at": None}
+            if lease.get("owner") != owner:
+                lease.update(owner=owner, acquired_at=now)
+            lease.update(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=ttl))
+            finished = lease["last_finished_at"]
+            return LeaseGrant((now - finished).total_seconds() if finished else None)
+
+    def release(self, name: str, owner: str) -> None:
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is not None and lease["owner"] == owner:
+                lease["lease_expires_at"] = datetime.now(timezone.utc)
+
+    def record_run(self, name: str, owner: str, started_at: datetime, duration_ms: int,
+                   status: str, error: Optional[str]) -> None:
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is None or lease["owner"] != owner:
+                return
+            lease.update(
+                last_started_at=started_at,
+                last_finished_at=datetime.now(timezone.utc),
+                last_duration_ms=duration_ms,
+                last_status=status,
+                last_error=error,
+                run_count=lease["run_count"] + 1,
+            )
+
+    def holds(self, db, name: str, owner: str) -> bool:
+        with self._lock:
+            lease = self._leases.get(name)
+            return (lease is not None and lease["owner"] == owner
+                    and lease["lease_expires_at"] > datetime.now(timezone.utc))
+
+    def list_leases(self) -> List[dict]:
+        with self._lock:
+            return [dict(lease) for lease in self._leases.values()]
+
+
+# 租约不存在、已过期或本来就属于自己时获得租约；换了持有者才更新 acquired_at
+_POSTGRES_ACQUIRE_SQL = text("""
+    INSERT INTO job_leases AS l (name, owner, acquired_at, heartbeat_at, lease_expires_at, run_count)
+    VALUES (:name, :owner, now(), now(), now() + make_interval(secs => :ttl), 0)
+    ON CONFLICT (name) DO UPDATE SET
+        owner = EXCLUDED.owner,
+        acquired_at = CASE WHEN l.owner = EXCLUDED.owner THEN l.acquired_at ELSE now() END,
+        heartbeat_at = now(),
+        lease_expires_at = EXCLUDED.lease_expires_at
+    WHERE l.owner = EXCLUDED.owner OR l.lease_expires_at < now()
+    RETURNING EXTRACT(EPOCH FROM (now() - l.last_finished_at)) AS seconds_since_last_run
+""")
+
+_POSTGRES_RELEASE_SQL = text(
+    "UPDATE job_leases SET lease_expires_at = now() WHERE name = :name AND owner = :owner"
+)
+
+_POSTGRES_RECORD_RUN_SQL = text("""
+    UPDATE job_leases SET
+        last_started_at = :started_at,
+        last_finished_at = now(),
+        last_duration_ms = :duration_ms,
+        last_status = :status,
+        last_error = :error,
+        run_count = run_count + 1
+    WHERE name = :name AND owner = :owner
+""")
+
+
+# 在任务自己的事务中确认仍是持有者；FOR SHARE 让接管者的 UPDATE 等到本事务提交，
+# clock_timestamp() 而不是 now()：长事务中 now() 是事务开始时间
+_POSTGRES_HOLDS_SQL = text("""
+    SELECT 1 FROM job_leases
+    WHERE name = :name AND owner = :owner AND lease_expires_at > clock_timestamp()
+    FOR SHARE
+""")
+
+
+class PostgresLeaseBackend:
+    """job_leases 表上的租约，所有时间比较使用数据库时钟"""
+
+    def acquire(self, name: str, owner: str, ttl: float) -> Optional[LeaseGrant]:
+        from db.database import engine
+        with engine.begin() as conn:
+            row = conn.execute(_POSTGRES_ACQUIRE_SQL, {"name": name, "owner": owner, "ttl": ttl}).first()
+        if row is None:
+            return None
+        since = row.seconds_since_last_run
+        return LeaseGrant(float(since) if since is not None else None)
+
+    def release(self, name: str, owner: str) -> None:
+        from db.database import engine
+        with engine.begin() as conn:
+            conn.execute(_POSTGRES_RELEASE_SQL, {"name": name, "owner": owner})
+
+    def record_run(self, name: str, owner: str, started_at: datetime, duration_ms: int,
+                   status: str, error: Optional[str]) -> None:
+        from db.database import engine
+        with engine.begin() as conn:
+            conn.execute(
+                _POSTGRES_RECORD_RUN_SQL,
+                {
+                    "name": name,
+                    "owner": owner,
+                    "started_at": started_at,
+                    "duration_ms": duration_ms,
+                    "status": status,
+                    "error": error,
+                },
+            )
+
+    def holds(self, db, name: str, owner: str) -> bool:
+        return db.execute(_POSTGRES_HOLDS_SQL, {"name": name, "owner": owner}).first() is not None
+
+    def list_leases(self) -> List[dict]:
+        from db.database import engine
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT * FROM job_leases ORDER BY name")).mappings().all()
+        return [dict(row) for row in rows]
+
+
+@dataclass
+class PeriodicJob:
+    name: str
+    # 同步函数，在线程池中执行
+    func: Callable[[], None]
+    interval: float
+
+
+@dataclass
+class SingletonService:
+    name: str
+    # 同步的启动 / 停止函数，获得租约时启动，失去租约或进程停止时停止
+    start: Callable[[], None]
+    stop: Callable[[], None]
+
+
+class JobCoordinator:
+    def __init__(self, backend=None, owner: Optional[str] = None,
+                 ttl_seconds: float = settings.JOB_LEASE_TTL_SECONDS):
+        self.backend = backend or MemoryLeaseBackend()
+        self.owner = owner or default_owner_id()
+        self.ttl_seconds = ttl_seconds
+        self.renew_interval = ttl_seconds / 3
+        self._jobs: Dict[str, PeriodicJob] = {}
+        self._services: Dict[str, SingletonService] = {}
+        # 任务名 -> 本地判断租约失效的单调时钟时间
+        self._lease_deadlines: Dict[str, float] = {}
+        # 任务名 -> 上次运行完成的单调时钟时间（None 表示从未运行）
+        self._last_finished: Dict[str, Optional[float]] = {}
+        self._running_services: set = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def add_periodic_job(self, name: str, func: Callable[[], None], interval: float) -> None:
+        self._jobs[name] = PeriodicJob(name, func, interval)
+
+    def add_singleton(self, name: str, start: Callable[[], None], stop: Callable[[], None]) -> None:
+        self._services[name] = SingletonService(name, start, stop)
+
+    def is_leader(self, name: str) -> bool:
+        deadline = self._lease_deadlines.get(name)
+        return deadline is not None and time.monotonic() < deadline
+
+    def ensure_lease(self, name: str, db=None) -> None:
+        """仍持有 name 的租约时返回，否则抛出 LeaseLost；传入 db 时在该会话的事务中再确认一次"""
+        if not self.is_leader(name):
+            raise LeaseLost(f"后台任务租约已失效: job={name}")
+        if db is not None and not self.backend.holds(db, name, self.owner):
+            raise LeaseLost(f"后台任务租约已被其他 worker 接管: job={name}")
+
+    async def renew_leases(self) -> None:
+        """获得或续约所有任务的租约，并按结果启停单例服务"""
+        for name in [*self._jobs, *self._services]:
+            # 以发起请求的时间为起点计算本地到期时间，宁可提前放弃也不与接管者重叠
+            requested_at = time.monotonic()
+            try:
+                grant = await asyncio.to_thread(self.backend.acquire, name, self.owner, self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"续约后台任务租约失败: job={name}, err={e}")
+                continue
+            if grant is None:
+                if self._lease_deadlines.pop(name, None) is not None:
+                    logger.warning(f"后台任务租约已被其他 worker 接管: job={name}")
+                continue
+            if name not in self._lease_deadlines:
+                logger.info(f"获得后台任务租约: job={name}, owner={self.owner}")
+                since = grant.seconds_since_last_run
+                self._last_finished[name] = None if since is None else time.monotonic() - since
+            self._lease_deadlines[name] = requested_at + self.ttl_seconds
+        await self._reconcile_services()
+
+    async def _reconcile_services(self) -> None:
+        for name, service in self._services.items():
+            leader = self.is_leader(name)
+            if leader and name not in self._running_services:
+                try:
+                    await asyncio.to_thread(service.start)
+                    self._running_services.add(name)
+                    logger.info(f"单例服务已在本 worker 启动: {name}")
+                except Exception as e:
+                    # 下一次续约时重试
+                    logger.error(f"单例服务启动失败: {name}, err={e}")
+            elif not leader and name in self._running_services:
+                await self._stop_service(service)
+
+    async def _stop_service(self, service: SingletonService) -> None:
+        self._running_services.discard(service.name)
+        try:
+            await asyncio.to_thread(service.stop)
+            logger.info(f"单例服务已在本 worker 停止: {service.name}")
+        except Exception as e:
+            logger.error(f"单例服务停止失败: {service.name}, err={e}")
+
+    def _seconds_until_due(self, job: PeriodicJob) -> float:
+        finished = self._last_finished.get(job.name)
+        if finished is None:
+            return 0.0
+        return max(0.0, finished + job.interval - time.monotonic())
+
+    async def run_job_once(self, job: PeriodicJob) -> None:
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        status, error = STATUS_OK, None
+        token = _current_job.set((self, job.name))
+        try:
+            await asyncio.to_thread(job.func)
+        except LeaseLost as e:
+            status, error = STATUS_ERROR, str(e)[:MAX_ERROR_LENGTH]
+            logger.warning(f"后台任务失去租约，已停止: job={job.name}")
+        except Exception as e:
+            status, error = STATUS_ERROR, str(e)[:MAX_ERROR_LENGTH]
+            logger.error(f"后台任务执行失败: job={job.name}, err={e}")
+        finally:
+            _current_job.reset(token)
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        self._last_finished[job.name] = time.monotonic()
+        try:
+            await asyncio.to_thread(
+                self.backend.record_run, job.name, self.owner, started_at, duration_ms, status, error
+            )
+        except Exception as e:
+            logger.warning(f"记录后台任务运行结果失败: job={job.name}, err={e}")
+
+    async def _job_loop(self, job: PeriodicJob) -> None:
+        while True:
+            if self.is_leader(job.name) and self._seconds_until_due(job) <= 0:
+                await self.run_job_once(job)
+            # 非持有者每个续约间隔检查一次，以便接管后及时运行
+            wait = self._seconds_until_due(job) if self.is_leader(job.name) else self.renew_interval
+            await asyncio.sleep(min(max(wait, 1.0), self.renew_interval))
+
+    async def _lease_loop(self) -> None:
+        while True:
+            await self.renew_leases()
+            await asyncio.sleep(self.renew_interval)
+
+    def start(self) -> None:
+        self._tasks.append(asyncio.create_task(self._lease_loop()))
+        for job in self._jobs.values():
+            self._tasks.append(asyncio.create_task(self._job_loop(job)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+
+        for name in list(self._running_services):
+            await self._stop_service(self._services[name])
+        # 主动让出租约，其他 worker 不必等到过期即可接管
+        for name in list(self._lease_deadlines):
+            try:
+                await asyncio.to_thread(self.backend.release, name, self.owner)
+            except Exception as e:
+                logger.warning(f"释放后台任务租约失败: job={name}, err={e}")
+        self._lease_deadlines.clear()
+
+    def _job_kind(self, name: str) -> Optional[str]:
+        if name in self._jobs:
+            return "periodic"
+        if name in self._services:
+            return "singleton"
+        return None
+
+    def status(self) -> dict:
+        """
+        所有任务的租约与最近运行情况，is_self 标记本 worker
+        任务列表以共享后端的租约行为准：api 进程不登记任何任务，也能看到其他进程持有的任务；
+        本进程登记的任务只用来补充 kind / interval（未在本进程登记时为 None），尚无租约行的也会列出
+        """
+        now = datetime.now(timezone.utc)
+        leases = {lease["name"]: lease for lease in self.backend.list_leases()}
+        names = [*leases, *(name for name in [*self._jobs, *self._services] if name not in leases)]
+        jobs = []
+        for name in names:
+            lease = leases.get(name, {})
+            expires_at = lease.get("lease_expires_at")
+            job = self._jobs.get(name)
+            jobs.append({
+                "name": name,
+                "kind": self._job_kind(name),
+                "interval_seconds": job.interval if job else None,
+                "owner": lease.get("owner"),
+                "is_self": self.is_leader(name),
+                "lease_active": bool(expires_at and expires_at > now),
+                "acquired_at": lease.get("acquired_at"),
+                "heartbeat_at": lease.get("heartbeat_at"),
+                "lease_expires_at": expires_at,
+                "last_started_at": lease.get("last_started_at"),
+                "last_finished_at": lease.get("last_finished_at"),
+                "last_duration_ms": lease.get("last_duration_ms"),
+                "last_status": lease.get("last_status"),
+                "last_error": lease.get("last_error"),
+                "run_count": lease.get("run_count", 0),
+            })
+        return {"worker": self.owner, "ttl_seconds": self.ttl_seconds, "jobs": jobs}
+
+
+def ensure_job_lease(db=None) -> None:
+    """
+    长任务在每批提交前调用：当前线程不在协调器的任务中（API 手动触发、测试）时直接返回，
+    否则失去租约时抛出 LeaseLost。传入 db 时检查与本批写入在同一事务，需紧接着提交
+    """
+    current = _current_job.get()
+    if current is not None:
+        coordinator, name = current
+        coordinator.ensure_lease(name, db)
+
+
+def create_backend(name: str):
+    if name == BACKEND_POSTGRES:
+        return PostgresLeaseBackend()
+    if name != BACKEND_MEMORY:
+        logger.warning(f"未知的后台任务租约后端 {name}，使用 memory")
+    return MemoryLeaseBackend()
+
+
+job_coordinator = JobCoordinator(create_backend(settings.JOB_LEASE_BACKEND))
@@ -11,8 +11,7 @@ import email
 from email.header import decode_header
 from email.utils import parsedate_to_datetime
 from datetime import datetime
-from typing import Optional, List, Tuple
-import asyncio
+from typing import Optional, List, Set, Tuple
 import os
 import uuid
 from aiosmtpd.controller import Controller
@@ -22,6 +21,9 @@ from db.database import SessionLocal
 from db.models.email import Email, Folder, TempMailbox, Attachment
 from db.models.user import User
 from core import websocket as ws_manager
+from core.verification_codes import extract_code
+from core.mailbox_waiters import publish_new_code
+from core.pool_stats import invalidate_user_stats
 import logging
 
 logger = logging.getLogger(__name__)
@@ -155,9 +157,14 @@ class LMTPHandler:
                     pass
             
             body_html, body_text, attachments = get_email_body_and_attachments(msg)
+            # 验证码每封邮件只提取一次，所有收件人共用
+            code_match = extract_code(body_text, body_html)
             
             # 为每个收件人创建邮件记录
             db: Session = SessionLocal()
+            stored_recipients: List[str] = []
+            temp_owner_ids: Set[int] = set()
+            notify_user_ids: List[int] = []
             try:
                 for rcpt in envelope.rcpt_tos:
                     rcpt_email = extract_email_address(rcpt)
@@ -210,6 +217,8 @@ class LMTPHandler:
                         recipients=to_header,
                         body_html=body_html,
                         body_text=body_text,
+                        verification_code=code_match.code if code_match else None,
+                        verification_code_pattern=code_match.pattern if code_match else None,
                         received_at=received_at,
                         is_read=False,
                         is_starred=False,
@@ -237,20 +246,29 @@ class LMTPHandler:
                         db.add(db_attachment)
                     
                     logger.info(f"LMTP: 邮件已存入数据库 to={rcpt_email} subject={subject[:50]} attachments={len(attachments)}")
+                    stored_recipients.append(rcpt_email)
+                    if temp_mailbox:
+                        temp_owner_ids.add(temp_mailbox.owner_id)
                     
                     # 通知用户有新邮件
-                    try:
-                        asyncio.create_task(ws_manager.notify_new_email(user.id, {
-                            "subject": subject,
-                            "sender": sender
-                        }))
-                    except Exception as e:
-                        logger.warning(f"WebSocket 通知失败: {e}")
+                    notify_user_ids.append(user.id)
                 
                 db.commit()
                 
             finally:
                 db.close()
+
+            for owner_id in temp_owner_ids:
+                invalidate_user_stats(owner_id)
+
+            # 提交后再通知，WebSocket 连接可能在其他进程
+            for user_id in notify_user_ids:
+                ws_manager.publish_new_email(user_id, subject, sender)
+
+            # 唤醒等待验证码的长轮询 / SSE 请求
+            if code_match:
+                for rcpt_email in stored_recipients:
+                    publish_new_code(rcpt_email)
             
             return '250 Message accepted for delivery'
             
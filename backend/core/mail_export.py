@@ -0,0 +1,572 @@
+"""
+邮件导出（EML / mbox / PDF）
+
+PDF 渲染（weasyprint）是 CPU 密集型操作：
+- 在独立的进程池中执行，API 进程不导入 weasyprint，也不占用 API 进程的 CPU
+- 进程池前有有界队列（运行中 + 排队 ≤ PDF_EXPORT_MAX_PENDING），单封导出满了直接返回忙，
+  批量导出等待空位，多封同时在进程池中渲染
+- 单次渲染超时由子进程内的 SIGALRM 中断，父进程另有兜底等待超时
+- 渲染结果按 (邮件 ID, 时区, 内容哈希) 缓存在磁盘上，按最近访问时间淘汰（LRU）
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import signal
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, parseaddr
+from multiprocessing import get_context
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = "Asia/Shanghai"
+# 修改导出 HTML 模板时递增，使旧缓存失效
+PDF_TEMPLATE_VERSION = "1"
+# 父进程等待比子进程超时多留的时间（进程启动、结果回传）
+RESULT_GRACE_SECONDS = 5
+# 附件分块读取大小：57 字节正好编码为一行 76 字符的 base64
+ATTACHMENT_READ_CHUNK = 57 * 1024
+# mboxrd：正文中以 From 开头的行（含已转义的 >From）
+MBOX_FROM_LINE = re.compile(rb'^(>*From )', re.MULTILINE)
+
+# 时区显示名称映射
+TZ_DISPLAY_NAMES = {
+    "Asia/Shanghai": "北京时间 (UTC+8)",
+    "Asia/Tokyo": "东京时间 (UTC+9)",
+    "America/New_York": "纽约时间 (UTC-5)",
+    "America/Los_Angeles": "洛杉矶时间 (UTC-8)",
+    "Europe/London": "伦敦时间 (UTC+0)",
+    "Europe/Paris": "巴黎时间 (UTC+1)",
+    "UTC": "世界协调时间 (UTC)",
+}
+
+
+class PdfExportBusy(Exception):
+    """渲染队列已满"""
+
+
+class PdfExportTimeout(Exception):
+    """渲染超时"""
+
+
+class PdfRendererUnavailable(Exception):
+    """weasyprint 不可用"""
+
+
+def safe_filename(subject: Optional[str], ext: str) -> str:
+    safe_subject = (subject or 'email')[:50].replace('/', '_').replace('\\', '_')
+    return f"{safe_subject}.{ext}"
+
+
+def _parse_recipients(recipients: Optional[str]) -> Tuple[List[str], List[str]]:
+    data = json.loads(recipients)
+    to_list = [r.get('email', '') for r in data.get('to', [])]
+    cc_list = [r.get('email', '') for r in data.get('cc', [])]
+    return to_list, cc_list
+
+
+def _build_message(email):
+    """邮件正文部分（纯文本 / alternative），已设置邮件头"""
+    # 创建 MIME 消息
+    if email.body_html:
+        msg = MIMEMultipart('alternative')
+        # 添加纯文本版本
+        if email.body_text:
+            msg.attach(MIMEText(email.body_text, 'plain', 'utf-8'))
+        # 添加 HTML 版本
+        msg.attach(MIMEText(email.body_html, 'html', 'utf-8'))
+    else:
+        msg = MIMEText(email.body_text or '', 'plain', 'utf-8')
+
+    # 设置邮件头
+    msg['Subject'] = email.subject or '(无主题)'
+    msg['From'] = email.sender or ''
+
+    # 解析收件人
+    if email.recipients:
+        try:
+            to_list, cc_list = _parse_recipients(email.recipients)
+            if to_list:
+                msg['To'] = ', '.join(to_list)
+            if cc_list:
+                msg['Cc'] = ', '.join(cc_list)
+        except Exception:
+            msg['To'] = email.recipients
+
+    if email.received_at:
+        msg['Date'] = formatdate(email.received_at.timestamp(), localtime=True)
+    if email.message_id:
+        msg['Message-ID'] = f'<{email.message_id}>'
+    return msg
+
+
+def _iter_base64_file(path: str) -> Iterator[bytes]:
+    """分块读取文件并 base64 编码（每行 76 字符），最后一行不带换行"""
+    with open(path, 'rb') as f:
+        chunk = f.read(ATTACHMENT_READ_CHUNK)
+        while chunk:
+            next_chunk = f.read(ATTACHMENT_READ_CHUNK)
+            encoded = base64.encodebytes(chunk)
+            yield encoded if next_chunk else encoded.rstrip(b'\n')
+            chunk = next_chunk
+
+
+def iter_eml(email, attachments: Sequence) -> Iterator[bytes]:
+    """
+    逐段生成邮件（含附件）的 RFC 822 内容
+    附件从磁盘分块读取编码，不整体载入内存；每段都从行首开始
+    """
+    msg = _build_message(email)
+    readable = [att for att in attachments if att.file_path and os.path.exists(att.file_path)]
+    if not readable:
+        yield msg.as_bytes()
+        return
+
+    # 有附件时改用 mixed 类型；附件正文先用占位符生成 MIME 结构，输出时替换为流式编码的文件内容
+    outer = MIMEMultipart('mixed')
+    for key in ['Subject', 'From', 'To', 'Cc', 'Date', 'Message-ID']:
+        if msg[key]:
+            outer[key] = msg[key]
+    outer.attach(msg)
+
+    placeholders = {}
+    for att in readable:
+        placeholder = f"@@attachment-{uuid.uuid4().hex}@@"
+        att_part = MIMEBase('application', 'octet-stream')
+        att_part['Content-Transfer-Encoding'] = 'base64'
+        att_part.add_header('Content-Disposition', 'attachment', filename=att.filename or 'attachment')
+        att_part.set_payload(placeholder)
+        outer.attach(att_part)
+        placeholders[placeholder.encode('ascii')] = att
+
+    segments = re.split(b'(@@attachment-[0-9a-f]{32}@@)', outer.as_bytes())
+    for segment in segments:
+        att = placeholders.get(segment)
+        if att is None:
+            yield segment
+            continue
+        try:
+            yield from _iter_base64_file(att.file_path)
+        except OSError as e:
+            # 已输出 MIME 头，读取失败时附件留空
+            logger.warning(f"无法读取附件 {att.filename}: {e}")
+
+
+def build_eml(email, attachments: Sequence) -> bytes:
+    """邮件（含附件）的 RFC 822 内容"""
+    return b"".join(iter_eml(email, attachments))
+
+
+def iter_mbox_message(email, attachments: Sequence) -> Iterator[bytes]:
+    """mboxrd 格式的一封邮件：From_ 分隔行 + 转义后的正文 + 空行"""
+    sender = parseaddr(email.sender or '')[1].replace(' ', '') or 'MAILER-DAEMON'
+    received_at = email.received_at or datetime.now(timezone.utc)
+    if received_at.tzinfo is not None:
+        received_at = received_at.astimezone(timezone.utc)
+    yield f"From {sender} {received_at.strftime('%a %b %d %H:%M:%S %Y')}\n".encode('ascii', 'replace')
+
+    last = b'\n'
+    for chunk in iter_eml(email, attachments):
+        if not chunk:
+            continue
+        # 每段都从行首开始，正文中以 From 开头（含已转义的 >From）的行再加一个 >
+        yield MBOX_FROM_LINE.sub(rb'>\1', chunk)
+        last = chunk[-1:]
+    yield b'\n' if last == b'\n' else b'\n\n'
+
+
+def _resolve_timezone(user_timezone: str):
+    from zoneinfo import ZoneInfo
+    try:
+        return ZoneInfo(user_timezone), user_timezone
+    except Exception:
+        return ZoneInfo(DEFAULT_TIMEZONE), DEFAULT_TIMEZONE
+
+
+def build_email_html(email, attachment_names: Sequence[str], user_timezone: str = DEFAULT_TIMEZONE) -> str:
+    """PDF 导出用的 HTML（页脚时间为渲染时间）"""
+    user_tz, tz_name = _resolve_timezone(user_timezone)
+    tz_display = TZ_DISPLAY_NAMES.get(tz_name, tz_name)
+
+    # 解析收件人
+    recipients_str = ""
+    if email.recipients:
+        try:
+            to_list, cc_list = _parse_recipients(email.recipients)
+            if to_list:
+                recipients_str += f"收件人: {', '.join(to_list)}"
+            if cc_list:
+                recipients_str += f"<br>抄送: {', '.join(cc_list)}"
+        except Exception:
+            recipients_str = f"收件人: {email.recipients}"
+
+    # 格式化日期（转换为用户时区）
+    date_str = ""
+    if email.received_at:
+        received_at_utc = email.received_at
+        if received_at_utc.tzinfo is None:
+            received_at_utc = received_at_utc.replace(tzinfo=timezone.utc)
+        date_str = received_at_utc.astimezone(user_tz).strftime("%Y年%m月%d日 %H:%M")
+
+    attachments_html = ""
+    if attachment_names:
+        att_list = ', '.join(attachment_names)
+        attachments_html = f'<p style="color: #666; font-size: 12px; margin-top: 20px; padding-top: 10px; border-top: 1px solid #eee;">📎 附件: {att_list}</p>'
+
+    return f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
+            max-width: 800px;
+            margin: 0 auto;
+            padding: 40px;
+            color: #333;
+            line-height: 1.6;
+        }}
+        .header {{
+            border-bottom: 2px solid #3b82f6;
+            padding-bottom: 20px;
+            margin-bottom: 30px;
+        }}
+        .subject {{
+            font-size: 24px;
+            font-weight: bold;
+            margin-bottom: 15px;
+            color: #1a1a1a;
+        }}
+        .meta {{
+            font-size: 14px;
+            color: #666;
+        }}
+        .meta-row {{
+            margin: 5px 0;
+        }}
+        .label {{
+            font-weight: 600;
+            color: #444;
+        }}
+        .body {{
+            margin-top: 20px;
+        }}
+        .footer {{
+            margin-top: 40px;
+            padding-top: 20px;
+            border-top: 1px solid #eee;
+            font-size: 12px;
+            color: #999;
+            text-align: center;
+        }}
+    </style>
+</head>
+<body>
+    <div class="header">
+        <div class="subject">{email.subject or '(无主题)'}</div>
+        <div class="meta">
+            <div class="meta-row"><span class="label">发件人:</span> {email.sender or ''}</div>
+            <div class="meta-row">{recipients_str}</div>
+            <div class="meta-row"><span class="label">日期:</span> {date_str}</div>
+        </div>
+    </div>
+    <div class="body">
+        {email.body_html or f'<pre style="white-space: pre-wrap; font-family: inherit;">{email.body_text or "(无正文内容)"}</pre>'}
+    </div>
+    {attachments_html}
+    <div class="footer">
+        由 TalentMail 导出 · {datetime.now(user_tz).strftime("%Y-%m-%d %H:%M")} ({tz_display})
+    </div>
+</body>
+</html>
+"""
+
+
+def content_hash(email, attachment_names: Sequence[str]) -> str:
+    """影响 PDF 内容的字段的哈希（不含页脚的导出时间）"""
+    digest = hashlib.sha256()
+    for part in (
+        PDF_TEMPLATE_VERSION,
+        email.subject,
+        email.sender,
+        email.recipients,
+        email.received_at.isoformat() if email.received_at else None,
+        email.body_html,
+        email.body_text,
+        "\x00".join(attachment_names),
+    ):
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """磁盘 LRU 缓存：文件 mtime 即最近访问时间，总大小超过上限时删除最久未访问的文件"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 本进程估算的目录大小，None 表示尚未扫描
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def key(email_id: int, user_timezone: str, body_hash: str) -> str:
+        return hashlib.sha256(f"{email_id}|{user_timezone}|{body_hash}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"读取 PDF 缓存失败: {e}")
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # 先写临时文件再改名，其他进程不会读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"写入 PDF 缓存失败: {e}")
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+            if self._size is None or self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pdf"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                total -= size
+            except OSError as e:
+                logger.warning(f"淘汰 PDF 缓存失败: {e}")
+        self._size = total
+
+
+def _raise_timeout(signum, frame):
+    raise PdfExportTimeout()
+
+
+def _render_pdf_in_worker(html: str, timeout_seconds: float) -> Optional[bytes]:
+    """在进程池子进程中执行；weasyprint 不可用时返回 None"""
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        return None
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+    try:
+        return HTML(string=html).write_pdf()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class PdfRenderer:
+    """有界队列 + 进程池；进程池首次使用时创建"""
+
+    def __init__(self, workers: int, max_pending: int, timeout_seconds: float):
+        self.workers = workers
+        self.timeout_seconds = timeout_seconds
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # 子进程报告 weasyprint 不可用后不再提交任务
+        self.available = True
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn：不继承父进程的数据库连接池和线程
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+            return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        """子进程异常退出后进程池不可再用，丢弃后下次调用重建"""
+        with self._executor_lock:
+            if executor is not None and self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, html: str, wait_for_slot: bool = False) -> Tuple[ProcessPoolExecutor, Future]:
+        """
+        占用队列槽位并提交渲染，返回 (进程池, Future)，结果由 wait 取回
+        队列已满时 wait_for_slot=False 抛 PdfExportBusy，否则最多等待一个超时周期
+        """
+        if not self.available:
+            raise PdfRendererUnavailable()
+        acquired = self._slots.acquire(timeout=self.timeout_seconds) if wait_for_slot else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise PdfExportBusy()
+        executor = None
+        try:
+            executor = self._get_executor()
+            future = executor.submit(_render_pdf_in_worker, html, self.timeout_seconds)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard_executor(executor)
+            raise PdfExportBusy()
+        except BaseException:
+            self._slots.release()
+            raise
+        # 槽位在任务结束时才释放：等待超时后子进程可能仍在渲染，提前释放会超出并发上限
+        future.add_done_callback(lambda _: self._slots.release())
+        return executor, future
+
+    def wait(self, executor: ProcessPoolExecutor, future: Future) -> bytes:
+        """
+        等待 submit 提交的渲染结果
+        渲染子进程崩溃（weasyprint 异常退出、OOM）时重建进程池并抛 PdfExportBusy
+        """
+        try:
+            # 排队等待的时间也算在内，留出余量
+            result = future.result(timeout=self.timeout_seconds * 2 + RESULT_GRACE_SECONDS)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PdfExportTimeout()
+        except BrokenProcessPool:
+            logger.warning("PDF 渲染子进程异常退出，重建进程池")
+            self._discard_executor(executor)
+            raise PdfExportBusy()
+        if result is None:
+            self.available = False
+            raise PdfRendererUnavailable()
+        return result
+
+    def render(self, html: str, wait_for_slot: bool = False) -> bytes:
+        """渲染单个 PDF 并等待结果"""
+        return self.wait(*self.submit(html, wait_for_slot=wait_for_slot))
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def render_email_pdf(email, attachment_names: Sequence[str], user_timezone: str) -> Tuple[bytes, str, str]:
+    """
+    导出单封邮件为 PDF，返回 (内容, media_type, 扩展名)
+    weasyprint 不可用时返回 HTML（与原行为一致）
+    """
+    _, tz_name = _resolve_timezone(user_timezone)
+    key = PdfCache.key(email.id, tz_name, content_hash(email, attachment_names))
+    cached = pdf_cache.get(key)
+    if cached is not None:
+        return cached, "application/pdf", "pdf"
+
+    html = build_email_html(email, attachment_names, tz_name)
+    try:
+        started = time.perf_counter()
+        pdf = pdf_renderer.render(html)
+    except PdfRendererUnavailable:
+        logger.info("weasyprint 不可用，返回 HTML 格式")
+        return html.encode("utf-8"), "text/html", "html"
+    logger.info(f"PDF 渲染完成: email_id={email.id}, {(time.perf_counter() - started) * 1000:.0f}ms")
+    pdf_cache.put(key, pdf)
+    return pdf, "application/pdf", "pdf"
+
+
+
+def iter_email_pdfs(items: Sequence[Tuple[object, Sequence[str]]],
+                    user_timezone: str) -> Iterator[Tuple[object, bytes, str, str]]:
+    """
+    批量导出 PDF，items 为 (邮件, 附件名列表)，按输入顺序产出 (邮件, 内容, media_type, 扩展名)
+    未命中缓存的邮件依次提交到进程池并发渲染，提交时等待队列空位；
+    队首已完成的结果随即产出，不等整批渲染结束。出错或调用方停止迭代时取消尚未开始的渲染
+    """
+    _, tz_name = _resolve_timezone(user_timezone)
+    # (邮件, 缓存键, html, 缓存内容, (进程池, Future))
+    pending = deque()
+
+    def ready(entry) -> bool:
+        submission = entry[4]
+        return submission is None or submission[1].done()
+
+    def take() -> Tuple[object, bytes, str, str]:
+        email, key, html, cached, submission = pending.popleft()
+        if cached is not None:
+            return email, cached, "application/pdf", "pdf"
+        if submission is not None:
+            try:
+                pdf = pdf_renderer.wait(*submission)
+            except PdfRendererUnavailable:
+                pass
+            else:
+                pdf_cache.put(key, pdf)
+                return email, pdf, "application/pdf", "pdf"
+        logger.info("weasyprint 不可用，返回 HTML 格式")
+        return email, html.encode("utf-8"), "text/html", "html"
+
+    try:
+        for email, attachment_names in items:
+            key = PdfCache.key(email.id, tz_name, content_hash(email, attachment_names))
+            cached = pdf_cache.get(key)
+            html, submission = None, None
+            if cached is None:
+                html = build_email_html(email, attachment_names, tz_name)
+                try:
+                    submission = pdf_renderer.submit(html, wait_for_slot=True)
+                except PdfRendererUnavailable:
+                    pass
+            pending.append((email, key, html, cached, submission))
+            while pending and ready(pending[0]):
+                yield take()
+        while pending:
+            yield take()
+    finally:
+        for entry in pending:
+            if entry[4] is not None:
+                entry[4][1].cancel()
+
+pdf_cache = PdfCache(settings.PDF_EXPORT_CACHE_DIR, settings.PDF_EXPORT_CACHE_MAX_BYTES)
+pdf_renderer = PdfRenderer(
+    workers=settings.PDF_EXPORT_WORKERS,
+    max_pending=settings.PDF_EXPORT_MAX_PENDING,
+    timeout_seconds=settings.PDF_EXPORT_TIMEOUT_SECONDS,
+)
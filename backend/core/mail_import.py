@@ -0,0 +1,488 @@
+"""
+邮箱批量导入（mbox / EML zip / 单个 EML）
+
+上传文件先落盘并创建任务，worker 的 mail_import 定时任务逐个处理：
+- 流式解析：mbox 逐行切分、zip 逐个条目读取，内存中只保留当前一批邮件
+- 去重：任务内用 Message-ID 的哈希集合去重（没有 Message-ID 的按原文哈希），
+  每批再用一次查询排除该用户已有的 Message-ID，重复上传同一文件不会重复入库
+- 入库：每批一个事务，邮件 ID 预先从序列取号，emails / attachments 都用多行 INSERT
+- 全文检索：search_vector 在多行 INSERT 中直接生成，逐行触发器见到已提供的向量即跳过
+- 进度随每批提交写入任务行；worker 中断后从 processed_count 处继续
+- 单封邮件超过 MAIL_IMPORT_MAX_MESSAGE_BYTES 计为失败；一批入库出错时逐封重试，坏邮件计为失败
+- 反复中断（进程崩溃）的任务达到 MAIL_IMPORT_MAX_ATTEMPTS 次后标记失败，不阻塞其他任务
+- 每批提交前确认仍持有 mail_import 租约，租约被接管后立即停止，由接管者续跑
+"""
+import email
+import hashlib
+import logging
+import os
+import uuid
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import BinaryIO, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import Text, func, insert, literal, literal_column, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.job_coordinator import LeaseLost, ensure_job_lease
+from core.lmtp_server import UPLOAD_DIR, decode_mime_header, get_email_body_and_attachments
+from db.database import SessionLocal
+from db.models.email import Attachment, Email, Folder
+from db.models.system import MailImportJob
+from db.models.user import User
+
+logger = logging.getLogger(__name__)
+
+FORMAT_MBOX = "mbox"
+FORMAT_ZIP = "zip"
+FORMAT_EML = "eml"
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+# 单批原文总大小上限：附件多的归档按大小提前入库，避免一批占用过多内存
+BATCH_MAX_BYTES = 64 * 1024 * 1024
+
+_EXTENSION_FORMATS = {
+    ".mbox": FORMAT_MBOX,
+    ".mbx": FORMAT_MBOX,
+    ".zip": FORMAT_ZIP,
+    ".eml": FORMAT_EML,
+}
+
+
+@dataclass
+class ParsedMessage:
+    dedupe_key: bytes
+    message_id: Optional[str]
+    in_reply_to: Optional[str]
+    references: Optional[str]
+    subject: str
+    sender: str
+    recipients: str
+    body_html: str
+    body_text: str
+    received_at: datetime
+    attachments: List[dict]
+    # 历史邮件默认按已读导入
+    is_read: bool = True
+
+
+@dataclass
+class _Progress:
+    """本批的进度增量，与入库在同一事务中提交"""
+    processed: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    bytes_processed: int = 0
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return _EXTENSION_FORMATS.get(ext)
+
+
+def iter_mbox_messages(fp: BinaryIO) -> Iterator[Tuple[Optional[bytes], int]]:
+    """
+    逐封切分 mbox，返回 (邮件原文, 该封在文件中占用的字节数)
+    按 mboxrd 处理：未转义的 "From " 行是分隔行，正文中的 ">From " 去掉一层 >
+    超过单封上限的邮件不再缓存，原文返回 None
+    """
+    max_bytes = settings.MAIL_IMPORT_MAX_MESSAGE_BYTES
+    lines: List[bytes] = []
+    size = 0
+    started = False
+    oversized = False
+    for line in fp:
+        if line.startswith(b"From "):
+            if started:
+                yield None if oversized else _finish_mbox_message(lines), size
+            lines, size, started, oversized = [], len(line), True, False
+            continue
+        size += len(line)
+        if not started or oversized:
+            continue
+        if size > max_bytes:
+            lines, oversized = [], True
+            continue
+        if line.startswith(b">") and line.lstrip(b">").startswith(b"From "):
+            line = line[1:]
+        lines.append(line)
+    if started:
+        yield None if oversized else _finish_mbox_message(lines), size
+
+
+def _finish_mbox_message(lines: List[bytes]) -> bytes:
+    # 分隔行前的空行属于 mbox 格式，不属于邮件
+    if lines and lines[-1] in (b"\n", b"\r\n"):
+        lines = lines[:-1]
+    return b"".join(lines)
+
+
+def iter_zip_messages(path: str) -> Iterator[Tuple[Optional[bytes], int]]:
+    """
+    逐个读取 zip 中的 .eml 条目，返回 (邮件原文, 压缩后大小)
+    条目声明或实际解压后超过单封上限时原文返回 None，读取量不超过上限
+    """
+    max_bytes = settings.MAIL_IMPORT_MAX_MESSAGE_BYTES
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(".eml"):
+                continue
+            if info.file_size > max_bytes:
+                yield None, info.compress_size
+                continue
+            with archive.open(info) as fp:
+                raw = fp.read(max_bytes + 1)
+            yield (None if len(raw) > max_bytes else raw), info.compress_size
+
+
+def iter_archive_messages(path: str, file_format: str) -> Iterator[Tuple[Optional[bytes], int]]:
+    if file_format == FORMAT_ZIP:
+        yield from iter_zip_messages(path)
+    elif file_format == FORMAT_MBOX:
+        with open(path, "rb") as fp:
+            yield from iter_mbox_messages(fp)
+    else:
+        size = os.path.getsize(path)
+        if size > settings.MAIL_IMPORT_MAX_MESSAGE_BYTES:
+            yield None, size
+            return
+        with open(path, "rb") as fp:
+            raw = fp.read()
+        yield raw, len(raw)
+
+
+def _clean_message_id(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip().strip("<>").strip()
+    return value or None
+
+
+def _strip_nul(value: Optional[str]) -> Optional[str]:
+    """PostgreSQL 文本不能包含 NUL，psycopg2 遇到会直接报错"""
+    return value.replace("\x00", "") if value else value
+
+
+def parse_message(raw: bytes) -> ParsedMessage:
+    msg = email.message_from_bytes(raw)
+    message_id = _clean_message_id(msg.get("Message-ID"))
+
+    received_at = None
+    date_str = msg.get("Date")
+    if date_str:
+        try:
+            received_at = parsedate_to_datetime(date_str)
+        except Exception:
+            received_at = None
+    if received_at is None:
+        received_at = datetime.now(timezone.utc)
+    elif received_at.tzinfo is None:
+        received_at = received_at.replace(tzinfo=timezone.utc)
+
+    body_html, body_text, attachments = get_email_body_and_attachments(msg)
+    # 没有 Message-ID 时按原文去重，同一封邮件重复出现在归档中只导入一次
+    key_source = message_id.encode("utf-8", "replace") if message_id else raw
+    return ParsedMessage(
+        dedupe_key=hashlib.blake2b(key_source, digest_size=16).digest(),
+        message_id=_strip_nul(message_id),
+        in_reply_to=_strip_nul(_clean_message_id(msg.get("In-Reply-To"))),
+        references=_strip_nul(msg.get("References")),
+        subject=_strip_nul(decode_mime_header(msg.get("Subject"))),
+        sender=_strip_nul(decode_mime_header(msg.get("From"))),
+        recipients=_strip_nul(decode_mime_header(msg.get("To", ""))),
+        body_html=_strip_nul(body_html),
+        body_text=_strip_nul(body_text),
+        received_at=received_at,
+        attachments=[{**att, "filename": _strip_nul(att["filename"])} for att in attachments],
+    )
+
+
+def _search_vector(subject: str, sender: str, body_text: str):
+    """与 emails_search_vector_update 触发器相同的向量表达式"""
+    def weighted(value: str, weight: str):
+        return func.setweight(
+            func.to_tsvector(literal_column("'simple'"), func.coalesce(literal(value, Text), "")),
+            literal_column(f"'{weight}'"),
+        )
+    return weighted(subject, "A").op("||")(weighted(sender, "B")).op("||")(weighted(body_text, "C"))
+
+
+def _existing_message_ids(db: Session, user_id: int, message_ids: List[str],
+                          folder_id: Optional[int] = None) -> Set[str]:
+    if not message_ids:
+        return set()
+    stmt = (
+        select(Email.message_id)
+        .join(Folder, Email.folder_id == Folder.id)
+        .where(Folder.user_id == user_id, Email.message_id.in_(message_ids))
+    )
+    if folder_id is not None:
+        stmt = stmt.where(Email.folder_id == folder_id)
+    return set(db.execute(stmt).scalars())
+
+
+def _allocate_email_ids(db: Session, count: int) -> List[int]:
+    return list(db.execute(
+        text("SELECT nextval(pg_get_serial_sequence('emails', 'id')) FROM generate_series(1, :n)"),
+        {"n": count},
+    ).scalars())
+
+
+def _save_attachment_file(att: dict) -> str:
+    ext = os.path.splitext(att["filename"])[1] if att["filename"] else ""
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}{ext}")
+    with open(file_path, "wb") as f:
+        f.write(att["data"])
+    return file_path
+
+
+def remove_files(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def insert_parsed_messages(db: Session, user_id: int, folder_id: int, mailbox_address: Optional[str],
+                           batch: List[ParsedMessage], dedupe_in_folder: bool = False) -> Tuple[int, int, List[str]]:
+    """
+    多行 INSERT 一批已解析的邮件（不提交），返回 (入库数, 已存在跳过数, 写入的附件文件)
+    已存在按该用户全部邮件的 Message-ID 判断，dedupe_in_folder=True 时只看目标文件夹；
+    事务失败时调用方用 remove_files 删除附件文件
+    """
+    existing = _existing_message_ids(
+        db, user_id, [m.message_id for m in batch if m.message_id],
+        folder_id=folder_id if dedupe_in_folder else None,
+    )
+    messages = [m for m in batch if m.message_id not in existing]
+    duplicates = len(batch) - len(messages)
+    if not messages:
+        return 0, duplicates, []
+
+    email_ids = _allocate_email_ids(db, len(messages))
+    db.execute(insert(Email).values([
+        {
+            "id": email_id,
+            "folder_id": folder_id,
+            "mailbox_address": mailbox_address,
+            "message_id": m.message_id,
+            "in_reply_to": m.in_reply_to,
+            "references": m.references,
+            "subject": m.subject,
+            "sender": m.sender,
+            "recipients": m.recipients,
+            "body_html": m.body_html,
+            "body_text": m.body_text,
+            "received_at": m.received_at,
+            "is_read": m.is_read,
+            "is_starred": False,
+            "is_draft": False,
+            "search_vector": _search_vector(m.subject, m.sender, m.body_text),
+        }
+        for email_id, m in zip(email_ids, messages)
+    ]))
+
+    written: List[str] = []
+    attachment_rows = []
+    try:
+        for email_id, m in zip(email_ids, messages):
+            for att in m.attachments:
+                file_path = _save_attachment_file(att)
+                written.append(file_path)
+                attachment_rows.append({
+                    "email_id": email_id,
+                    "user_id": user_id,
+                    "filename": att["filename"],
+                    "content_type": att["content_type"],
+                    "size": len(att["data"]),
+                    "file_path": file_path,
+                })
+        if attachment_rows:
+            db.execute(insert(Attachment), attachment_rows)
+    except Exception:
+        remove_files(written)
+        raise
+    return len(messages), duplicates, written
+
+
+def _commit_batch(db: Session, job: MailImportJob, mailbox_address: str,
+                  batch: List[ParsedMessage], progress: _Progress) -> None:
+    """
+    一批入库并提交进度；多行 INSERT 出错时回滚后逐封重试，入库失败的邮件计入 failed_count
+    写附件文件等非数据库错误仍直接抛出，整个任务失败
+    """
+    try:
+        _insert_and_commit(db, job, mailbox_address, batch, progress)
+        return
+    except (SQLAlchemyError, ValueError) as e:
+        if not batch:
+            raise
+        logger.warning(f"批量入库失败，逐封重试: job={job.id}, size={len(batch)}, error={e}")
+
+    for message in batch:
+        try:
+            _insert_and_commit(db, job, mailbox_address, [message], _Progress())
+        except (SQLAlchemyError, ValueError) as e:
+            logger.warning(f"导入邮件入库失败: job={job.id}, message_id={message.message_id}, error={e}")
+            progress.failed += 1
+    _insert_and_commit(db, job, mailbox_address, [], progress)
+
+
+def _insert_and_commit(db: Session, job: MailImportJob, mailbox_address: str,
+                       batch: List[ParsedMessage], progress: _Progress) -> None:
+    written: List[str] = []
+    try:
+        if batch:
+            imported, duplicates, written = insert_parsed_messages(
+                db, job.user_id, job.folder_id, mailbox_address, batch
+            )
+            progress.imported += imported
+            progress.duplicates += duplicates
+        job.processed_count += progress.processed
+        job.imported_count += progress.imported
+        job.duplicate_count += progress.duplicates
+        job.failed_count += progress.failed
+        job.bytes_processed += progress.bytes_processed
+        ensure_job_lease(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        remove_files(written)
+        raise
+
+
+def create_import_job(db: Session, user_id: int, folder_id: int, file_format: str,
+                      filename: Optional[str], file_path: str, file_size: int) -> MailImportJob:
+    job = MailImportJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        folder_id=folder_id,
+        format=file_format,
+        filename=(filename or "")[:255] or None,
+        file_path=file_path,
+        file_size=file_size,
+        status=STATUS_PENDING,
+        processed_count=0,
+        imported_count=0,
+        duplicate_count=0,
+        failed_count=0,
+        bytes_processed=0,
+        attempts=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def run_import_job(db: Session, job: MailImportJob) -> None:
+    """处理一个导入任务；中断后再次调用从 processed_count 处继续"""
+    user = db.get(User, job.user_id)
+    mailbox_address = user.email if user else None
+    resume_from = job.processed_count
+    job.status = STATUS_RUNNING
+    if job.started_at is None:
+        job.started_at = datetime.now(timezone.utc)
+    db.commit()
+    logger.info(f"开始导入邮件: job={job.id}, format={job.format}, resume_from={resume_from}")
+
+    seen: Set[bytes] = set()
+    batch: List[ParsedMessage] = []
+    batch_bytes = 0
+    progress = _Progress()
+    for index, (raw, size) in enumerate(iter_archive_messages(job.file_path, job.format)):
+        if index < resume_from:
+            continue
+        progress.processed += 1
+        progress.bytes_processed += size
+        if raw is None:
+            logger.warning(f"导入邮件超过大小上限，跳过: job={job.id}, index={index}")
+            progress.failed += 1
+            continue
+        try:
+            parsed = parse_message(raw)
+        except Exception as e:
+            logger.warning(f"导入邮件解析失败: job={job.id}, index={index}, error={e}")
+            progress.failed += 1
+            continue
+        if parsed.dedupe_key in seen:
+            progress.duplicates += 1
+            continue
+        seen.add(parsed.dedupe_key)
+        batch.append(parsed)
+        batch_bytes += len(raw)
+        if len(batch) >= settings.MAIL_IMPORT_BATCH_SIZE or batch_bytes >= BATCH_MAX_BYTES:
+            _commit_batch(db, job, mailbox_address, batch, progress)
+            batch, batch_bytes, progress = [], 0, _Progress()
+
+    _commit_batch(db, job, mailbox_address, batch, progress)
+    job.status = STATUS_COMPLETED
+    job.completed_at = datetime.now(timezone.utc)
+    db.commit()
+    logger.info(
+        f"邮件导入完成: job={job.id}, imported={job.imported_count}, "
+        f"duplicates={job.duplicate_count}, failed={job.failed_count}"
+    )
+
+
+def _remove_upload(job: MailImportJob) -> None:
+    try:
+        os.remove(job.file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除导入文件失败: {e}")
+
+
+def run_pending_imports_once() -> None:
+    """
+    处理最早的一个未完成任务（worker 的 mail_import 定时任务）
+    任务由选主后的单个 worker 顺序执行，running 状态的任务只可能是上一个 worker 中断留下的，直接续跑；
+    每次开始前先提交 attempts，导致进程崩溃的任务续跑达到上限后标记失败
+    """
+    db = SessionLocal()
+    try:
+        job = (
+            db.query(MailImportJob)
+            .filter(MailImportJob.status.in_([STATUS_PENDING, STATUS_RUNNING]))
+            .order_by(MailImportJob.created_at)
+            .first()
+        )
+        if job is None:
+            return
+        if job.attempts >= settings.MAIL_IMPORT_MAX_ATTEMPTS:
+            logger.error(f"邮件导入多次中断，放弃: job={job.id}, attempts={job.attempts}")
+            job.status = STATUS_FAILED
+            job.error = f"处理中断 {job.attempts} 次，已放弃"
+            job.completed_at = datetime.now(timezone.utc)
+            db.commit()
+            _remove_upload(job)
+            return
+        job.attempts += 1
+        ensure_job_lease(db)
+        db.commit()
+        try:
+            run_import_job(db, job)
+        except LeaseLost:
+            # 接管者从已提交的进度续跑，任务状态和上传文件都留给它
+            db.rollback()
+            raise
+        except Exception as e:
+            db.rollback()
+            logger.error(f"邮件导入失败: job={job.id}, error={e}", exc_info=True)
+            job.status = STATUS_FAILED
+            job.error = str(e)[:1000]
+            job.completed_at = datetime.now(timezone.utc)
+            db.commit()
+        _remove_upload(job)
+    finally:
+        db.close()
@@ -0,0 +1,296 @@
+"""
+邮件服务器账户异步开通
+
+请求路径只负责把创建 / 删除任务放入队列，后台线程按批次合并后执行：
+- 同一邮箱的多个待处理任务只保留最后一个（先建后删 = 删）
+- 创建与删除分别走 mailserver_sync 的批量接口，每批一次 exec
+- 失败任务按指数退避重试，操作本身幂等（已存在 / 不存在视为成功）
+- 每个邮箱记录最新任务序号，被更新任务取代的重试直接丢弃（避免旧的创建 / 删除覆盖新操作）
+- 序号只在本进程内有效：执行删除前在数据库中锁定并复查临时邮箱，已被其他进程恢复 / 续期为
+  active 的不删除；锁持有到删除完成，恢复请求的提交与随后的创建都排在删除之后
+- 停止时尽量执行完待处理的删除；进程崩溃遗留的账户由临时邮箱维护任务对账清理
+- 启动时的全量同步也在后台线程执行，不阻塞 lifespan
+"""
+import heapq
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from core.mailserver_sync import (
+    MAIL_USER_BATCH_SIZE,
+    create_mail_users_batch,
+    delete_mail_users_batch,
+    sync_users_to_mailserver,
+)
+from db.database import SessionLocal
+from db.models.email import TempMailbox
+
+logger = logging.getLogger(__name__)
+
+OP_CREATE = "create"
+OP_DELETE = "delete"
+OP_FULL_SYNC = "full_sync"
+
+# 攒批等待时间（秒）：收到第一个任务后再等待一小段时间合并后续任务
+BATCH_LINGER_SECONDS = 0.2
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 120.0
+
+
+@dataclass
+class ProvisionJob:
+    op: str
+    email: str = ""
+    password: Optional[str] = field(default=None, repr=False)
+    attempts: int = 0
+    # 提交序号，同一邮箱序号更大的任务取代之前的任务
+    seq: int = 0
+
+
+class MailProvisioner:
+    """邮件服务器开通队列（单后台线程消费）"""
+
+    def __init__(self, batch_size: int = MAIL_USER_BATCH_SIZE, linger_seconds: float = BATCH_LINGER_SECONDS):
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self._queue: "queue.Queue[ProvisionJob]" = queue.Queue()
+        # 等待重试的任务：(可执行时间, 序号, 任务)
+        self._retry_heap: List[Tuple[float, int, ProvisionJob]] = []
+        self._retry_seq = 0
+        # 邮箱 -> 最新提交任务的序号（生产者在请求线程中提交，需加锁）
+        self._lock = threading.Lock()
+        self._submit_seq = 0
+        self._latest_seq: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats = {
+            "created": 0, "deleted": 0, "retried": 0, "dropped": 0,
+            "superseded": 0, "kept_active": 0, "batches": 0,
+        }
+        self._last_sync_result: Optional[dict] = None
+
+    # ============ 生产者 ============
+
+    def _submit(self, job: ProvisionJob) -> None:
+        with self._lock:
+            self._submit_seq += 1
+            job.seq = self._submit_seq
+            self._latest_seq[job.email] = job.seq
+        self._queue.put(job)
+
+    def submit_create(self, email: str, password: Optional[str] = None) -> None:
+        self._submit(ProvisionJob(OP_CREATE, email, password))
+
+    def submit_create_many(self, accounts: List[Tuple[str, Optional[str]]]) -> None:
+        for email, password in accounts:
+            self._submit(ProvisionJob(OP_CREATE, email, password))
+
+    def submit_delete(self, email: str) -> None:
+        self._submit(ProvisionJob(OP_DELETE, email))
+
+    def submit_delete_many(self, emails: List[str]) -> None:
+        for email in emails:
+            self._submit(ProvisionJob(OP_DELETE, email))
+
+    def submit_full_sync(self) -> None:
+        """把数据库中所有用户同步到邮件服务器（后台执行）"""
+        self._queue.put(ProvisionJob(OP_FULL_SYNC))
+
+    # ============ 生命周期 ============
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mail-provisioner", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        停止后台线程并执行完待处理的删除
+        数据库中的过期 / 清理已提交，删除丢失会遗留账户；未处理的创建由下次启动的全量同步补齐
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                # 仍在执行批次，不与其并发处理；遗留的删除由维护任务对账
+                logger.warning("邮件服务器开通线程未能及时停止，跳过待删除任务")
+                return
+            self._thread = None
+        self._drain_deletes()
+
+    def _drain_deletes(self) -> None:
+        jobs = [entry[2] for entry in self._retry_heap]
+        self._retry_heap.clear()
+        while True:
+            try:
+                jobs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        deletes = [job for job in jobs if job.op == OP_DELETE]
+        if not deletes:
+            return
+        logger.info(f"停止前执行 {len(deletes)} 个待删除的邮件服务器账户")
+        try:
+            self.process(deletes)
+        except Exception as e:
+            logger.error(f"停止前删除邮件服务器账户失败: {e}")
+        self._retry_heap.clear()
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "pending": self._queue.qsize(),
+            "retrying": len(self._retry_heap),
+            "running": self._thread is not None and self._thread.is_alive(),
+            "last_full_sync": self._last_sync_result,
+        }
+
+    # ============ 消费者 ============
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                jobs = self._collect_batch()
+                if jobs:
+                    self.process(jobs)
+            except Exception as e:
+                logger.error(f"邮件服务器开通任务处理异常: {e}")
+                self._stop.wait(1)
+
+    def _next_timeout(self) -> float:
+        if not self._retry_heap:
+            return 1.0
+        return max(0.0, min(1.0, self._retry_heap[0][0] - time.monotonic()))
+
+    def _collect_batch(self) -> List[ProvisionJob]:
+        jobs: List[ProvisionJob] = []
+        now = time.monotonic()
+        while self._retry_heap and self._retry_heap[0][0] <= now and len(jobs) < self.batch_size:
+            jobs.append(heapq.heappop(self._retry_heap)[2])
+
+        if not jobs:
+            try:
+                jobs.append(self._queue.get(timeout=self._next_timeout()))
+            except queue.Empty:
+                return jobs
+
+        deadline = time.monotonic() + self.linger_seconds
+        while len(jobs) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return jobs
+
+    def process(self, jobs: List[ProvisionJob]) -> None:
+        """合并并执行一批任务（后台线程调用，测试中也可直接调用）"""
+        if any(job.op == OP_FULL_SYNC for job in jobs):
+            self._last_sync_result = sync_users_to_mailserver()
+
+        # 同一邮箱只保留最新的任务；已被队列中更新任务取代的直接丢弃
+        latest: Dict[str, ProvisionJob] = {}
+        for job in jobs:
+            if job.op == OP_FULL_SYNC:
+                continue
+            if not self._is_current(job):
+                self._stats["superseded"] += 1
+                continue
+            previous = latest.get(job.email)
+            if previous is None or job.seq >= previous.seq:
+                latest[job.email] = job
+
+        creates = [job for job in latest.values() if job.op == OP_CREATE]
+        deletes = [job for job in latest.values() if job.op == OP_DELETE]
+        if not creates and not deletes:
+            return
+
+        self._stats["batches"] += 1
+        if creates:
+            results = create_mail_users_batch([(job.email, job.password) for job in creates])
+            self._handle_results(creates, results, "created")
+        if deletes:
+            self._delete(deletes)
+
+    def _delete(self, deletes: List[ProvisionJob]) -> None:
+        """
+        删除前对这些临时邮箱行加共享锁并复查状态，仍为 active 的跳过（其他进程已恢复 / 续期）
+        锁在删除完成后释放：并发的恢复要等删除结束才能提交，它随后提交的创建不会被这次删除覆盖
+        """
+        db = SessionLocal()
+        try:
+            try:
+                active = self._lock_active_mailboxes(db, [job.email for job in deletes])
+            except Exception as e:
+                logger.warning(f"复查临时邮箱状态失败，稍后重试删除: {e}")
+                self._handle_results(deletes, {}, "deleted")
+                return
+            kept = [job for job in deletes if job.email in active]
+            for job in kept:
+                self._stats["kept_active"] += 1
+                self._finish(job)
+            if kept:
+                logger.info(f"{len(kept)} 个待删除邮箱已恢复为活跃状态，保留邮件服务器账户")
+            deletes = [job for job in deletes if job.email not in active]
+            if deletes:
+                results = delete_mail_users_batch([job.email for job in deletes])
+                self._handle_results(deletes, results, "deleted")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _lock_active_mailboxes(db, emails: List[str]) -> Set[str]:
+        # 延迟导入避免循环依赖（生命周期模块提交删除任务）
+        from core.temp_mailbox_lifecycle import STATUS_ACTIVE
+
+        rows = db.execute(
+            select(TempMailbox.email, TempMailbox.status)
+            .where(TempMailbox.email.in_(emails))
+            .with_for_update(read=True)
+        ).all()
+        return {email for email, status in rows if status == STATUS_ACTIVE}
+
+    def _is_current(self, job: ProvisionJob) -> bool:
+        """该邮箱之后没有提交过新任务"""
+        with self._lock:
+            return self._latest_seq.get(job.email, job.seq) <= job.seq
+
+    def _finish(self, job: ProvisionJob) -> None:
+        with self._lock:
+            if self._latest_seq.get(job.email) == job.seq:
+                del self._latest_seq[job.email]
+
+    def _handle_results(self, jobs: List[ProvisionJob], results: Dict[str, bool], counter: str) -> None:
+        for job in jobs:
+            if results.get(job.email):
+                self._stats[counter] += 1
+                self._finish(job)
+                continue
+            if not self._is_current(job):
+                # 执行期间提交了新任务，失败的旧任务不再重试
+                self._stats["superseded"] += 1
+                continue
+            job.attempts += 1
+            if job.attempts >= MAX_ATTEMPTS:
+                self._stats["dropped"] += 1
+                logger.error(f"邮件服务器{job.op}任务重试 {job.attempts} 次仍失败，放弃: {job.email}")
+                self._finish(job)
+                continue
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** (job.attempts - 1)))
+            self._retry_seq += 1
+            heapq.heappush(self._retry_heap, (time.monotonic() + delay, self._retry_seq, job))
+            self._stats["retried"] += 1
+
+
+# 全局实例
+mail_provisioner = MailProvisioner()
@@ -7,7 +7,6 @@
 import imaplib
 import email
 import hashlib
-import asyncio
 import logging
 from email.header import decode_header
 from email.utils import parsedate_to_datetime
@@ -18,6 +17,9 @@ from db.database import SessionLocal
 from db.models.user import User
 from db.models.email import Email, Folder, TempMailbox
 from core.config import settings
+from core.verification_codes import apply_verification_code
+from core.mailbox_waiters import publish_new_code
+from core.pool_stats import invalidate_user_stats
 
 logger = logging.getLogger(__name__)
 
@@ -108,6 +110,7 @@ def _sync_imap_inbox(
         同步的邮件数量
     """
     synced = 0
+    has_code = False
     imap = None
     try:
         imap = _connect_imap()
@@ -160,6 +163,8 @@ def _sync_imap_inbox(
                 is_starred=False,
                 is_draft=False,
             )
+            if apply_verification_code(new_email):
+                has_code = True
             db.add(new_email)
             existing_ids.add(msg_id)
             synced += 1
@@ -167,6 +172,8 @@ def _sync_imap_inbox(
         if synced > 0:
             db.commit()
             logger.info(f"同步 {mailbox_address}: {synced} 封新邮件")
+            if has_code:
+                publish_new_code(mailbox_address)
 
     except imaplib.IMAP4.error as e:
         err_msg = str(e)
@@ -222,7 +229,10 @@ def sync_temp_mailbox(db: Session, temp_mailbox: TempMailbox) -> int:
         logger.warning(f"所有者 {owner.email} 没有收件箱")
         return 0
 
-    return _sync_imap_inbox(db, temp_mailbox.email, inbox.id, temp_mailbox.email)
+    synced = _sync_imap_inbox(db, temp_mailbox.email, inbox.id, temp_mailbox.email)
+    if synced:
+        invalidate_user_stats(owner.id)
+    return synced
 
 
 def sync_all_mailboxes() -> dict:
@@ -251,13 +261,8 @@ def sync_all_mailboxes() -> dict:
     return results
 
 
-async def periodic_sync(interval: int = 30):
-    """定期同步任务（默认30秒）"""
-    while True:
-        await asyncio.sleep(interval)
-        try:
-            results = sync_all_mailboxes()
-            if results["total"] > 0:
-                logger.info(f"邮件同步完成，共 {results['total']} 封新邮件")
-        except Exception as e:
-            logger.error(f"定期同步失败: {e}")
+def run_periodic_sync() -> None:
+    """定时同步任务的单次执行，由后台任务协调器在持有租约的 worker 上调度（默认30秒）"""
+    results = sync_all_mailboxes()
+    if results["total"] > 0:
+        logger.info(f"邮件同步完成，共 {results['total']} 封新邮件")
@@ -0,0 +1,211 @@
+"""
+邮箱批量导出（mbox / zip）
+
+按文件夹或接收时间范围导出整个邮箱，适合数万封邮件的迁出：
+- 服务端游标（yield_per）按邮件 ID 顺序分批读取，每批一次查询附件
+- 附件从磁盘分块读取编码，输出边生成边压缩（mbox 为 gzip，zip 逐个条目 deflate）
+- 进度记录在 mail_export_jobs 上，下载中断后用同一任务 ID 再次下载，从已确认位置继续，
+  得到的是后续的分卷文件
+
+进度确认滞后一批：某批写出后，上一批才记为已导出。连接断开时最后一两批可能在续传的
+分卷里重复出现（mbox 可按 Message-ID 去重，zip 条目以邮件 ID 命名，解压时覆盖），但不会遗漏。
+"""
+import logging
+import uuid
+import zlib
+import zipfile
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session, defer
+
+from core.config import settings
+from core.mail_export import iter_eml, iter_mbox_message, safe_filename
+from db.database import ReadSessionLocal, SessionLocal
+from db.models.email import Attachment, Email, Folder
+from db.models.system import MailExportJob
+
+logger = logging.getLogger(__name__)
+
+FORMAT_MBOX = "mbox"
+FORMAT_ZIP = "zip"
+EXPORT_FORMATS = (FORMAT_MBOX, FORMAT_ZIP)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+
+MEDIA_TYPES = {FORMAT_MBOX: "application/gzip", FORMAT_ZIP: "application/zip"}
+EXTENSIONS = {FORMAT_MBOX: "mbox.gz", FORMAT_ZIP: "zip"}
+
+
+def _filters(user_id: int, folder_id: Optional[int], since: Optional[datetime], until: Optional[datetime]) -> list:
+    conditions = [Folder.user_id == user_id, Email.is_purged == False]  # noqa: E712
+    if folder_id is not None:
+        conditions.append(Email.folder_id == folder_id)
+    if since is not None:
+        conditions.append(Email.received_at >= since)
+    if until is not None:
+        conditions.append(Email.received_at < until)
+    return conditions
+
+
+def create_export_job(db: Session, user_id: int, export_format: str, folder_id: Optional[int] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None) -> MailExportJob:
+    total = db.execute(
+        select(func.count(Email.id)).join(Folder, Email.folder_id == Folder.id)
+        .where(*_filters(user_id, folder_id, since, until))
+    ).scalar_one()
+    job = MailExportJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        folder_id=folder_id,
+        since=since,
+        until=until,
+        format=export_format,
+        status=STATUS_PENDING,
+        total_count=total,
+        exported_count=0,
+        last_email_id=0,
+        parts=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def export_filename(job: MailExportJob) -> str:
+    """首次下载为完整文件名，续传的分卷带序号"""
+    part = f"_part{job.parts}" if job.parts > 1 else ""
+    return f"mailbox_{job.id[:8]}{part}.{EXTENSIONS[job.format]}"
+
+
+def start_part(db: Session, job: MailExportJob) -> None:
+    """开始一次下载（分卷），之后由 stream_export 输出"""
+    job.parts += 1
+    job.status = STATUS_RUNNING
+    db.commit()
+
+
+class _ChunkSink:
+    """zipfile 的输出目标：不可 seek，写入的数据由生成器取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class MboxWriter:
+    """gzip 压缩的 mboxrd"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def add(self, email, attachments: Sequence) -> Iterator[bytes]:
+        for chunk in iter_mbox_message(email, attachments):
+            data = self._compressor.compress(chunk)
+            if data:
+                yield data
+
+    def close(self) -> Iterator[bytes]:
+        yield self._compressor.flush()
+
+
+class ZipWriter:
+    """每封邮件一个 EML 条目的 zip"""
+
+    def __init__(self):
+        self._sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, email, attachments: Sequence) -> Iterator[bytes]:
+        name = f"{email.id}_{safe_filename(email.subject, 'eml')}"
+        with self._zip.open(name, "w") as entry:
+            for chunk in iter_eml(email, attachments):
+                entry.write(chunk)
+                data = self._sink.drain()
+                if data:
+                    yield data
+        data = self._sink.drain()
+        if data:
+            yield data
+
+    def close(self) -> Iterator[bytes]:
+        self._zip.close()
+        yield self._sink.drain()
+
+
+def _create_writer(export_format: str):
+    return MboxWriter() if export_format == FORMAT_MBOX else ZipWriter()
+
+
+def _load_attachments(db: Session, email_ids: List[int]) -> Dict[int, list]:
+    by_email: Dict[int, list] = {}
+    rows = db.execute(
+        select(Attachment).where(Attachment.email_id.in_(email_ids)).order_by(Attachment.id)
+    ).scalars()
+    for att in rows:
+        by_email.setdefault(att.email_id, []).append(att)
+    return by_email
+
+
+def _checkpoint(db: Session, job_id: str, last_email_id: int, count: int, completed: bool = False) -> None:
+    values = {
+        "last_email_id": last_email_id,
+        "exported_count": MailExportJob.exported_count + count,
+    }
+    if completed:
+        values["status"] = STATUS_COMPLETED
+        values["completed_at"] = datetime.now(timezone.utc)
+    db.execute(update(MailExportJob).where(MailExportJob.id == job_id).values(**values))
+    db.commit()
+
+
+def stream_export(job_id: str, user_id: int, export_format: str, folder_id: Optional[int],
+                  since: Optional[datetime], until: Optional[datetime], after_email_id: int) -> Iterator[bytes]:
+    """
+    从 after_email_id 之后开始输出导出文件
+    调用方先 start_part；参数取自任务行，生成器内自行打开会话（响应期间请求的会话可能已关闭）
+    """
+    writer = _create_writer(export_format)
+    read_db = ReadSessionLocal()
+    db = SessionLocal()
+    try:
+        stmt = (
+            select(Email)
+            .join(Folder, Email.folder_id == Folder.id)
+            .where(Email.id > after_email_id, *_filters(user_id, folder_id, since, until))
+            .order_by(Email.id)
+            # 全文检索向量不参与导出
+            .options(defer(Email.search_vector))
+            .execution_options(yield_per=settings.MAILBOX_EXPORT_BATCH_SIZE)
+        )
+        pending = None
+        for batch in read_db.execute(stmt).scalars().partitions():
+            attachments = _load_attachments(read_db, [e.id for e in batch])
+            for email in batch:
+                yield from writer.add(email, attachments.get(email.id, []))
+            # 本批已交给响应，上一批确认导出
+            if pending is not None:
+                _checkpoint(db, job_id, *pending)
+            pending = (batch[-1].id, len(batch))
+        yield from writer.close()
+        last_email_id, count = pending if pending is not None else (after_email_id, 0)
+        _checkpoint(db, job_id, last_email_id, count, completed=True)
+        logger.info(f"邮箱导出完成: job={job_id}")
+    finally:
+        read_db.close()
+        db.close()
@@ -0,0 +1,200 @@
+"""
+按邮箱聚合的邮件统计（临时邮箱列表、账号池统计的读模型）
+
+mailbox_email_stats 每个邮箱地址一行：总数、未读数、当天数量、最近收件时间。
+由 emails 表上的语句级触发器维护（LMTP / IMAP 入库、标记已读、批量清理都走同一套逻辑），
+读取时按主键取行即可，不再对 emails 做 COUNT。
+
+- "当天" 按 UTC 日期计算；today_date 早于今天的行视为当天数量为 0
+- 删除邮件后如删掉的是最新一封，重新取该邮箱的 max(received_at)（走 (mailbox_address, received_at DESC) 索引）
+- 总数归零的行随删除一起清理
+"""
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from db.models.email import MailboxEmailStats
+
+_DELTA_SELECT = """
+    PERFORM mailbox_email_stats_merge(
+        d.mailbox_address,
+        COALESCE(SUM(d.sign), 0),
+        COALESCE(SUM(d.sign) FILTER (WHERE NOT COALESCE(d.is_read, false)), 0),
+        COALESCE(SUM(d.sign) FILTER (WHERE (d.received_at AT TIME ZONE 'UTC')::date = v_today), 0),
+        MAX(d.received_at) FILTER (WHERE d.sign > 0)
+    )
+    FROM ({rows}) d
+    WHERE d.mailbox_address IS NOT NULL
+    GROUP BY d.mailbox_address
+    ORDER BY d.mailbox_address;
+"""
+
+_CHANGED_ROWS = """
+    SELECT {side}.mailbox_address, {sign} AS sign, {side}.is_read, {side}.received_at
+    FROM old_rows o JOIN new_rows n ON n.id = o.id
+    WHERE (o.mailbox_address, o.is_read, o.received_at) IS DISTINCT FROM (n.mailbox_address, n.is_read, n.received_at)
+"""
+
+_INSERT_DELTA = _DELTA_SELECT.format(rows="SELECT mailbox_address, 1 AS sign, is_read, received_at FROM new_rows")
+_DELETE_DELTA = _DELTA_SELECT.format(rows="SELECT mailbox_address, -1 AS sign, is_read, received_at FROM old_rows")
+_UPDATE_DELTA = _DELTA_SELECT.format(
+    rows=_CHANGED_ROWS.format(side="o", sign=-1) + " UNION ALL " + _CHANGED_ROWS.format(side="n", sign=1)
+)
+
+MAILBOX_STATS_TRIGGER_SQL: List[str] = [
+    """
+    CREATE OR REPLACE FUNCTION mailbox_email_stats_merge(
+        p_address text, p_total bigint, p_unread bigint, p_today bigint, p_last timestamptz
+    ) RETURNS void AS $$
+    DECLARE
+        v_today date := (now() AT TIME ZONE 'UTC')::date;
+    BEGIN
+        INSERT INTO mailbox_email_stats AS s
+            (mailbox_address, total_count, unread_count, today_date, today_count, last_received_at, updated_at)
+        VALUES
+            (p_address, GREATEST(p_total, 0), GREATEST(p_unread, 0), v_today, GREATEST(p_today, 0), p_last, now())
+        ON CONFLICT (mailbox_address) DO UPDATE SET
+            total_count = GREATEST(s.total_count + p_total, 0),
+            unread_count = GREATEST(s.unread_count + p_unread, 0),
+            today_count = GREATEST(CASE WHEN s.today_date = v_today THEN s.today_count ELSE 0 END + p_today, 0),
+            today_date = v_today,
+            last_received_at = GREATEST(s.last_received_at, p_last),
+            updated_at = now();
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION mailbox_email_stats_trigger() RETURNS trigger AS $$
+    DECLARE
+        v_today date := (now() AT TIME ZONE 'UTC')::date;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {_INSERT_DELTA}
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP = 'DELETE' THEN
+            {_DELETE_DELTA}
+        ELSE
+            {_UPDATE_DELTA}
+        END IF;
+
+        -- 移走的邮件中包含最新一封时，重新计算最近收件时间
+        UPDATE mailbox_email_stats s
+        SET last_received_at = (
+            SELECT MAX(e.received_at) FROM emails e WHERE e.mailbox_address = s.mailbox_address
+        )
+        FROM (
+            SELECT mailbox_address, MAX(received_at) AS received_at
+            FROM old_rows WHERE mailbox_address IS NOT NULL GROUP BY mailbox_address
+        ) o
+        WHERE s.mailbox_address = o.mailbox_address AND o.received_at >= s.last_received_at;
+
+        DELETE FROM mailbox_email_stats s
+        USING (SELECT DISTINCT mailbox_address FROM old_rows) o
+        WHERE s.mailbox_address = o.mailbox_address AND s.total_count = 0;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_insert ON emails;",
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_update ON emails;",
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_delete ON emails;",
+    """
+    CREATE TRIGGER emails_mailbox_stats_insert
+    AFTER INSERT ON emails REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mailbox_email_stats_trigger();
+    """,
+    """
+    CREATE TRIGGER emails_mailbox_stats_update
+    AFTER UPDATE ON emails REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mailbox_email_stats_trigger();
+    """,
+    """
+    CREATE TRIGGER emails_mailbox_stats_delete
+    AFTER DELETE ON emails REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION mailbox_email_stats_trigger();
+    """,
+]
+
+MAILBOX_STATS_DROP_SQL: List[str] = [
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_insert ON emails;",
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_update ON emails;",
+    "DROP TRIGGER IF EXISTS emails_mailbox_stats_delete ON emails;",
+    "DROP FUNCTION IF EXISTS mailbox_email_stats_trigger();",
+    "DROP FUNCTION IF EXISTS mailbox_email_stats_merge(text, bigint, bigint, bigint, timestamptz);",
+]
+
+# 按 emails 全量（或指定邮箱）重建统计行
+REBUILD_SQL = """
+    INSERT INTO mailbox_email_stats
+        (mailbox_address, total_count, unread_count, today_date, today_count, last_received_at, updated_at)
+    SELECT
+        mailbox_address,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE NOT COALESCE(is_read, false)),
+        (now() AT TIME ZONE 'UTC')::date,
+        COUNT(*) FILTER (WHERE (received_at AT TIME ZONE 'UTC')::date = (now() AT TIME ZONE 'UTC')::date),
+        MAX(received_at),
+        now()
+    FROM emails
+    WHERE mailbox_address IS NOT NULL {address_filter}
+    GROUP BY mailbox_address
+    ON CONFLICT (mailbox_address) DO UPDATE SET
+        total_count = EXCLUDED.total_count,
+        unread_count = EXCLUDED.unread_count,
+        today_date = EXCLUDED.today_date,
+        today_count = EXCLUDED.today_count,
+        last_received_at = EXCLUDED.last_received_at,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def install_mailbox_stats_triggers(conn: Connection) -> None:
+    """创建（或替换）维护 mailbox_email_stats 的函数与触发器，可重复执行"""
+    for statement in MAILBOX_STATS_TRIGGER_SQL:
+        conn.execute(text(statement))
+
+
+def rebuild_mailbox_stats(db: Session, addresses: Optional[List[str]] = None) -> None:
+    """根据 emails 重新计算统计行（回填或修复用），addresses 为空时全量重建"""
+    if addresses is None:
+        db.execute(text(REBUILD_SQL.format(address_filter="")))
+        return
+    if not addresses:
+        return
+    db.execute(
+        text("DELETE FROM mailbox_email_stats WHERE mailbox_address = ANY(:addresses)"),
+        {"addresses": addresses},
+    )
+    db.execute(
+        text(REBUILD_SQL.format(address_filter="AND mailbox_address = ANY(:addresses)")),
+        {"addresses": addresses},
+    )
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def today_count(stats: Optional[MailboxEmailStats], today: Optional[date] = None) -> int:
+    """当天收件数；统计行停留在之前的日期说明今天还没有收到邮件"""
+    if stats is None or stats.today_date != (today or _utc_today()):
+        return 0
+    return stats.today_count or 0
+
+
+def get_mailbox_stats(db: Session, address: str) -> Optional[MailboxEmailStats]:
+    return db.get(MailboxEmailStats, address)
+
+
+def get_mailbox_stats_map(db: Session, addresses: Iterable[str]) -> Dict[str, MailboxEmailStats]:
+    """按主键批量读取统计行，没有邮件的邮箱不在结果中"""
+    addresses = list(addresses)
+    if not addresses:
+        return {}
+    rows = db.query(MailboxEmailStats).filter(MailboxEmailStats.mailbox_address.in_(addresses)).all()
+    return {row.mailbox_address: row for row in rows}
@@ -0,0 +1,96 @@
+"""
+邮箱新邮件等待注册表
+
+长轮询 / SSE 请求按邮箱地址登记等待者，入库路径（LMTP、IMAP 同步）写入带验证码的邮件后唤醒。
+- 入库线程与等待者所在的事件循环不同，唤醒通过 loop.call_soon_threadsafe 完成
+- 其他 worker 的入库事件通过 Postgres NOTIFY 转发（复用配置缓存的监听连接）
+- 等待者被唤醒后自行查询数据库确认，唤醒丢失时由调用方的定期复查兜底
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional, Set
+
+from core import config_cache
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "talentmail_mailbox_codes"
+
+
+class MailboxWaiter:
+    """单个等待者，绑定创建时所在的事件循环"""
+
+    def __init__(self, address: str):
+        self.address = address
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def wake(self) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    async def wait(self, timeout: float) -> bool:
+        """等待唤醒，返回是否被唤醒；每次返回后重置，可重复等待"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+
+class MailboxWaiterRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Set[MailboxWaiter]] = {}
+
+    def register(self, address: str) -> MailboxWaiter:
+        """登记等待者（需在事件循环中调用）"""
+        address = address.lower()
+        waiter = MailboxWaiter(address)
+        with self._lock:
+            self._waiters.setdefault(address, set()).add(waiter)
+        return waiter
+
+    def unregister(self, waiter: MailboxWaiter) -> None:
+        with self._lock:
+            waiters = self._waiters.get(waiter.address)
+            if waiters is None:
+                return
+            waiters.discard(waiter)
+            if not waiters:
+                del self._waiters[waiter.address]
+
+    def notify_local(self, address: str) -> int:
+        """唤醒本进程内等待该邮箱的请求，返回唤醒数量（线程安全）"""
+        with self._lock:
+            waiters = list(self._waiters.get(address.lower(), ()))
+        for waiter in waiters:
+            waiter.wake()
+        return len(waiters)
+
+    def waiting_count(self, address: Optional[str] = None) -> int:
+        with self._lock:
+            if address is not None:
+                return len(self._waiters.get(address.lower(), ()))
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+
+# 全局实例
+mailbox_waiters = MailboxWaiterRegistry()
+
+config_cache.register_channel_handler(NOTIFY_CHANNEL, mailbox_waiters.notify_local)
+
+
+def publish_new_code(address: str) -> None:
+    """
+    入库路径调用：新邮件（含验证码）已提交
+    先唤醒本进程等待者，再通知其他 worker
+    """
+    mailbox_waiters.notify_local(address)
+    config_cache.publish(NOTIFY_CHANNEL, address.lower())
@@ -9,10 +9,7 @@
 
 import logging
 import os
-from typing import Set, List, Optional
-
-import docker
-from docker.errors import NotFound, APIError
+from typing import Dict, List, Optional, Set, Tuple
 
 from db.database import SessionLocal
 
@@ -22,7 +19,7 @@ logger = logging.getLogger(__name__)
 MAILSERVER_CONTAINER_NAME = os.getenv("MAILSERVER_CONTAINER_NAME", "talentmail-mailserver-1")
 DEFAULT_MAIL_PASSWORD = os.getenv("DEFAULT_MAIL_PASSWORD", "password")
 
-# Docker 客户端（延迟初始化）
+# Docker 客户端（延迟初始化）；docker SDK 导入较慢，只在首次使用时导入，不拖慢进程启动
 _docker_client = None
 
 
@@ -31,6 +28,7 @@ def get_docker_client():
     global _docker_client
     if _docker_client is None:
         try:
+            import docker
             _docker_client = docker.from_env()
         except Exception as e:
             logger.error(f"无法连接到 Docker: {e}")
@@ -51,6 +49,8 @@ def get_users_from_db() -> List[str]:
 
 def get_existing_mail_users() -> Set[str]:
     """获取 mailserver 中已存在的所有邮箱账户"""
+    from docker.errors import NotFound, APIError
+
     client = get_docker_client()
     if client is None:
         return set()
@@ -103,6 +103,8 @@ def create_mail_user(email: str, password: Optional[str] = None) -> bool:
         email: 邮箱地址
         password: 明文密码，如果不提供则使用默认密码
     """
+    from docker.errors import NotFound, APIError
+
     client = get_docker_client()
     if client is None:
         return False
@@ -133,6 +135,111 @@ def create_mail_user(email: str, password: Optional[str] = None) -> bool:
         return False
 
 
+# 单次 exec 处理的最大账户数（受命令行参数长度限制）
+MAIL_USER_BATCH_SIZE = 200
+
+# 在容器内逐个执行 setup email add，每个账户输出一行 "OK email" 或 "FAIL email"
+# 账户已存在视为成功，保证重试幂等
+_BATCH_ADD_SCRIPT = (
+    'while [ "$#" -gt 1 ]; do '
+    'email="$1"; password="$2"; shift 2; '
+    'if out=$(setup email add "$email" "$password" 2>&1); then echo "OK $email"; '
+    'else case "$out" in *"already exists"*) echo "OK $email";; *) echo "FAIL $email";; esac; fi; '
+    'done'
+)
+
+# 批量删除，账户不存在视为成功
+_BATCH_DEL_SCRIPT = (
+    'for email in "$@"; do '
+    'if out=$(setup email del -y "$email" 2>&1); then echo "OK $email"; '
+    'else case "$out" in *"does not exist"*) echo "OK $email";; *) echo "FAIL $email";; esac; fi; '
+    'done'
+)
+
+
+def _parse_batch_output(output: bytes, emails: List[str]) -> Dict[str, bool]:
+    """解析批量脚本输出，未出现在输出中的账户视为失败"""
+    results = {email: False for email in emails}
+    for line in (output or b'').decode('utf-8', errors='replace').splitlines():
+        status, _, email = line.strip().partition(' ')
+        if email in results:
+            results[email] = status == 'OK'
+    return results
+
+
+def _run_batch_script(script: str, items: List[Tuple[str, List[str]]], action: str) -> Dict[str, bool]:
+    """
+    在容器内分块执行批量脚本，每 MAIL_USER_BATCH_SIZE 个账户只执行一次 exec
+
+    Args:
+        script: sh 脚本，账户参数通过 "$@" 传入
+        items: [(邮箱地址, 该账户的脚本参数)]
+        action: 日志中的操作名称
+    """
+    from docker.errors import NotFound, APIError
+
+    emails = [email for email, _ in items]
+    client = get_docker_client()
+    if client is None:
+        return {email: False for email in emails}
+
+    try:
+        container = client.containers.get(MAILSERVER_CONTAINER_NAME)
+    except NotFound:
+        logger.error(f"容器 {MAILSERVER_CONTAINER_NAME} 未找到")
+        return {email: False for email in emails}
+    except APIError as e:
+        logger.error(f"Docker API 错误: {e}")
+        return {email: False for email in emails}
+
+    results: Dict[str, bool] = {}
+    for start in range(0, len(items), MAIL_USER_BATCH_SIZE):
+        chunk = items[start:start + MAIL_USER_BATCH_SIZE]
+        chunk_emails = [email for email, _ in chunk]
+        args = [arg for _, item_args in chunk for arg in item_args]
+        try:
+            logger.info(f"正在 mailserver 中批量{action} {len(chunk)} 个邮箱")
+            result = container.exec_run(["sh", "-c", script, "sh", *args], demux=True)
+            results.update(_parse_batch_output(result.output[0], chunk_emails))
+        except APIError as e:
+            logger.error(f"✖ 批量{action}邮箱时 Docker API 错误: {e}")
+            results.update({email: False for email in chunk_emails})
+        except Exception as e:
+            logger.error(f"✖ 批量{action}邮箱时发生错误: {e}")
+            results.update({email: False for email in chunk_emails})
+
+    failed = sum(1 for ok in results.values() if not ok)
+    logger.info(f"批量{action}邮箱完成: 成功 {len(results) - failed}, 失败 {failed}")
+    return results
+
+
+def create_mail_users_batch(accounts: List[Tuple[str, Optional[str]]]) -> Dict[str, bool]:
+    """
+    批量在 mailserver 中创建邮箱账户（已存在视为成功）
+
+    Args:
+        accounts: [(邮箱地址, 明文密码)]，密码为空时使用默认密码
+
+    Returns:
+        {邮箱地址: 是否成功}
+    """
+    items = [
+        (email, [email, password if password else DEFAULT_MAIL_PASSWORD])
+        for email, password in accounts
+    ]
+    return _run_batch_script(_BATCH_ADD_SCRIPT, items, "创建")
+
+
+def delete_mail_users_batch(emails: List[str]) -> Dict[str, bool]:
+    """
+    批量删除 mailserver 中的邮箱账户（不存在视为成功）
+
+    Returns:
+        {邮箱地址: 是否成功}
+    """
+    return _run_batch_script(_BATCH_DEL_SCRIPT, [(email, [email]) for email in emails], "删除")
+
+
 def update_mail_user_password(email: str, password: str) -> bool:
     """
     更新 mailserver 中邮箱账户的密码
@@ -141,6 +248,8 @@ def update_mail_user_password(email: str, password: str) -> bool:
         email: 邮箱地址
         password: 新的明文密码
     """
+    from docker.errors import NotFound, APIError
+
     client = get_docker_client()
     if client is None:
         return False
@@ -191,6 +300,8 @@ def delete_mail_user(email: str) -> bool:
     """
     删除 mailserver 中邮箱账户
     """
+    from docker.errors import NotFound, APIError
+
     client = get_docker_client()
     if client is None:
         return False
@@ -243,16 +354,14 @@ def sync_users_to_mailserver() -> dict:
         result["existing_mail_users"] = len(mail_users)
         logger.info(f"Mailserver 中已存在 {len(mail_users)} 个邮箱。")
         
-        for user_email in db_users:
-            if user_email not in mail_users:
-                # 使用默认密码创建（仅用于批量同步）
-                if create_mail_user(user_email):
-                    result["created"] += 1
-                else:
-                    result["failed"] += 1
-            else:
-                logger.debug(f"邮箱 {user_email} 已存在于 mailserver 中，跳过。")
-                result["skipped"] += 1
+        missing = [user_email for user_email in db_users if user_email not in mail_users]
+        result["skipped"] = len(db_users) - len(missing)
+
+        # 使用默认密码批量创建（仅用于批量同步）
+        if missing:
+            created = create_mail_users_batch([(user_email, None) for user_email in missing])
+            result["created"] = sum(1 for ok in created.values() if ok)
+            result["failed"] = len(created) - result["created"]
         
         logger.info(f"--- 同步完成: 创建 {result['created']}, 跳过 {result['skipped']}, 失败 {result['failed']} ---")
         
@@ -0,0 +1,239 @@
+"""
+账号池统计
+
+- 用户统计：一条 FILTER 聚合查询（temp_mailboxes LEFT JOIN mailbox_email_stats）+ 最近邮件查询，
+  结果按用户缓存 USER_STATS_TTL_SECONDS 秒；入库、创建 / 删除 / 续期 / 恢复、生命周期任务会主动失效
+- 全局统计：后台定时汇总到 pool_stats_rollups，管理端直接读取汇总行
+
+失效通过 Postgres NOTIFY 广播到其他 worker（复用配置缓存的监听连接），
+通知丢失时由短 TTL 兜底。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from core import config_cache
+from core.temp_mailbox_lifecycle import (
+    STATUS_PURGED,
+    active_mailbox_clause,
+    recoverable_mailbox_clause,
+)
+from db import models
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "talentmail_pool_stats"
+# 广播失效全部用户时的 payload
+INVALIDATE_ALL = "*"
+USER_STATS_TTL_SECONDS = 15
+USER_STATS_MAX_ENTRIES = 10000
+RECENT_EMAILS_LIMIT = 5
+ROLLUP_SCOPE_GLOBAL = "global"
+# 全局汇总刷新间隔（秒）
+ROLLUP_REFRESH_SECONDS = 300
+
+
+class UserStatsCache:
+    """按用户缓存统计结果（TTL + 容量上限，超出时淘汰最久未使用的条目）"""
+
+    def __init__(self, ttl_seconds: float = USER_STATS_TTL_SECONDS, max_entries: int = USER_STATS_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # user_id -> (写入时间, 值)
+        self._entries: "OrderedDict[int, Tuple[float, Any]]" = OrderedDict()
+        # user_id -> 失效代数，加载期间发生失效时不写入旧值
+        self._generations: Dict[int, int] = {}
+        self._global_generation = 0
+
+    def _generation(self, user_id: int) -> Tuple[int, int]:
+        return self._global_generation, self._generations.get(user_id, 0)
+
+    def get(self, user_id: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.ttl_seconds:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def get_or_load(self, user_id: int, loader) -> Any:
+        value = self.get(user_id)
+        if value is not None:
+            return value
+        with self._lock:
+            generation = self._generation(user_id)
+        value = loader()
+        with self._lock:
+            if self._generation(user_id) == generation:
+                self._entries[user_id] = (time.monotonic(), value)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if len(self._generations) > self.max_entries:
+                # 代数表只需区分“加载期间是否失效”，过大时整体换代
+                self._generations.clear()
+                self._global_generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._global_generation += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+user_stats_cache = UserStatsCache()
+
+
+def _handle_notification(payload: str) -> None:
+    if payload == INVALIDATE_ALL:
+        user_stats_cache.clear()
+    elif payload.isdigit():
+        user_stats_cache.invalidate(int(payload))
+
+
+config_cache.register_channel_handler(NOTIFY_CHANNEL, _handle_notification)
+
+
+def invalidate_user_stats(user_id: int, broadcast: bool = True) -> None:
+    """用户的临时邮箱或其中的邮件发生变化"""
+    user_stats_cache.invalidate(user_id)
+    if broadcast:
+        config_cache.publish(NOTIFY_CHANNEL, str(user_id))
+
+
+def invalidate_all_user_stats(broadcast: bool = True) -> None:
+    """生命周期任务批量变更状态后调用"""
+    user_stats_cache.clear()
+    if broadcast:
+        config_cache.publish(NOTIFY_CHANNEL, INVALIDATE_ALL)
+
+
+def _aggregate_columns(now: datetime):
+    """temp_mailboxes LEFT JOIN mailbox_email_stats 上的 FILTER 聚合列"""
+    tm = models.TempMailbox
+    stats = models.MailboxEmailStats
+    not_purged = tm.status != STATUS_PURGED
+    return (
+        func.count(tm.id).filter(not_purged).label("total_mailboxes"),
+        func.count(tm.id).filter(active_mailbox_clause(now)).label("active_mailboxes"),
+        func.count(tm.id).filter(recoverable_mailbox_clause(now)).label("recoverable_mailboxes"),
+        func.coalesce(func.sum(stats.total_count).filter(not_purged), 0).label("total_emails"),
+        func.coalesce(func.sum(stats.unread_count).filter(not_purged), 0).label("unread_emails"),
+        func.coalesce(
+            func.sum(stats.today_count).filter(and_(not_purged, stats.today_date == now.date())), 0
+        ).label("today_emails"),
+    )
+
+
+def _stats_join(db: Session, *columns):
+    tm = models.TempMailbox
+    stats = models.MailboxEmailStats
+    return db.query(*columns).select_from(tm).outerjoin(stats, stats.mailbox_address == tm.email)
+
+
+def _recent_emails(db: Session, owner_id: int) -> list:
+    tm = models.TempMailbox
+    stats = models.MailboxEmailStats
+    # 最近几封邮件必然落在最近收件时间最新的几个邮箱里
+    addresses = [
+        row.mailbox_address
+        for row in db.query(stats.mailbox_address)
+        .join(tm, tm.email == stats.mailbox_address)
+        .filter(tm.owner_id == owner_id, tm.status != STATUS_PURGED, stats.last_received_at.isnot(None))
+        .order_by(stats.last_received_at.desc())
+        .limit(RECENT_EMAILS_LIMIT)
+        .all()
+    ]
+    if not addresses:
+        return []
+    recent = db.query(models.Email).filter(
+        models.Email.mailbox_address.in_(addresses)
+    ).order_by(models.Email.received_at.desc()).limit(RECENT_EMAILS_LIMIT).all()
+    return [{
+        "id": e.id,
+        "mailbox": e.mailbox_address,
+        "sender": e.sender,
+        "subject": e.subject,
+        "received_at": e.received_at.isoformat() if e.received_at else None
+    } for e in recent]
+
+
+def compute_user_pool_stats(db: Session, owner_id: int, now: Optional[datetime] = None) -> dict:
+    """不经缓存计算单个用户的账号池统计"""
+    now = now or datetime.now(timezone.utc)
+    row = _stats_join(db, *_aggregate_columns(now)).filter(models.TempMailbox.owner_id == owner_id).one()
+    result = {key: int(value or 0) for key, value in row._asdict().items()}
+    result["recent_emails"] = _recent_emails(db, owner_id)
+    return result
+
+
+def get_user_pool_stats(db: Session, owner_id: int) -> dict:
+    """账号池统计（短 TTL 缓存）"""
+    return user_stats_cache.get_or_load(owner_id, lambda: compute_user_pool_stats(db, owner_id))
+
+
+def compute_global_pool_stats(db: Session, now: Optional[datetime] = None) -> dict:
+    """全量汇总（只在后台刷新任务和汇总缺失时执行）"""
+    now = now or datetime.now(timezone.utc)
+    tm = models.TempMailbox
+    row = _stats_join(
+        db,
+        *_aggregate_columns(now),
+        func.count(tm.id).filter(tm.status == STATUS_PURGED).label("purged_mailboxes"),
+        func.count(func.distinct(tm.owner_id)).filter(tm.status != STATUS_PURGED).label("owners"),
+    ).one()
+    return {key: int(value or 0) for key, value in row._asdict().items()}
+
+
+def refresh_global_rollup(db: Session) -> models.PoolStatsRollup:
+    """重新计算全局汇总并写入 pool_stats_rollups"""
+    started = time.monotonic()
+    now = datetime.now(timezone.utc)
+    values = compute_global_pool_stats(db, now)
+    rollup = db.get(models.PoolStatsRollup, ROLLUP_SCOPE_GLOBAL) or models.PoolStatsRollup(scope=ROLLUP_SCOPE_GLOBAL)
+    for key, value in values.items():
+        setattr(rollup, key, value)
+    rollup.computed_at = now
+    rollup.duration_ms = int((time.monotonic() - started) * 1000)
+    db.add(rollup)
+    db.commit()
+    return rollup
+
+
+def get_global_pool_stats(db: Session) -> dict:
+    """读取全局汇总；从未计算过时同步计算一次"""
+    rollup = db.get(models.PoolStatsRollup, ROLLUP_SCOPE_GLOBAL)
+    if rollup is None:
+        rollup = refresh_global_rollup(db)
+    return {
+        "total_mailboxes": rollup.total_mailboxes,
+        "active_mailboxes": rollup.active_mailboxes,
+        "recoverable_mailboxes": rollup.recoverable_mailboxes,
+        "purged_mailboxes": rollup.purged_mailboxes,
+        "owners": rollup.owners,
+        "total_emails": rollup.total_emails,
+        "unread_emails": rollup.unread_emails,
+        "today_emails": rollup.today_emails,
+        "computed_at": rollup.computed_at.isoformat() if rollup.computed_at else None,
+        "duration_ms": rollup.duration_ms,
+        "refresh_interval_seconds": ROLLUP_REFRESH_SECONDS,
+    }
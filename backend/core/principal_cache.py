@@ -0,0 +1,183 @@
+"""
+JWT 登录用户快照缓存
+
+按 (sub, session_id) 缓存登录用户的轻量快照（ID、邮箱、角色、账号池权限），
+认证依赖命中缓存时不再按邮箱查询用户；需要完整 User 对象的接口再按主键加载。
+
+- token 带 session_id 时，加载快照会同时确认该会话仍然有效，撤销的会话无法继续认证
+- 修改密码、角色 / 账号池权限、删除用户或撤销会话时主动失效，
+  并通过 Postgres NOTIFY 广播到其他 worker；通知丢失时由短 TTL 兜底
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from core import config_cache
+from core.config import settings
+from db import models
+from db.models.user import UserSession
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "talentmail_auth_principal"
+# 广播失效全部条目时的 payload
+INVALIDATE_ALL = "*"
+PRINCIPAL_CACHE_MAX_ENTRIES = 20000
+
+PrincipalKey = Tuple[str, Optional[int]]
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """登录用户快照，字段名与 User 一致，可直接用于只读取这些字段的权限判断"""
+    id: int
+    email: str
+    role: Optional[str]
+    pool_enabled: bool
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+
+def _tags(key: PrincipalKey, principal: UserPrincipal) -> FrozenSet[str]:
+    tags = {f"user:{principal.id}"}
+    if key[1] is not None:
+        tags.add(f"session:{key[1]}")
+    return frozenset(tags)
+
+
+class PrincipalCache:
+    """(sub, session_id) -> (写入时间, 快照)，按用户 / 会话标签反查以便失效"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS,
+        max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[PrincipalKey, Tuple[float, UserPrincipal]]" = OrderedDict()
+        self._by_tag: Dict[str, Set[PrincipalKey]] = {}
+        # 每次失效递增，加载期间发生失效时不写入旧快照
+        self._generation = 0
+
+    def get(self, key: PrincipalKey) -> Optional[UserPrincipal]:
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.ttl_seconds:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get_or_load(self, key: PrincipalKey, loader: Callable[[], Optional[UserPrincipal]]) -> Optional[UserPrincipal]:
+        principal = self.get(key)
+        if principal is not None:
+            return principal
+        generation = self._generation
+        principal = loader()
+        if principal is None or self.ttl_seconds <= 0:
+            return principal
+        with self._lock:
+            if generation == self._generation:
+                self._remove(key)
+                self._entries[key] = (time.monotonic(), principal)
+                for tag in _tags(key, principal):
+                    self._by_tag.setdefault(tag, set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    self._remove(next(iter(self._entries)))
+        return principal
+
+    def _remove(self, key: PrincipalKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in _tags(key, entry[1]):
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate_tag(self, tag: str) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in list(self._by_tag.get(tag, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+principal_cache = PrincipalCache()
+
+
+def _handle_notification(payload: str) -> None:
+    if payload == INVALIDATE_ALL:
+        principal_cache.clear()
+    else:
+        principal_cache.invalidate_tag(payload)
+
+
+config_cache.register_channel_handler(NOTIFY_CHANNEL, _handle_notification)
+
+
+def load_principal(db: Session, sub: str, session_id: Optional[int]) -> Optional[UserPrincipal]:
+    """按 token 中的邮箱加载用户快照；带 session_id 时要求会话属于该用户且仍有效"""
+    row = (
+        db.query(models.User.id, models.User.email, models.User.role, models.User.pool_enabled)
+        .filter(models.User.email == sub)
+        .first()
+    )
+    if row is None:
+        return None
+    if session_id is not None:
+        session_active = (
+            db.query(UserSession.id)
+            .filter(
+                UserSession.id == session_id,
+                UserSession.user_id == row.id,
+                UserSession.is_active == True,  # noqa: E712
+            )
+            .first()
+        )
+        if session_active is None:
+            return None
+    return UserPrincipal(id=row.id, email=row.email, role=row.role, pool_enabled=bool(row.pool_enabled))
+
+
+def get_principal(db: Session, sub: str, session_id: Optional[int]) -> Optional[UserPrincipal]:
+    return principal_cache.get_or_load((sub, session_id), lambda: load_principal(db, sub, session_id))
+
+
+def _invalidate(tag: str, broadcast: bool) -> None:
+    principal_cache.invalidate_tag(tag)
+    if broadcast:
+        config_cache.publish(NOTIFY_CHANNEL, tag)
+
+
+def invalidate_user_principals(user_id: int, broadcast: bool = True) -> None:
+    """用户密码、角色 / 账号池权限变更或用户被删除后调用（应在事务提交之后）"""
+    _invalidate(f"user:{user_id}", broadcast)
+
+
+def invalidate_session_principal(session_id: int, broadcast: bool = True) -> None:
+    """会话被撤销后调用（应在事务提交之后）"""
+    _invalidate(f"session:{session_id}", broadcast)
@@ -0,0 +1,49 @@
+"""
+进程模式
+
+同一套 core 模块可以按职责拆成多个进程部署：
+- api：只提供 HTTP，可水平扩展
+- ingest：LMTP 收信 + IMAP 定时同步，收信高峰不影响 API 延迟
+- worker：定时维护任务、邮件服务器全量同步、SpamAssassin 训练
+- all：以上全部（默认，单进程 / 开发环境）
+
+ingest / worker 中的任务仍通过租约选主，同一模式启动多个进程时只有一个实际运行。
+"""
+from typing import FrozenSet
+
+from core.config import settings
+
+MODE_ALL = "all"
+MODE_API = "api"
+MODE_INGEST = "ingest"
+MODE_WORKER = "worker"
+
+ROLE_API = "api"
+ROLE_INGEST = "ingest"
+ROLE_WORKER = "worker"
+
+MODE_ROLES = {
+    MODE_ALL: frozenset({ROLE_API, ROLE_INGEST, ROLE_WORKER}),
+    MODE_API: frozenset({ROLE_API}),
+    MODE_INGEST: frozenset({ROLE_INGEST}),
+    MODE_WORKER: frozenset({ROLE_WORKER}),
+}
+
+
+def parse_mode(value: str) -> str:
+    mode = (value or MODE_ALL).strip().lower()
+    if mode not in MODE_ROLES:
+        raise ValueError(f"未知的进程模式 {value}，可选: {', '.join(MODE_ROLES)}")
+    return mode
+
+
+def current_mode() -> str:
+    return parse_mode(settings.PROCESS_MODE)
+
+
+def current_roles() -> FrozenSet[str]:
+    return MODE_ROLES[current_mode()]
+
+
+def has_role(role: str) -> bool:
+    return role in current_roles()
@@ -0,0 +1,226 @@
+"""
+滑动窗口限流
+
+按固定窗口计数，并用上一窗口计数按剩余比例加权估算滑动窗口内的请求数：
+    estimated = previous * (1 - elapsed / window) + current
+每个限流键只保存两个计数，判断与计数都是 O(1)。
+
+后端：
+- memory（默认）：进程内计数，多 worker 时每个 worker 独立计数
+- postgres：计数存放在 UNLOGGED 表 rate_limit_counters，一条语句完成判断与计数，
+  多 worker 共享；数据库不可用时退回本进程计数
+"""
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKEND_MEMORY = "memory"
+BACKEND_POSTGRES = "postgres"
+DEFAULT_WINDOW_SECONDS = 60
+# 内存后端每隔多少次计数清理一次过期键
+MEMORY_PRUNE_EVERY = 1024
+# postgres 后端清理过期窗口的间隔（秒）
+POSTGRES_CLEANUP_SECONDS = 60
+# 后端故障日志的最小间隔（秒）
+ERROR_LOG_INTERVAL_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    # 当前窗口结束时间（Unix 秒）
+    reset_at: int
+    retry_after: int = 0
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset_at),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+def estimate(previous: int, current: int, elapsed: float, window: float) -> float:
+    """滑动窗口内的估算请求数"""
+    return previous * (1 - elapsed / window) + current
+
+
+def retry_after_seconds(previous: int, current: int, limit: int, elapsed: float, window: float) -> int:
+    """估算再次允许请求需要等待的秒数"""
+    if current + 1 <= limit and previous > 0:
+        # 当前窗口内等待上一窗口的权重衰减
+        needed = 1 - (limit - 1 - current) / previous
+        wait = needed * window - elapsed
+    else:
+        # 需要等到下一窗口，当前窗口的计数成为下一窗口的 previous
+        needed = max(0.0, 1 - (limit - 1) / current) if current > 0 else 0.0
+        wait = (window - elapsed) + needed * window
+    return max(1, math.ceil(wait))
+
+
+def decide(
+    previous: int, current: int, limit: int, window_index: int, elapsed: float, window: int
+) -> Tuple[bool, RateLimitResult]:
+    """根据两个窗口计数判断本次请求是否允许（current 为计入本次之前的计数）"""
+    used = estimate(previous, current, elapsed, window)
+    reset_at = (window_index + 1) * window
+    if used + 1 > limit:
+        return False, RateLimitResult(
+            allowed=False,
+            limit=limit,
+            remaining=0,
+            reset_at=reset_at,
+            retry_after=retry_after_seconds(previous, current, limit, elapsed, window),
+        )
+    return True, RateLimitResult(
+        allowed=True,
+        limit=limit,
+        remaining=max(0, int(limit - used - 1)),
+        reset_at=reset_at,
+    )
+
+
+class MemoryRateLimitBackend:
+    """进程内计数：key -> [窗口序号, 当前窗口计数, 上一窗口计数]"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, List[int]] = {}
+        self._hits_since_prune = 0
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> RateLimitResult:
+        window_index = int(now // window)
+        elapsed = now - window_index * window
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = [window_index, 0, 0]
+                self._counters[key] = counter
+            elif counter[0] != window_index:
+                previous = counter[1] if counter[0] == window_index - 1 else 0
+                counter[0], counter[1], counter[2] = window_index, 0, previous
+
+            allowed, result = decide(counter[2], counter[1], limit, window_index, elapsed, window)
+            if allowed:
+                counter[1] += 1
+
+            self._hits_since_prune += 1
+            if self._hits_since_prune >= MEMORY_PRUNE_EVERY:
+                self._prune(window_index)
+        return result
+
+    def _prune(self, window_index: int) -> None:
+        self._hits_since_prune = 0
+        stale = [key for key, counter in self._counters.items() if counter[0] < window_index - 1]
+        for key in stale:
+            del self._counters[key]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+# 先读上一窗口计数，再按估算值有条件地累加当前窗口；被拒绝时返回语句开始前的当前计数
+_POSTGRES_HIT_SQL = text("""
+    WITH prev AS (
+        SELECT COALESCE(
+            (SELECT hits FROM rate_limit_counters WHERE bucket_key = :key AND window_start = :prev_window), 0
+        ) AS hits
+    ),
+    cur AS (
+        INSERT INTO rate_limit_counters AS c (bucket_key, window_start, hits)
+        SELECT :key, :window, 1 FROM prev WHERE prev.hits * :weight + 1 <= :limit
+        ON CONFLICT (bucket_key, window_start) DO UPDATE SET hits = c.hits + 1
+        WHERE (SELECT hits FROM prev) * :weight + c.hits + 1 <= :limit
+        RETURNING c.hits
+    )
+    SELECT
+        (SELECT hits FROM prev) AS prev_hits,
+        (SELECT hits FROM cur) AS new_hits,
+        (SELECT hits FROM rate_limit_counters WHERE bucket_key = :key AND window_start = :window) AS old_hits
+""")
+
+
+class PostgresRateLimitBackend:
+    """多 worker 共享计数（UNLOGGED 表，重启丢失计数可以接受）"""
+
+    def __init__(self, fallback: Optional[MemoryRateLimitBackend] = None):
+        self._fallback = fallback or MemoryRateLimitBackend()
+        self._last_cleanup = 0.0
+        self._last_error_log = 0.0
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> RateLimitResult:
+        window_index = int(now // window)
+        elapsed = now - window_index * window
+        try:
+            from db.database import engine
+            with engine.begin() as conn:
+                row = conn.execute(
+                    _POSTGRES_HIT_SQL,
+                    {
+                        "key": key,
+                        "window": window_index,
+                        "prev_window": window_index - 1,
+                        "weight": 1 - elapsed / window,
+                        "limit": limit,
+                    },
+                ).one()
+                self._maybe_cleanup(conn, window_index)
+        except Exception as e:
+            if time.monotonic() - self._last_error_log >= ERROR_LOG_INTERVAL_SECONDS:
+                self._last_error_log = time.monotonic()
+                logger.warning(f"共享限流计数不可用，退回本进程计数: {e}")
+            return self._fallback.hit(key, limit, window, now)
+
+        previous = row.prev_hits or 0
+        if row.new_hits is not None:
+            # 已计入本次请求
+            _, result = decide(previous, row.new_hits - 1, limit, window_index, elapsed, window)
+            return result
+        _, result = decide(previous, row.old_hits or 0, limit, window_index, elapsed, window)
+        return result
+
+    def _maybe_cleanup(self, conn, window_index: int) -> None:
+        if time.monotonic() - self._last_cleanup < POSTGRES_CLEANUP_SECONDS:
+            return
+        self._last_cleanup = time.monotonic()
+        conn.execute(
+            text("DELETE FROM rate_limit_counters WHERE window_start < :window"),
+            {"window": window_index - 1},
+        )
+
+
+class RateLimiter:
+    def __init__(self, backend=None, window_seconds: int = DEFAULT_WINDOW_SECONDS):
+        self.backend = backend or MemoryRateLimitBackend()
+        self.window_seconds = window_seconds
+
+    def hit(self, key: str, limit: int, now: Optional[float] = None) -> RateLimitResult:
+        """计入一次请求并返回限流结果；被拒绝的请求不计数"""
+        return self.backend.hit(key, limit, self.window_seconds, time.time() if now is None else now)
+
+
+def create_backend(name: str):
+    if name == BACKEND_POSTGRES:
+        return PostgresRateLimitBackend()
+    if name != BACKEND_MEMORY:
+        logger.warning(f"未知的限流后端 {name}，使用 memory")
+    return MemoryRateLimitBackend()
+
+
+# API Key 每分钟限流
+api_key_rate_limiter = RateLimiter(create_backend(settings.API_KEY_RATE_LIMIT_BACKEND))
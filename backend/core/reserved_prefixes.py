@@ -0,0 +1,96 @@
+"""
+保留前缀匹配器
+
+启用中的保留前缀常驻内存（通过 config_cache 在管理端修改后重新加载），
+创建临时邮箱、别名、注册时的检查不再逐条查询数据库。
+
+规则写法：
+- 普通前缀：admin            精确匹配 admin
+- 前缀规则：admin*           匹配所有以 admin 开头的前缀（admin、admin01、admin-bot ...）
+- 通配规则：*bot、test?、a*z  按 shell 通配符匹配（* 任意长度，? 单个字符）
+"""
+import fnmatch
+import re
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from core.config_cache import ConfigCache
+from db.models.system import ReservedPrefix
+
+WILDCARD_CHARS = frozenset("*?")
+
+
+def normalize_prefix(prefix: str) -> str:
+    return prefix.lower().strip()
+
+
+class ReservedPrefixMatcher:
+    """保留前缀匹配器：精确规则用集合，前缀规则用有序元组，其余通配规则合并为一个正则"""
+
+    def __init__(self, rules: Iterable[str]):
+        self._exact = set()
+        starts_with = set()
+        patterns: List[str] = []
+        for rule in rules:
+            rule = normalize_prefix(rule)
+            if not rule:
+                continue
+            if not WILDCARD_CHARS.intersection(rule):
+                self._exact.add(rule)
+            elif rule.endswith("*") and not WILDCARD_CHARS.intersection(rule[:-1]):
+                starts_with.add(rule[:-1])
+            else:
+                patterns.append(rule)
+
+        # 按长度排序，优先报告最短（最宽泛）的规则
+        self._starts_with = tuple(sorted(starts_with, key=lambda p: (len(p), p)))
+        self._pattern_rules = patterns
+        self._pattern = None
+        if patterns:
+            self._pattern = re.compile(
+                "|".join(f"(?P<r{i}>{fnmatch.translate(rule)})" for i, rule in enumerate(patterns))
+            )
+
+    def __len__(self) -> int:
+        return len(self._exact) + len(self._starts_with) + len(self._pattern_rules)
+
+    def match(self, prefix: str) -> Optional[str]:
+        """返回命中的规则，未命中返回 None"""
+        prefix = normalize_prefix(prefix)
+        if prefix in self._exact:
+            return prefix
+        if self._starts_with and prefix.startswith(self._starts_with):
+            for rule in self._starts_with:
+                if prefix.startswith(rule):
+                    return f"{rule}*"
+        if self._pattern is not None:
+            matched = self._pattern.match(prefix)
+            if matched:
+                return self._pattern_rules[int(matched.lastgroup[1:])]
+        return None
+
+    def is_reserved(self, prefix: str) -> bool:
+        return self.match(prefix) is not None
+
+    def match_many(self, prefixes: Iterable[str]) -> Dict[str, Optional[str]]:
+        """批量匹配，返回 {规范化前缀: 命中的规则或 None}"""
+        return {normalize_prefix(p): self.match(p) for p in prefixes}
+
+
+def _load_matcher(db: Session) -> ReservedPrefixMatcher:
+    rows = db.query(ReservedPrefix.prefix).filter(ReservedPrefix.is_active == True).all()
+    return ReservedPrefixMatcher(row.prefix for row in rows)
+
+
+reserved_prefix_cache = ConfigCache("reserved_prefixes", _load_matcher)
+
+
+def get_reserved_prefix_matcher(db: Session) -> ReservedPrefixMatcher:
+    """获取当前生效的匹配器（缓存）"""
+    return reserved_prefix_cache.get(db)
+
+
+def is_prefix_reserved(db: Session, prefix: str) -> bool:
+    """检查前缀是否被保留"""
+    return get_reserved_prefix_matcher(db).is_reserved(prefix)
@@ -13,8 +13,6 @@ from email.utils import format_datetime
 from html import unescape
 import re
 
-from docker.errors import APIError, NotFound
-
 from core.mailserver_sync import get_docker_client
 
 logger = logging.getLogger(__name__)
@@ -69,6 +67,8 @@ def _build_tar_payload(file_name: str, content: bytes) -> bytes:
 
 
 def train_report_with_spamassassin(report, report_type: str) -> None:
+    from docker.errors import APIError, NotFound
+
     if report_type not in {"spam", "ham"}:
         raise ValueError(f"Invalid report_type: {report_type}")
 
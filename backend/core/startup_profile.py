@@ -0,0 +1,55 @@
+"""
+启动阶段耗时记录
+
+main.py 与 init_db 用 phase() 包住每个启动阶段（导入、建表、各个 seeder、后台服务启动），
+记录始终开启（开销可以忽略）；STARTUP_PROFILE 开启时在启动完成后打印各阶段耗时，
+管理员也可以通过 /api/health/startup 查看本进程的记录。
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: List[Tuple[str, float]] = []
+        self.ready_seconds: Optional[float] = None
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self, seconds: float) -> None:
+        """记录从进程开始导入到可以接收请求的总耗时，STARTUP_PROFILE 开启时打印各阶段"""
+        self.ready_seconds = seconds
+        if settings.STARTUP_PROFILE:
+            lines = [f"  {name:<40}{duration * 1000:>10.1f} ms" for name, duration in self.phases()]
+            logger.info("启动耗时（%.1f ms）:\n%s", seconds * 1000, "\n".join(lines))
+
+    def phases(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return list(self._phases)
+
+    def snapshot(self) -> dict:
+        return {
+            "ready_ms": self.ready_seconds * 1000 if self.ready_seconds is not None else None,
+            "phases": [{"name": name, "duration_ms": duration * 1000} for name, duration in self.phases()],
+        }
+
+
+startup_profile = StartupProfile()
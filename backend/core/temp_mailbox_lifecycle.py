@@ -1,13 +1,20 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import List, Optional, Tuple
 import logging
+import time
 
+from sqlalchemy import String, and_, any_, delete, func, literal, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
 
 from db import models
-from core.mailserver_sync import delete_mail_user
+from core.config_cache import ConfigCache
+from core.job_coordinator import ensure_job_lease
+from core.mail_provisioner import mail_provisioner
+from core.mailserver_sync import get_existing_mail_users
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +26,16 @@ DEFAULT_TTL_HOURS = 24
 DEFAULT_RECOVERABLE_DAYS = 10
 DEFAULT_CLEANUP_INTERVAL_HOURS = 24
 DEFAULT_CLEANUP_BATCH_SIZE = 500
+# 单次运行的时间预算（秒），超出后剩余批次留给下一轮
+RUN_TIME_BUDGET_SECONDS = 30.0
+# 积压计数封顶
+BACKLOG_COUNT_CAP = 100000
+# mailserver 账户对账间隔（秒）：清理进程崩溃 / 重启时丢失的删除任务
+RECONCILE_INTERVAL_SECONDS = 3600
+RECONCILE_CHUNK_SIZE = 1000
+
+# 上次对账时间（monotonic）
+_last_reconcile_at: Optional[float] = None
 
 
 def _now_utc() -> datetime:
@@ -46,14 +63,75 @@ def get_or_create_policy(db: Session) -> models.TempMailboxPolicy:
     return policy
 
 
+@dataclass(frozen=True)
+class TempMailboxPolicySnapshot:
+    """临时邮箱策略的只读快照（不含清理运行状态）"""
+    cleanup_enabled: bool
+    ttl_hours: int
+    recoverable_days: int
+    cleanup_interval_hours: int
+    cleanup_batch_size: int
+    delete_emails_on_purge: bool
+
+
+def _load_policy_snapshot(db: Session) -> TempMailboxPolicySnapshot:
+    policy = get_or_create_policy(db)
+    return TempMailboxPolicySnapshot(
+        cleanup_enabled=policy.cleanup_enabled,
+        ttl_hours=policy.ttl_hours,
+        recoverable_days=policy.recoverable_days,
+        cleanup_interval_hours=policy.cleanup_interval_hours,
+        cleanup_batch_size=policy.cleanup_batch_size,
+        delete_emails_on_purge=policy.delete_emails_on_purge,
+    )
+
+
+policy_cache = ConfigCache("temp_mailbox_policy", _load_policy_snapshot)
+
+
+def get_policy_snapshot(db: Session) -> TempMailboxPolicySnapshot:
+    """获取策略快照（缓存），用于只读场景如计算有效期；需要修改策略时使用 get_or_create_policy"""
+    return policy_cache.get(db)
+
+
 def compute_new_expiry_windows(
-    now: datetime, policy: models.TempMailboxPolicy
+    now: datetime, policy: models.TempMailboxPolicy | TempMailboxPolicySnapshot
 ) -> tuple[datetime, datetime]:
     expires_at = now + timedelta(hours=max(1, int(policy.ttl_hours or DEFAULT_TTL_HOURS)))
     recovery_until = expires_at + timedelta(days=max(1, int(policy.recoverable_days or DEFAULT_RECOVERABLE_DAYS)))
     return expires_at, recovery_until
 
 
+def effective_status(mailbox: models.TempMailbox, now: Optional[datetime] = None) -> str:
+    """
+    读取时计算的生命周期状态
+    后台任务尚未推进的过期邮箱（status 仍为 active 但 expires_at 已过）按可恢复状态返回
+    """
+    status = mailbox.status or STATUS_ACTIVE
+    if status == STATUS_ACTIVE and mailbox.expires_at is not None and mailbox.expires_at <= (now or _now_utc()):
+        return STATUS_EXPIRED_RECOVERABLE
+    return status
+
+
+def active_mailbox_clause(now: Optional[datetime] = None):
+    """SQL 条件：读取时仍处于活跃状态的邮箱"""
+    now = now or _now_utc()
+    return and_(
+        models.TempMailbox.status == STATUS_ACTIVE,
+        models.TempMailbox.is_active == True,  # noqa: E712
+        or_(models.TempMailbox.expires_at.is_(None), models.TempMailbox.expires_at > now),
+    )
+
+
+def recoverable_mailbox_clause(now: Optional[datetime] = None):
+    """SQL 条件：读取时处于可恢复状态的邮箱（含尚未被后台推进的过期邮箱）"""
+    now = now or _now_utc()
+    return or_(
+        models.TempMailbox.status == STATUS_EXPIRED_RECOVERABLE,
+        and_(models.TempMailbox.status == STATUS_ACTIVE, models.TempMailbox.expires_at <= now),
+    )
+
+
 def normalize_mailbox_windows(
     mailbox: models.TempMailbox, policy: models.TempMailboxPolicy, now: Optional[datetime] = None
 ) -> None:
@@ -64,39 +142,133 @@ def normalize_mailbox_windows(
         mailbox.recovery_until = mailbox.expires_at + timedelta(days=max(1, int(policy.recoverable_days or DEFAULT_RECOVERABLE_DAYS)))
 
 
+def _ttl(policy) -> timedelta:
+    return timedelta(hours=max(1, int(policy.ttl_hours or DEFAULT_TTL_HOURS)))
+
+
+def _recoverable(policy) -> timedelta:
+    return timedelta(days=max(1, int(policy.recoverable_days or DEFAULT_RECOVERABLE_DAYS)))
+
+
+def _batch_size(policy, limit: Optional[int] = None) -> int:
+    return max(1, int(limit or policy.cleanup_batch_size or DEFAULT_CLEANUP_BATCH_SIZE))
+
+
+def fill_missing_windows(db: Session, policy, now: Optional[datetime] = None) -> int:
+    """为缺少有效期的历史活跃邮箱一次性补齐 expires_at / recovery_until"""
+    now = now or _now_utc()
+    tm = models.TempMailbox
+    result = db.execute(
+        update(tm)
+        .where(tm.status == STATUS_ACTIVE, tm.expires_at.is_(None))
+        .values(
+            expires_at=func.coalesce(tm.created_at, now) + _ttl(policy),
+            recovery_until=func.coalesce(tm.recovery_until, func.coalesce(tm.created_at, now) + _ttl(policy) + _recoverable(policy)),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def build_expire_batch_statement(now: datetime, batch_size: int, recoverable: timedelta, owner_id: Optional[int] = None):
+    """
+    一批到期邮箱转为可恢复状态：
+    UPDATE ... WHERE id IN (SELECT id ... WHERE status='active' AND expires_at <= now LIMIT n FOR UPDATE SKIP LOCKED)
+    RETURNING email
+    """
+    tm = models.TempMailbox
+    due = select(tm.id).where(tm.status == STATUS_ACTIVE, tm.expires_at <= now)
+    if owner_id is not None:
+        due = due.where(tm.owner_id == owner_id)
+    due = due.order_by(tm.expires_at, tm.id).limit(batch_size).with_for_update(skip_locked=True)
+    return (
+        update(tm)
+        .where(tm.id.in_(due.scalar_subquery()))
+        .values(
+            status=STATUS_EXPIRED_RECOVERABLE,
+            is_active=False,
+            expired_at=func.coalesce(tm.expired_at, now),
+            recovery_until=func.coalesce(tm.recovery_until, tm.expires_at + recoverable),
+        )
+        .returning(tm.email)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def build_purge_batch_statement(now: datetime, batch_size: int, cursor: Optional[Tuple[datetime, int]] = None):
+    """
+    一批超过恢复窗口的邮箱标记为已清理，按 (recovery_until, id) 游标推进
+    RETURNING (email, recovery_until, id)
+    """
+    tm = models.TempMailbox
+    due = select(tm.id).where(tm.status == STATUS_EXPIRED_RECOVERABLE, tm.recovery_until <= now)
+    if cursor is not None:
+        due = due.where(tuple_(tm.recovery_until, tm.id) > tuple_(literal(cursor[0]), literal(cursor[1])))
+    due = due.order_by(tm.recovery_until, tm.id).limit(batch_size).with_for_update(skip_locked=True)
+    return (
+        update(tm)
+        .where(tm.id.in_(due.scalar_subquery()))
+        .values(status=STATUS_PURGED, is_active=False, purged_at=now)
+        .returning(tm.email, tm.recovery_until, tm.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def delete_emails_for_mailboxes(db: Session, emails: List[str]) -> int:
+    """DELETE FROM emails WHERE mailbox_address = ANY(:emails)"""
+    if not emails:
+        return 0
+    result = db.execute(
+        delete(models.Email)
+        .where(models.Email.mailbox_address == any_(literal(emails, type_=ARRAY(String))))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def count_backlog(db: Session, now: Optional[datetime] = None) -> dict:
+    """待处理积压（封顶计数，避免全表 count）"""
+    now = now or _now_utc()
+    tm = models.TempMailbox
+
+    def capped(*conditions) -> int:
+        inner = select(tm.id).where(*conditions).limit(BACKLOG_COUNT_CAP).subquery()
+        return db.execute(select(func.count()).select_from(inner)).scalar() or 0
+
+    return {
+        "expire_backlog": capped(tm.status == STATUS_ACTIVE, tm.expires_at <= now),
+        "purge_backlog": capped(tm.status == STATUS_EXPIRED_RECOVERABLE, tm.recovery_until <= now),
+        "backlog_cap": BACKLOG_COUNT_CAP,
+    }
+
+
 def expire_due_mailboxes(
     db: Session,
     policy: models.TempMailboxPolicy,
     owner_id: Optional[int] = None,
     now: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    time_budget_seconds: float = RUN_TIME_BUDGET_SECONDS,
 ) -> int:
+    """分批将到期邮箱转为可恢复状态，每批提交一次并批量停用 mailserver 账户"""
     now = now or _now_utc()
-    query = db.query(models.TempMailbox).filter(
-        models.TempMailbox.status == STATUS_ACTIVE,
-        models.TempMailbox.is_active == True,  # noqa: E712
-        models.TempMailbox.email.isnot(None),
-    )
-    if owner_id is not None:
-        query = query.filter(models.TempMailbox.owner_id == owner_id)
-
-    due_mailboxes = []
-    for mailbox in query.all():
-        normalize_mailbox_windows(mailbox, policy, now=now)
-        if mailbox.expires_at and mailbox.expires_at <= now:
-            due_mailboxes.append(mailbox)
-
-    for mailbox in due_mailboxes:
-        mailbox.status = STATUS_EXPIRED_RECOVERABLE
-        mailbox.is_active = False
-        if mailbox.expired_at is None:
-            mailbox.expired_at = now
-        if mailbox.recovery_until is None and mailbox.expires_at:
-            mailbox.recovery_until = mailbox.expires_at + timedelta(days=max(1, int(policy.recoverable_days or DEFAULT_RECOVERABLE_DAYS)))
-        try:
-            delete_mail_user(mailbox.email)
-        except Exception as e:
-            logger.warning(f"过期停用邮箱时删除 mailserver 账户失败: {mailbox.email}, err={e}")
-    return len(due_mailboxes)
+    batch_size = _batch_size(policy, limit)
+    recoverable = _recoverable(policy)
+    fill_missing_windows(db, policy, now=now)
+
+    started = time.monotonic()
+    total = 0
+    while time.monotonic() - started < time_budget_seconds:
+        emails = list(db.execute(build_expire_batch_statement(now, batch_size, recoverable, owner_id)).scalars())
+        ensure_job_lease(db)
+        db.commit()
+        if emails:
+            mail_provisioner.submit_delete_many(emails)
+        total += len(emails)
+        if len(emails) < batch_size:
+            break
+    _record_throughput(policy, "expire", total, time.monotonic() - started)
+    return total
 
 
 def purge_expired_mailboxes(
@@ -104,29 +276,107 @@ def purge_expired_mailboxes(
     policy: models.TempMailboxPolicy,
     now: Optional[datetime] = None,
     limit: Optional[int] = None,
+    time_budget_seconds: float = RUN_TIME_BUDGET_SECONDS,
 ) -> int:
+    """
+    分批清理超过恢复窗口的邮箱
+    游标保存在策略行上，与每批清理同一事务提交，跨运行、跨 worker 保留：
+    被其他事务锁定而跳过的行在游标回绕后的下一轮处理
+    """
     now = now or _now_utc()
-    batch_size = max(1, int(limit or policy.cleanup_batch_size or DEFAULT_CLEANUP_BATCH_SIZE))
-    to_purge = db.query(models.TempMailbox).filter(
-        models.TempMailbox.status == STATUS_EXPIRED_RECOVERABLE,
-        models.TempMailbox.recovery_until.isnot(None),
-        models.TempMailbox.recovery_until <= now,
-    ).order_by(models.TempMailbox.recovery_until.asc()).limit(batch_size).all()
-
-    for mailbox in to_purge:
-        try:
-            delete_mail_user(mailbox.email)
-        except Exception as e:
-            logger.warning(f"清理邮箱时删除 mailserver 账户失败: {mailbox.email}, err={e}")
+    batch_size = _batch_size(policy, limit)
 
+    started = time.monotonic()
+    total = 0
+    while time.monotonic() - started < time_budget_seconds:
+        rows = db.execute(build_purge_batch_statement(now, batch_size, _purge_cursor(policy))).all()
+        emails = [row.email for row in rows]
         if policy.delete_emails_on_purge:
-            db.query(models.Email).filter(models.Email.mailbox_address == mailbox.email).delete(synchronize_session=False)
+            delete_emails_for_mailboxes(db, emails)
+        if len(rows) < batch_size:
+            # 到达末尾，下次从头扫描
+            policy.purge_cursor_recovery_until, policy.purge_cursor_id = None, None
+        else:
+            last = max(rows, key=lambda row: (row.recovery_until, row.id))
+            policy.purge_cursor_recovery_until, policy.purge_cursor_id = last.recovery_until, last.id
+        ensure_job_lease(db)
+        db.commit()
+
+        if emails:
+            mail_provisioner.submit_delete_many(emails)
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+    _record_throughput(policy, "purge", total, time.monotonic() - started)
+    return total
+
+
+def reconcile_mailserver_accounts(db: Session) -> int:
+    """
+    删除 mailserver 中仍存在、但临时邮箱已过期或已清理的账户
+    只处理 temp_mailboxes 中的非活跃地址，不会动正式用户账户
+    """
+    existing = sorted(get_existing_mail_users())
+    tm = models.TempMailbox
+    stale: List[str] = []
+    for start in range(0, len(existing), RECONCILE_CHUNK_SIZE):
+        chunk = existing[start:start + RECONCILE_CHUNK_SIZE]
+        stale.extend(db.execute(
+            select(tm.email).where(
+                tm.email == any_(literal(chunk, type_=ARRAY(String))),
+                tm.status != STATUS_ACTIVE,
+            )
+        ).scalars())
+    if stale:
+        logger.info(f"对账发现 {len(stale)} 个已停用临时邮箱仍有 mailserver 账户，提交删除")
+        mail_provisioner.submit_delete_many(stale)
+    return len(stale)
+
+
+def _reconcile_if_due(db: Session) -> Optional[int]:
+    global _last_reconcile_at
+    now = time.monotonic()
+    if _last_reconcile_at is not None and now - _last_reconcile_at < RECONCILE_INTERVAL_SECONDS:
+        return None
+    _last_reconcile_at = now
+    try:
+        return reconcile_mailserver_accounts(db)
+    except Exception as e:
+        logger.warning(f"mailserver 账户对账失败: {e}")
+        return None
+
+
+def _purge_cursor(policy) -> Optional[Tuple[datetime, int]]:
+    if policy.purge_cursor_id is None:
+        return None
+    return policy.purge_cursor_recovery_until, policy.purge_cursor_id
+
+
+def _record_throughput(policy, job: str, count: int, elapsed: float) -> None:
+    """最近一次运行的吞吐量写在策略行上（随调用方提交），API 进程也能读到 worker 的结果"""
+    metrics = dict(policy.last_run_metrics or {})
+    metrics[job] = {
+        "count": count,
+        "elapsed_seconds": round(elapsed, 3),
+        "per_second": round(count / elapsed, 1) if elapsed > 0 else float(count),
+        "finished_at": _now_utc().isoformat(),
+    }
+    # 重新赋值，JSON 列原地修改不会被跟踪
+    policy.last_run_metrics = metrics
 
-        mailbox.status = STATUS_PURGED
-        mailbox.is_active = False
-        mailbox.purged_at = now
 
-    return len(to_purge)
+def get_lifecycle_metrics(db: Session) -> dict:
+    """最近一次运行的吞吐量与当前积压"""
+    policy = get_or_create_policy(db)
+    cursor = _purge_cursor(policy)
+    return {
+        "last_run": dict(policy.last_run_metrics or {}),
+        "purge_cursor": {
+            "recovery_until": cursor[0].isoformat(),
+            "id": cursor[1],
+        } if cursor else None,
+        **count_backlog(db),
+    }
 
 
 def run_temp_mailbox_maintenance(
@@ -143,6 +393,9 @@ def run_temp_mailbox_maintenance(
     should_run_cleanup = False
     if force_cleanup:
         should_run_cleanup = True
+    elif policy.cleanup_enabled and policy.purge_cursor_id is not None:
+        # 上一轮因时间预算中断，继续消化积压
+        should_run_cleanup = True
     elif policy.cleanup_enabled:
         if not policy.last_cleanup_at:
             should_run_cleanup = True
@@ -157,10 +410,16 @@ def run_temp_mailbox_maintenance(
         policy.last_cleanup_count = purged_count
 
     db.commit()
+    reconciled_count = _reconcile_if_due(db)
+    if expired_count or purged_count:
+        # 状态批量变化，账号池统计全部失效（延迟导入避免循环依赖）
+        from core.pool_stats import invalidate_all_user_stats
+        invalidate_all_user_stats()
     return {
         "expired_count": expired_count,
         "purged_count": purged_count,
         "cleanup_ran": should_run_cleanup,
+        "reconciled_count": reconciled_count,
         "policy": {
             "cleanup_enabled": policy.cleanup_enabled,
             "ttl_hours": policy.ttl_hours,
@@ -1,15 +1,185 @@
 """
 模板渲染引擎 - 阶段一核心组件，阶段二复用
 负责处理模板变量替换、全局变量注入等
+
+模板在首次使用时被编译为节点列表（文本 / 变量 / 条件块），之后每次渲染只做一次线性遍历。
+编译结果在进程内缓存：
+- 任意模板字符串按内容缓存（LRU）
+- 系统邮件模板按 (code, updated_at) 缓存，模板或全局变量被编辑时主动失效
 """
 import re
-from typing import Dict, Any, Optional, Tuple
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple, List, Union
 from sqlalchemy.orm import Session
 from datetime import datetime
 
 from db.models.template import GlobalVariable
 from db.models.system import SystemEmailTemplate
 from core.config import settings
+from core.config_cache import ConfigCache
+
+
+# 一次扫描识别三类标签：{{#if var}}、{{/if}}、{{variable}} / {{variable|default:"value"}}
+_TOKEN_PATTERN = re.compile(r'\{\{(?:#if\s+(\w+)|(/if)|([^#/][^}]*?))\}\}')
+_DEFAULT_VALUE_PATTERN = re.compile(r'["\'](.+?)["\']')
+_FALSY_STRINGS = frozenset(['', '0', 'false', 'False', 'null', 'None'])
+
+# 按内容缓存的临时模板字符串数量上限
+COMPILED_STRING_CACHE_SIZE = 512
+
+
+@dataclass(frozen=True)
+class VariableNode:
+    """变量节点 {{name}} / {{name|default:"value"}}"""
+    name: str
+    default: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ConditionalNode:
+    """条件节点 {{#if name}}...{{/if}}"""
+    name: str
+    children: Tuple["TemplateNode", ...]
+
+
+TemplateNode = Union[str, VariableNode, ConditionalNode]
+
+
+def _parse_variable(content: str) -> Optional[VariableNode]:
+    """解析变量标签内容，空内容返回 None（保留原文）"""
+    content = content.strip()
+    if not content:
+        return None
+
+    if '|default:' in content:
+        parts = content.split('|default:')
+        default_match = _DEFAULT_VALUE_PATTERN.search(parts[1])
+        return VariableNode(
+            name=parts[0].strip(),
+            default=default_match.group(1) if default_match else None,
+        )
+    return VariableNode(name=content)
+
+
+@lru_cache(maxsize=COMPILED_STRING_CACHE_SIZE)
+def compile_template(template_str: str) -> Tuple[TemplateNode, ...]:
+    """
+    将模板字符串编译为节点元组
+
+    未闭合的 {{#if}} 与多余的 {{/if}} 按原文保留，与旧版正则实现保持一致。
+    """
+    # 栈中每一层为 (条件变量名, 开始标签原文, 已收集的子节点)
+    stack: List[Tuple[Optional[str], str, List[TemplateNode]]] = [(None, '', [])]
+    position = 0
+
+    for match in _TOKEN_PATTERN.finditer(template_str):
+        if match.start() > position:
+            stack[-1][2].append(template_str[position:match.start()])
+        position = match.end()
+
+        if_name, end_if, variable = match.groups()
+        if if_name is not None:
+            stack.append((if_name, match.group(0), []))
+        elif end_if is not None:
+            if len(stack) > 1:
+                name, _, children = stack.pop()
+                stack[-1][2].append(ConditionalNode(name=name, children=tuple(children)))
+            else:
+                stack[-1][2].append(match.group(0))
+        else:
+            node = _parse_variable(variable)
+            stack[-1][2].append(node if node is not None else match.group(0))
+
+    if position < len(template_str):
+        stack[-1][2].append(template_str[position:])
+
+    # 未闭合的条件块：开始标签按原文输出，其内容提升到上一层
+    while len(stack) > 1:
+        _, opening, children = stack.pop()
+        stack[-1][2].append(opening)
+        stack[-1][2].extend(children)
+
+    return tuple(stack[0][2])
+
+
+def _is_truthy(value: Any) -> bool:
+    """判断真值：非空字符串、非零数字、非空列表等"""
+    if not value:
+        return False
+    try:
+        return value not in _FALSY_STRINGS
+    except TypeError:
+        # 不可哈希的值（如 list/dict）只要非空即为真
+        return True
+
+
+def _render_nodes(nodes: Tuple[TemplateNode, ...], context: Dict[str, Any], out: List[str]) -> None:
+    for node in nodes:
+        if isinstance(node, str):
+            out.append(node)
+        elif isinstance(node, VariableNode):
+            value = context.get(node.name)
+            # 如果变量不存在或为空，使用默认值；无默认值时替换为空字符串
+            if value is None or value == '':
+                value = node.default if node.default is not None else ''
+            out.append(str(value))
+        elif _is_truthy(context.get(node.name)):
+            _render_nodes(node.children, context, out)
+
+
+def render_compiled(nodes: Tuple[TemplateNode, ...], context: Dict[str, Any]) -> str:
+    """渲染已编译的模板"""
+    out: List[str] = []
+    _render_nodes(nodes, context, out)
+    return ''.join(out)
+
+
+@dataclass(frozen=True)
+class CompiledEmailTemplate:
+    """已编译的系统邮件模板"""
+    code: str
+    updated_at: Optional[datetime]
+    subject: Tuple[TemplateNode, ...]
+    body_html: Tuple[TemplateNode, ...]
+    body_text: Tuple[TemplateNode, ...]
+
+
+_cache_lock = threading.Lock()
+# (code, updated_at) -> CompiledEmailTemplate
+_compiled_email_templates: Dict[Tuple[str, Optional[datetime]], CompiledEmailTemplate] = {}
+
+
+def invalidate_template_cache(code: Optional[str] = None) -> None:
+    """
+    使系统邮件模板的编译缓存失效
+
+    Args:
+        code: 模板代码；为空时清空全部
+    """
+    with _cache_lock:
+        if code is None:
+            _compiled_email_templates.clear()
+            return
+        for key in [k for k in _compiled_email_templates if k[0] == code]:
+            del _compiled_email_templates[key]
+
+
+def _load_global_variable_defs(db: Session) -> List[Tuple[str, str, str]]:
+    rows = db.query(GlobalVariable.key, GlobalVariable.value, GlobalVariable.value_type).filter(
+        GlobalVariable.is_active == True
+    ).all()
+    return [(row.key, row.value, row.value_type) for row in rows]
+
+
+# 全局变量定义：[(key, value, value_type), ...]，dynamic 类型在渲染时计算
+global_variables_cache = ConfigCache("global_variables", _load_global_variable_defs)
+
+
+def invalidate_global_variables_cache() -> None:
+    """使全局变量缓存失效（全局变量被编辑后调用，会通知其他 worker）"""
+    global_variables_cache.invalidate()
 
 
 class TemplateEngine:
@@ -22,38 +192,33 @@ class TemplateEngine:
         if self._global_vars_cache is not None:
             return self._global_vars_cache
 
-        # 从数据库获取
-        db_vars = self.db.query(GlobalVariable).filter(
-            GlobalVariable.is_active == True
-        ).all()
-        
         variables = {}
-        for var in db_vars:
-            if var.value_type == 'config':
+        for key, value, value_type in global_variables_cache.get(self.db):
+            if value_type == 'config':
                 # 从配置读取
-                if var.key == 'app_name':
-                    variables[var.key] = settings.APP_NAME
-                elif var.key == 'site_url':
+                if key == 'app_name':
+                    variables[key] = settings.APP_NAME
+                elif key == 'site_url':
                     # 使用 DOMAIN 构建网站 URL
-                    variables[var.key] = f"https://{settings.DOMAIN}"
-                elif var.key == 'support_email':
-                    variables[var.key] = f"support@{settings.BASE_DOMAIN}"
-                elif var.key == 'company_name':
-                    variables[var.key] = getattr(settings, 'COMPANY_NAME', settings.APP_NAME)
+                    variables[key] = f"https://{settings.DOMAIN}"
+                elif key == 'support_email':
+                    variables[key] = f"support@{settings.BASE_DOMAIN}"
+                elif key == 'company_name':
+                    variables[key] = getattr(settings, 'COMPANY_NAME', settings.APP_NAME)
                 else:
-                    variables[var.key] = var.value
-            elif var.value_type == 'dynamic':
+                    variables[key] = value
+            elif value_type == 'dynamic':
                 # 动态计算
-                if var.key == 'current_year':
-                    variables[var.key] = str(datetime.now().year)
-                elif var.key == 'current_date':
-                    variables[var.key] = datetime.now().strftime('%Y-%m-%d')
+                if key == 'current_year':
+                    variables[key] = str(datetime.now().year)
+                elif key == 'current_date':
+                    variables[key] = datetime.now().strftime('%Y-%m-%d')
                 else:
-                    variables[var.key] = var.value
+                    variables[key] = value
             else:
                 # 静态值
-                variables[var.key] = var.value
-        
+                variables[key] = value
+
         self._global_vars_cache = variables
         return variables
 
@@ -62,113 +227,66 @@ class TemplateEngine:
         渲染模板字符串
         支持 {{variable}} 格式
         支持 {{variable|default:"value"}} 格式
-        支持 {{#if variable}}...{{/if}} 条件语法
+        支持 {{#if variable}}...{{/if}} 条件语法（可嵌套）
         """
         if not template_str:
             return ""
 
-        # 获取全局变量并合并上下文
-        global_vars = self.get_global_variables()
-        full_context = {**global_vars, **context}
-        
-        result = template_str
-        
-        # 1. 首先处理条件语法 {{#if variable}}...{{/if}}
-        result = self._process_conditionals(result, full_context)
-        
-        # 2. 然后处理变量替换 {{variable}} 和 {{variable|default:"value"}}
-        result = self._process_variables(result, full_context)
-            
-        return result
-    
-    def _process_conditionals(self, template_str: str, context: Dict[str, Any]) -> str:
-        """
-        处理条件语法 {{#if variable}}...{{/if}}
-        支持嵌套条件
-        """
-        # 使用非贪婪匹配处理条件块
-        # 匹配 {{#if var}}...{{/if}}，支持多行
-        pattern = r'\{\{#if\s+(\w+)\}\}(.*?)\{\{/if\}\}'
-        
-        def replace_conditional(match):
-            var_name = match.group(1)
-            content = match.group(2)
-            
-            # 检查变量是否存在且为真值
-            value = context.get(var_name)
-            
-            # 判断真值：非空字符串、非零数字、非空列表等
-            is_truthy = bool(value) and value not in ['', '0', 'false', 'False', 'null', 'None']
-            
-            if is_truthy:
-                # 递归处理嵌套条件
-                return self._process_conditionals(content, context)
-            else:
-                return ''
-        
-        # 使用 re.DOTALL 让 . 匹配换行符
-        result = re.sub(pattern, replace_conditional, template_str, flags=re.DOTALL)
-        
-        return result
-    
-    def _process_variables(self, template_str: str, context: Dict[str, Any]) -> str:
-        """
-        处理变量替换 {{variable}} 和 {{variable|default:"value"}}
-        """
-        result = template_str
-        
-        # 查找所有 {{...}} 模式（排除条件语法）
-        matches = list(re.finditer(r'\{\{([^#/][^}]*?)\}\}', template_str))
-        
-        for match in matches:
-            full_match = match.group(0)
-            content = match.group(1).strip()
-            
-            # 跳过空内容
-            if not content:
-                continue
-            
-            # 处理默认值过滤器 |default:"..."
-            default_value = None
-            if '|default:' in content:
-                parts = content.split('|default:')
-                var_name = parts[0].strip()
-                # 提取引号中的默认值
-                default_match = re.search(r'["\'](.+?)["\']', parts[1])
-                if default_match:
-                    default_value = default_match.group(1)
-            else:
-                var_name = content
-            
-            # 获取变量值
-            value = context.get(var_name)
-            
-            # 如果变量不存在或为空，使用默认值
-            if value is None or value == '':
-                if default_value is not None:
-                    value = default_value
-                else:
-                    # 变量未找到且无默认值，替换为空字符串（更干净的输出）
-                    value = ''
-            
-            result = result.replace(full_match, str(value), 1)
-            
-        return result
+        return render_compiled(compile_template(template_str), self._build_context(context))
 
-    def render_template(self, template_code: str, context: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    def _build_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """获取全局变量并合并上下文"""
+        return {**self.get_global_variables(), **context}
+
+    def get_compiled_template(self, template_code: str) -> Optional[CompiledEmailTemplate]:
         """
-        渲染完整模板，返回 subject, body_html, body_text
+        获取已编译的系统邮件模板
+
+        只查询模板版本 (id, updated_at)，命中缓存时不加载模板正文。
         """
-        template = self.db.query(SystemEmailTemplate).filter(
+        version = self.db.query(SystemEmailTemplate.id, SystemEmailTemplate.updated_at).filter(
             SystemEmailTemplate.code == template_code,
             SystemEmailTemplate.is_active == True
         ).first()
-        
+        if not version:
+            return None
+
+        cache_key = (template_code, version.updated_at)
+        compiled = _compiled_email_templates.get(cache_key)
+        if compiled is not None:
+            return compiled
+
+        template = self.db.query(SystemEmailTemplate).filter(
+            SystemEmailTemplate.id == version.id
+        ).first()
         if not template:
             return None
-            
+
+        compiled = CompiledEmailTemplate(
+            code=template.code,
+            updated_at=template.updated_at,
+            subject=compile_template(template.subject or ""),
+            body_html=compile_template(template.body_html or ""),
+            body_text=compile_template(template.body_text or ""),
+        )
+        with _cache_lock:
+            # 同一模板只保留最新版本
+            for key in [k for k in _compiled_email_templates if k[0] == template_code]:
+                del _compiled_email_templates[key]
+            _compiled_email_templates[(template.code, template.updated_at)] = compiled
+        return compiled
+
+    def render_template(self, template_code: str, context: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """
+        渲染完整模板，返回 subject, body_html, body_text
+        """
+        compiled = self.get_compiled_template(template_code)
+        if not compiled:
+            return None
+
+        full_context = self._build_context(context)
         return {
-            "subject": self.render(template.subject, context),
-            "body_html": self.render(template.body_html, context),
-            "body_text": self.render(template.body_text or "", context)
-        }
\ No newline at end of file
+            "subject": render_compiled(compiled.subject, full_context),
+            "body_html": render_compiled(compiled.body_html, full_context),
+            "body_text": render_compiled(compiled.body_text, full_context)
+        }
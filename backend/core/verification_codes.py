@@ -0,0 +1,107 @@
+"""
+验证码提取
+
+邮件入库时（LMTP / IMAP 同步）提取一次验证码并写入 emails.verification_code，
+读取接口直接使用该列，不再对正文重复执行正则。
+
+规则按顺序匹配，先命中者生效；可通过 register_pattern 追加规则。
+HTML 邮件先转换为纯文本再匹配，避免命中标签属性中的数字。
+"""
+import html
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Pattern
+
+# 正文过长时只扫描开头部分，验证码几乎总在前面
+MAX_SCAN_CHARS = 20000
+CODE_MAX_LENGTH = 32
+
+
+@dataclass(frozen=True)
+class CodePattern:
+    name: str
+    regex: Pattern
+    group: int = 1
+
+
+@dataclass(frozen=True)
+class CodeMatch:
+    code: str
+    pattern: str
+
+
+_patterns: List[CodePattern] = [
+    CodePattern("zh_label", re.compile(r'验证码(?:是)?[：:\s]*([A-Za-z0-9]{4,8})', re.IGNORECASE)),
+    CodePattern("en_verification_code", re.compile(r'verification code(?: is)?[：:\s]*([A-Za-z0-9]{4,8})', re.IGNORECASE)),
+    CodePattern("en_code_label", re.compile(r'code[：:\s]+([A-Za-z0-9]{4,8})', re.IGNORECASE)),
+    CodePattern("standalone_digits", re.compile(r'(?:^|\s)(\d{4,8})(?:\s|$)')),
+]
+
+_SCRIPT_STYLE = re.compile(r'<(script|style|head)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_BLOCK_TAGS = re.compile(r'<\s*(br|/p|/div|/tr|/li|/h[1-6]|/td)\b[^>]*>', re.IGNORECASE)
+_TAGS = re.compile(r'<[^>]+>')
+_HTML_COMMENTS = re.compile(r'<!--.*?-->', re.DOTALL)
+_INLINE_SPACES = re.compile(r'[ \t\r\f\v\u00a0]+')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+
+def register_pattern(name: str, pattern: str, flags: int = re.IGNORECASE, group: int = 1, index: Optional[int] = None) -> None:
+    """
+    追加验证码规则
+
+    Args:
+        name: 规则名称，会随验证码一起存储
+        pattern: 正则表达式，验证码所在的分组由 group 指定
+        index: 插入位置，默认追加到末尾（优先级最低）
+    """
+    code_pattern = CodePattern(name, re.compile(pattern, flags), group)
+    if index is None:
+        _patterns.append(code_pattern)
+    else:
+        _patterns.insert(index, code_pattern)
+
+
+def get_patterns() -> List[CodePattern]:
+    return list(_patterns)
+
+
+def html_to_text(body_html: str) -> str:
+    """将 HTML 转为用于匹配的纯文本"""
+    text = _HTML_COMMENTS.sub(' ', body_html)
+    text = _SCRIPT_STYLE.sub(' ', text)
+    text = _BLOCK_TAGS.sub('\n', text)
+    text = _TAGS.sub(' ', text)
+    text = html.unescape(text)
+    text = _INLINE_SPACES.sub(' ', text)
+    return _BLANK_LINES.sub('\n', text).strip()
+
+
+def find_code(text: str) -> Optional[CodeMatch]:
+    """在纯文本中查找验证码"""
+    if not text:
+        return None
+    text = text[:MAX_SCAN_CHARS]
+    for code_pattern in _patterns:
+        match = code_pattern.regex.search(text)
+        if match:
+            code = match.group(code_pattern.group)
+            if code and len(code) <= CODE_MAX_LENGTH:
+                return CodeMatch(code=code, pattern=code_pattern.name)
+    return None
+
+
+def extract_code(body_text: Optional[str], body_html: Optional[str] = None) -> Optional[CodeMatch]:
+    """从邮件正文提取验证码：优先纯文本正文，没有纯文本时使用 HTML 转换后的文本"""
+    if body_text:
+        return find_code(body_text)
+    if body_html:
+        return find_code(html_to_text(body_html))
+    return None
+
+
+def apply_verification_code(email_obj) -> Optional[CodeMatch]:
+    """提取验证码并写入 Email 对象的 verification_code / verification_code_pattern"""
+    match = extract_code(email_obj.body_text, email_obj.body_html)
+    email_obj.verification_code = match.code if match else None
+    email_obj.verification_code_pattern = match.pattern if match else None
+    return match
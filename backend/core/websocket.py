@@ -1,11 +1,25 @@
-"""WebSocket 连接管理，用于实时推送新邮件通知"""
+"""WebSocket 连接管理，用于实时推送新邮件通知
+
+入库（LMTP / IMAP 同步）可能在 ingest 进程或其他 worker 中完成，新邮件事件通过
+Postgres NOTIFY 广播（复用配置缓存的监听连接），每个进程只推送给自己持有的连接。
+"""
 from fastapi import WebSocket
-from typing import Dict, Set
+from typing import Dict, Optional, Set
+import asyncio
 import json
 import logging
 
+from core import config_cache
+
 logger = logging.getLogger(__name__)
 
+NOTIFY_CHANNEL = "talentmail_new_email"
+# NOTIFY 负载上限 8000 字节，主题截断后再发送
+MAX_SUBJECT_LENGTH = 200
+
+# 连接所在的事件循环，监听线程收到通知后切回该循环发送
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
 # 存储每个用户的 WebSocket 连接
 # key: user_id, value: set of WebSocket connections
 connections: Dict[int, Set[WebSocket]] = {}
@@ -13,6 +27,8 @@ connections: Dict[int, Set[WebSocket]] = {}
 
 async def connect(websocket: WebSocket, user_id: int):
     """添加用户连接"""
+    global _loop
+    _loop = asyncio.get_running_loop()
     await websocket.accept()
     if user_id not in connections:
         connections[user_id] = set()
@@ -69,4 +85,28 @@ async def broadcast_to_user(user_id: int, message_type: str, data: dict = None):
             dead_connections.add(ws)
     
     for ws in dead_connections:
-        connections[user_id].discard(ws)
\ No newline at end of file
+        connections[user_id].discard(ws)
+
+
+def publish_new_email(user_id: int, subject: str, sender: str) -> None:
+    """入库路径调用（任意线程 / 进程）：通知持有该用户连接的进程推送新邮件"""
+    payload = {
+        "user_id": user_id,
+        "data": {"subject": (subject or "")[:MAX_SUBJECT_LENGTH], "sender": sender or ""},
+    }
+    config_cache.publish(NOTIFY_CHANNEL, json.dumps(payload, ensure_ascii=False))
+
+
+def _handle_notification(payload: str) -> None:
+    message = json.loads(payload)
+    user_id = message["user_id"]
+    if user_id not in connections or _loop is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(notify_new_email(user_id, message.get("data")), _loop)
+    except RuntimeError:
+        # 事件循环已关闭
+        pass
+
+
+config_cache.register_channel_handler(NOTIFY_CHANNEL, _handle_notification)
@@ -2,10 +2,12 @@
 工作流服务核心模块
 负责工作流的执行、状态管理和节点处理
 """
+import asyncio
 import logging
 import json
 import random
 import string
+import weakref
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 from sqlalchemy.orm import Session
@@ -31,11 +33,28 @@ logger = logging.getLogger(__name__)
 WorkflowContext = RuntimeContext
 
 
+# 会话 -> 锁，同一会话上的线程池数据库操作串行执行
+_session_locks: "weakref.WeakKeyDictionary[Session, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+
 class NodeHandler:
     """节点处理器基类"""
     
     def __init__(self, db: Session):
         self.db = db
+
+    async def run_db(self, func, *args):
+        """
+        在线程池中执行同步数据库操作，避免阻塞事件循环
+        并行分支共享同一个会话，同一会话上的操作通过锁串行执行。
+        会话不是线程安全的：add、提交后读取 ORM 属性（提交会使对象过期，读取时触发 SELECT）、
+        使用会话的模板 / 邮件服务都要放在同一个 func 里执行，事件循环上只使用 func 返回的普通值
+        """
+        lock = _session_locks.get(self.db)
+        if lock is None:
+            lock = _session_locks[self.db] = asyncio.Lock()
+        async with lock:
+            return await asyncio.to_thread(func, *args)
     
     async def execute(self, node_config: Dict[str, Any], context: WorkflowContext) -> Tuple[bool, Dict[str, Any], Optional[str]]:
         """
@@ -85,8 +104,11 @@ class GenerateCodeHandler(NodeHandler):
                 purpose=purpose,
                 expires_at=expire_time
             )
-            self.db.add(verification)
-            self.db.commit()
+            def save():
+                self.db.add(verification)
+                self.db.commit()
+
+            await self.run_db(save)
             print(f"[GenerateCodeHandler] Saved code {code} for {email}")
         else:
             print(f"[GenerateCodeHandler] No email provided, code {code} generated in memory only.")
@@ -129,14 +151,21 @@ class SendTemplateEmailHandler(NodeHandler):
         # - template_data (for rendering)
         try:
             mail_service = MailService(self.db)
-            
-            # Use the high-level send_template_email which handles loading + rendering
-            await mail_service.send_template_email(
-                to=to_email,
-                template_code=template_code,
-                template_data=template_vars
+
+            # 渲染需要查询模板与全局变量，在会话锁内执行；SMTP 发送不占用会话锁
+            rendered = await self.run_db(mail_service.template_engine.render_template, template_code, template_vars)
+            if not rendered:
+                raise ValueError(f"Template not found or inactive: {template_code}")
+            sent = await asyncio.to_thread(
+                mail_service.send_raw,
+                to_email=to_email,
+                subject=rendered["subject"],
+                body_html=rendered["body_html"],
+                body_text=rendered["body_text"],
             )
-            
+            if not sent:
+                raise RuntimeError(f"Failed to send {template_code} to {to_email}")
+
             print(f"[SendTemplateEmailHandler] Sent {template_code} to {to_email}")
             return {
                 'status': 'sent',
@@ -228,24 +257,29 @@ class CreateUserHandler(NodeHandler):
         if not email or not password:
             return False, {'error': 'Email and password are required'}, None
         
-        # 检查用户是否已存在
-        existing = self.db.query(User).filter(User.email == email).first()
-        if existing:
+        hashed_password = get_password_hash(password)
+
+        def create():
+            # 检查用户是否已存在
+            if self.db.query(User).filter(User.email == email).first():
+                return None
+            # 创建用户
+            user = User(
+                email=email,
+                display_name=display_name,
+                password_hash=hashed_password,
+            )
+            self.db.add(user)
+            self.db.commit()
+            self.db.refresh(user)
+            return user.id, user.email
+
+        created = await self.run_db(create)
+        if created is None:
             return False, {'error': 'User already exists'}, None
-        
-        # 创建用户
-        user = User(
-            email=email,
-            display_name=display_name,
-            hashed_password=get_password_hash(password),
-            is_active=True,
-            is_verified=True  # 如果通过验证码流程，则已验证
-        )
-        self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
-        
-        return True, {'user_id': user.id, 'user_email': user.email}, None
+
+        user_id, user_email = created
+        return True, {'user_id': user_id, 'user_email': user_email}, None
 
 
 class VerifyCodeHandler(NodeHandler):
@@ -259,22 +293,26 @@ class VerifyCodeHandler(NodeHandler):
         if not email or not code:
             return True, {'valid': False, 'error': 'Email and code required'}, 'invalid'
         
-        # 查找验证码
-        verification = self.db.query(VerificationCode).filter(
-            and_(
-                VerificationCode.email == email,
-                VerificationCode.code == code,
-                VerificationCode.purpose == purpose,
-                VerificationCode.is_used == False,
-                VerificationCode.expires_at > datetime.utcnow()
-            )
-        ).first()
-        
-        if verification:
+        def consume() -> bool:
+            # 查找验证码
+            verification = self.db.query(VerificationCode).filter(
+                and_(
+                    VerificationCode.email == email,
+                    VerificationCode.code == code,
+                    VerificationCode.purpose == purpose,
+                    VerificationCode.is_used == False,
+                    VerificationCode.expires_at > datetime.utcnow()
+                )
+            ).first()
+            if not verification:
+                return False
             # 标记为已使用
             verification.is_used = True
             verification.used_at = datetime.utcnow()
             self.db.commit()
+            return True
+
+        if await self.run_db(consume):
             return True, {'valid': True}, 'valid'
         else:
             return True, {'valid': False, 'error': 'Invalid or expired code'}, 'invalid'
@@ -292,12 +330,15 @@ class VerifyPasswordHandler(NodeHandler):
         if not email or not password:
             return True, {'valid': False, 'error': 'Email and password required'}, 'invalid'
         
-        user = self.db.query(User).filter(User.email == email).first()
-        
+        # 在会话锁内取出需要的字段：其他分支的提交会使对象过期，事件循环上再读属性会触发查询
+        user = await self.run_db(lambda: self.db.query(
+            User.id, User.email, User.display_name, User.password_hash
+        ).filter(User.email == email).first())
+
         if not user:
             return True, {'valid': False, 'error': 'User not found'}, 'invalid'
-        
-        if verify_password(password, user.hashed_password):
+
+        if verify_password(password, user.password_hash):
             # 将用户信息添加到上下文
             context.set_variable('user_id', user.id)
             context.set_variable('user_email', user.email)
@@ -314,9 +355,9 @@ class LogHandler(NodeHandler):
         message = node_config.get('message', '')
         level = node_config.get('level', 'info')
         
-        # 变量替换
+        # 变量替换（全局变量可能需要查询，在会话锁内执行）
         engine = TemplateEngine(self.db)
-        rendered_message = engine.render(message, context.variables)
+        rendered_message = await self.run_db(engine.render, message, context.variables)
         
         if level == 'warning':
             logger.warning(f"[Workflow] {rendered_message}")
@@ -730,23 +771,38 @@ class DataUpdateUserHandler(NodeHandler):
             return {'success': False, 'error': 'user_id is required'}
 
         try:
-            user = self.db.query(User).filter(User.id == int(user_id)).first()
-            if not user:
-                return {'success': False, 'error': f'User {user_id} not found'}
+            hashed_password = get_password_hash(updates['password']) if 'password' in updates else None
+
+            def apply_updates():
+                user = self.db.query(User).filter(User.id == int(user_id)).first()
+                if not user:
+                    return None
+                # 应用更新
+                for key, value in updates.items():
+                    if key == 'password':
+                        # 密码需要加密
+                        user.password_hash = hashed_password
+                    elif hasattr(user, key):
+                        setattr(user, key, value)
+                # 提交前取 ID：提交后对象过期，读取属性会再查询一次
+                updated_id = user.id
+                self.db.commit()
+                return updated_id
 
-            # 应用更新
-            for key, value in updates.items():
-                if key == 'password':
-                    # 密码需要加密
-                    user.hashed_password = get_password_hash(value)
-                elif hasattr(user, key):
-                    setattr(user, key, value)
+            updated_id = await self.run_db(apply_updates)
+            if updated_id is None:
+                return {'success': False, 'error': f'User {user_id} not found'}
 
-            self.db.commit()
+            if 'role' in updates or 'pool_enabled' in updates:
+                from core.api_key_cache import invalidate_api_key_owner
+                invalidate_api_key_owner(updated_id)
+            if {'password', 'role', 'pool_enabled'} & set(updates):
+                from core.principal_cache import invalidate_user_principals
+                invalidate_user_principals(updated_id)
 
             return {
                 'success': True,
-                'user_id': user.id,
+                'user_id': updated_id,
                 'updated_fields': list(updates.keys())
             }
         except Exception as e:
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from db import models
 from schemas.user import UserCreate
 from core import security
+from core.principal_cache import invalidate_user_principals
 from typing import Optional
 from datetime import datetime, timezone
 
@@ -42,13 +43,7 @@ def get_user_by_email(db: Session, email: str):
     """
     Retrieves a user from the database by their email address.
     """
-    logger.info(f"正在数据库中查询邮箱: {email}")
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user:
-        logger.info(f"成功找到用户，ID: {user.id}")
-    else:
-        logger.info(f"未找到邮箱为 {email} 的用户。")
-    return user
+    return db.query(models.User).filter(models.User.email == email).first()
 
 
 def create_default_folders_for_user(db: Session, user_id: int):
@@ -193,6 +188,7 @@ def reset_user_password(db: Session, email: str, new_password: str) -> Optional[
         db.add(user)
         db.commit()
         db.refresh(user)
+        invalidate_user_principals(user.id)
         logger.info(f"用户 '{email}' 的数据库密码已成功重置。")
         
         # 同步更新邮件服务器密码
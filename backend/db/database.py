@@ -1,19 +1,38 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from core.config import settings
+from db.pooling import engine_options
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL_DOCKER
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    connect_args={}
-)
+
+def to_async_database_url(url: str) -> str:
+    """把同步连接串（postgresql:// 或 postgresql+psycopg2://）转换为 asyncpg 驱动"""
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options("primary"))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 只读副本：列表、搜索、统计等只读查询走这里；未配置副本时复用主库引擎
+if settings.DATABASE_READ_REPLICA_URL:
+    read_engine = create_engine(settings.DATABASE_READ_REPLICA_URL, **engine_options("replica"))
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# 异步引擎：供 async def 路由使用，查询期间不阻塞事件循环
+async_engine = create_async_engine(
+    to_async_database_url(SQLALCHEMY_DATABASE_URL),
+    **engine_options("async", is_async=True),
+)
+# 提交后不过期对象，避免在返回响应时触发隐式的懒加载
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Dependency to get a DB session
@@ -27,3 +46,25 @@ def get_db():
         raise
     finally:
         db.close()
+
+
+# Dependency to get a read-only DB session (replica if configured)
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        # 只读会话从不提交，副本上也无法提交
+        db.rollback()
+        db.close()
+
+
+# Dependency to get an async DB session (for async def routes)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
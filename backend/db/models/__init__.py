@@ -3,11 +3,11 @@ from db.database import Base
 
 # Import all models to make them accessible via this package.
 from .user import User, UserSession, PoolActivityLog, BlockedSender, TrustedSender, SpamReport
-from .email import Folder, Email, Attachment, Signature, Alias, TempMailbox, Domain
+from .email import Folder, Email, MailboxEmailStats, Attachment, Signature, Alias, TempMailbox, Domain
 from .billing import Plan, Subscription, Transaction, RedemptionCode, InviteCode, InviteCodeUsage, SubscriptionHistory
 from .features import Contact, Filter, Template, Tag, EmailTag, TrackingPixel, TrackingEvent
-from .system import ServerLog, ApiKey, ApiKeyAuditLog, ReservedPrefix, SystemEmailTemplate, VerificationCode, Changelog, TempMailboxPolicy
-from .external_account import ExternalAccount
+from .system import ServerLog, ApiKey, ApiKeyAuditLog, ReservedPrefix, SystemEmailTemplate, VerificationCode, Changelog, TempMailboxPolicy, PoolStatsRollup, RateLimitCounter, JobLease, SeedFingerprint, MailExportJob, MailImportJob
+from .external_account import ExternalAccount, ExternalFolderState
 from .drive import DriveFile
 from .template import TemplateMetadata, GlobalVariable
 from .automation import AutomationRule, AutomationLog
@@ -37,6 +37,7 @@ __all__ = [
     "SpamReport",
     "Folder",
     "Email",
+    "MailboxEmailStats",
     "Attachment",
     "Signature",
     "Alias",
@@ -64,7 +65,14 @@ __all__ = [
     "VerificationCode",
     "Changelog",
     "TempMailboxPolicy",
+    "PoolStatsRollup",
+    "RateLimitCounter",
+    "JobLease",
+    "SeedFingerprint",
+    "MailExportJob",
+    "MailImportJob",
     "ExternalAccount",
+    "ExternalFolderState",
     "DriveFile",
     "TemplateMetadata",
     "GlobalVariable",
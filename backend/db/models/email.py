@@ -4,9 +4,12 @@ from sqlalchemy import (
     String,
     Boolean,
     Text,
+    Date,
     DateTime,
     func,
+    text,
     ForeignKey,
+    Index,
     UUID as SQLAlchemy_UUID,
 )
 from sqlalchemy.dialects.postgresql import TSVECTOR
@@ -29,10 +32,21 @@ class Folder(Base):
 
 class Email(Base):
     __tablename__ = "emails"
-    __table_args__ = {'comment': '存储所有邮件的核心内容和元数据'}
+    __table_args__ = (
+        # 按邮箱分页列出邮件（临时邮箱收件箱、最近邮件）
+        Index("ix_emails_mailbox_received", "mailbox_address", text("received_at DESC")),
+        # 按邮箱查询最新验证码（/codes/latest）
+        Index(
+            "ix_emails_mailbox_code_received",
+            "mailbox_address",
+            text("received_at DESC"),
+            postgresql_where=text("verification_code IS NOT NULL"),
+        ),
+        {'comment': '存储所有邮件的核心内容和元数据'},
+    )
     id = Column(Integer, primary_key=True, comment="邮件唯一标识符")
     folder_id = Column(Integer, ForeignKey("folders.id"), nullable=False, comment="邮件所在的文件夹ID")
-    mailbox_address = Column(String, index=True, comment="接收该邮件的邮箱地址（用于区分不同别名/域名收到的邮件）")
+    mailbox_address = Column(String, comment="接收该邮件的邮箱地址（用于区分不同别名/域名收到的邮件）")
     message_id = Column(String, unique=False, nullable=True, comment="邮件的全局唯一Message-ID（发送后才有）")
     in_reply_to = Column(String, nullable=True, comment="回复的邮件的Message-ID")
     references = Column(Text, nullable=True, comment="邮件引用链（空格分隔的Message-ID列表）")
@@ -57,10 +71,25 @@ class Email(Base):
     is_purged = Column(Boolean, default=False, comment="是否已从回收站彻底清除")
     # Full-text search vector (PostgreSQL tsvector)
     search_vector = Column(TSVECTOR, nullable=True, comment="全文搜索向量，包含主题、发件人和正文的分词结果")
+    # 入库时提取的验证码
+    verification_code = Column(String(32), nullable=True, comment="入库时提取的验证码")
+    verification_code_pattern = Column(String(64), nullable=True, comment="命中的验证码规则名称")
     folder = relationship("Folder")
     tags = relationship("Tag", secondary="email_tags", backref="emails")
 
 
+class MailboxEmailStats(Base):
+    __tablename__ = "mailbox_email_stats"
+    __table_args__ = {'comment': '按邮箱地址聚合的邮件统计，由 emails 表触发器维护'}
+    mailbox_address = Column(String, primary_key=True, comment="邮箱地址")
+    total_count = Column(Integer, nullable=False, default=0, comment="邮件总数")
+    unread_count = Column(Integer, nullable=False, default=0, comment="未读邮件数")
+    today_date = Column(Date, nullable=True, comment="today_count 对应的日期（UTC）")
+    today_count = Column(Integer, nullable=False, default=0, comment="today_date 当天收到的邮件数")
+    last_received_at = Column(DateTime(timezone=True), nullable=True, comment="最近一封邮件的接收时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), comment="统计更新时间")
+
+
 class Attachment(Base):
     __tablename__ = "attachments"
     __table_args__ = {'comment': '存储邮件附件的信息'}
@@ -101,7 +130,14 @@ class Alias(Base):
 
 class TempMailbox(Base):
     __tablename__ = "temp_mailboxes"
-    __table_args__ = {'comment': '存储用户创建的临时邮箱'}
+    __table_args__ = (
+        # 后台生命周期任务按状态扫描到期行
+        Index("ix_temp_mailboxes_status_expires_at", "status", "expires_at"),
+        Index("ix_temp_mailboxes_status_recovery_until", "status", "recovery_until"),
+        # 按用户聚合账号池统计
+        Index("ix_temp_mailboxes_owner_status", "owner_id", "status"),
+        {'comment': '存储用户创建的临时邮箱'},
+    )
     id = Column(Integer, primary_key=True, comment="临时邮箱唯一标识符")
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, comment="所属用户的ID")
     email = Column(String, unique=True, nullable=False, comment="临时邮箱地址")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Text, DateTime, ForeignKey, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -34,7 +34,32 @@ class ExternalAccount(Base):
     sync_enabled = Column(Boolean, default=True, comment="是否启用同步")
     last_sync_at = Column(DateTime(timezone=True), nullable=True, comment="最后同步时间")
     sync_error = Column(Text, nullable=True, comment="同步错误信息")
+    last_sync_duration_ms = Column(Integer, nullable=True, comment="最近一次同步耗时（毫秒）")
+    last_sync_message_count = Column(Integer, nullable=True, comment="最近一次同步拉取的邮件数")
+    root_folder_id = Column(Integer, ForeignKey("folders.id", ondelete="SET NULL"), nullable=True, comment="本地根文件夹，远端文件夹映射为其子文件夹")
     
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+
+class ExternalFolderState(Base):
+    """外部邮箱单个远端文件夹的增量同步位置"""
+    __tablename__ = "external_folder_states"
+    __table_args__ = (
+        UniqueConstraint("account_id", "remote_name", name="uq_external_folder_states_account_remote"),
+        {'comment': '外部邮箱远端文件夹与本地文件夹的映射及 UID / MODSEQ 同步位置'},
+    )
+
+    id = Column(Integer, primary_key=True, comment="主键")
+    account_id = Column(Integer, ForeignKey("external_accounts.id", ondelete="CASCADE"), nullable=False, comment="外部邮箱账号ID")
+    remote_name = Column(String, nullable=False, comment="远端文件夹名（IMAP modified UTF-7 原文）")
+    local_folder_id = Column(Integer, ForeignKey("folders.id", ondelete="SET NULL"), nullable=True, comment="映射到的本地文件夹")
+    uidvalidity = Column(BigInteger, nullable=True, comment="远端 UIDVALIDITY，变化时从头同步")
+    last_uid = Column(BigInteger, default=0, nullable=False, comment="已同步的最大 UID")
+    highest_modseq = Column(BigInteger, nullable=True, comment="CONDSTORE HIGHESTMODSEQ，未变化时跳过该文件夹")
+    last_synced_at = Column(DateTime(timezone=True), nullable=True, comment="最近同步时间")
+    last_fetched_count = Column(Integer, default=0, nullable=False, comment="最近一次同步拉取的邮件数")
+    last_duration_ms = Column(Integer, nullable=True, comment="最近一次同步耗时（毫秒）")
+    total_fetched_count = Column(BigInteger, default=0, nullable=False, comment="累计拉取的邮件数")
+    last_error = Column(Text, nullable=True, comment="最近一次同步失败的原因，成功后清空")
@@ -60,7 +60,8 @@ class ApiKey(Base):
 
 class ApiKeyAuditLog(Base):
     __tablename__ = "api_key_audit_logs"
-    __table_args__ = {'comment': 'API Key 调用审计日志'}
+    # 按 created_at 按天分区，分区由 core.api_key_audit 创建与清理
+    __table_args__ = {'comment': 'API Key 调用审计日志', 'postgresql_partition_by': 'RANGE (created_at)'}
     id = Column(BigInteger, primary_key=True, autoincrement=True, comment="审计日志唯一标识符")
     api_key_id = Column(Integer, ForeignKey("api_keys.id", ondelete="SET NULL"), nullable=True, index=True, comment="关联的 API Key ID")
     user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True, comment="调用用户ID")
@@ -70,7 +71,7 @@ class ApiKeyAuditLog(Base):
     status_code = Column(Integer, nullable=True, comment="响应状态码")
     decision = Column(String(32), nullable=False, comment="决策结果: allow/deny")
     error_code = Column(String(64), nullable=True, comment="错误类型标识")
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True, comment="创建时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True, index=True, comment="创建时间（分区键）")
     api_key = relationship("ApiKey")
     user = relationship("User")
 
@@ -144,5 +145,111 @@ class TempMailboxPolicy(Base):
     delete_emails_on_purge = Column(Boolean, default=True, nullable=False, comment="清理邮箱时是否删除关联邮件")
     last_cleanup_at = Column(DateTime(timezone=True), nullable=True, comment="最近一次清理执行时间")
     last_cleanup_count = Column(Integer, default=0, nullable=False, comment="最近一次清理处理数量")
+    purge_cursor_recovery_until = Column(DateTime(timezone=True), nullable=True, comment="清理游标：上一批最后一行的恢复截止时间")
+    purge_cursor_id = Column(Integer, nullable=True, comment="清理游标：上一批最后一行的 ID，为空表示从头扫描")
+    last_run_metrics = Column(JSON, nullable=True, comment="最近一次过期/清理运行的吞吐量")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+
+class PoolStatsRollup(Base):
+    """账号池全局统计汇总，由后台任务定时刷新"""
+    __tablename__ = "pool_stats_rollups"
+    __table_args__ = {'comment': '账号池全局统计汇总（管理端仪表盘读取）'}
+
+    scope = Column(String(32), primary_key=True, comment="汇总范围（global）")
+    total_mailboxes = Column(Integer, default=0, nullable=False, comment="未清理的临时邮箱数")
+    active_mailboxes = Column(Integer, default=0, nullable=False, comment="活跃临时邮箱数")
+    recoverable_mailboxes = Column(Integer, default=0, nullable=False, comment="可恢复临时邮箱数")
+    purged_mailboxes = Column(Integer, default=0, nullable=False, comment="已清理临时邮箱数")
+    owners = Column(Integer, default=0, nullable=False, comment="拥有临时邮箱的用户数")
+    total_emails = Column(BigInteger, default=0, nullable=False, comment="临时邮箱邮件总数")
+    unread_emails = Column(BigInteger, default=0, nullable=False, comment="临时邮箱未读邮件数")
+    today_emails = Column(BigInteger, default=0, nullable=False, comment="临时邮箱当天（UTC）收到的邮件数")
+    computed_at = Column(DateTime(timezone=True), nullable=True, comment="汇总计算时间")
+    duration_ms = Column(Integer, default=0, nullable=False, comment="汇总计算耗时（毫秒）")
+
+
+class RateLimitCounter(Base):
+    """共享限流计数（UNLOGGED，重启后丢失计数可以接受）"""
+    __tablename__ = "rate_limit_counters"
+    __table_args__ = {'prefixes': ['UNLOGGED'], 'comment': '滑动窗口限流的固定窗口计数'}
+
+    bucket_key = Column(String(128), primary_key=True, comment="限流键")
+    window_start = Column(BigInteger, primary_key=True, comment="窗口序号（Unix 秒 / 窗口长度）")
+    hits = Column(Integer, default=0, nullable=False, comment="窗口内已允许的请求数")
+
+
+class JobLease(Base):
+    """后台任务租约：多个 worker 中只有持有未过期租约的一个执行该任务"""
+    __tablename__ = "job_leases"
+    __table_args__ = {'comment': '后台定时任务与单例服务（LMTP）的租约与最近运行记录'}
+
+    name = Column(String(64), primary_key=True, comment="任务名")
+    owner = Column(String(128), nullable=False, comment="持有者（主机名:进程号）")
+    acquired_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="当前持有者获得租约的时间")
+    heartbeat_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="最近续约时间")
+    lease_expires_at = Column(DateTime(timezone=True), nullable=False, comment="租约到期时间，过期后其他 worker 可接管")
+    last_started_at = Column(DateTime(timezone=True), nullable=True, comment="最近一次运行开始时间")
+    last_finished_at = Column(DateTime(timezone=True), nullable=True, comment="最近一次运行结束时间")
+    last_duration_ms = Column(Integer, nullable=True, comment="最近一次运行耗时（毫秒）")
+    last_status = Column(String(16), nullable=True, comment="最近一次运行结果（ok / error）")
+    last_error = Column(Text, nullable=True, comment="最近一次运行的错误信息")
+    run_count = Column(BigInteger, default=0, nullable=False, comment="累计运行次数")
+
+
+class SeedFingerprint(Base):
+    """启动 seeder 的内容指纹，未变化时跳过"""
+    __tablename__ = "seed_fingerprints"
+    __table_args__ = {'comment': '启动种子数据的内容指纹'}
+
+    name = Column(String(64), primary_key=True, comment="seeder 名称")
+    content_hash = Column(String(64), nullable=False, comment="seeder 定义的 sha256")
+    applied_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="最近一次执行时间")
+
+
+class MailExportJob(Base):
+    """邮箱批量导出任务：记录导出范围与已导出位置，下载中断后可续传"""
+    __tablename__ = "mail_export_jobs"
+    __table_args__ = {'comment': '邮箱批量导出（mbox / zip）任务与续传位置'}
+
+    id = Column(String(32), primary_key=True, comment="任务 ID")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True, comment="所属用户")
+    folder_id = Column(Integer, ForeignKey("folders.id", ondelete="CASCADE"), nullable=True, comment="导出的文件夹，为空表示全部")
+    since = Column(DateTime(timezone=True), nullable=True, comment="接收时间下限（含）")
+    until = Column(DateTime(timezone=True), nullable=True, comment="接收时间上限（不含）")
+    format = Column(String(8), nullable=False, comment="导出格式（mbox / zip）")
+    status = Column(String(16), default="pending", nullable=False, comment="状态（pending / running / completed）")
+    total_count = Column(Integer, default=0, nullable=False, comment="创建时符合条件的邮件数")
+    exported_count = Column(Integer, default=0, nullable=False, comment="已确认导出的邮件数")
+    last_email_id = Column(Integer, default=0, nullable=False, comment="已确认导出的最大邮件 ID，续传从其后开始")
+    parts = Column(Integer, default=0, nullable=False, comment="已开始的下载次数（分卷序号）")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, comment="最近更新时间")
+    completed_at = Column(DateTime(timezone=True), nullable=True, comment="完成时间")
+
+
+class MailImportJob(Base):
+    """邮箱批量导入任务：上传的 mbox / EML zip 由 worker 分批入库"""
+    __tablename__ = "mail_import_jobs"
+    __table_args__ = {'comment': '邮箱批量导入（mbox / zip / eml）任务与进度'}
+
+    id = Column(String(32), primary_key=True, comment="任务 ID")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True, comment="所属用户")
+    folder_id = Column(Integer, ForeignKey("folders.id", ondelete="CASCADE"), nullable=False, comment="导入到的文件夹")
+    format = Column(String(8), nullable=False, comment="文件格式（mbox / zip / eml）")
+    filename = Column(String(255), nullable=True, comment="上传的原始文件名")
+    file_path = Column(String, nullable=False, comment="上传文件的存储路径，完成后删除")
+    file_size = Column(BigInteger, default=0, nullable=False, comment="上传文件大小（字节）")
+    status = Column(String(16), default="pending", nullable=False, comment="状态（pending / running / completed / failed）")
+    processed_count = Column(Integer, default=0, nullable=False, comment="已处理的邮件数（续跑时跳过）")
+    imported_count = Column(Integer, default=0, nullable=False, comment="已入库的邮件数")
+    duplicate_count = Column(Integer, default=0, nullable=False, comment="按 Message-ID 去重跳过的邮件数")
+    failed_count = Column(Integer, default=0, nullable=False, comment="解析失败的邮件数")
+    bytes_processed = Column(BigInteger, default=0, nullable=False, comment="已处理的文件字节数，用于估算进度")
+    attempts = Column(Integer, default=0, nullable=False, comment="开始处理的次数（含中断后续跑）")
+    error = Column(Text, nullable=True, comment="失败原因")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="创建时间")
+    started_at = Column(DateTime(timezone=True), nullable=True, comment="开始处理时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, comment="最近更新时间")
+    completed_at = Column(DateTime(timezone=True), nullable=True, comment="完成时间")
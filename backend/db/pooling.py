@@ -0,0 +1,147 @@
+"""
+数据库连接池配置与指标
+
+- 连接池大小、溢出数、获取超时、回收时间来自 core.config
+- PgBouncer 模式（DB_PGBOUNCER_MODE）：连接池交给 PgBouncer（事务池模式），
+  应用侧使用 NullPool，并关闭 asyncpg 的预编译语句缓存
+- 每个连接池按名称记录获取连接的次数、等待时间、超时次数，供管理端查看
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from core.config import settings
+
+# 保留最近多少次获取连接的等待时间用于计算分位数
+WAIT_SAMPLE_SIZE = 1000
+
+
+class PoolMetrics:
+    """单个连接池的获取连接统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def observe(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait_seconds
+            self.max_wait = max(self.max_wait, wait_seconds)
+            self._waits.append(wait_seconds)
+
+    def observe_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            checkouts, timeouts, total_wait, max_wait = self.checkouts, self.timeouts, self.total_wait, self.max_wait
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(len(waits) * p))] * 1000 if waits else 0.0
+
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "avg_wait_ms": total_wait / checkouts * 1000 if checkouts else 0.0,
+            "p50_wait_ms": percentile(0.5),
+            "p99_wait_ms": percentile(0.99),
+            "max_wait_ms": max_wait * 1000,
+        }
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_pool_metrics(name: str) -> PoolMetrics:
+    with _metrics_lock:
+        metrics = _metrics.get(name)
+        if metrics is None:
+            metrics = _metrics[name] = PoolMetrics(name)
+        return metrics
+
+
+class _MeteredPoolMixin:
+    """统计 connect() 的耗时（排队等待 + 新建连接 + pre_ping）
+
+    指标按 logging_name 归档，engine.dispose() 重建连接池后继续累加。
+    """
+
+    def connect(self):
+        metrics = get_pool_metrics(self._orig_logging_name or "default")
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            metrics.observe_timeout()
+            raise
+        metrics.observe(time.perf_counter() - started)
+        return connection
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class MeteredNullPool(_MeteredPoolMixin, NullPool):
+    pass
+
+
+def engine_options(name: str, is_async: bool = False) -> dict:
+    """create_engine / create_async_engine 的连接池参数"""
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_logging_name": name,
+    }
+    if settings.DB_PGBOUNCER_MODE:
+        options["poolclass"] = MeteredNullPool
+        if is_async:
+            # 事务池模式下同一会话可能落在不同的后端连接上，不能复用命名的预编译语句
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        return options
+
+    options.update(
+        poolclass=MeteredAsyncQueuePool if is_async else MeteredQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+    return options
+
+
+def pool_status(name: str, engine) -> dict:
+    """连接池当前状态 + 获取连接统计"""
+    pool = engine.pool
+    status: Dict[str, Optional[object]] = {"name": name, "pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=pool.overflow(),
+            max_overflow=settings.DB_MAX_OVERFLOW,
+        )
+    status.update(get_pool_metrics(name).snapshot())
+    return status
@@ -1,14 +1,21 @@
 import logging
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
 from crud import user as crud_user
 from schemas.user import UserCreate
 from core.config import settings
+from core.api_key_audit import maintain_audit_partitions
+from core.mailbox_stats import install_mailbox_stats_triggers
 from db.database import engine, SessionLocal
 from db import models
 from db.models.billing import Plan
 from db.models.system import ReservedPrefix, SystemEmailTemplate
+from core.startup_profile import startup_profile
+from initial import init_template_data as init_template_data_module
+from initial import init_workflow_templates as init_workflow_templates_module
 from initial.init_template_data import init_template_data
 from initial.init_workflow_templates import init_workflow_templates
+from initial.seed_fingerprints import run_seeder, source_fingerprint
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,20 +25,26 @@ def init_db() -> None:
     """
     Initializes the database. Creates tables and the initial admin user.
     Manages its own database session to avoid conflicts.
+    Static seeders are skipped when their content fingerprint is unchanged.
     """
     db = SessionLocal()
     try:
         logger.info("Creating all tables...")
-        models.Base.metadata.create_all(bind=engine)
+        with startup_profile.phase("init_db.create_tables"):
+            models.Base.metadata.create_all(bind=engine)
+        with startup_profile.phase("init_db.triggers_and_partitions"), engine.begin() as conn:
+            install_mailbox_stats_triggers(conn)
+            maintain_audit_partitions(conn)
         logger.info("Tables created.")
-        _create_initial_admin(db)
-        _create_default_plans(db)  # 创建默认套餐
-        _create_default_reserved_prefixes(db)  # 创建默认保留前缀
-        _create_default_email_templates(db)  # 创建默认邮件模板
-        init_template_data(db)  # 初始化模板元数据和全局变量
-        init_workflow_templates(db)  # 初始化工作流模板
-        _ensure_default_folders_for_all_users(db) # Add this line
-        db.commit() # Commit the changes
+        with startup_profile.phase("init_db.initial_admin"):
+            _create_initial_admin(db)
+            db.commit()
+        for name, seeder, content_hash in _seeders():
+            with startup_profile.phase(f"init_db.seed.{name}"):
+                run_seeder(db, name, seeder, content_hash)
+        with startup_profile.phase("init_db.default_folders"):
+            _ensure_default_folders_for_all_users(db)
+            db.commit() # Commit the changes
     except Exception as e:
         logger.error(f"Database initialization failed: {e}", exc_info=True)
         db.rollback()
@@ -40,6 +53,17 @@ def init_db() -> None:
         logger.info("Database session closed after initialization.")
 
 
+def _seeders():
+    """(名称, seeder, 内容指纹)；指纹取自 seeder 的源码，内置的种子数据变化时随之变化"""
+    return [
+        ("default_plans", _create_default_plans, source_fingerprint(_create_default_plans)),
+        ("reserved_prefixes", _create_default_reserved_prefixes, source_fingerprint(_create_default_reserved_prefixes)),
+        ("email_templates", _create_default_email_templates, source_fingerprint(_create_default_email_templates)),
+        ("template_data", init_template_data, source_fingerprint(init_template_data_module)),
+        ("workflow_templates", init_workflow_templates, source_fingerprint(init_workflow_templates_module)),
+    ]
+
+
 def _create_initial_admin(db: Session) -> None:
     """
     Creates the initial admin user if it doesn't exist.
@@ -404,23 +428,20 @@ def _create_default_email_templates(db: Session) -> None:
 
 def _ensure_default_folders_for_all_users(db: Session) -> None:
     """
-    Checks all users and creates default folders for those who don't have them.
+    Creates default folders for users who don't have them.
     This is useful for applying the folder structure to existing users.
+    Users missing an inbox are found with a single query instead of one lookup per user.
     """
     logger.info("Checking for users missing default folders...")
-    users = db.query(models.User).all()
+    has_inbox = exists().where(models.Folder.user_id == models.User.id, models.Folder.role == "inbox")
+    users = db.query(models.User).filter(~has_inbox).all()
     for user in users:
-        # A simple way to check is to see if they have an 'inbox' folder.
-        inbox_folder = crud_user.get_folder_by_role(db, user_id=user.id, role="inbox")
-        if not inbox_folder:
-            logger.info(f"User {user.email} (ID: {user.id}) is missing default folders. Creating them now...")
-            try:
-                crud_user.create_default_folders_for_user(db, user_id=user.id)
-                logger.info(f"Successfully added folder creation tasks for user {user.email}.")
-            except Exception as e:
-                logger.error(f"Failed to create folders for user {user.email}: {e}", exc_info=True)
-                # We will let the main exception handler catch this and rollback.
-                raise
-        else:
-            logger.info(f"User {user.email} already has an inbox. Assuming all folders are present.")
-    logger.info("Folder check for all users complete.")
+        logger.info(f"User {user.email} (ID: {user.id}) is missing default folders. Creating them now...")
+        try:
+            crud_user.create_default_folders_for_user(db, user_id=user.id)
+            logger.info(f"Successfully added folder creation tasks for user {user.email}.")
+        except Exception as e:
+            logger.error(f"Failed to create folders for user {user.email}: {e}", exc_info=True)
+            # We will let the main exception handler catch this and rollback.
+            raise
+    logger.info(f"Folder check for all users complete, {len(users)} user(s) fixed.")
@@ -0,0 +1,49 @@
+"""
+Seeder 内容指纹
+
+每个 seeder 以其定义（函数 / 模块源码，包含内置的种子数据）的 sha256 作为指纹，
+执行成功后记录到 seed_fingerprints 表；下次启动指纹未变时直接跳过，不再逐行比对数据库。
+STARTUP_FORCE_SEED=true 时忽略指纹全部执行（例如手动删除了种子数据后需要恢复）。
+"""
+import hashlib
+import inspect
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.models.system import SeedFingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def source_fingerprint(*objects) -> Optional[str]:
+    """函数 / 模块源码的 sha256；取不到源码（只有 .pyc）时返回 None，seeder 每次都执行"""
+    digest = hashlib.sha256()
+    for obj in objects:
+        try:
+            digest.update(inspect.getsource(obj).encode("utf-8"))
+        except (OSError, TypeError):
+            return None
+    return digest.hexdigest()
+
+
+def run_seeder(db: Session, name: str, seeder: Callable[[Session], object], content_hash: Optional[str]) -> bool:
+    """指纹变化（或首次、强制）时执行 seeder 并记录指纹，返回是否执行"""
+    row = db.get(SeedFingerprint, name)
+    if row is not None and content_hash is not None and row.content_hash == content_hash \
+            and not settings.STARTUP_FORCE_SEED:
+        logger.info(f"种子数据未变化，跳过: {name}")
+        return False
+
+    seeder(db)
+    if content_hash is not None:
+        if row is None:
+            row = SeedFingerprint(name=name)
+            db.add(row)
+        row.content_hash = content_hash
+        row.applied_at = datetime.now(timezone.utc)
+    db.commit()
+    return True
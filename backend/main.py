@@ -1,18 +1,18 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
 from starlette.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-import asyncio
-from db.database import engine, SessionLocal
+from db.database import async_engine, SessionLocal
 from db import models  # 确保导入 models 以注册表
 from api import auth, mail, users, folders, tracking, invite, pool, signatures, attachments, billing, reserved_prefixes, email_templates, totp, blocklist, aliases, tags, contacts, external_accounts, drive, automation, automation_temp_mailboxes, workflows, workflow_templates, changelog, spam, health, api_keys
 from api.deps import get_current_user_from_token
-from api.auth import cleanup_old_sessions
 from initial import initial_data
-from core.mailserver_sync import sync_users_to_mailserver
-from core.lmtp_server import start_lmtp_server, stop_lmtp_server
-from core.mail_sync import periodic_sync
-from core.temp_mailbox_lifecycle import run_temp_mailbox_maintenance
 from core.config import settings
+from core import background_jobs
+from core.process_mode import current_roles
+from core.startup_profile import startup_profile
 from core import websocket as ws_manager
 import logging
 
@@ -20,122 +20,29 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 定时任务
-sync_task = None
-cleanup_task = None
-temp_mailbox_cleanup_task = None
-
-
-async def periodic_session_cleanup(interval: int = 86400):
-    """
-    定期清理旧会话的任务
-    默认每24小时执行一次,清理30天未活动的会话
-    """
-    while True:
-        await asyncio.sleep(interval)  # 等待指定间隔
-        try:
-            db = SessionLocal()
-            try:
-                deleted_count = cleanup_old_sessions(db, days=30)
-                if deleted_count > 0:
-                    logger.info(f"已清理 {deleted_count} 个过期会话记录")
-            finally:
-                db.close()
-        except Exception as e:
-            logger.error(f"清理会话记录失败: {e}")
-
-
-async def periodic_temp_mailbox_cleanup(interval: int = 600):
-    """
-    定时推进临时邮箱生命周期并按策略执行清理
-    interval 为轮询检查间隔（秒），实际清理频率由数据库策略控制。
-    """
-    while True:
-        await asyncio.sleep(interval)
-        try:
-            db = SessionLocal()
-            try:
-                result = run_temp_mailbox_maintenance(db, force_cleanup=False)
-                if result["expired_count"] > 0 or result["cleanup_ran"]:
-                    logger.info(
-                        f"临时邮箱维护完成: expired={result['expired_count']}, "
-                        f"purged={result['purged_count']}, ran={result['cleanup_ran']}"
-                    )
-            finally:
-                db.close()
-        except Exception as e:
-            logger.error(f"临时邮箱维护任务失败: {e}")
+startup_profile.record("import_app_modules", time.perf_counter() - _import_started)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global sync_task, cleanup_task, temp_mailbox_cleanup_task
+    roles = current_roles()
     # Initialize the database and create the initial admin user
-    initial_data.init_db()
-
-    # 同步用户到邮件服务器
-    logger.info("开始执行用户同步到邮件服务器...")
-    try:
-        result = sync_users_to_mailserver()
-        logger.info(f"用户同步完成: {result}")
-    except Exception as e:
-        logger.error(f"用户同步失败，但 backend 将继续启动: {e}")
-
-    # 启动 LMTP 服务器接收邮件
-    logger.info("启动 LMTP 邮件接收服务...")
-    try:
-        start_lmtp_server(host='0.0.0.0', port=24)
-        logger.info("LMTP 服务启动成功，监听端口 24")
-    except Exception as e:
-        logger.error(f"LMTP 服务启动失败: {e}")
-
-    # 启动定时邮件同步任务（每30秒，确保临时邮箱验证码及时到达）
-    logger.info("启动定时邮件同步任务（间隔30秒）...")
-    sync_task = asyncio.create_task(periodic_sync(interval=30))
+    with startup_profile.phase("init_db"):
+        initial_data.init_db()
 
-    # 启动定时会话清理任务（每24小时）
-    logger.info("启动定时会话清理任务（间隔24小时）...")
-    cleanup_task = asyncio.create_task(periodic_session_cleanup(interval=86400))
-
-    # 启动临时邮箱生命周期维护任务（每10分钟检查一次）
-    logger.info("启动临时邮箱生命周期维护任务（检查间隔10分钟）...")
-    temp_mailbox_cleanup_task = asyncio.create_task(periodic_temp_mailbox_cleanup(interval=600))
-
-    # 启动时先执行一次清理
-    try:
-        db = SessionLocal()
-        try:
-            deleted_count = cleanup_old_sessions(db, days=30)
-            if deleted_count > 0:
-                logger.info(f"启动时清理了 {deleted_count} 个过期会话记录")
-        finally:
-            db.close()
-    except Exception as e:
-        logger.error(f"启动时清理会话记录失败: {e}")
+    # 按进程模式启动后台服务：all 模式下包含 LMTP、邮件同步与定时维护任务，
+    # api 模式只保留 HTTP 需要的开通队列与审计日志写入
+    # 邮件服务器全量同步与会话清理都在后台执行，不阻塞就绪
+    logger.info(f"进程模式: {settings.PROCESS_MODE}")
+    with startup_profile.phase("background_jobs.start"):
+        await background_jobs.start(roles)
+    startup_profile.mark_ready(time.perf_counter() - _import_started)
 
     yield
 
     # Shutdown
-    logger.info("停止 LMTP 服务...")
-    stop_lmtp_server()
-    if sync_task:
-        sync_task.cancel()
-        try:
-            await sync_task
-        except asyncio.CancelledError:
-            pass
-    if cleanup_task:
-        cleanup_task.cancel()
-        try:
-            await cleanup_task
-        except asyncio.CancelledError:
-            pass
-    if temp_mailbox_cleanup_task:
-        temp_mailbox_cleanup_task.cancel()
-        try:
-            await temp_mailbox_cleanup_task
-        except asyncio.CancelledError:
-            pass
+    await background_jobs.stop(roles)
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+按进程模式启动后端
+
+    python run.py --mode api --workers 4     # 只提供 HTTP，可水平扩展
+    python run.py --mode ingest              # LMTP 收信 + IMAP 定时同步
+    python run.py --mode worker              # 定时维护任务、全量同步、SpamAssassin 训练
+    python run.py                            # 默认 all，等同于 uvicorn main:app
+
+未指定 --mode 时读取环境变量 PROCESS_MODE。ingest / worker 模式不启动 HTTP 服务，
+收到 SIGINT / SIGTERM 后释放租约退出，其他进程随即接管其任务。
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+from core.config import settings
+from core.process_mode import MODE_ALL, MODE_API, MODE_ROLES, parse_mode
+
+logger = logging.getLogger(__name__)
+
+
+async def run_headless(mode: str) -> None:
+    """不带 HTTP 的 ingest / worker 进程"""
+    from core import background_jobs
+    from db.database import async_engine
+
+    roles = MODE_ROLES[mode]
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    logger.info(f"进程模式: {mode}")
+    await background_jobs.start(roles)
+    try:
+        await stop_event.wait()
+    finally:
+        await background_jobs.stop(roles)
+        await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TalentMail 后端")
+    parser.add_argument("--mode", choices=list(MODE_ROLES), default=None,
+                        help="进程模式，默认读取环境变量 PROCESS_MODE（未设置时为 all）")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="HTTP worker 数（api / all 模式）")
+    parser.add_argument("--reload", action="store_true", help="开发环境自动重载（api / all 模式）")
+    args = parser.parse_args()
+
+    mode = parse_mode(args.mode or settings.PROCESS_MODE or MODE_ALL)
+    # 本进程的 settings 已加载，直接覆盖；uvicorn 多 worker 时子进程从环境变量读取
+    settings.PROCESS_MODE = mode
+    os.environ["PROCESS_MODE"] = mode
+
+    if mode in (MODE_ALL, MODE_API):
+        import uvicorn
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, reload=args.reload)
+        return
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_headless(mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+事件循环延迟基准测试
+
+在同一个事件循环里并发执行慢查询（SELECT pg_sleep），同时用一个探测协程
+每隔 INTERVAL 秒醒来一次，记录实际醒来时间比预期晚了多少（即事件循环延迟）。
+
+对比三种写法：
+- sync：async def 中直接调用同步会话（当前大量路由的写法，查询期间阻塞整个事件循环）
+- threadpool：同步会话放进线程池执行
+- async：异步会话（asyncpg）
+
+用法（容器内）：
+    python scripts/bench_event_loop_latency.py --concurrency 20 --query-seconds 0.2
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+sys.path.append('/app')
+
+from sqlalchemy import text
+
+from db.database import AsyncSessionLocal, SessionLocal, async_engine
+
+INTERVAL = 0.01
+SLOW_QUERY = text("SELECT pg_sleep(:seconds)")
+
+
+async def probe(stop: asyncio.Event, lags: list) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + INTERVAL
+        await asyncio.sleep(INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+def _sync_query(seconds: float) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(SLOW_QUERY, {"seconds": seconds})
+    finally:
+        db.close()
+
+
+async def run_sync(seconds: float) -> None:
+    _sync_query(seconds)
+
+
+async def run_threadpool(seconds: float) -> None:
+    await asyncio.to_thread(_sync_query, seconds)
+
+
+async def run_async(seconds: float) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(SLOW_QUERY, {"seconds": seconds})
+
+
+MODES = {"sync": run_sync, "threadpool": run_threadpool, "async": run_async}
+
+
+async def bench(mode: str, concurrency: int, query_seconds: float, rounds: int) -> dict:
+    lags: list = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, lags))
+    worker = MODES[mode]
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(worker(query_seconds) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "mode": mode,
+        "elapsed_s": elapsed,
+        "samples": len(lags),
+        "p50_ms": statistics.median(lags_ms),
+        "p99_ms": lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))],
+        "max_ms": lags_ms[-1],
+    }
+
+
+async def main(args) -> None:
+    # 预热连接池，避免把建立连接的时间算进去
+    await asyncio.to_thread(_sync_query, 0)
+    await run_async(0)
+
+    print(f"并发 {args.concurrency}，每条查询 {args.query_seconds}s，{args.rounds} 轮")
+    print(f"{'mode':<12}{'elapsed(s)':>12}{'samples':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for mode in args.modes:
+        r = await bench(mode, args.concurrency, args.query_seconds, args.rounds)
+        print(
+            f"{r['mode']:<12}{r['elapsed_s']:>12.2f}{r['samples']:>10}"
+            f"{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}"
+        )
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="事件循环延迟基准测试")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--query-seconds", type=float, default=0.2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    asyncio.run(main(parser.parse_args()))
@@ -268,6 +268,8 @@ def main():
         key = generate_encryption_key()
         print(f"新密钥:\n{key}")
         print("\n请将此密钥保存到安全的地方，并设置为 ENCRYPTION_KEY 环境变量")
+        print("轮换密钥时，把原 ENCRYPTION_KEY 追加到 ENCRYPTION_KEYS_OLD（逗号分隔），"
+              "再运行 migrate_external_passwords.py 重新加密已有密码")
 
     elif args.command == 'verify':
         if verify_config():
@@ -2,30 +2,25 @@
 """
 独立的密码加密迁移脚本
 
-用于将现有外部账户的明文密码迁移为加密存储
+用于将现有外部账户的明文密码迁移为加密存储；
+更换 ENCRYPTION_KEY（旧密钥放入 ENCRYPTION_KEYS_OLD）后，同样用它把密文重新加密为新密钥
 """
 import sys
 sys.path.append('/app')
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
 from core.config import settings
-from core.crypto import encrypt_password, decrypt_password
+from core.crypto import is_encrypted
+from core.key_rotation import BATCH_SIZE, reencrypt_external_passwords
 from db.models.external_account import ExternalAccount
 
 
-def is_encrypted(password: str) -> bool:
-    """检查密码是否已经加密
+def migrate_passwords(dry_run: bool = False, batch_size: int = BATCH_SIZE):
+    """执行密码加密迁移
 
-    Fernet 加密的密码会以 'gAAAAA' 开头
+    明文密码加密存储，旧密钥加密的密码用当前密钥重新加密（密钥轮换后执行）。
     """
-    if not password:
-        return True  # 空密码视为已处理
-    return password.startswith('gAAAAA')
-
-
-def migrate_passwords():
-    """执行密码加密迁移"""
     # 创建数据库连接
     engine = create_engine(settings.DATABASE_URL_DOCKER)
     SessionLocal = sessionmaker(bind=engine)
@@ -33,55 +28,18 @@ def migrate_passwords():
 
     try:
         print("开始密码加密迁移...")
+        result = reencrypt_external_passwords(db, batch_size=batch_size, dry_run=dry_run)
 
-        # 获取所有外部账户
-        accounts = db.query(ExternalAccount).all()
-        total_accounts = len(accounts)
-        encrypted_count = 0
-        skipped_count = 0
-        error_count = 0
-
-        print(f"找到 {total_accounts} 个外部账户")
-
-        for account in accounts:
-            try:
-                if not account.password:
-                    print(f"跳过账户 {account.email} - 密码为空")
-                    skipped_count += 1
-                    continue
-
-                if is_encrypted(account.password):
-                    print(f"跳过账户 {account.email} - 密码已加密")
-                    skipped_count += 1
-                    continue
-
-                # 加密密码
-                encrypted_password = encrypt_password(account.password)
-                account.password = encrypted_password
-
-                # 验证加密是否正确
-                decrypted = decrypt_password(encrypted_password)
-                if decrypted != account.password:
-                    print(f"✓ 账户 {account.email} - 密码加密成功")
-                    encrypted_count += 1
-
-            except Exception as e:
-                print(f"✗ 账户 {account.email} - 加密失败: {str(e)}")
-                error_count += 1
-                continue
-
-        # 提交更改
-        if encrypted_count > 0:
-            db.commit()
-            print(f"\n迁移完成！")
-            print(f"- 总账户数: {total_accounts}")
-            print(f"- 已加密: {encrypted_count}")
-            print(f"- 已跳过: {skipped_count}")
-            print(f"- 失败: {error_count}")
-        else:
-            print("\n没有需要加密的密码")
+        print(f"\n迁移完成！")
+        print(f"- 检查账户数: {result.scanned}")
+        print(f"- 明文已加密: {result.encrypted}")
+        print(f"- 已轮换到新密钥: {result.rotated}")
+        print(f"- 期间被修改、已跳过: {result.skipped}")
+        print(f"- 失败: {len(result.failed_ids)}")
+        for account_id in result.failed_ids:
+            print(f"✗ 账户 ID {account_id} - 所有密钥都无法解密")
 
-        return encrypted_count > 0
+        return result.encrypted + result.rotated > 0
 
     except Exception as e:
         db.rollback()
@@ -100,14 +58,16 @@ def verify_migration():
     try:
         print("\n验证迁移结果...")
 
-        accounts = db.query(ExternalAccount).filter(
-            ExternalAccount.password.isnot(None)
-        ).all()
+        rows = db.execute(
+            select(ExternalAccount.email, ExternalAccount.password)
+            .where(ExternalAccount.password.isnot(None))
+            .execution_options(yield_per=BATCH_SIZE)
+        )
 
         all_encrypted = True
-        for account in accounts:
-            if not is_encrypted(account.password):
-                print(f"✗ 账户 {account.email} 的密码未加密！")
+        for email, password in rows:
+            if not is_encrypted(password):
+                print(f"✗ 账户 {email} 的密码未加密！")
                 all_encrypted = False
 
         if all_encrypted:
@@ -135,6 +95,12 @@ if __name__ == "__main__":
         action="store_true",
         help="模拟运行，不实际修改数据"
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help="每批处理的账户数"
+    )
 
     args = parser.parse_args()
 
@@ -143,5 +109,5 @@ if __name__ == "__main__":
     else:
         if args.dry_run:
             print("【模拟运行模式】不会实际修改数据")
-        migrate_passwords()
+        migrate_passwords(dry_run=args.dry_run, batch_size=args.batch_size)
         verify_migration()
\ No newline at end of file
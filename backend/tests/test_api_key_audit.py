@@ -0,0 +1,92 @@
+"""
+API Key 审计日志缓冲写入测试
+"""
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from core.api_key_audit import (
+    ApiKeyAuditWriter,
+    AuditEvent,
+    drop_expired_audit_partitions,
+    partition_name,
+)
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _event(key_id=1, decision="allow", offset=0):
+    return AuditEvent(
+        api_key_id=key_id,
+        user_id=1,
+        method="GET",
+        path="/api/test",
+        ip_address="127.0.0.1",
+        status_code=200 if decision == "allow" else 403,
+        decision=decision,
+        created_at=NOW + timedelta(seconds=offset),
+    )
+
+
+def test_last_used_is_coalesced_per_key():
+    writer = ApiKeyAuditWriter(capacity=100, batch_size=100)
+    writer.record(_event(1, offset=5))
+    writer.record(_event(1, offset=1))
+    writer.record(_event(2, offset=3))
+    writer.record(_event(3, decision="deny", offset=9))
+
+    events, last_used = writer._take()
+    assert len(events) == 4
+    assert last_used == {1: NOW + timedelta(seconds=5), 2: NOW + timedelta(seconds=3)}
+
+
+def test_ring_buffer_drops_oldest_when_full():
+    writer = ApiKeyAuditWriter(capacity=2, batch_size=100)
+    for offset in range(3):
+        writer.record(_event(offset=offset))
+
+    stats = writer.stats()
+    assert stats["dropped"] == 1
+    assert stats["pending"] == 2
+    events, _ = writer._take()
+    assert [e.created_at for e in events] == [NOW + timedelta(seconds=1), NOW + timedelta(seconds=2)]
+
+
+def test_failed_flush_restores_events():
+    writer = ApiKeyAuditWriter(capacity=100, batch_size=100)
+    writer.record(_event(1))
+    writer.record(_event(2))
+    with patch("db.database.engine") as engine:
+        engine.begin.side_effect = RuntimeError("down")
+        assert writer.flush() == 0
+
+    stats = writer.stats()
+    assert stats["failed_flushes"] == 1
+    assert stats["pending"] == 2
+    assert stats["pending_keys"] == 2
+
+
+def test_flush_writes_batch_in_one_transaction():
+    writer = ApiKeyAuditWriter(capacity=100, batch_size=100)
+    for offset in range(3):
+        writer.record(_event(1, offset=offset))
+    with patch("db.database.engine") as engine, patch("core.api_key_audit.write_batch") as write_batch:
+        assert writer.flush() == 3
+    assert engine.begin.call_count == 1
+    _, events, last_used = write_batch.call_args.args
+    assert len(events) == 3
+    assert last_used == {1: NOW + timedelta(seconds=2)}
+
+
+def test_partition_name_and_expired_partitions():
+    assert partition_name(date(2026, 1, 2)) == "api_key_audit_logs_p20260102"
+
+    conn = MagicMock()
+    conn.execute.return_value.fetchall.return_value = [
+        SimpleNamespace(relname="api_key_audit_logs_default"),
+        SimpleNamespace(relname="api_key_audit_logs_p20251201"),
+        SimpleNamespace(relname="api_key_audit_logs_p20251202"),
+        SimpleNamespace(relname="api_key_audit_logs_p20251231"),
+    ]
+    dropped = drop_expired_audit_partitions(conn, retention_days=30, today=date(2026, 1, 1))
+    assert dropped == ["api_key_audit_logs_p20251201"]
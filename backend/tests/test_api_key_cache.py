@@ -0,0 +1,118 @@
+"""
+API Key 认证缓存测试
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from api import deps
+from core import api_key_cache
+from core.api_key_cache import ApiKeyAuthCache, ApiKeyPrincipal
+from core.api_keys import hash_api_key
+
+RAW_KEY = "tm_example_key_for_cache_test"
+
+
+def _principal(key_id=1, user_id=10, expires_at=None, revoked_at=None):
+    return ApiKeyPrincipal(
+        id=key_id,
+        user_id=user_id,
+        scopes=("temp_code:read",),
+        rate_limit_per_minute=1000,
+        expires_at=expires_at,
+        revoked_at=revoked_at,
+        owner_role="user",
+        owner_pool_enabled=True,
+    )
+
+
+def _request():
+    return SimpleNamespace(method="GET", url=SimpleNamespace(path="/api/test"), client=None)
+
+
+def _authenticate(cache, db):
+    credentials = SimpleNamespace(credentials=RAW_KEY)
+    with patch.object(deps, "api_key_auth_cache", cache), patch.object(deps, "api_key_audit_writer"):
+        return deps.get_current_api_key(_request(), SimpleNamespace(headers={}), credentials, db)
+
+
+def test_invalidate_by_key_and_owner():
+    cache = ApiKeyAuthCache(ttl_seconds=60)
+    cache.put("a", _principal(key_id=1, user_id=10), cache.generation)
+    cache.put("b", _principal(key_id=2, user_id=10), cache.generation)
+    cache.put("c", _principal(key_id=3, user_id=20), cache.generation)
+
+    cache.invalidate_key(1)
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+
+    cache.invalidate_user(10)
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_invalidation_during_load_is_not_cached():
+    cache = ApiKeyAuthCache(ttl_seconds=60)
+    generation = cache.generation
+    cache.invalidate_key(1)
+    cache.put("a", _principal(), generation)
+    assert cache.get("a") is None
+
+
+def test_entries_expire_after_ttl():
+    cache = ApiKeyAuthCache(ttl_seconds=10)
+    with patch.object(api_key_cache.time, "monotonic", return_value=100.0):
+        cache.put("a", _principal(), cache.generation)
+    with patch.object(api_key_cache.time, "monotonic", return_value=111.0):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_notifications_invalidate_key_user_or_all():
+    cache = ApiKeyAuthCache(ttl_seconds=60)
+    with patch.object(api_key_cache, "api_key_auth_cache", cache):
+        cache.put("a", _principal(key_id=1, user_id=10), cache.generation)
+        cache.put("b", _principal(key_id=2, user_id=20), cache.generation)
+        api_key_cache._handle_notification("key:1")
+        assert cache.get("a") is None
+        api_key_cache._handle_notification("user:20")
+        assert cache.get("b") is None
+        cache.put("a", _principal(key_id=1, user_id=10), cache.generation)
+        api_key_cache._handle_notification(api_key_cache.INVALIDATE_ALL)
+        assert len(cache) == 0
+
+
+def test_cache_hit_skips_database():
+    cache = ApiKeyAuthCache(ttl_seconds=60)
+    cache.put(hash_api_key(RAW_KEY), _principal(), cache.generation)
+    db = MagicMock()
+    assert _authenticate(cache, db).id == 1
+    db.query.assert_not_called()
+
+
+def test_cache_miss_loads_and_caches_verified_key():
+    cache = ApiKeyAuthCache(ttl_seconds=60)
+    api_key = SimpleNamespace(
+        id=5, user_id=10, key_hash=hash_api_key(RAW_KEY), scopes=["temp_code:read"],
+        rate_limit_per_minute=1000, expires_at=None, revoked_at=None,
+        user=SimpleNamespace(role="admin", pool_enabled=False),
+    )
+    db = MagicMock()
+    db.query.return_value.options.return_value.filter.return_value.all.return_value = [api_key]
+
+    principal = _authenticate(cache, db)
+    assert principal.id == 5
+    assert principal.has_pool_access
+    assert cache.get(hash_api_key(RAW_KEY)) == principal
+
+
+def test_cached_key_expiry_is_checked_on_every_request():
+    cache = ApiKeyAuthCache(ttl_seconds=60)
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+    cache.put(hash_api_key(RAW_KEY), _principal(expires_at=expired), cache.generation)
+    with pytest.raises(HTTPException) as exc_info:
+        _authenticate(cache, MagicMock())
+    assert exc_info.value.detail == "API key expired"
@@ -0,0 +1,36 @@
+"""
+异步数据库层测试
+"""
+import asyncio
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from core.workflow_service import NodeHandler
+from db.database import to_async_database_url
+
+
+def test_async_url_uses_asyncpg_and_keeps_credentials():
+    assert to_async_database_url("postgresql://u:p%40ss@db:5432/mail") == "postgresql+asyncpg://u:p%40ss@db:5432/mail"
+    assert to_async_database_url("postgresql+psycopg2://u:p@db/mail") == "postgresql+asyncpg://u:p@db/mail"
+
+
+@pytest.mark.asyncio
+async def test_handler_db_calls_run_off_loop_and_serialized_per_session():
+    db = Mock()
+    handlers = [NodeHandler(db), NodeHandler(db)]
+    loop_thread = threading.get_ident()
+    active = []
+    overlaps = []
+
+    def work():
+        active.append(1)
+        overlaps.append(len(active))
+        threading.Event().wait(0.01)
+        active.pop()
+        return threading.get_ident()
+
+    threads = await asyncio.gather(*(h.run_db(work) for h in handlers for _ in range(3)))
+    assert loop_thread not in threads
+    assert max(overlaps) == 1
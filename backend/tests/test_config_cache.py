@@ -0,0 +1,49 @@
+"""
+配置缓存测试
+"""
+from unittest.mock import Mock, patch
+
+from core import config_cache
+from core.config_cache import ConfigCache
+
+
+def test_get_loads_once_until_invalidated():
+    loader = Mock(side_effect=["v1", "v2"])
+    cache = ConfigCache("test_loads_once", loader)
+
+    assert cache.get(Mock()) == "v1"
+    assert cache.get(Mock()) == "v1"
+    assert loader.call_count == 1
+
+    with patch("core.config_cache.notify_config_change") as notify:
+        cache.invalidate()
+    notify.assert_called_once_with("test_loads_once")
+
+    assert cache.get(Mock()) == "v2"
+    assert loader.call_count == 2
+
+
+def test_value_loaded_during_invalidation_is_not_stored():
+    cache = None
+
+    def loader(db):
+        # 模拟加载过程中另一个请求修改了配置
+        cache.invalidate(broadcast=False)
+        return "stale"
+
+    cache = ConfigCache("test_race", loader)
+    assert cache.get(Mock()) == "stale"
+    assert cache._entry is None
+
+
+def test_notification_invalidates_without_rebroadcast():
+    loader = Mock(side_effect=["v1", "v2"])
+    cache = ConfigCache("test_notify", loader)
+    cache.get(Mock())
+
+    with patch("core.config_cache.notify_config_change") as notify:
+        config_cache._handle_notification("test_notify")
+        config_cache._handle_notification("unknown_namespace")
+    notify.assert_not_called()
+
+    assert cache.get(Mock()) == "v2"
@@ -176,5 +176,87 @@ class TestPasswordEncryption:
             core.crypto._encryption_instance = original_instance
 
 
+class TestKeyRotation:
+    """密钥缓存与轮换测试"""
+
+    def test_derived_key_is_cached(self):
+        """非法 Fernet 密钥（如 hex）只做一次 PBKDF2 派生"""
+        from unittest.mock import patch
+        import core.crypto
+
+        hex_key = "ab" * 32
+        core.crypto._derive_key.cache_clear()
+        with patch.object(core.crypto, "PBKDF2HMAC", wraps=core.crypto.PBKDF2HMAC) as kdf:
+            first = PasswordEncryption(hex_key, old_keys=[])
+            second = PasswordEncryption(hex_key, old_keys=[])
+        assert kdf.call_count == 1
+        assert second.decrypt_password(first.encrypt_password("x")) == "x"
+
+    def test_old_keys_decrypt_and_rotate(self):
+        """新密钥加密，旧密钥仍可解密，轮换后只依赖新密钥"""
+        old_key, new_key = generate_encryption_key(), generate_encryption_key()
+        old = PasswordEncryption(old_key, old_keys=[])
+        rotated = PasswordEncryption(new_key, old_keys=[old_key])
+        new_only = PasswordEncryption(new_key, old_keys=[])
+
+        token = old.encrypt_password("secret")
+        assert rotated.decrypt_password(token) == "secret"
+        assert rotated.needs_rotation(token)
+
+        fresh = rotated.rotate_password(token)
+        assert not rotated.needs_rotation(fresh)
+        assert new_only.decrypt_password(fresh) == "secret"
+        assert not rotated.needs_rotation(rotated.encrypt_password("secret"))
+
+        with pytest.raises(ValueError, match="密码解密失败"):
+            new_only.rotate_password(token)
+
+    def test_reencrypt_external_passwords_in_batches(self):
+        """分批读取，只写回明文和旧密钥密文"""
+        from unittest.mock import MagicMock, patch
+        from core import key_rotation
+
+        old_key, new_key = generate_encryption_key(), generate_encryption_key()
+        encryption = PasswordEncryption(new_key, old_keys=[old_key])
+        stale = PasswordEncryption(old_key, old_keys=[]).encrypt_password("a")
+        current = encryption.encrypt_password("b")
+        broken = PasswordEncryption(generate_encryption_key(), old_keys=[]).encrypt_password("c")
+
+        batches = [[(1, stale), (2, current)], [(3, "plain"), (4, broken)], []]
+        updates = []
+
+        def execute(statement, params=None):
+            result = MagicMock()
+            if params is None:
+                rows = batches.pop(0)
+                result.all.return_value = [_Row(*r) for r in rows]
+            else:
+                updates.append(params)
+                result.rowcount = len(params)
+            return result
+
+        db = MagicMock()
+        db.execute.side_effect = execute
+        with patch.object(key_rotation, "get_password_encryption", return_value=encryption):
+            result = key_rotation.reencrypt_external_passwords(db, batch_size=2)
+
+        assert (result.scanned, result.encrypted, result.rotated, result.failed_ids) == (4, 1, 1, [4])
+        assert [[p["b_id"] for p in batch] for batch in updates] == [[1], [3]]
+        assert encryption.decrypt_password(updates[0][0]["b_new"]) == "a"
+        assert not encryption.needs_rotation(updates[1][0]["b_new"])
+        assert db.commit.call_count == 2
+
+
+class _Row(tuple):
+    """模拟 SQLAlchemy Row：既可解包也可按属性取值"""
+
+    def __new__(cls, account_id, password):
+        return super().__new__(cls, (account_id, password))
+
+    @property
+    def id(self):
+        return self[0]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
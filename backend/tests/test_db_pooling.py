@@ -0,0 +1,78 @@
+"""
+数据库连接池配置与指标测试
+"""
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import exc
+
+from db import pooling
+from db.pooling import MeteredNullPool, MeteredQueuePool, PoolMetrics, engine_options, get_pool_metrics, pool_status
+
+
+def test_metrics_snapshot_percentiles():
+    metrics = PoolMetrics("t")
+    for ms in range(1, 101):
+        metrics.observe(ms / 1000)
+    metrics.observe_timeout()
+
+    snap = metrics.snapshot()
+    assert snap["checkouts"] == 100
+    assert snap["timeouts"] == 1
+    assert snap["avg_wait_ms"] == pytest.approx(50.5)
+    assert snap["p50_wait_ms"] == pytest.approx(51)
+    assert snap["p99_wait_ms"] == pytest.approx(100)
+    assert snap["max_wait_ms"] == pytest.approx(100)
+
+
+def test_empty_metrics_snapshot():
+    snap = PoolMetrics("empty").snapshot()
+    assert snap["checkouts"] == 0
+    assert snap["avg_wait_ms"] == 0.0
+    assert snap["p99_wait_ms"] == 0.0
+
+
+def test_engine_options_use_pool_settings():
+    with patch.object(pooling.settings, "DB_PGBOUNCER_MODE", False), \
+            patch.object(pooling.settings, "DB_POOL_SIZE", 7), \
+            patch.object(pooling.settings, "DB_MAX_OVERFLOW", 3):
+        options = engine_options("primary")
+    assert options["poolclass"] is MeteredQueuePool
+    assert options["pool_size"] == 7
+    assert options["max_overflow"] == 3
+    assert options["pool_logging_name"] == "primary"
+
+
+def test_pgbouncer_mode_disables_pooling_and_statement_cache():
+    with patch.object(pooling.settings, "DB_PGBOUNCER_MODE", True):
+        sync_options = engine_options("primary")
+        async_options = engine_options("async", is_async=True)
+    assert sync_options["poolclass"] is MeteredNullPool
+    assert "pool_size" not in sync_options
+    assert "connect_args" not in sync_options
+    connect_args = async_options["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_name_func"]() != connect_args["prepared_statement_name_func"]()
+
+
+def test_checkouts_and_timeouts_are_recorded_across_recreate():
+    pool = MeteredQueuePool(
+        lambda: sqlite3.connect(":memory:"),
+        pool_size=1, max_overflow=0, timeout=0.01, logging_name="test-checkout",
+    )
+    metrics = get_pool_metrics("test-checkout")
+
+    conn = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    conn.close()
+
+    recreated = pool.recreate()
+    recreated.connect().close()
+
+    assert metrics.checkouts == 2
+    assert metrics.timeouts == 1
+    status = pool_status("test-checkout", type("E", (), {"pool": recreated})())
+    assert status["checked_out"] == 0
+    assert status["checkouts"] == 2
@@ -0,0 +1,244 @@
+"""
+外部邮箱 IMAP 同步：响应解析、文件夹选择、增量位置与按提供商限流的调度测试
+"""
+import imaplib
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core import external_sync, job_coordinator
+from core.external_sync import (
+    ExternalSyncScheduler,
+    decode_imap_utf7,
+    parse_fetch_response,
+    parse_list_response,
+    provider_key,
+    select_sync_folders,
+    sync_folder,
+)
+from core.job_coordinator import LeaseLost
+
+
+def raw_email(n):
+    return f"Subject: s{n}\nFrom: a@example.com\nMessage-ID: <m{n}@example.com>\n\nbody\n".encode()
+
+
+def test_decode_modified_utf7():
+    assert decode_imap_utf7("&XfJT0ZAB-") == "已发送"
+    assert decode_imap_utf7("Tom &- Jerry") == "Tom & Jerry"
+    assert decode_imap_utf7("INBOX") == "INBOX"
+
+
+def test_list_parsing_and_folder_selection():
+    lines = [
+        b'(\\HasNoChildren) "/" "INBOX"',
+        b'(\\HasNoChildren \\Sent) "/" "[Gmail]/Sent Mail"',
+        b'(\\All \\HasNoChildren) "/" "[Gmail]/All Mail"',
+        b'(\\HasNoChildren) "/" "&XfJT0ZAB-"',
+        b'(\\HasNoChildren) "/" "&V4NXPpCuTvY-"',
+        (b'(\\HasNoChildren) "." {8}', b'Work.Q&A'),
+        b'(\\Noselect \\HasChildren) "/" "[Gmail]"',
+    ]
+    folders = parse_list_response(lines)
+    assert [f.display_name for f in folders][-2] == "Work/Q&A"
+
+    selected = select_sync_folders(list(reversed(folders)))
+    assert selected[0].is_inbox
+    assert {f.display_name for f in selected} == {"INBOX", "[Gmail]/Sent Mail", "已发送", "Work/Q&A"}
+
+
+def test_fetch_parsing_handles_flags_after_literal():
+    data = [
+        (b'1 (UID 101 FLAGS (\\Seen) BODY[] {10}', b"raw-one"),
+        b')',
+        (b'2 (UID 102 BODY[] {10}', b"raw-two"),
+        b' FLAGS ())',
+    ]
+    assert parse_fetch_response(data) == [(101, True, b"raw-one"), (102, False, b"raw-two")]
+
+
+def test_provider_key():
+    assert provider_key("gmail", "imap.gmail.com") == "gmail"
+    assert provider_key("custom", "Mail.Example.com") == "mail.example.com"
+
+
+def make_imap(uids, uidvalidity=7, modseq=50):
+    imap = MagicMock()
+    imap.select.return_value = ("OK", [b"3"])
+    imap.response.side_effect = lambda code: (code, [str({"UIDVALIDITY": uidvalidity, "HIGHESTMODSEQ": modseq}[code]).encode()])
+
+    def uid(command, *args):
+        if command == "SEARCH":
+            return "OK", [" ".join(str(u) for u in uids).encode()]
+        requested = [int(u) for u in args[0].split(",")]
+        data = []
+        for u in requested:
+            data.append((f"{u} (UID {u} FLAGS (\\Seen) BODY[] {{1}}".encode(), raw_email(u)))
+            data.append(b")")
+        return "OK", data
+    imap.uid.side_effect = uid
+    return imap
+
+
+def run_sync_folder(state, imap, budget=100):
+    db = MagicMock()
+    account = SimpleNamespace(id=1, user_id=2, email="me@gmail.com")
+    remote = SimpleNamespace(name="INBOX", display_name="INBOX", flags=set(), is_inbox=True)
+    inserted = []
+
+    def fake_insert(db, user_id, folder_id, mailbox_address, batch, dedupe_in_folder):
+        inserted.append([(m.message_id, m.is_read) for m in batch])
+        return len(batch), 0, []
+
+    with patch.object(external_sync, "_get_folder_state", return_value=state), \
+            patch.object(external_sync, "_ensure_local_folder", return_value=9), \
+            patch.object(external_sync, "insert_parsed_messages", side_effect=fake_insert), \
+            patch.object(external_sync, "FETCH_CHUNK_SIZE", 2):
+        fetched = sync_folder(db, imap, account, remote, condstore=True, budget=budget)
+    return fetched, inserted
+
+
+def make_state(**overrides):
+    fields = dict(uidvalidity=7, last_uid=10, highest_modseq=40, total_fetched_count=0,
+                  last_synced_at=None, last_fetched_count=0, last_duration_ms=None)
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def test_incremental_fetch_in_chunks_advances_uid_and_modseq():
+    state = make_state()
+    # "11:*" 在没有新邮件时也返回最后一封，10 需要被过滤掉
+    fetched, inserted = run_sync_folder(state, make_imap([10, 11, 12, 15]))
+
+    assert fetched == 3
+    assert inserted == [
+        [("m11@example.com", True), ("m12@example.com", True)],
+        [("m15@example.com", True)],
+    ]
+    assert (state.last_uid, state.highest_modseq, state.total_fetched_count) == (15, 50, 3)
+
+
+def test_unchanged_modseq_skips_search():
+    state = make_state(highest_modseq=50)
+    imap = make_imap([11])
+    fetched, inserted = run_sync_folder(state, imap)
+    assert (fetched, inserted) == (0, [])
+    imap.uid.assert_not_called()
+
+
+def test_budget_leaves_modseq_for_next_run_and_uidvalidity_resets():
+    state = make_state(uidvalidity=6, last_uid=99, highest_modseq=50)
+    fetched, _ = run_sync_folder(state, make_imap([1, 2, 3]), budget=2)
+    assert fetched == 2
+    assert (state.uidvalidity, state.last_uid, state.highest_modseq) == (7, 2, None)
+
+
+def test_scheduler_limits_connections_per_provider():
+    lock = threading.Lock()
+    active, peak = {}, {}
+
+    def fake_sync(account_id):
+        provider = "gmail" if account_id < 10 else "qq"
+        with lock:
+            active[provider] = active.get(provider, 0) + 1
+            peak[provider] = max(peak.get(provider, 0), active[provider])
+        time.sleep(0.02)
+        with lock:
+            active[provider] -= 1
+        return account_id
+
+    scheduler = ExternalSyncScheduler(max_workers=4, provider_limits={"gmail": 2}, default_provider_limit=1)
+    accounts = [(i, "gmail") for i in range(5)] + [(10 + i, "qq") for i in range(3)]
+    results = scheduler.run(accounts, fake_sync)
+
+    assert results == {account_id: account_id for account_id, _ in accounts}
+    assert peak == {"gmail": 2, "qq": 1}
+
+
+def test_scheduler_records_failures():
+    def fake_sync(account_id):
+        if account_id == 2:
+            raise RuntimeError("boom")
+        return 1
+
+    scheduler = ExternalSyncScheduler(max_workers=2, provider_limits={}, default_provider_limit=1)
+    assert scheduler.run([(1, "a"), (2, "b")], fake_sync) == {1: 1, 2: None}
+
+
+def run_sync_account(folder_results):
+    account = SimpleNamespace(id=1, user_id=2, email="me@x.com", username="me", password="enc",
+                              last_sync_at=None, sync_error=None)
+    db = MagicMock()
+    db.get.return_value = account
+    imap = MagicMock()
+    imap.list.return_value = ("OK", [])
+    folders = [SimpleNamespace(name=f"F{i}", display_name=f"F{i}") for i in range(len(folder_results))]
+    with patch.object(external_sync, "SessionLocal", return_value=db), \
+            patch.object(external_sync, "decrypt_password", return_value="pw"), \
+            patch.object(external_sync, "_connect", return_value=imap), \
+            patch.object(external_sync, "_capabilities", return_value=set()), \
+            patch.object(external_sync, "select_sync_folders", return_value=folders), \
+            patch.object(external_sync, "sync_folder", side_effect=folder_results) as sync, \
+            patch.object(external_sync, "_record_folder_error") as record:
+        fetched = external_sync.sync_account(1)
+    return fetched, account, sync, record
+
+
+def test_failed_folder_does_not_stop_other_folders():
+    fetched, account, sync, record = run_sync_account([ValueError("bad row"), 5])
+    assert fetched == 5
+    assert sync.call_count == 2
+    assert record.call_args[0][2].name == "F0"
+    assert account.sync_error == "1 个文件夹同步失败: F0"
+    assert account.last_sync_message_count == 5
+
+
+def test_lost_connection_stops_account_sync():
+    fetched, account, sync, record = run_sync_account([imaplib.IMAP4.abort("socket closed"), 5])
+    assert fetched == 0
+    assert sync.call_count == 1
+    record.assert_not_called()
+    assert "socket closed" in account.sync_error
+
+
+def test_changing_host_or_username_resets_folder_states():
+    from api.external_accounts import ExternalAccountUpdate, update_account
+
+    account = SimpleNamespace(id=1, imap_host="imap.a.com", username="me", last_sync_at="t", sync_error=None)
+    db = MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = account
+    user = SimpleNamespace(id=2)
+
+    update_account(1, ExternalAccountUpdate(imap_host="imap.a.com", display_name="x"), db, user)
+    db.query.return_value.filter.return_value.delete.assert_not_called()
+
+    update_account(1, ExternalAccountUpdate(username="other"), db, user)
+    db.query.return_value.filter.return_value.delete.assert_called_once()
+    assert (account.username, account.last_sync_at) == ("other", None)
+
+
+def test_scheduler_stops_dispatching_after_lease_lost():
+    synced = []
+
+    def fake_sync(account_id):
+        synced.append(account_id)
+        raise LeaseLost("taken over")
+
+    scheduler = ExternalSyncScheduler(max_workers=1, provider_limits={}, default_provider_limit=1)
+    with pytest.raises(LeaseLost):
+        scheduler.run([(1, "a"), (2, "a"), (3, "b")], fake_sync)
+    assert synced == [1]
+
+
+def test_scheduler_threads_see_current_job():
+    coordinator = MagicMock()
+    token = job_coordinator._current_job.set((coordinator, "external_sync"))
+    try:
+        scheduler = ExternalSyncScheduler(max_workers=2, provider_limits={}, default_provider_limit=1)
+        scheduler.run([(1, "a"), (2, "b")], lambda account_id: job_coordinator.ensure_job_lease())
+    finally:
+        job_coordinator._current_job.reset(token)
+    assert coordinator.ensure_lease.call_count == 2
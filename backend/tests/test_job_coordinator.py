@@ -0,0 +1,200 @@
+"""
+后台任务协调（多 worker 选主）测试
+"""
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core import job_coordinator as jc
+from core.job_coordinator import (
+    STATUS_ERROR,
+    STATUS_OK,
+    JobCoordinator,
+    LeaseLost,
+    MemoryLeaseBackend,
+    PostgresLeaseBackend,
+)
+
+
+def make_workers(backend, ttl=30):
+    return JobCoordinator(backend, owner="w1", ttl_seconds=ttl), JobCoordinator(backend, owner="w2", ttl_seconds=ttl)
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_owns_each_job():
+    backend = MemoryLeaseBackend()
+    w1, w2 = make_workers(backend)
+    for w in (w1, w2):
+        w.add_periodic_job("mail_sync", lambda: None, interval=30)
+
+    await w1.renew_leases()
+    await w2.renew_leases()
+    assert w1.is_leader("mail_sync")
+    assert not w2.is_leader("mail_sync")
+
+    # 持有者续约不改变归属
+    await w1.renew_leases()
+    await w2.renew_leases()
+    assert w1.is_leader("mail_sync") and not w2.is_leader("mail_sync")
+
+
+@pytest.mark.asyncio
+async def test_released_lease_fails_over():
+    backend = MemoryLeaseBackend()
+    w1, w2 = make_workers(backend)
+    for w in (w1, w2):
+        w.add_periodic_job("session_cleanup", lambda: None, interval=86400)
+
+    await w1.renew_leases()
+    await w1.stop()
+    await w2.renew_leases()
+    assert w2.is_leader("session_cleanup")
+    assert backend.list_leases()[0]["owner"] == "w2"
+
+
+@pytest.mark.asyncio
+async def test_local_lease_expires_when_renewal_fails():
+    backend = MemoryLeaseBackend()
+    w1 = JobCoordinator(backend, owner="w1", ttl_seconds=30)
+    w1.add_periodic_job("mail_sync", lambda: None, interval=30)
+    with patch.object(jc.time, "monotonic", return_value=1000.0):
+        await w1.renew_leases()
+    with patch.object(backend, "acquire", side_effect=RuntimeError("db down")), \
+            patch.object(jc.time, "monotonic", return_value=1031.0):
+        await w1.renew_leases()
+        assert not w1.is_leader("mail_sync")
+
+
+@pytest.mark.asyncio
+async def test_singleton_service_follows_lease():
+    backend = MemoryLeaseBackend()
+    events = []
+    w1 = JobCoordinator(backend, owner="w1")
+    w1.add_singleton("lmtp_server", start=lambda: events.append("start"), stop=lambda: events.append("stop"))
+
+    await w1.renew_leases()
+    await w1.renew_leases()
+    assert events == ["start"]
+
+    with patch.object(backend, "acquire", return_value=None):
+        await w1.renew_leases()
+    assert events == ["start", "stop"]
+
+
+@pytest.mark.asyncio
+async def test_run_records_status_and_schedule_survives_failover():
+    backend = MemoryLeaseBackend()
+    w1, w2 = make_workers(backend)
+
+    def boom():
+        raise ValueError("imap down")
+
+    w1.add_periodic_job("mail_sync", boom, interval=30)
+    w2.add_periodic_job("mail_sync", lambda: None, interval=30)
+    await w1.renew_leases()
+    await w1.run_job_once(w1._jobs["mail_sync"])
+
+    lease = backend.list_leases()[0]
+    assert lease["last_status"] == STATUS_ERROR
+    assert lease["last_error"] == "imap down"
+    assert lease["run_count"] == 1
+
+    # 接管者按上次完成时间调度，不会立即重复执行
+    await w1.stop()
+    await w2.renew_leases()
+    assert w2._seconds_until_due(w2._jobs["mail_sync"]) > 25
+
+    await w2.run_job_once(w2._jobs["mail_sync"])
+    assert backend.list_leases()[0]["last_status"] == STATUS_OK
+
+
+@pytest.mark.asyncio
+async def test_status_reports_owner_and_last_run():
+    backend = MemoryLeaseBackend()
+    w1, w2 = make_workers(backend)
+    for w in (w1, w2):
+        w.add_periodic_job("pool_stats_rollup", lambda: None, interval=300)
+        w.add_singleton("lmtp_server", start=lambda: None, stop=lambda: None)
+    await w1.renew_leases()
+    await w1.run_job_once(w1._jobs["pool_stats_rollup"])
+
+    status = w2.status()
+    jobs = {job["name"]: job for job in status["jobs"]}
+    assert status["worker"] == "w2"
+    assert jobs["pool_stats_rollup"]["owner"] == "w1"
+    assert jobs["pool_stats_rollup"]["lease_active"]
+    assert not jobs["pool_stats_rollup"]["is_self"]
+    assert jobs["pool_stats_rollup"]["run_count"] == 1
+    assert jobs["lmtp_server"]["kind"] == "singleton"
+
+
+@pytest.mark.asyncio
+async def test_job_stops_at_next_batch_after_losing_lease():
+    backend = MemoryLeaseBackend()
+    w1 = JobCoordinator(backend, owner="w1")
+    committed = []
+
+    def long_job():
+        for batch in range(3):
+            jc.ensure_job_lease(db=object())
+            committed.append(batch)
+            if batch == 0:
+                # 续约失败期间本地租约到期
+                w1._lease_deadlines["mail_import"] = 0.0
+
+    w1.add_periodic_job("mail_import", long_job, interval=10)
+    await w1.renew_leases()
+    await w1.run_job_once(w1._jobs["mail_import"])
+
+    assert committed == [0]
+    lease = backend.list_leases()[0]
+    assert lease["last_status"] == STATUS_ERROR
+    assert "租约已失效" in lease["last_error"]
+
+
+@pytest.mark.asyncio
+async def test_db_fence_rejects_batch_after_takeover():
+    backend = MemoryLeaseBackend()
+    w1, w2 = make_workers(backend)
+    for w in (w1, w2):
+        w.add_periodic_job("external_sync", lambda: None, interval=60)
+    await w1.renew_leases()
+    w1.ensure_lease("external_sync", db=object())
+
+    # w1 本地仍认为持有，但共享后端中租约已过期并被 w2 接管
+    backend._leases["external_sync"]["lease_expires_at"] = datetime.now(timezone.utc)
+    await w2.renew_leases()
+    with pytest.raises(LeaseLost):
+        w1.ensure_lease("external_sync", db=object())
+
+
+def test_ensure_job_lease_outside_jobs_is_noop():
+    jc.ensure_job_lease(db=object())
+
+
+def test_postgres_fence_locks_lease_row_in_callers_transaction():
+    db = MagicMock()
+    db.execute.return_value.first.return_value = None
+    assert not PostgresLeaseBackend().holds(db, "mail_import", "w1")
+    sql = str(db.execute.call_args[0][0])
+    assert "FOR SHARE" in sql and "clock_timestamp()" in sql
+    assert db.execute.call_args[0][1] == {"name": "mail_import", "owner": "w1"}
+
+
+@pytest.mark.asyncio
+async def test_status_lists_leases_held_by_other_processes():
+    backend = MemoryLeaseBackend()
+    worker = JobCoordinator(backend, owner="worker")
+    worker.add_periodic_job("temp_mailbox_maintenance", lambda: None, interval=60)
+    await worker.renew_leases()
+
+    # api 进程不登记任务，仍能看到 worker 持有的租约
+    api = JobCoordinator(backend, owner="api")
+    jobs = api.status()["jobs"]
+    assert [job["name"] for job in jobs] == ["temp_mailbox_maintenance"]
+    assert jobs[0]["owner"] == "worker"
+    assert jobs[0]["lease_active"] and not jobs[0]["is_self"]
+    assert (jobs[0]["kind"], jobs[0]["interval_seconds"]) == (None, None)
+
+    assert worker.status()["jobs"][0]["kind"] == "periodic"
@@ -0,0 +1,209 @@
+"""
+邮件导出：PDF 磁盘缓存、渲染队列与 EML 构建测试
+"""
+import email as email_lib
+import io
+import os
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core import mail_export
+from core.mail_export import (
+    PdfCache,
+    PdfExportBusy,
+    PdfExportTimeout,
+    PdfRenderer,
+    PdfRendererUnavailable,
+    build_eml,
+    content_hash,
+    iter_email_pdfs,
+    render_email_pdf,
+)
+
+
+def make_email(**overrides):
+    fields = dict(
+        id=1,
+        subject="周报",
+        sender="a@example.com",
+        recipients='{"to": [{"email": "b@example.com"}], "cc": [{"email": "c@example.com"}]}',
+        received_at=datetime(2025, 1, 2, 3, 4, tzinfo=timezone.utc),
+        body_html="<p>hello</p>",
+        body_text="hello",
+        message_id="m1@example.com",
+    )
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=25)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"x" * 10)
+    # 访问 a 后 b 成为最久未访问
+    os.utime(tmp_path / "b.pdf", (1, 1))
+    assert cache.get("a") == b"x" * 10
+    cache.put("c", b"x" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_cache_key_follows_content_and_timezone():
+    email = make_email()
+    body_hash = content_hash(email, ["a.txt"])
+    assert body_hash == content_hash(make_email(), ["a.txt"])
+    assert body_hash != content_hash(make_email(body_html="<p>changed</p>"), ["a.txt"])
+    assert body_hash != content_hash(email, [])
+    assert PdfCache.key(1, "UTC", body_hash) != PdfCache.key(1, "Asia/Shanghai", body_hash)
+
+
+def test_renderer_rejects_when_queue_is_full():
+    renderer = PdfRenderer(workers=1, max_pending=1, timeout_seconds=1)
+    renderer._slots.acquire()
+    with pytest.raises(PdfExportBusy):
+        renderer.render("<p></p>")
+    renderer._slots.release()
+
+
+def test_renderer_marks_unavailable_without_weasyprint():
+    renderer = PdfRenderer(workers=1, max_pending=1, timeout_seconds=1)
+    future = Future()
+    future.set_result(None)
+    executor = MagicMock()
+    executor.submit.return_value = future
+    with patch.object(renderer, "_get_executor", return_value=executor):
+        with pytest.raises(PdfRendererUnavailable):
+            renderer.render("<p></p>")
+        with pytest.raises(PdfRendererUnavailable):
+            renderer.render("<p></p>")
+    assert executor.submit.call_count == 1
+
+
+def test_broken_pool_is_rebuilt():
+    renderer = PdfRenderer(workers=1, max_pending=1, timeout_seconds=1)
+    broken = Future()
+    broken.set_exception(BrokenProcessPool("child died"))
+    ok = Future()
+    ok.set_result(b"%PDF")
+    first, second = MagicMock(), MagicMock()
+    first.submit.return_value = broken
+    second.submit.return_value = ok
+
+    with patch.object(mail_export, "ProcessPoolExecutor", side_effect=[first, second]):
+        with pytest.raises(PdfExportBusy):
+            renderer.render("<p></p>")
+        first.shutdown.assert_called_once()
+        assert renderer.render("<p></p>") == b"%PDF"
+
+
+def test_timed_out_render_keeps_slot_until_finished():
+    renderer = PdfRenderer(workers=1, max_pending=1, timeout_seconds=0.01)
+    future = Future()
+    future.set_running_or_notify_cancel()
+    executor = MagicMock()
+    executor.submit.return_value = future
+    with patch.object(renderer, "_get_executor", return_value=executor), \
+            patch.object(mail_export, "RESULT_GRACE_SECONDS", 0):
+        with pytest.raises(PdfExportTimeout):
+            renderer.render("<p></p>")
+        # 子进程仍在渲染，不能接新任务
+        with pytest.raises(PdfExportBusy):
+            renderer.render("<p></p>")
+        future.set_result(b"%PDF")
+        assert renderer._slots.acquire(blocking=False)
+
+
+def test_render_uses_cache_and_falls_back_to_html(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=1024)
+    renderer = MagicMock()
+    renderer.render.return_value = b"%PDF"
+    with patch.object(mail_export, "pdf_cache", cache), patch.object(mail_export, "pdf_renderer", renderer):
+        assert render_email_pdf(make_email(), [], "UTC") == (b"%PDF", "application/pdf", "pdf")
+        assert render_email_pdf(make_email(), [], "UTC")[0] == b"%PDF"
+        assert renderer.render.call_count == 1
+
+        renderer.render.side_effect = PdfRendererUnavailable()
+        content, media_type, ext = render_email_pdf(make_email(subject="其他"), [], "Bad/Zone")
+    assert (media_type, ext) == ("text/html", "html")
+    assert "其他" in content.decode("utf-8")
+
+
+
+def test_batch_render_submits_all_before_waiting(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=1024 * 1024)
+    cached_email = make_email(id=2, subject="已缓存")
+    cache.put(PdfCache.key(2, "UTC", content_hash(cached_email, [])), b"%PDF-2")
+    calls = []
+    renderer = MagicMock()
+
+    def submit(html, wait_for_slot=False):
+        calls.append("submit")
+        assert wait_for_slot
+        return MagicMock(), Future()
+
+    def wait(executor, future):
+        calls.append("wait")
+        return b"%PDF-" + str(calls.count("wait")).encode()
+    renderer.submit.side_effect = submit
+    renderer.wait.side_effect = wait
+
+    emails = [make_email(id=1), cached_email, make_email(id=3, subject="其他")]
+    with patch.object(mail_export, "pdf_cache", cache), patch.object(mail_export, "pdf_renderer", renderer):
+        results = list(iter_email_pdfs([(e, []) for e in emails], "UTC"))
+
+    # 两封未缓存的邮件先全部提交，再按顺序取结果
+    assert calls == ["submit", "submit", "wait", "wait"]
+    assert [(e.id, content) for e, content, _, _ in results] == [(1, b"%PDF-1"), (2, b"%PDF-2"), (3, b"%PDF-2")]
+    assert cache.get(PdfCache.key(3, "UTC", content_hash(emails[2], []))) == b"%PDF-2"
+
+
+def test_batch_render_failure_cancels_pending(tmp_path):
+    futures = [Future(), Future()]
+    renderer = MagicMock()
+    renderer.submit.side_effect = [(MagicMock(), future) for future in futures]
+    renderer.wait.side_effect = PdfExportTimeout()
+
+    emails = [make_email(id=1), make_email(id=2, subject="其他")]
+    with patch.object(mail_export, "pdf_cache", PdfCache(str(tmp_path), max_bytes=1024)), \
+            patch.object(mail_export, "pdf_renderer", renderer):
+        with pytest.raises(PdfExportTimeout):
+            list(iter_email_pdfs([(e, []) for e in emails], "UTC"))
+    assert futures[1].cancelled()
+
+
+def test_bulk_export_zip_is_written_to_a_temp_file():
+    from api.mail import _iter_and_close, _write_export_zip
+
+    files = (item for item in [
+        (make_email(id=1, subject="a"), b"%PDF", "application/pdf", "pdf"),
+        (make_email(id=2, subject="b"), b"eml", "message/rfc822", "eml"),
+    ])
+    archive_file = _write_export_zip(files)
+    data = b"".join(_iter_and_close(archive_file))
+
+    assert archive_file.closed
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == ["1_a.pdf", "2_b.eml"]
+        assert archive.getinfo("1_a.pdf").compress_type == zipfile.ZIP_STORED
+
+
+def test_build_eml_with_attachment(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"attachment body")
+    attachments = [SimpleNamespace(file_path=str(path), filename="a.txt")]
+
+    msg = email_lib.message_from_bytes(build_eml(make_email(), attachments))
+    assert msg.get_content_type() == "multipart/mixed"
+    assert msg["To"] == "b@example.com"
+    assert msg["Cc"] == "c@example.com"
+    assert msg["Message-ID"] == "<m1@example.com>"
+    parts = [p for p in msg.walk() if p.get_filename() == "a.txt"]
+    assert parts[0].get_payload(decode=True) == b"attachment body"
@@ -0,0 +1,209 @@
+"""
+邮箱批量导入：流式解析、去重、分批入库与续跑测试
+"""
+import io
+import zipfile
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core import mail_import
+from core.job_coordinator import LeaseLost
+from core.mail_import import (
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    detect_format,
+    iter_mbox_messages,
+    iter_zip_messages,
+    parse_message,
+    run_import_job,
+    run_pending_imports_once,
+)
+
+
+def raw_email(n, message_id=True, body="hello"):
+    headers = f"Subject: s{n}\nFrom: a@example.com\nDate: Thu, 02 Jan 2025 03:04:00 +0000\n"
+    if message_id:
+        headers += f"Message-ID: <m{n}@example.com>\n"
+    return (headers + f"\n{body}\n").encode()
+
+
+def test_detect_format():
+    assert detect_format("Archive.MBOX") == "mbox"
+    assert detect_format("export.zip") == "zip"
+    assert detect_format("one.eml") == "eml"
+    assert detect_format("notes.txt") is None
+
+
+def test_mbox_is_split_and_unescaped():
+    data = (
+        b"From a@example.com Thu Jan  2 03:04:00 2025\n" + raw_email(1, body=">From here\n>>From there") + b"\n"
+        b"From b@example.com Thu Jan  2 03:05:00 2025\n" + raw_email(2) + b"\n"
+    )
+    messages = list(iter_mbox_messages(io.BytesIO(data)))
+
+    assert [m for m, _ in messages] == [raw_email(1, body="From here\n>From there"), raw_email(2)]
+    assert sum(size for _, size in messages) == len(data)
+
+
+def test_zip_reads_only_eml_entries(tmp_path):
+    path = tmp_path / "mail.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("inbox/1.eml", raw_email(1))
+        archive.writestr("__MACOSX/inbox/._1.eml", b"junk")
+        archive.writestr("readme.txt", b"x")
+    assert [m for m, _ in iter_zip_messages(str(path))] == [raw_email(1)]
+
+
+def test_oversized_messages_are_not_read(tmp_path):
+    path = tmp_path / "bomb.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("big.eml", b"x" * 10000)
+        archive.writestr("ok.eml", raw_email(1))
+    mbox = b"From a Thu Jan  2 03:04:00 2025\n" + b"y" * 3000 + b"\nFrom b Thu Jan  2 03:04:00 2025\n" + raw_email(2)
+
+    with patch.object(mail_import.settings, "MAIL_IMPORT_MAX_MESSAGE_BYTES", 1000):
+        zipped = [m for m, _ in iter_zip_messages(str(path))]
+        boxed = [m for m, _ in iter_mbox_messages(io.BytesIO(mbox))]
+    assert zipped == [None, raw_email(1)]
+    assert boxed == [None, raw_email(2)]
+
+
+def test_parse_message_strips_nul():
+    parsed = parse_message(b"Subject: a\x00b\nMessage-ID: <m@x>\n\nhel\x00lo\n")
+    assert parsed.subject == "ab"
+    assert "\x00" not in parsed.body_text
+
+
+def test_parse_message_dedupe_key():
+    first = parse_message(raw_email(1))
+    assert first.message_id == "m1@example.com"
+    assert first.subject == "s1"
+    assert first.received_at.tzinfo is not None
+    assert first.dedupe_key == parse_message(raw_email(1, body="changed")).dedupe_key
+    # 没有 Message-ID 时按原文去重
+    assert parse_message(raw_email(2, message_id=False)).dedupe_key != \
+        parse_message(raw_email(2, message_id=False, body="changed")).dedupe_key
+
+
+def make_job(**overrides):
+    fields = dict(
+        id="job", user_id=1, folder_id=5, format="mbox", file_path="/tmp/x.mbox", status="pending",
+        started_at=None, completed_at=None, processed_count=0, imported_count=0,
+        duplicate_count=0, failed_count=0, bytes_processed=0,
+    )
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def run_with(job, messages, batch_size=2, bad_ids=()):
+    batches = []
+
+    def fake_insert(db, user_id, folder_id, mailbox_address, batch):
+        batches.append([m.message_id for m in batch])
+        if any(m.message_id in bad_ids for m in batch):
+            raise ValueError("A string literal cannot contain NUL (0x00) characters.")
+        return len(batch), 0, []
+
+    db = MagicMock()
+    db.get.return_value = SimpleNamespace(email="me@example.com")
+    with patch.object(mail_import, "iter_archive_messages", return_value=iter(messages)), \
+            patch.object(mail_import, "insert_parsed_messages", side_effect=fake_insert), \
+            patch.object(mail_import.settings, "MAIL_IMPORT_BATCH_SIZE", batch_size):
+        run_import_job(db, job)
+    return batches
+
+
+def test_import_batches_dedupes_and_counts_failures():
+    job = make_job()
+    messages = [(raw_email(1), 10), (raw_email(2), 10), (raw_email(1), 10), (b"\xff\x00", 5), (raw_email(3), 10)]
+
+    def parse_or_fail(raw):
+        if raw == b"\xff\x00":
+            raise ValueError("bad")
+        return parse_message(raw)
+
+    with patch.object(mail_import, "parse_message", side_effect=parse_or_fail):
+        batches = run_with(job, messages)
+
+    assert batches == [["m1@example.com", "m2@example.com"], ["m3@example.com"]]
+    assert job.status == STATUS_COMPLETED
+    assert (job.processed_count, job.imported_count, job.duplicate_count, job.failed_count) == (5, 3, 1, 1)
+    assert job.bytes_processed == 45
+
+
+def test_import_resumes_after_processed_messages():
+    job = make_job(status="running", processed_count=2, imported_count=2)
+    batches = run_with(job, [(raw_email(1), 1), (raw_email(2), 1), (raw_email(3), 1)])
+
+    assert batches == [["m3@example.com"]]
+    assert (job.processed_count, job.imported_count) == (3, 3)
+
+
+def test_failed_batch_is_retried_one_message_at_a_time():
+    job = make_job()
+    messages = [(raw_email(n), 1) for n in (1, 2, 3)]
+    batches = run_with(job, messages, batch_size=3, bad_ids={"m2@example.com"})
+
+    assert batches[0] == ["m1@example.com", "m2@example.com", "m3@example.com"]
+    assert batches[1:4] == [["m1@example.com"], ["m2@example.com"], ["m3@example.com"]]
+    assert job.status == STATUS_COMPLETED
+    assert (job.processed_count, job.imported_count, job.failed_count) == (3, 2, 1)
+
+
+def test_job_interrupted_too_often_is_failed():
+    job = make_job(status="running", attempts=mail_import.settings.MAIL_IMPORT_MAX_ATTEMPTS, error=None)
+    db = MagicMock()
+    db.query.return_value.filter.return_value.order_by.return_value.first.return_value = job
+    with patch.object(mail_import, "SessionLocal", return_value=db), \
+            patch.object(mail_import, "run_import_job") as run, \
+            patch.object(mail_import, "_remove_upload") as remove:
+        run_pending_imports_once()
+
+    run.assert_not_called()
+    remove.assert_called_once_with(job)
+    assert job.status == STATUS_FAILED
+
+
+def test_attempt_is_recorded_before_running():
+    job = make_job(attempts=0)
+    db = MagicMock()
+    db.query.return_value.filter.return_value.order_by.return_value.first.return_value = job
+    seen = []
+    with patch.object(mail_import, "SessionLocal", return_value=db), \
+            patch.object(mail_import, "run_import_job", side_effect=lambda db, job: seen.append(job.attempts)), \
+            patch.object(mail_import, "_remove_upload"):
+        run_pending_imports_once()
+    assert seen == [1]
+
+
+def test_lost_lease_keeps_job_and_upload_for_new_owner():
+    job = make_job(status="running", attempts=0, error=None)
+    db = MagicMock()
+    db.query.return_value.filter.return_value.order_by.return_value.first.return_value = job
+    with patch.object(mail_import, "SessionLocal", return_value=db), \
+            patch.object(mail_import, "run_import_job", side_effect=LeaseLost("taken over")), \
+            patch.object(mail_import, "_remove_upload") as remove, \
+            pytest.raises(LeaseLost):
+        run_pending_imports_once()
+
+    remove.assert_not_called()
+    assert (job.status, job.error) == ("running", None)
+
+
+def test_batch_is_not_committed_after_losing_lease():
+    job = make_job()
+    db = MagicMock()
+    db.get.return_value = SimpleNamespace(email="me@example.com")
+    with patch.object(mail_import, "iter_archive_messages", return_value=iter([(raw_email(1), 1)])), \
+            patch.object(mail_import, "insert_parsed_messages", return_value=(1, 0, ["/tmp/att"])), \
+            patch.object(mail_import, "ensure_job_lease", side_effect=LeaseLost("taken over")), \
+            patch.object(mail_import, "remove_files") as remove, \
+            pytest.raises(LeaseLost):
+        run_import_job(db, job)
+
+    # 只提交了开始时的 running 状态，这一批回滚且附件文件被删除
+    assert db.commit.call_count == 1
+    db.rollback.assert_called()
+    remove.assert_called_once_with(["/tmp/att"])
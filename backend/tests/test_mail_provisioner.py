@@ -0,0 +1,120 @@
+"""
+邮件服务器开通队列测试
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from core import mail_provisioner as provisioner_module
+from core.mail_provisioner import MailProvisioner, OP_CREATE, OP_DELETE, ProvisionJob
+
+
+@pytest.fixture(autouse=True)
+def mailbox_db():
+    """删除前复查临时邮箱状态用的会话，默认没有仍为 active 的邮箱"""
+    db = MagicMock()
+    db.execute.return_value.all.return_value = []
+    with patch.object(provisioner_module, "SessionLocal", return_value=db):
+        yield db
+
+
+def test_jobs_for_same_email_are_coalesced():
+    provisioner = MailProvisioner()
+    jobs = [
+        ProvisionJob(OP_CREATE, "a@x.com", "p1"),
+        ProvisionJob(OP_CREATE, "b@x.com", "p2"),
+        ProvisionJob(OP_DELETE, "a@x.com"),
+    ]
+    with patch.object(provisioner_module, "create_mail_users_batch", return_value={"b@x.com": True}) as create, \
+            patch.object(provisioner_module, "delete_mail_users_batch", return_value={"a@x.com": True}) as delete:
+        provisioner.process(jobs)
+
+    create.assert_called_once_with([("b@x.com", "p2")])
+    delete.assert_called_once_with(["a@x.com"])
+    assert provisioner.stats()["created"] == 1
+    assert provisioner.stats()["deleted"] == 1
+
+
+def test_failed_jobs_are_retried_then_dropped():
+    provisioner = MailProvisioner()
+    job = ProvisionJob(OP_CREATE, "a@x.com")
+    with patch.object(provisioner_module, "create_mail_users_batch", return_value={"a@x.com": False}):
+        for _ in range(provisioner_module.MAX_ATTEMPTS):
+            provisioner.process([job])
+            provisioner._retry_heap.clear()
+
+    stats = provisioner.stats()
+    assert stats["retried"] == provisioner_module.MAX_ATTEMPTS - 1
+    assert stats["dropped"] == 1
+
+
+def test_collect_batch_drains_queue():
+    provisioner = MailProvisioner(batch_size=2, linger_seconds=0.01)
+    provisioner.submit_delete_many(["a@x.com", "b@x.com", "c@x.com"])
+    assert [job.email for job in provisioner._collect_batch()] == ["a@x.com", "b@x.com"]
+    assert [job.email for job in provisioner._collect_batch()] == ["c@x.com"]
+
+
+def test_failed_job_superseded_by_newer_op_is_not_retried():
+    provisioner = MailProvisioner()
+    provisioner.submit_create("a@x.com", "p")
+    [create_job] = provisioner._collect_batch()
+    with patch.object(provisioner_module, "create_mail_users_batch", return_value={"a@x.com": False}):
+        provisioner.process([create_job])
+    assert len(provisioner._retry_heap) == 1
+
+    # 失败后邮箱被删除：旧的创建重试不能再把账户建回来
+    provisioner.submit_delete("a@x.com")
+    jobs = [provisioner._retry_heap.pop()[2]] + provisioner._collect_batch()
+    with patch.object(provisioner_module, "create_mail_users_batch") as create, \
+            patch.object(provisioner_module, "delete_mail_users_batch", return_value={"a@x.com": True}) as delete:
+        provisioner.process(jobs)
+
+    create.assert_not_called()
+    delete.assert_called_once_with(["a@x.com"])
+    assert provisioner.stats()["superseded"] == 1
+    assert provisioner._latest_seq == {}
+
+
+def test_stop_drains_pending_deletes():
+    provisioner = MailProvisioner()
+    provisioner.submit_create("new@x.com", "p")
+    provisioner.submit_delete_many(["a@x.com", "b@x.com"])
+    with patch.object(provisioner_module, "create_mail_users_batch") as create, \
+            patch.object(provisioner_module, "delete_mail_users_batch",
+                         return_value={"a@x.com": True, "b@x.com": True}) as delete:
+        provisioner.stop()
+
+    create.assert_not_called()
+    delete.assert_called_once_with(["a@x.com", "b@x.com"])
+    assert provisioner.stats()["pending"] == 0
+
+
+def test_delete_skips_mailboxes_restored_in_another_process(mailbox_db):
+    mailbox_db.execute.return_value.all.return_value = [("a@x.com", "active"), ("b@x.com", "purged")]
+    events = []
+    mailbox_db.close.side_effect = lambda: events.append("close")
+    provisioner = MailProvisioner()
+    provisioner.submit_delete_many(["a@x.com", "b@x.com"])
+    with patch.object(provisioner_module, "delete_mail_users_batch",
+                      side_effect=lambda emails: events.append(emails) or {"b@x.com": True}):
+        provisioner.process(provisioner._collect_batch())
+
+    # 行锁持有到删除完成后才释放
+    assert events == [["b@x.com"], "close"]
+    sql = str(mailbox_db.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+    assert "FOR SHARE" in sql
+    stats = provisioner.stats()
+    assert (stats["kept_active"], stats["deleted"]) == (1, 1)
+    assert provisioner._latest_seq == {}
+
+
+def test_delete_is_retried_when_status_check_fails(mailbox_db):
+    mailbox_db.execute.side_effect = RuntimeError("db down")
+    provisioner = MailProvisioner()
+    with patch.object(provisioner_module, "delete_mail_users_batch") as delete:
+        provisioner.process([ProvisionJob(OP_DELETE, "a@x.com")])
+
+    delete.assert_not_called()
+    assert len(provisioner._retry_heap) == 1
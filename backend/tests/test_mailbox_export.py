@@ -0,0 +1,101 @@
+"""
+邮箱批量导出：mbox / zip 流式输出与续传位置测试
+"""
+import email as email_lib
+import gzip
+import io
+import mailbox
+import zipfile
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from core import mail_export, mailbox_export
+from core.mailbox_export import MboxWriter, ZipWriter, export_filename, stream_export
+
+
+def make_email(email_id, body_text="hello"):
+    return SimpleNamespace(
+        id=email_id,
+        subject=f"邮件 {email_id}",
+        sender="Alice <alice@example.com>",
+        recipients='{"to": [{"email": "bob@example.com"}]}',
+        received_at=datetime(2025, 1, 2, 3, 4, tzinfo=timezone.utc),
+        body_html=None,
+        body_text=body_text,
+        message_id=f"m{email_id}@example.com",
+    )
+
+
+def collect(writer, items):
+    out = b"".join(chunk for email, atts in items for chunk in writer.add(email, atts))
+    return out + b"".join(writer.close())
+
+
+def test_mbox_is_gzipped_and_parseable(tmp_path):
+    data = collect(MboxWriter(), [(make_email(1), []), (make_email(2), [])])
+    path = tmp_path / "out.mbox"
+    path.write_bytes(gzip.decompress(data))
+
+    box = mailbox.mbox(str(path))
+    messages = list(box)
+    box.close()
+    assert [m["Message-ID"] for m in messages] == ["<m1@example.com>", "<m2@example.com>"]
+    assert messages[0].get_from().startswith("alice@example.com ")
+
+
+def test_mbox_escapes_from_lines():
+    raw = b"Subject: x\n\nFrom here\n>From there\nok"
+    with patch.object(mail_export, "iter_eml", return_value=iter([raw])):
+        out = b"".join(mail_export.iter_mbox_message(make_email(1), []))
+    assert out.startswith(b"From alice@example.com Thu Jan 02 03:04:00 2025\n")
+    assert out.endswith(b"\n>From here\n>>From there\nok\n\n")
+
+
+def test_zip_streams_attachments_from_disk(tmp_path):
+    payload = bytes(range(256)) * 1000
+    att_path = tmp_path / "big.bin"
+    att_path.write_bytes(payload)
+    attachment = SimpleNamespace(file_path=str(att_path), filename="big.bin")
+
+    data = collect(ZipWriter(), [(make_email(1), [attachment]), (make_email(2), [])])
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = archive.namelist()
+        assert names == ["1_邮件 1.eml", "2_邮件 2.eml"]
+        msg = email_lib.message_from_bytes(archive.read(names[0]))
+    parts = [p for p in msg.walk() if p.get_filename() == "big.bin"]
+    assert parts[0].get_payload(decode=True) == payload
+
+
+def test_checkpoint_lags_one_batch_and_completes():
+    batches = [[make_email(1), make_email(2)], [make_email(3)], [make_email(5)]]
+    read_db = MagicMock()
+    read_db.execute.return_value.scalars.return_value.partitions.return_value = iter(batches)
+    checkpoints = []
+
+    with patch.object(mailbox_export, "ReadSessionLocal", return_value=read_db), \
+            patch.object(mailbox_export, "SessionLocal", return_value=MagicMock()), \
+            patch.object(mailbox_export, "_load_attachments", return_value={}), \
+            patch.object(mailbox_export, "_checkpoint",
+                         side_effect=lambda db, job_id, *args, **kw: checkpoints.append((args, kw))):
+        stream = stream_export("job", 1, "mbox", None, None, None, 0)
+        next(stream)
+        # 第一批还在输出，尚未确认
+        assert checkpoints == []
+        data = b"".join(stream)
+
+    assert data
+    assert checkpoints == [
+        ((2, 2), {}),
+        ((3, 1), {}),
+        ((5, 1), {"completed": True}),
+    ]
+    read_db.close.assert_called_once()
+
+
+def test_resumed_parts_are_numbered():
+    job = SimpleNamespace(id="a" * 32, parts=1, format="mbox")
+    assert export_filename(job) == "mailbox_aaaaaaaa.mbox.gz"
+    job.parts, job.format = 3, "zip"
+    assert export_filename(job) == "mailbox_aaaaaaaa_part3.zip"
@@ -0,0 +1,69 @@
+"""
+按邮箱聚合统计测试
+"""
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from core.mailbox_stats import MAILBOX_STATS_TRIGGER_SQL, REBUILD_SQL, today_count
+from db.models.email import Email
+
+TODAY = date(2026, 1, 2)
+
+
+def test_today_count_resets_on_new_day():
+    assert today_count(SimpleNamespace(today_date=TODAY, today_count=3), TODAY) == 3
+    assert today_count(SimpleNamespace(today_date=date(2026, 1, 1), today_count=3), TODAY) == 0
+    assert today_count(None, TODAY) == 0
+
+
+def test_trigger_sql_covers_all_write_paths():
+    sql = "\n".join(MAILBOX_STATS_TRIGGER_SQL)
+    for trigger in ("emails_mailbox_stats_insert", "emails_mailbox_stats_update", "emails_mailbox_stats_delete"):
+        assert f"CREATE TRIGGER {trigger}" in sql
+    # 模板占位符已全部展开
+    assert "{" not in sql.replace("{}", "")
+    assert "{address_filter}" in REBUILD_SQL
+
+
+def test_mailbox_received_index_is_descending():
+    index = next(i for i in Email.__table__.indexes if i.name == "ix_emails_mailbox_received")
+    ddl = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    assert "mailbox_address, received_at DESC" in ddl
+    assert not any(i.name == "ix_emails_mailbox_address" for i in Email.__table__.indexes)
+
+
+def _mailbox(n):
+    return SimpleNamespace(
+        id=n, email=f"m{n}@x.com", purpose=None, auto_verify_codes=True, is_active=True, status="active",
+        created_at=datetime(2026, 1, 1, tzinfo=timezone.utc), expires_at=None, recovery_until=None,
+    )
+
+
+def test_list_endpoints_read_unread_counts_in_one_query():
+    from api import pool
+    from api.automation_temp_mailboxes import list_temp_mailboxes_for_api_key
+
+    mailboxes = [_mailbox(1), _mailbox(2), _mailbox(3)]
+    db = MagicMock()
+    query = db.query.return_value.filter.return_value.filter.return_value
+    query.count.return_value = 3
+    query.order_by.return_value.offset.return_value.limit.return_value.all.return_value = mailboxes
+    query.order_by.return_value.all.return_value = mailboxes
+    stats = {"m2@x.com": SimpleNamespace(unread_count=5)}
+    user = SimpleNamespace(id=1, pool_enabled=True, role="user")
+    api_key = SimpleNamespace(user_id=1, has_pool_access=True)
+
+    with patch.object(pool, "get_mailbox_stats_map", return_value=stats) as stats_map, \
+            patch.object(pool, "get_mailbox_stats") as single:
+        page = pool.list_temp_mailboxes(page=1, limit=20, include_purged=False, db=db, current_user=user)
+        items = list_temp_mailboxes_for_api_key(include_purged=False, db=db, api_key=api_key)
+
+    single.assert_not_called()
+    assert stats_map.call_count == 2
+    assert stats_map.call_args[0][1] == ["m1@x.com", "m2@x.com", "m3@x.com"]
+    assert [m.unread_count for m in page["items"]] == [0, 5, 0]
+    assert [m.unread_count for m in items] == [0, 5, 0]
@@ -0,0 +1,84 @@
+"""
+邮箱等待注册表测试
+"""
+import asyncio
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.mailbox_waiters import MailboxWaiterRegistry
+
+
+@pytest.mark.asyncio
+async def test_notify_wakes_waiter_for_same_address():
+    registry = MailboxWaiterRegistry()
+    waiter = registry.register("User@Example.com")
+    other = registry.register("other@example.com")
+    try:
+        assert registry.notify_local("user@example.com") == 1
+        assert await waiter.wait(1) is True
+        assert await other.wait(0.05) is False
+    finally:
+        registry.unregister(waiter)
+        registry.unregister(other)
+    assert registry.waiting_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_notify_from_ingest_thread():
+    registry = MailboxWaiterRegistry()
+    waiter = registry.register("a@example.com")
+    try:
+        thread = threading.Thread(target=registry.notify_local, args=("a@example.com",))
+        thread.start()
+        assert await waiter.wait(1) is True
+        thread.join()
+    finally:
+        registry.unregister(waiter)
+
+
+@pytest.mark.asyncio
+async def test_wait_times_out_and_can_be_reused():
+    registry = MailboxWaiterRegistry()
+    waiter = registry.register("a@example.com")
+    try:
+        assert await waiter.wait(0.05) is False
+        registry.notify_local("a@example.com")
+        assert await waiter.wait(1) is True
+        # 唤醒后事件已重置
+        assert await waiter.wait(0.05) is False
+    finally:
+        registry.unregister(waiter)
+
+
+@pytest.mark.asyncio
+async def test_unregistered_waiter_is_not_notified():
+    registry = MailboxWaiterRegistry()
+    waiter = registry.register("a@example.com")
+    registry.unregister(waiter)
+    assert registry.waiting_count("a@example.com") == 0
+    assert registry.notify_local("a@example.com") == 0
+    await asyncio.sleep(0)
+    assert await waiter.wait(0.05) is False
+
+
+def test_imap_sync_publishes_after_commit_when_code_found():
+    from core import imap_sync
+
+    raw = b"Subject: code\nMessage-ID: <m1@x>\n\nYour verification code is 482913\n"
+    imap = MagicMock()
+    imap.select.return_value = ("OK", [b"1"])
+    imap.search.return_value = ("OK", [b"1"])
+    imap.fetch.return_value = ("OK", [(b"1 (RFC822 {1}", raw)])
+    db = MagicMock()
+    db.query.return_value.filter.return_value.all.return_value = []
+    events = []
+    db.commit.side_effect = lambda: events.append("commit")
+
+    with patch.object(imap_sync.imaplib, "IMAP4", return_value=imap), \
+            patch.object(imap_sync.settings, "MAIL_USE_SSL", False), \
+            patch.object(imap_sync, "publish_new_code", side_effect=lambda address: events.append(address)):
+        assert imap_sync.sync_user_mailbox(db, "me@x.com", "pw", 1) == 1
+
+    assert events == ["commit", "me@x.com"]
@@ -0,0 +1,78 @@
+"""
+账号池统计缓存测试
+"""
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from sqlalchemy.dialects import postgresql
+
+from core import pool_stats
+from core.pool_stats import UserStatsCache, _aggregate_columns, _stats_join
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_cache_returns_cached_value_until_invalidated():
+    cache = UserStatsCache(ttl_seconds=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"total_mailboxes": len(calls)}
+
+    assert cache.get_or_load(1, loader) == {"total_mailboxes": 1}
+    assert cache.get_or_load(1, loader) == {"total_mailboxes": 1}
+    cache.invalidate(1)
+    assert cache.get_or_load(1, loader) == {"total_mailboxes": 2}
+
+
+def test_cache_expires_after_ttl():
+    cache = UserStatsCache(ttl_seconds=10)
+    with patch.object(pool_stats.time, "monotonic", return_value=100.0):
+        cache.get_or_load(1, lambda: "old")
+    with patch.object(pool_stats.time, "monotonic", return_value=111.0):
+        assert cache.get(1) is None
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    cache = UserStatsCache(ttl_seconds=60)
+
+    def loader():
+        # 加载期间入库路径使缓存失效
+        cache.invalidate(1)
+        return "stale"
+
+    assert cache.get_or_load(1, loader) == "stale"
+    assert cache.get(1) is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = UserStatsCache(ttl_seconds=60, max_entries=2)
+    cache.get_or_load(1, lambda: "a")
+    cache.get_or_load(2, lambda: "b")
+    cache.get(1)
+    cache.get_or_load(3, lambda: "c")
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert len(cache) == 2
+
+
+def test_notifications_invalidate_user_or_all():
+    cache = UserStatsCache(ttl_seconds=60)
+    with patch.object(pool_stats, "user_stats_cache", cache):
+        cache.get_or_load(1, lambda: "a")
+        cache.get_or_load(2, lambda: "b")
+        pool_stats._handle_notification("1")
+        assert cache.get(1) is None
+        assert cache.get(2) == "b"
+        pool_stats._handle_notification(pool_stats.INVALIDATE_ALL)
+        assert cache.get(2) is None
+
+
+def test_user_stats_use_single_filter_aggregate():
+    from sqlalchemy.orm import Session
+
+    query = _stats_join(Session(), *_aggregate_columns(NOW))
+    sql = str(query.statement.compile(dialect=postgresql.dialect()))
+    assert sql.count("FILTER (WHERE") == 6
+    assert "LEFT OUTER JOIN mailbox_email_stats" in sql
@@ -0,0 +1,82 @@
+"""
+JWT 登录用户快照缓存测试
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from core import principal_cache
+from core.principal_cache import PrincipalCache, UserPrincipal, load_principal
+
+ALICE = UserPrincipal(id=1, email="alice@example.com", role="user", pool_enabled=True)
+BOB = UserPrincipal(id=2, email="bob@example.com", role="admin", pool_enabled=False)
+
+
+def test_cached_principal_is_reused_until_invalidated():
+    cache = PrincipalCache(ttl_seconds=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return ALICE
+
+    assert cache.get_or_load((ALICE.email, 5), loader) is ALICE
+    assert cache.get_or_load((ALICE.email, 5), loader) is ALICE
+    assert len(calls) == 1
+    cache.invalidate_tag("user:1")
+    cache.get_or_load((ALICE.email, 5), loader)
+    assert len(calls) == 2
+
+
+def test_session_invalidation_only_drops_that_session():
+    cache = PrincipalCache(ttl_seconds=60)
+    cache.get_or_load((ALICE.email, 5), lambda: ALICE)
+    cache.get_or_load((ALICE.email, 6), lambda: ALICE)
+    cache.get_or_load((BOB.email, None), lambda: BOB)
+
+    cache.invalidate_tag("session:5")
+    assert cache.get((ALICE.email, 5)) is None
+    assert cache.get((ALICE.email, 6)) is ALICE
+    assert cache.get((BOB.email, None)) is BOB
+
+
+def test_missing_user_is_not_cached_and_ttl_expires():
+    cache = PrincipalCache(ttl_seconds=10)
+    assert cache.get_or_load(("ghost@example.com", None), lambda: None) is None
+    assert len(cache) == 0
+
+    with patch.object(principal_cache.time, "monotonic", return_value=100.0):
+        cache.get_or_load((ALICE.email, None), lambda: ALICE)
+    with patch.object(principal_cache.time, "monotonic", return_value=111.0):
+        assert cache.get((ALICE.email, None)) is None
+
+
+def test_invalidation_during_load_is_not_cached():
+    cache = PrincipalCache(ttl_seconds=60)
+
+    def loader():
+        cache.invalidate_tag("user:1")
+        return ALICE
+
+    assert cache.get_or_load((ALICE.email, None), loader) is ALICE
+    assert cache.get((ALICE.email, None)) is None
+
+
+def test_notifications_invalidate_tag_or_all():
+    cache = PrincipalCache(ttl_seconds=60)
+    with patch.object(principal_cache, "principal_cache", cache):
+        cache.get_or_load((ALICE.email, 5), lambda: ALICE)
+        cache.get_or_load((BOB.email, None), lambda: BOB)
+        principal_cache._handle_notification("session:5")
+        assert cache.get((ALICE.email, 5)) is None
+        principal_cache._handle_notification(principal_cache.INVALIDATE_ALL)
+        assert len(cache) == 0
+
+
+def test_revoked_session_does_not_load():
+    db = MagicMock()
+    user_query = db.query.return_value.filter.return_value
+    user_query.first.side_effect = [
+        SimpleNamespace(id=1, email=ALICE.email, role="user", pool_enabled=True),
+        None,
+    ]
+    assert load_principal(db, ALICE.email, 5) is None
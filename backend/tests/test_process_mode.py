@@ -0,0 +1,66 @@
+"""
+进程模式与按职责登记后台任务测试
+"""
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from core import background_jobs, websocket as ws_manager
+from core.job_coordinator import JobCoordinator, MemoryLeaseBackend
+from core.process_mode import MODE_ROLES, ROLE_API, parse_mode
+
+
+def registered(mode):
+    coordinator = JobCoordinator(MemoryLeaseBackend(), owner="w1")
+    background_jobs.register_jobs(coordinator, MODE_ROLES[mode])
+    return set(coordinator._jobs), set(coordinator._services)
+
+
+def test_parse_mode():
+    assert parse_mode(" Worker ") == "worker"
+    assert parse_mode("") == "all"
+    with pytest.raises(ValueError):
+        parse_mode("scheduler")
+
+
+def test_jobs_are_split_by_mode():
+    assert registered("api") == (set(), set())
+    assert registered("ingest") == ({"mail_sync", "external_sync"}, {"lmtp_server"})
+    worker_jobs, worker_services = registered("worker")
+    assert worker_jobs == {"session_cleanup", "temp_mailbox_maintenance", "pool_stats_rollup", "spam_training", "mail_import"}
+    assert worker_services == set()
+    all_jobs, all_services = registered("all")
+    assert all_jobs == {"mail_sync", "external_sync"} | worker_jobs
+    assert all_services == {"lmtp_server"}
+
+
+def test_api_mode_does_not_train_spam_inline():
+    from api import spam
+    with patch.object(spam.settings, "PROCESS_MODE", "api"):
+        assert not spam.has_role("worker")
+        assert spam.has_role(ROLE_API)
+
+
+@pytest.mark.asyncio
+async def test_new_email_notification_is_pushed_to_local_connections():
+    sent = AsyncMock()
+    loop = asyncio.get_running_loop()
+    with patch.object(ws_manager, "connections", {7: {object()}}), \
+            patch.object(ws_manager, "_loop", loop), \
+            patch.object(ws_manager, "notify_new_email", sent):
+        payload = json.dumps({"user_id": 7, "data": {"subject": "hi", "sender": "a@b.c"}})
+        # 监听线程中调用
+        await asyncio.to_thread(ws_manager._handle_notification, payload)
+        await asyncio.to_thread(ws_manager._handle_notification, json.dumps({"user_id": 8, "data": {}}))
+        await asyncio.sleep(0)
+    sent.assert_awaited_once_with(7, {"subject": "hi", "sender": "a@b.c"})
+
+
+def test_publish_truncates_subject():
+    with patch.object(ws_manager.config_cache, "publish") as publish:
+        ws_manager.publish_new_email(3, "x" * 1000, "s@example.com")
+    channel, payload = publish.call_args.args
+    assert channel == ws_manager.NOTIFY_CHANNEL
+    assert len(json.loads(payload)["data"]["subject"]) == ws_manager.MAX_SUBJECT_LENGTH
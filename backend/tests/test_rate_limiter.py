@@ -0,0 +1,60 @@
+"""
+滑动窗口限流测试
+"""
+from unittest.mock import patch
+
+from core.rate_limiter import (
+    MemoryRateLimitBackend,
+    PostgresRateLimitBackend,
+    RateLimiter,
+    estimate,
+)
+
+WINDOW_START = 6000 * 60.0
+
+
+def test_allows_up_to_limit_then_denies():
+    limiter = RateLimiter(MemoryRateLimitBackend())
+    results = [limiter.hit("k", 3, now=WINDOW_START + 1) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    denied = results[3]
+    assert denied.retry_after > 0
+    assert denied.headers()["Retry-After"] == str(denied.retry_after)
+    assert denied.headers()["X-RateLimit-Limit"] == "3"
+
+
+def test_denied_requests_are_not_counted():
+    limiter = RateLimiter(MemoryRateLimitBackend())
+    for _ in range(10):
+        limiter.hit("k", 2, now=WINDOW_START + 1)
+    # 下一窗口过半后，上一窗口的 2 次按一半权重计算
+    result = limiter.hit("k", 2, now=WINDOW_START + 90)
+    assert result.allowed
+    assert result.remaining == 0
+
+
+def test_previous_window_is_weighted():
+    assert estimate(previous=10, current=0, elapsed=15, window=60) == 7.5
+    limiter = RateLimiter(MemoryRateLimitBackend())
+    for _ in range(10):
+        limiter.hit("k", 10, now=WINDOW_START + 59)
+    assert not limiter.hit("k", 10, now=WINDOW_START + 61).allowed
+    assert limiter.hit("k", 10, now=WINDOW_START + 119).allowed
+
+
+def test_keys_are_independent_and_reset_is_window_end():
+    limiter = RateLimiter(MemoryRateLimitBackend())
+    assert limiter.hit("a", 1, now=WINDOW_START + 5).allowed
+    result = limiter.hit("b", 1, now=WINDOW_START + 5)
+    assert result.allowed
+    assert result.reset_at == int(WINDOW_START + 60)
+
+
+def test_postgres_backend_falls_back_to_memory_when_unavailable():
+    backend = PostgresRateLimitBackend()
+    with patch("db.database.engine") as engine:
+        engine.begin.side_effect = RuntimeError("down")
+        limiter = RateLimiter(backend)
+        assert limiter.hit("k", 1, now=WINDOW_START).allowed
+        assert not limiter.hit("k", 1, now=WINDOW_START).allowed
@@ -0,0 +1,34 @@
+"""
+保留前缀匹配器测试
+"""
+from core.reserved_prefixes import ReservedPrefixMatcher
+
+
+def test_exact_rules_are_case_insensitive():
+    matcher = ReservedPrefixMatcher(["Admin", " support "])
+    assert matcher.match("admin") == "admin"
+    assert matcher.match("SUPPORT") == "support"
+    assert matcher.match("admin1") is None
+    assert len(matcher) == 2
+
+
+def test_prefix_rules_report_shortest_match():
+    matcher = ReservedPrefixMatcher(["post*", "postmaster*"])
+    assert matcher.match("postmaster") == "post*"
+    assert matcher.match("post") == "post*"
+    assert matcher.match("pos") is None
+
+
+def test_wildcard_rules():
+    matcher = ReservedPrefixMatcher(["*bot", "test?", "a*z"])
+    assert matcher.match("mybot") == "*bot"
+    assert matcher.match("test1") == "test?"
+    assert matcher.match("test12") is None
+    assert matcher.match("abcz") == "a*z"
+    assert matcher.match("abc") is None
+
+
+def test_match_many_and_empty_rules():
+    matcher = ReservedPrefixMatcher(["", "root"])
+    assert matcher.match_many(["Root", "alice"]) == {"root": "root", "alice": None}
+    assert not ReservedPrefixMatcher([]).is_reserved("anything")
@@ -0,0 +1,66 @@
+"""
+启动耗时记录与 seeder 内容指纹测试
+"""
+from unittest.mock import MagicMock, patch
+
+from core.startup_profile import StartupProfile
+from db.models.system import SeedFingerprint
+from initial import seed_fingerprints
+from initial.seed_fingerprints import run_seeder, source_fingerprint
+
+
+def _seed_a(db):
+    return ["a"]
+
+
+def _seed_b(db):
+    return ["b"]
+
+
+def test_phases_are_recorded_in_order():
+    profile = StartupProfile()
+    with profile.phase("import"):
+        pass
+    profile.record("init_db", 0.25)
+    profile.mark_ready(0.5)
+
+    snap = profile.snapshot()
+    assert [p["name"] for p in snap["phases"]] == ["import", "init_db"]
+    assert snap["phases"][1]["duration_ms"] == 250
+    assert snap["ready_ms"] == 500
+
+
+def test_fingerprint_follows_source():
+    assert source_fingerprint(_seed_a) == source_fingerprint(_seed_a)
+    assert source_fingerprint(_seed_a) != source_fingerprint(_seed_b)
+    assert source_fingerprint(len) is None
+
+
+def test_seeder_runs_once_per_fingerprint():
+    db = MagicMock()
+    db.get.return_value = None
+    seeder = MagicMock()
+
+    assert run_seeder(db, "plans", seeder, "h1")
+    seeder.assert_called_once_with(db)
+    stored = db.add.call_args.args[0]
+    assert isinstance(stored, SeedFingerprint)
+    assert stored.content_hash == "h1"
+
+    db.get.return_value = stored
+    assert not run_seeder(db, "plans", seeder, "h1")
+    assert seeder.call_count == 1
+
+    assert run_seeder(db, "plans", seeder, "h2")
+    assert seeder.call_count == 2
+    assert stored.content_hash == "h2"
+
+
+def test_force_seed_and_missing_source_always_run():
+    db = MagicMock()
+    db.get.return_value = SeedFingerprint(name="plans", content_hash="h1")
+    seeder = MagicMock()
+    with patch.object(seed_fingerprints.settings, "STARTUP_FORCE_SEED", True):
+        assert run_seeder(db, "plans", seeder, "h1")
+    assert run_seeder(db, "plans", seeder, None)
+    assert seeder.call_count == 2
@@ -0,0 +1,99 @@
+"""
+临时邮箱批量创建测试
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from api import pool
+from api.pool import (
+    TempMailboxBatchCreate,
+    TempMailboxBatchItem,
+    _allocate_batch_emails,
+    create_temp_mailboxes_batch,
+    expand_batch_request,
+    normalize_idempotency_key,
+)
+from core.mailserver_sync import _parse_batch_output
+
+
+def test_parse_batch_output_marks_missing_as_failed():
+    output = b"OK a@x.com\nFAIL b@x.com\nnoise line\n"
+    assert _parse_batch_output(output, ["a@x.com", "b@x.com", "c@x.com"]) == {
+        "a@x.com": True,
+        "b@x.com": False,
+        "c@x.com": False,
+    }
+    assert _parse_batch_output(None, ["a@x.com"]) == {"a@x.com": False}
+
+
+def test_expand_batch_request():
+    items = expand_batch_request(TempMailboxBatchCreate(count=3, purpose="farm"))
+    assert len(items) == 3
+    assert all(item.purpose == "farm" and item.prefix is None for item in items)
+
+    explicit = [TempMailboxBatchItem(prefix="a", idempotency_key="k1")]
+    assert expand_batch_request(TempMailboxBatchCreate(items=explicit)) == explicit
+
+    with pytest.raises(HTTPException):
+        expand_batch_request(TempMailboxBatchCreate())
+    with pytest.raises(HTTPException):
+        expand_batch_request(TempMailboxBatchCreate(items=explicit, count=1))
+
+
+def test_normalize_idempotency_key():
+    assert normalize_idempotency_key(None) is None
+    assert normalize_idempotency_key(" k1 ") == "k1"
+    with pytest.raises(HTTPException):
+        normalize_idempotency_key("   ")
+    with pytest.raises(HTTPException):
+        normalize_idempotency_key("x" * 129)
+
+
+def make_user():
+    return SimpleNamespace(id=1, email="owner@x.com", role="user")
+
+
+def test_allocate_retries_random_prefix_after_collision():
+    db = MagicMock()
+    # 第一轮生成的 aaa 已被占用，第二轮只为该条目重新生成
+    db.query.return_value.filter.return_value.all.side_effect = [
+        [SimpleNamespace(email="aaa@x.com")],
+        [],
+    ]
+    matcher = MagicMock()
+    matcher.is_reserved.return_value = False
+    with patch.object(pool, "get_reserved_prefix_matcher", return_value=matcher), \
+            patch.object(pool, "generate_random_prefix", side_effect=["aaa", "bbb", "ccc"]):
+        emails = _allocate_batch_emails(db, make_user(), [None, None])
+
+    assert emails == ["ccc@x.com", "bbb@x.com"]
+    assert db.query.return_value.filter.return_value.all.call_count == 2
+
+
+def test_batch_reuses_mailbox_for_known_idempotency_key():
+    existing = SimpleNamespace(email="old@x.com", api_idempotency_key="k1")
+    db = MagicMock()
+    db.query.return_value.filter.return_value.all.return_value = [existing]
+    items = [
+        TempMailboxBatchItem(idempotency_key="k1"),
+        TempMailboxBatchItem(idempotency_key="k2", purpose="farm"),
+    ]
+    with patch.object(pool, "get_user_temp_mailbox_limit", return_value=-1), \
+            patch.object(pool, "_allocate_batch_emails", return_value=["new@x.com"]) as allocate, \
+            patch.object(pool, "get_policy_snapshot", return_value=SimpleNamespace(ttl_hours=24, recoverable_days=10)), \
+            patch.object(pool, "invalidate_user_stats"):
+        results, to_sync = create_temp_mailboxes_batch(db, make_user(), items, "batch_create")
+
+    # 只为新的幂等键分配地址
+    assert allocate.call_args[0][2] == [None]
+    assert results[0] == (existing, False, "k1")
+    mailbox, created, key = results[1]
+    assert (mailbox.email, mailbox.api_idempotency_key, created, key) == ("new@x.com", "k2", True, "k2")
+    assert to_sync == ["new@x.com"]
+    db.commit.assert_called_once()
+    # 提交后一次查询重新加载全部结果行
+    reload_filter = db.query.return_value.filter.call_args[0][0]
+    assert reload_filter.right.value == ["new@x.com", "old@x.com"]
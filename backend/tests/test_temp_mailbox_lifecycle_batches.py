@@ -0,0 +1,123 @@
+"""
+临时邮箱批量过期/清理语句测试
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from core import temp_mailbox_lifecycle as lifecycle
+from core.temp_mailbox_lifecycle import build_expire_batch_statement, build_purge_batch_statement
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect())).upper()
+
+
+def test_expire_batch_is_single_bounded_update_returning_email():
+    sql = _sql(build_expire_batch_statement(NOW, 500, timedelta(days=10)))
+    assert sql.startswith("UPDATE TEMP_MAILBOXES")
+    assert "LIMIT" in sql
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "RETURNING TEMP_MAILBOXES.EMAIL" in sql
+    assert "OWNER_ID" not in sql.split("WHERE", 1)[1]
+
+    assert "OWNER_ID" in _sql(build_expire_batch_statement(NOW, 500, timedelta(days=10), owner_id=7))
+
+
+def test_purge_batch_resumes_from_cursor():
+    assert "(TEMP_MAILBOXES.RECOVERY_UNTIL, TEMP_MAILBOXES.ID) >" not in _sql(build_purge_batch_statement(NOW, 100))
+    sql = _sql(build_purge_batch_statement(NOW, 100, cursor=(NOW - timedelta(days=1), 42)))
+    assert "(TEMP_MAILBOXES.RECOVERY_UNTIL, TEMP_MAILBOXES.ID) >" in sql
+    assert "RETURNING TEMP_MAILBOXES.EMAIL, TEMP_MAILBOXES.RECOVERY_UNTIL, TEMP_MAILBOXES.ID" in sql
+
+
+def _params(statement) -> dict:
+    return statement.compile(dialect=postgresql.dialect()).params
+
+
+def test_expire_batch_binds_cutoff_and_batch_size():
+    values = list(_params(build_expire_batch_statement(NOW, 500, timedelta(days=10), owner_id=7)).values())
+    assert NOW in values
+    assert 500 in values
+    assert 7 in values
+    assert lifecycle.STATUS_ACTIVE in values
+    assert lifecycle.STATUS_EXPIRED_RECOVERABLE in values
+
+
+def test_purge_runs_batches_until_short_batch_and_advances_cursor():
+    first = [
+        SimpleNamespace(email="a@x.com", recovery_until=NOW - timedelta(days=2), id=11),
+        SimpleNamespace(email="b@x.com", recovery_until=NOW - timedelta(days=1), id=12),
+    ]
+    second = [SimpleNamespace(email="c@x.com", recovery_until=NOW, id=13)]
+    db = MagicMock()
+    db.execute.return_value.all.side_effect = [first, second]
+    policy = make_policy(cleanup_batch_size=2)
+    provisioner = MagicMock()
+    cursors = []
+    db.commit.side_effect = lambda: cursors.append((policy.purge_cursor_recovery_until, policy.purge_cursor_id))
+
+    with patch.object(lifecycle, "mail_provisioner", provisioner), \
+            patch.object(lifecycle, "delete_emails_for_mailboxes") as delete_emails:
+        assert lifecycle.purge_expired_mailboxes(db, policy, now=NOW) == 3
+
+    # 游标随每批提交，扫描到末尾后复位
+    assert cursors == [(first[-1].recovery_until, 12), (None, None)]
+    assert policy.last_run_metrics["purge"]["count"] == 3
+
+    # 第二批从第一批最后一行 (recovery_until, id) 之后开始
+    second_values = list(_params(db.execute.call_args_list[1][0][0]).values())
+    assert first[-1].recovery_until in second_values and 12 in second_values
+    assert [c[0][1] for c in delete_emails.call_args_list] == [["a@x.com", "b@x.com"], ["c@x.com"]]
+    assert [c[0][0] for c in provisioner.submit_delete_many.call_args_list] == [["a@x.com", "b@x.com"], ["c@x.com"]]
+    assert db.commit.call_count == 2
+
+
+def make_policy(**overrides):
+    fields = dict(cleanup_batch_size=500, delete_emails_on_purge=True, purge_cursor_recovery_until=None,
+                  purge_cursor_id=None, last_run_metrics=None)
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def test_purge_resumes_from_cursor_stored_on_policy():
+    db = MagicMock()
+    db.execute.return_value.all.return_value = []
+    policy = make_policy(purge_cursor_recovery_until=NOW - timedelta(days=3), purge_cursor_id=77)
+    with patch.object(lifecycle, "mail_provisioner", MagicMock()):
+        assert lifecycle.purge_expired_mailboxes(db, policy, now=NOW) == 0
+
+    values = list(_params(db.execute.call_args_list[0][0][0]).values())
+    assert NOW - timedelta(days=3) in values and 77 in values
+    assert policy.purge_cursor_id is None
+
+
+def test_metrics_are_read_from_policy_row():
+    policy = make_policy(
+        purge_cursor_recovery_until=NOW, purge_cursor_id=5,
+        last_run_metrics={"expire": {"count": 4}},
+    )
+    with patch.object(lifecycle, "get_or_create_policy", return_value=policy), \
+            patch.object(lifecycle, "count_backlog", return_value={"expire_backlog": 0}):
+        metrics = lifecycle.get_lifecycle_metrics(MagicMock())
+
+    assert metrics["last_run"] == {"expire": {"count": 4}}
+    assert metrics["purge_cursor"] == {"recovery_until": NOW.isoformat(), "id": 5}
+
+
+def test_reconcile_deletes_leaked_accounts_of_inactive_mailboxes():
+    db = MagicMock()
+    db.execute.return_value.scalars.return_value = iter(["old@x.com"])
+    provisioner = MagicMock()
+    with patch.object(lifecycle, "get_existing_mail_users", return_value={"old@x.com", "live@x.com", "user@x.com"}), \
+            patch.object(lifecycle, "mail_provisioner", provisioner):
+        assert lifecycle.reconcile_mailserver_accounts(db) == 1
+
+    provisioner.submit_delete_many.assert_called_once_with(["old@x.com"])
+    statement = db.execute.call_args[0][0]
+    params = statement.compile(dialect=postgresql.dialect()).params
+    assert ["live@x.com", "old@x.com", "user@x.com"] in params.values()
@@ -0,0 +1,29 @@
+"""
+临时邮箱读取时状态计算测试
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from core.temp_mailbox_lifecycle import (
+    STATUS_ACTIVE,
+    STATUS_EXPIRED_RECOVERABLE,
+    STATUS_PURGED,
+    effective_status,
+)
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _mailbox(status, expires_at):
+    return SimpleNamespace(status=status, expires_at=expires_at)
+
+
+def test_active_mailbox_past_expiry_reads_as_recoverable():
+    assert effective_status(_mailbox(STATUS_ACTIVE, NOW - timedelta(seconds=1)), NOW) == STATUS_EXPIRED_RECOVERABLE
+    assert effective_status(_mailbox(STATUS_ACTIVE, NOW + timedelta(hours=1)), NOW) == STATUS_ACTIVE
+
+
+def test_stored_status_is_kept_otherwise():
+    assert effective_status(_mailbox(STATUS_ACTIVE, None), NOW) == STATUS_ACTIVE
+    assert effective_status(_mailbox(None, None), NOW) == STATUS_ACTIVE
+    assert effective_status(_mailbox(STATUS_PURGED, NOW - timedelta(days=1)), NOW) == STATUS_PURGED
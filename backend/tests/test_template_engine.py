@@ -0,0 +1,81 @@
+"""
+模板引擎编译与渲染测试
+"""
+from unittest.mock import Mock
+
+import pytest
+
+from core import template_engine
+from core.template_engine import TemplateEngine, compile_template, render_compiled
+
+
+@pytest.fixture
+def engine():
+    """不带全局变量的模板引擎"""
+    engine = TemplateEngine(Mock())
+    engine._global_vars_cache = {"app_name": "TalentMail"}
+    return engine
+
+
+class TestTemplateRender:
+    """模板渲染语义测试"""
+
+    def test_render_variables_and_globals(self, engine):
+        result = engine.render("{{app_name}} 验证码: {{ code }}", {"code": "123456"})
+        assert result == "TalentMail 验证码: 123456"
+
+    def test_render_default_value(self, engine):
+        template = 'Hi {{username|default:"用户"}}'
+        assert engine.render(template, {}) == "Hi 用户"
+        assert engine.render(template, {"username": ""}) == "Hi 用户"
+        assert engine.render(template, {"username": "Alice"}) == "Hi Alice"
+
+    def test_missing_variable_renders_empty(self, engine):
+        assert engine.render("[{{missing}}]", {}) == "[]"
+
+    def test_conditionals(self, engine):
+        template = "A{{#if show}}B{{/if}}C"
+        assert engine.render(template, {"show": True}) == "ABC"
+        for falsy in (None, "", "0", "false", "None", 0, []):
+            assert engine.render(template, {"show": falsy}) == "AC"
+
+    def test_nested_conditionals(self, engine):
+        template = "{{#if a}}x{{#if b}}y{{/if}}z{{/if}}"
+        assert engine.render(template, {"a": 1, "b": 1}) == "xyz"
+        assert engine.render(template, {"a": 1, "b": 0}) == "xz"
+        assert engine.render(template, {"a": 0, "b": 1}) == ""
+
+    def test_unbalanced_tags_are_kept(self, engine):
+        assert engine.render("{{/if}}a", {}) == "{{/if}}a"
+        assert engine.render("{{#if a}}b{{x}}", {"x": "1"}) == "{{#if a}}b1"
+
+    def test_values_are_not_reparsed(self, engine):
+        assert engine.render("{{a}}", {"a": "{{b}}", "b": "no"}) == "{{b}}"
+
+
+class TestCompiledCache:
+    """编译缓存测试"""
+
+    def test_compile_is_cached_by_content(self):
+        assert compile_template("Hello {{name}}") is compile_template("Hello {{name}}")
+        assert render_compiled(compile_template("Hello {{name}}"), {"name": "Bob"}) == "Hello Bob"
+
+    def test_compiled_email_template_reused_until_updated(self):
+        template_engine.invalidate_template_cache()
+        db = Mock()
+        version = Mock(id=1, updated_at="v1")
+        row = Mock(code="welcome", updated_at="v1", subject="Hi {{name}}", body_html="<b>{{name}}</b>", body_text=None)
+        db.query.return_value.filter.return_value.first.side_effect = [version, row, version]
+
+        engine = TemplateEngine(db)
+        engine._global_vars_cache = {}
+        first = engine.render_template("welcome", {"name": "Bob"})
+        second = engine.render_template("welcome", {"name": "Eve"})
+
+        assert first == {"subject": "Hi Bob", "body_html": "<b>Bob</b>", "body_text": ""}
+        assert second["subject"] == "Hi Eve"
+        # 第二次渲染只查询版本，不重新加载模板正文
+        assert db.query.return_value.filter.return_value.first.call_count == 3
+
+        template_engine.invalidate_template_cache("welcome")
+        assert ("welcome", "v1") not in template_engine._compiled_email_templates
@@ -0,0 +1,40 @@
+"""
+验证码提取测试
+"""
+from types import SimpleNamespace
+
+from core import verification_codes
+from core.verification_codes import apply_verification_code, extract_code, html_to_text, register_pattern
+
+
+def test_extract_from_text_reports_pattern():
+    match = extract_code("您的验证码是：A1B2C3，5 分钟内有效")
+    assert match.code == "A1B2C3"
+    assert match.pattern == "zh_label"
+
+    match = extract_code("Your verification code is 482913.")
+    assert (match.code, match.pattern) == ("482913", "en_verification_code")
+
+    assert extract_code("Order\n 123456 \nthanks").pattern == "standalone_digits"
+    assert extract_code("hello world") is None
+
+
+def test_html_is_converted_before_matching():
+    body_html = (
+        '<html><head><style>.c{width:100000px}</style></head>'
+        '<body><div data-id="99999">Code:&nbsp;<b>7788</b></div></body></html>'
+    )
+    assert "99999" not in html_to_text(body_html)
+    match = extract_code(None, body_html)
+    assert match.code == "7788"
+
+
+def test_register_pattern_and_apply():
+    original = verification_codes.get_patterns()
+    try:
+        register_pattern("pin", r"PIN\s*#\s*(\d{3})", index=0)
+        email_obj = SimpleNamespace(body_text="PIN # 321", body_html=None)
+        apply_verification_code(email_obj)
+        assert (email_obj.verification_code, email_obj.verification_code_pattern) == ("321", "pin")
+    finally:
+        verification_codes._patterns[:] = original
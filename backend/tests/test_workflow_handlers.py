@@ -5,12 +5,16 @@ import pytest
 from unittest.mock import Mock, AsyncMock, MagicMock, patch
 from datetime import datetime, timedelta
 import asyncio
+import threading
 
 # Import handlers
 from core.workflow_service import (
     NodeHandler,
     GenerateCodeHandler,
     ConditionHandler,
+    CreateUserHandler,
+    DataUpdateUserHandler,
+    LogHandler,
     SendTemplateEmailHandler,
 )
 
@@ -311,7 +315,11 @@ class TestSendTemplateEmailHandler:
 
         # Mock MailService
         with patch('core.workflow_service.MailService') as MockMailService:
-            mock_mail_service = AsyncMock()
+            mock_mail_service = MagicMock()
+            mock_mail_service.template_engine.render_template.return_value = {
+                'subject': 'Welcome', 'body_html': '<p>123456</p>', 'body_text': '123456',
+            }
+            mock_mail_service.send_raw.return_value = True
             MockMailService.return_value = mock_mail_service
 
             result = await handler.execute(config, context)
@@ -319,11 +327,109 @@ class TestSendTemplateEmailHandler:
             assert result['status'] == 'sent'
             assert result['to'] == 'user@example.com'
             assert result['template'] == 'welcome_email'
-            mock_mail_service.send_template_email.assert_called_once_with(
-                to='user@example.com',
-                template_code='welcome_email',
-                template_data={'name': 'Test User', 'code': '123456'}
+            mock_mail_service.template_engine.render_template.assert_called_once_with(
+                'welcome_email', {'name': 'Test User', 'code': '123456'}
             )
+            mock_mail_service.send_raw.assert_called_once_with(
+                to_email='user@example.com',
+                subject='Welcome',
+                body_html='<p>123456</p>',
+                body_text='123456',
+            )
+
+    @pytest.mark.asyncio
+    async def test_send_email_failure_raises(self, mock_db):
+        """模板不存在或发送失败时节点失败"""
+        handler = SendTemplateEmailHandler(mock_db)
+        config = {'to': 'user@example.com', 'template_code': 'welcome_email', 'variables': {}}
+
+        with patch('core.workflow_service.MailService') as MockMailService:
+            MockMailService.return_value.template_engine.render_template.return_value = {
+                'subject': 's', 'body_html': '', 'body_text': 't',
+            }
+            MockMailService.return_value.send_raw.return_value = False
+            with pytest.raises(RuntimeError):
+                await handler.execute(config, MockRuntimeContext())
+
+            MockMailService.return_value.template_engine.render_template.return_value = None
+            with pytest.raises(ValueError, match="Template not found"):
+                await handler.execute(config, MockRuntimeContext())
+
+
+class ThreadRecordingSession:
+    """记录每次会话访问所在线程的假会话"""
+
+    def __init__(self, first=None):
+        self.threads = []
+        self.first = first
+        self.added = []
+
+    def _record(self):
+        self.threads.append(threading.get_ident())
+
+    def add(self, obj):
+        self._record()
+        self.added.append(obj)
+
+    def commit(self):
+        self._record()
+
+    def refresh(self, obj):
+        self._record()
+        obj.id = 42
+
+    def query(self, *args):
+        self._record()
+        query = MagicMock()
+        query.filter.return_value.first.side_effect = lambda: self._record() or self.first
+        return query
+
+
+class TestSessionAccessOffLoop:
+    """处理器的所有会话访问都在 run_db 的工作线程中执行"""
+
+    @pytest.mark.asyncio
+    async def test_generate_code_adds_and_commits_in_worker_thread(self):
+        db = ThreadRecordingSession()
+        await GenerateCodeHandler(db).execute({'email': 'a@example.com'}, MockRuntimeContext())
+        assert len(db.added) == 1
+        assert db.threads and threading.get_ident() not in db.threads
+
+    @pytest.mark.asyncio
+    async def test_create_user_reads_id_before_leaving_worker_thread(self):
+        db = ThreadRecordingSession()
+        form_data = {'email': 'new@example.com', 'password': 'pw'}
+        context = MagicMock()
+        context.get_variable.side_effect = lambda name, default=None: form_data if name == 'form_data' else default
+        with patch('core.security.get_password_hash', return_value='hashed'):
+            ok, output, _ = await CreateUserHandler(db).execute({}, context)
+        assert ok and output == {'user_id': 42, 'user_email': 'new@example.com'}
+        assert threading.get_ident() not in db.threads
+
+    @pytest.mark.asyncio
+    async def test_update_user_commits_and_reads_id_in_worker_thread(self):
+        user = MagicMock(id=7)
+        db = ThreadRecordingSession(first=user)
+        with patch('core.security.get_password_hash', return_value='hashed'), \
+                patch('core.principal_cache.invalidate_user_principals') as invalidate:
+            result = await DataUpdateUserHandler(db).execute(
+                {'user_id': '7', 'updates': {'password': 'new'}}, MockRuntimeContext()
+            )
+        assert result['success'] and result['user_id'] == 7
+        assert user.password_hash == 'hashed'
+        invalidate.assert_called_once_with(7)
+        assert threading.get_ident() not in db.threads
+
+    @pytest.mark.asyncio
+    async def test_log_renders_in_worker_thread(self):
+        threads = []
+        with patch('core.workflow_service.TemplateEngine') as engine:
+            engine.return_value.render.side_effect = lambda message, variables: threads.append(
+                threading.get_ident()) or message
+            context = MagicMock(variables={})
+            ok, output, _ = await LogHandler(Mock()).execute({'message': 'hi'}, context)
+        assert ok and output['message'] == 'hi'
+        assert threads and threading.get_ident() not in threads
 
 
 class TestNodeHandlerIntegration: